@@ -3,8 +3,14 @@ import sys
 import os
 import re
 import time
+import random
+import shutil
+import tracemalloc
 
 def memoryusage():
+    usage = memory_usage()
+    if "mem_rss" in usage:
+        return float(usage["mem_rss"]) / 1024 / 1024
     for line in open("/proc/self/status"):
         line = line.rstrip()
         if line.startswith("VmRSS:"):
@@ -12,25 +18,116 @@ def memoryusage():
             return float(line) / 1024
     return -1
 
-musage = memoryusage()
-rnum = 1000000
-if len(sys.argv) > 1:
-    rnum = int(sys.argv[1])
+def sizegen(spec, rng):
+    if spec.startswith("exp:"):
+        mean = float(spec[4:])
+        return lambda: max(int(rng.expovariate(1.0 / mean)), 1)
+    if "-" in spec:
+        low, high = spec.split("-", 1)
+        return lambda: rng.randint(int(low), int(high))
+    size = int(spec)
+    return lambda: size
+
+def measure(path, rnum, ksizspec, vsizspec):
+    rng = random.Random(rnum)
+    ksiz = sizegen(ksizspec, rng)
+    vsiz = sizegen(vsizspec, rng)
+    records = []
+    for i in range(0, rnum):
+        key = "{:08d}".format(i)
+        key = key + "k" * max(ksiz() - len(key), 0)
+        records.append((key, "v" * vsiz()))
+    payload = sum(len(key) + len(value) for key, value in records)
+    tracemalloc.start()
+    musage = memoryusage()
+    pusage = tracemalloc.get_traced_memory()[0]
+    tusage = tracemalloc.get_tracemalloc_memory()
+    if path is None:
+        hash = {}
+    else:
+        hash = DB()
+        if not hash.open(path, DB.OWRITER | DB.OCREATE | DB.OTRUNCATE):
+            raise RuntimeError(hash.error())
+    stime = time.time()
+    for key, value in records:
+        hash[key] = value
+    etime = time.time()
+    total = (memoryusage() - musage) * 1024 * 1024
+    python = tracemalloc.get_traced_memory()[0] - pusage
+    tracing = tracemalloc.get_tracemalloc_memory() - tusage
+    tracemalloc.stop()
+    result = {
+        "path": "dict" if path is None else path,
+        "count": len(hash),
+        "time": etime - stime,
+        "payload": payload,
+        "total": total,
+        "python": python,
+        "native": total - python - tracing,
+        "overhead": (total - payload) / rnum,
+        "size": hash.size() if path is not None else 0,
+    }
+    if path is not None:
+        hash.close()
+        filepath = re.sub(r"#.*", "", path)
+        if os.path.isdir(filepath):
+            shutil.rmtree(filepath)
+        elif os.path.isfile(filepath):
+            os.remove(filepath)
+    return result
 
-if len(sys.argv) > 2:
-    hash = DB()
-    if not hash.open(sys.argv[2], DB.OWRITER | DB.OCREATE | DB.OTRUNCATE):
-        raise RuntimeError(hash.error())
-else:
-    hash = {}
+def recommend(result, rnum, target):
+    scale = float(target) / rnum
+    name = re.sub(r"#.*", "", result["path"])
+    if name == "*":
+        return "#capsiz={}".format(int(result["size"] * scale * 1.2))
+    if name.endswith(".kch"):
+        return "#msiz={}".format(int(result["size"] * scale * 1.2))
+    if name.endswith(".kct"):
+        return "#msiz={}#pccap={}".format(int(result["size"] * scale * 1.2),
+                                         int(result["size"] * scale * 0.2))
+    if name.endswith(".kcf"):
+        return "#pccap={}".format(int(result["size"] * scale * 0.2))
+    return ""
 
-stime = time.time()
-for i in range(0, rnum):
-    key = "{:08d}".format(i)
-    value = "{:08d}".format(i)
-    hash[key] = value
-etime = time.time()
+ksizspec = "8"
+vsizspec = "8"
+target = None
+args = []
+i = 1
+while i < len(sys.argv):
+    arg = sys.argv[i]
+    if not args and arg in ("-ksiz", "-vsiz", "-target") and i + 1 < len(sys.argv):
+        i += 1
+        if arg == "-ksiz":
+            ksizspec = sys.argv[i]
+        elif arg == "-vsiz":
+            vsizspec = sys.argv[i]
+        else:
+            target = atoix(sys.argv[i])
+    else:
+        args.append(arg)
+    i += 1
+
+rnum = 1000000
+if len(args) > 0:
+    rnum = int(args[0])
+paths = args[1:] or [None]
+if target is None:
+    target = rnum
 
-print("Count: {}".format(len(hash)))
-print("Time: {:.3f} sec.".format(etime - stime))
-print("Usage: {:.3f} MB".format(memoryusage() - musage))
+for path in paths:
+    result = measure(path, rnum, ksizspec, vsizspec)
+    print("Path: {}".format(result["path"]))
+    print("Count: {}".format(result["count"]))
+    print("Time: {:.3f} sec.".format(result["time"]))
+    print("Usage: {:.3f} MB".format(result["total"] / 1024 / 1024))
+    print("Python: {:.3f} MB".format(result["python"] / 1024 / 1024))
+    print("Native: {:.3f} MB".format(result["native"] / 1024 / 1024))
+    print("Overhead: {:.1f} bytes/record".format(result["overhead"]))
+    if result["size"] > 0:
+        print("Size: {} bytes".format(result["size"]))
+    tuning = recommend(result, rnum, target)
+    if tuning:
+        print("Recommended for {} records: {}".format(target, tuning))
+    print("")
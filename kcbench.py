@@ -0,0 +1,839 @@
+#! /usr/bin/python3
+# -*- coding: utf-8 -*-
+
+# ------------------------------------------------------------------------------------------------
+# The benchmark cases of the Python binding
+#                                                                Copyright (C) 2009-2010 FAL Labs
+# This file is part of Kyoto Cabinet.
+# This program is free software: you can redistribute it and/or modify it under the terms of
+# the GNU General Public License as published by the Free Software Foundation, either version
+# 3 of the License, or any later version.
+# This program is distributed in the hope that it will be useful, but WITHOUT ANY WARRANTY;
+# without even the implied warranty of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+# See the GNU General Public License for more details.
+# You should have received a copy of the GNU General Public License along with this program.
+# If not, see <http://www.gnu.org/licenses/>.
+# -------------------------------------------------------------------------------------------------
+
+
+from kyotocabinet import *
+import sys
+import os
+import re
+import random
+import time
+import threading
+import multiprocessing
+import shutil
+import json
+
+
+# main routine
+def main():
+    if len(sys.argv) < 2: usage()
+    if sys.argv[1] == "tune":
+        rv = runtune()
+    elif sys.argv[1] == "stats":
+        rv = runstats()
+    elif sys.argv[1] == "suite":
+        rv = runsuite()
+    elif sys.argv[1] == "compare":
+        rv = runcompare()
+    elif sys.argv[1] == "ycsb":
+        rv = runycsb()
+    else:
+        usage()
+    return rv
+
+
+# print the usage and exit
+def usage():
+    print("{}: benchmark cases of the Python binding".format(progname), file=sys.stderr)
+    print("", file=sys.stderr)
+    print("usage:", file=sys.stderr)
+    print("  {} tune [-ksiz num] [-vsiz num] [-mem num] [-wl str] path rnum".format(progname),
+          file=sys.stderr)
+    print("  {} stats [-vsiz num] path rnum".format(progname), file=sys.stderr)
+    print("  {} suite [-types str] [-th str] [-cc] [-seed num] [-json path] rnum".format(progname),
+          file=sys.stderr)
+    print("  {} compare [-thres num] base target".format(progname), file=sys.stderr)
+    print("  {} ycsb [-wl str] [-dist str] [-mix str] [-vsiz num] [-ops num] [-scan num]"
+          " [-th num] [-proc num] [-cc] [-seed num] path rnum".format(progname), file=sys.stderr)
+    print("", file=sys.stderr)
+    exit(1)
+
+
+# generate a random number
+def rand(num):
+    if num < 2: return 0
+    return rndstate.randint(0, num - 1)
+
+
+# print the error message of the database
+def dberrprint(db, func):
+    err = db.error()
+    print("{}: {}: {}: {}: {}".format(progname, func, err.code(), err.name(), err.message()))
+
+
+# remove the files of a database
+def removedb(path):
+    path = re.sub(r"#.*", "", path)
+    if path in ("-", "+", ":", "*", "%"): return
+    shutil.rmtree(path, True)
+    try:
+        os.remove(path)
+    except OSError as e:
+        pass
+
+
+# parse arguments of tune command
+def runtune():
+    path = None
+    rnum = None
+    ksiz = 8
+    vsiz = 8
+    mem = None
+    workload = "balanced"
+    i = 2
+    while i < len(sys.argv):
+        arg = sys.argv[i]
+        if path is None and arg.startswith("-"):
+            if arg == "-ksiz":
+                i += 1
+                if i >= len(sys.argv): usage()
+                ksiz = int(sys.argv[i])
+            elif arg == "-vsiz":
+                i += 1
+                if i >= len(sys.argv): usage()
+                vsiz = int(sys.argv[i])
+            elif arg == "-mem":
+                i += 1
+                if i >= len(sys.argv): usage()
+                mem = atoix(sys.argv[i])
+            elif arg == "-wl":
+                i += 1
+                if i >= len(sys.argv): usage()
+                workload = sys.argv[i]
+            else:
+                usage()
+        elif path is None:
+            path = arg
+        elif rnum is None:
+            rnum = int(arg)
+        else:
+            usage()
+        i += 1
+    if path is None or rnum is None or rnum < 1 or ksiz < 1 or vsiz < 0: usage()
+    rv = proctune(path, rnum, ksiz, vsiz, mem, workload)
+    return rv
+
+
+# perform tune command
+def proctune(path, rnum, ksiz, vsiz, mem, workload):
+    print("<Tuning Benchmark>")
+    print("  path={}  rnum={}  ksiz={}  vsiz={}  mem={}  workload={}".
+          format(path, rnum, ksiz, vsiz, mem, workload))
+    print("")
+    err = False
+    keyfmt = "{{:0{}d}}".format(ksiz)
+    value = "v" * vsiz
+    results = []
+    for label in ("default", "tuned"):
+        removedb(path)
+        db = DB()
+        print("opening the database ({}):".format(label))
+        if label == "default":
+            rv = db.open(path, DB.OWRITER | DB.OCREATE | DB.OTRUNCATE)
+        else:
+            rv = db.open(path, DB.OWRITER | DB.OCREATE | DB.OTRUNCATE,
+                         expected_records=rnum, avg_key_size=ksiz, avg_value_size=vsiz,
+                         memory_budget=mem, workload=workload)
+        if not rv:
+            dberrprint(db, "DB::open")
+            err = True
+            break
+        tuning = db.tuning()
+        if tuning is not None:
+            for key in sorted(tuning):
+                print("  {}={}".format(key, tuning[key]))
+        print("setting records:")
+        stime = time.time()
+        for i in range(1, rnum + 1):
+            if not db.set(keyfmt.format(i), value):
+                dberrprint(db, "DB::set")
+                err = True
+                break
+        settime = time.time() - stime
+        print("time: {:.3f}".format(settime))
+        print("getting records:")
+        stime = time.time()
+        for i in range(1, rnum + 1):
+            if db.get(keyfmt.format(rand(rnum) + 1)) is None:
+                dberrprint(db, "DB::get")
+                err = True
+                break
+        gettime = time.time() - stime
+        print("time: {:.3f}".format(gettime))
+        print("size: {}".format(db.size()))
+        results.append((label, settime, gettime, db.size()))
+        if not db.close():
+            dberrprint(db, "DB::close")
+            err = True
+    removedb(path)
+    if len(results) == 2:
+        print("comparison:")
+        base = results[0]
+        for label, settime, gettime, size in results:
+            print("  {:8s} set={:.3f} ({:.2f}x)  get={:.3f} ({:.2f}x)  size={}".format(
+                label, settime, base[1] / settime if settime > 0 else 0,
+                gettime, base[2] / gettime if gettime > 0 else 0, size))
+    print("error" if err else "ok")
+    print("")
+    return 1 if err else 0
+
+
+# parse arguments of stats command
+def runstats():
+    path = None
+    rnum = None
+    vsiz = 8
+    i = 2
+    while i < len(sys.argv):
+        arg = sys.argv[i]
+        if path is None and arg.startswith("-"):
+            if arg == "-vsiz":
+                i += 1
+                if i >= len(sys.argv): usage()
+                vsiz = int(sys.argv[i])
+            else:
+                usage()
+        elif path is None:
+            path = arg
+        elif rnum is None:
+            rnum = int(arg)
+        else:
+            usage()
+        i += 1
+    if path is None or rnum is None or rnum < 1 or vsiz < 0: usage()
+    rv = procstats(path, rnum, vsiz)
+    return rv
+
+
+# perform stats command
+def procstats(path, rnum, vsiz):
+    print("<Statistics Overhead Benchmark>")
+    print("  path={}  rnum={}  vsiz={}".format(path, rnum, vsiz))
+    print("")
+    err = False
+    value = "v" * vsiz
+    results = []
+    for label in ("disabled", "enabled"):
+        removedb(path)
+        db = DB()
+        print("opening the database ({}):".format(label))
+        if not db.open(path, DB.OWRITER | DB.OCREATE | DB.OTRUNCATE):
+            dberrprint(db, "DB::open")
+            err = True
+            break
+        db.tune_stats(label == "enabled")
+        print("setting records:")
+        stime = time.time()
+        for i in range(1, rnum + 1):
+            if not db.set("{:08d}".format(i), value):
+                dberrprint(db, "DB::set")
+                err = True
+                break
+        settime = time.time() - stime
+        print("time: {:.3f}".format(settime))
+        print("getting records:")
+        stime = time.time()
+        for i in range(1, rnum + 1):
+            if db.get("{:08d}".format(i)) is None:
+                dberrprint(db, "DB::get")
+                err = True
+                break
+        gettime = time.time() - stime
+        print("time: {:.3f}".format(gettime))
+        stats = db.stats()
+        if stats is not None:
+            for name in ("set", "get"):
+                entry = stats[name]
+                print("  {}: calls={} native={:.3f} lock={:.3f} conv={:.3f}".format(
+                    name, entry["calls"], entry["native_time"], entry["lock_time"],
+                    entry["conv_time"]))
+        results.append((label, settime, gettime))
+        if not db.close():
+            dberrprint(db, "DB::close")
+            err = True
+    removedb(path)
+    if len(results) == 2:
+        print("overhead:")
+        base = results[0]
+        for label, settime, gettime in results:
+            print("  {:8s} set={:.3f} ({:+.1f}%)  get={:.3f} ({:+.1f}%)".format(
+                label, settime, (settime / base[1] - 1) * 100 if base[1] > 0 else 0,
+                gettime, (gettime / base[2] - 1) * 100 if base[2] > 0 else 0))
+    print("error" if err else "ok")
+    print("")
+    return 1 if err else 0
+
+
+# parse arguments of suite command
+def runsuite():
+    rnum = None
+    types = ":,*,%,kch,kct,kcd,kcf"
+    thnums = "1,2,4"
+    gopts = 0
+    seed = 19780211
+    jpath = None
+    i = 2
+    while i < len(sys.argv):
+        arg = sys.argv[i]
+        if rnum is None and arg.startswith("-"):
+            if arg == "-types":
+                i += 1
+                if i >= len(sys.argv): usage()
+                types = sys.argv[i]
+            elif arg == "-th":
+                i += 1
+                if i >= len(sys.argv): usage()
+                thnums = sys.argv[i]
+            elif arg == "-cc":
+                gopts |= DB.GCONCURRENT
+            elif arg == "-seed":
+                i += 1
+                if i >= len(sys.argv): usage()
+                seed = int(sys.argv[i])
+            elif arg == "-json":
+                i += 1
+                if i >= len(sys.argv): usage()
+                jpath = sys.argv[i]
+            else:
+                usage()
+        elif rnum is None:
+            rnum = int(arg)
+        else:
+            usage()
+        i += 1
+    if rnum is None or rnum < 1: usage()
+    types = [name for name in types.split(",") if name]
+    thnums = [int(num) for num in thnums.split(",") if num]
+    if not types or not thnums or min(thnums) < 1: usage()
+    rv = procsuite(rnum, types, thnums, gopts, seed, jpath)
+    return rv
+
+
+# get the path of a database type for the suite command
+def suitepath(dbtype):
+    if dbtype in (":", "*", "%", "+", "-"): return dbtype
+    return "casket." + dbtype
+
+
+# run a benchmark case of the suite command
+def suitecase(db, func, count, thnum):
+    db.stats(True)
+    errs = []
+    if thnum > 1:
+        def worker(thid):
+            if not func(thid, thnum): errs.append(thid)
+        threads = []
+        stime = time.time()
+        for thid in range(0, thnum):
+            th = threading.Thread(target=worker, args=(thid,))
+            th.start()
+            threads.append(th)
+        for th in threads:
+            th.join()
+        etime = time.time()
+    else:
+        stime = time.time()
+        if not func(0, 1): errs.append(0)
+        etime = time.time()
+    elapsed = etime - stime
+    stats = db.stats(True)
+    native = sum(entry["native_time"] for entry in stats.values())
+    calls = sum(entry["calls"] for entry in stats.values())
+    result = {
+        "ops": count,
+        "threads": thnum,
+        "time": elapsed,
+        "ops_per_sec": count / elapsed if elapsed > 0 else 0.0,
+        "calls": calls,
+        "native_time": native,
+        "overhead": 1.0 - native / elapsed if elapsed > 0 and native <= elapsed else 0.0,
+    }
+    return result, not errs
+
+
+# perform suite command
+def procsuite(rnum, types, thnums, gopts, seed, jpath):
+    print("<Benchmark Suite>")
+    print("  rnum={}  types={}  th={}  gopts={}  seed={}  json={}".
+          format(rnum, ",".join(types), ",".join(str(num) for num in thnums), gopts, seed, jpath))
+    print("")
+    err = False
+    results = []
+    keys = ["{:08d}".format(i) for i in range(1, rnum + 1)]
+    rndstate.seed(seed)
+    order = list(keys)
+    rndstate.shuffle(order)
+    bnum = 100
+
+    def benchset(db):
+        return lambda thid, thnum: all(db.set(key, key) for key in order[thid::thnum])
+
+    def benchget(db):
+        return lambda thid, thnum: all(db.get(key) is not None for key in order[thid::thnum])
+
+    def benchsetbulk(db):
+        def func(thid, thnum):
+            for i in range(thid * bnum, rnum, thnum * bnum):
+                recs = dict((key, key) for key in order[i:i + bnum])
+                if db.set_bulk(recs) != len(recs): return False
+            return True
+        return func
+
+    def benchgetbulk(db):
+        def func(thid, thnum):
+            for i in range(thid * bnum, rnum, thnum * bnum):
+                part = order[i:i + bnum]
+                if len(db.get_bulk(part)) != len(part): return False
+            return True
+        return func
+
+    def benchcursor(db):
+        def func(thid, thnum):
+            cur = db.cursor()
+            cnt = 0
+            if cur.jump():
+                while cur.get(True) is not None:
+                    cnt += 1
+            cur.disable()
+            return cnt == rnum
+        return func
+
+    def benchvisitor(db):
+        def func(thid, thnum):
+            def visit(key, value):
+                return Visitor.NOP
+            return all(db.accept(key, visit, False) for key in order[thid::thnum])
+        return func
+
+    def benchiterate(db):
+        def func(thid, thnum):
+            return db.iterate(lambda key, value: Visitor.NOP, False)
+        return func
+
+    def benchmatch(db):
+        def func(thid, thnum):
+            for i in range(thid, rnum // bnum, thnum):
+                if db.match_prefix(keys[i * bnum][:6]) is None: return False
+            return True
+        return func
+
+    def benchremove(db):
+        return lambda thid, thnum: all(db.remove(key) for key in order[thid::thnum])
+
+    cases = (
+        ("set", benchset, rnum, True),
+        ("get", benchget, rnum, True),
+        ("set_bulk", benchsetbulk, rnum, False),
+        ("get_bulk", benchgetbulk, rnum, False),
+        ("cursor", benchcursor, rnum, False),
+        ("visitor", benchvisitor, rnum, False),
+        ("iterate", benchiterate, rnum, False),
+        ("match_prefix", benchmatch, rnum // bnum, False),
+        ("remove", benchremove, rnum, True),
+    )
+    for dbtype in types:
+        path = suitepath(dbtype)
+        for thnum in thnums:
+            removedb(path)
+            db = DB(gopts)
+            print("opening the database ({}, {} threads):".format(dbtype, thnum))
+            if not db.open(path, DB.OWRITER | DB.OCREATE | DB.OTRUNCATE):
+                dberrprint(db, "DB::open")
+                err = True
+                continue
+            db.tune_stats()
+            for name, bench, count, scalable in cases:
+                if thnum > 1 and not scalable: continue
+                result, ok = suitecase(db, bench(db), count, thnum)
+                if not ok:
+                    dberrprint(db, "DB::" + name)
+                    err = True
+                result["type"] = dbtype
+                result["bench"] = name
+                results.append(result)
+                print("  {:14s} time={:.3f}  ops/s={:.0f}  overhead={:.1f}%".format(
+                    name, result["time"], result["ops_per_sec"], result["overhead"] * 100))
+            if not db.close():
+                dberrprint(db, "DB::close")
+                err = True
+            removedb(path)
+    if jpath is not None:
+        report = {
+            "version": VERSION,
+            "python": sys.version.split()[0],
+            "rnum": rnum,
+            "gopts": gopts,
+            "seed": seed,
+            "results": results,
+        }
+        with open(jpath, "w") as jfile:
+            json.dump(report, jfile, indent=1, sort_keys=True)
+        print("results: {}".format(jpath))
+    print("error" if err else "ok")
+    print("")
+    return 1 if err else 0
+
+
+# parse arguments of compare command
+def runcompare():
+    base = None
+    target = None
+    thres = 0.1
+    i = 2
+    while i < len(sys.argv):
+        arg = sys.argv[i]
+        if base is None and arg.startswith("-"):
+            if arg == "-thres":
+                i += 1
+                if i >= len(sys.argv): usage()
+                thres = float(sys.argv[i])
+            else:
+                usage()
+        elif base is None:
+            base = arg
+        elif target is None:
+            target = arg
+        else:
+            usage()
+        i += 1
+    if base is None or target is None or thres < 0: usage()
+    rv = proccompare(base, target, thres)
+    return rv
+
+
+# perform compare command
+def proccompare(base, target, thres):
+    print("<Benchmark Comparison>")
+    print("  base={}  target={}  thres={}".format(base, target, thres))
+    print("")
+    reports = []
+    for path in (base, target):
+        with open(path) as jfile:
+            reports.append(json.load(jfile))
+    baseres = {}
+    for result in reports[0]["results"]:
+        baseres[(result["type"], result["bench"], result["threads"])] = result
+    regs = 0
+    for result in reports[1]["results"]:
+        key = (result["type"], result["bench"], result["threads"])
+        old = baseres.get(key)
+        if old is None or old["ops_per_sec"] <= 0: continue
+        ratio = result["ops_per_sec"] / old["ops_per_sec"]
+        mark = ""
+        if ratio < 1.0 - thres:
+            mark = "  REGRESSION"
+            regs += 1
+        print("  {:5s} {:14s} th={:<3d} {:12.0f} -> {:12.0f} ({:+.1f}%){}".format(
+            key[0], key[1], key[2], old["ops_per_sec"], result["ops_per_sec"],
+            (ratio - 1) * 100, mark))
+    print("regressions: {}".format(regs))
+    print("error" if regs > 0 else "ok")
+    print("")
+    return 1 if regs > 0 else 0
+
+
+# core workloads of YCSB: operation mixes and key distributions
+YCSBWORKLOADS = {
+    "A": ({"read": 0.5, "update": 0.5}, "zipfian"),
+    "B": ({"read": 0.95, "update": 0.05}, "zipfian"),
+    "C": ({"read": 1.0}, "zipfian"),
+    "D": ({"read": 0.95, "insert": 0.05}, "latest"),
+    "E": ({"scan": 0.95, "insert": 0.05}, "zipfian"),
+    "F": ({"read": 0.5, "rmw": 0.5}, "zipfian"),
+}
+
+
+# parse arguments of ycsb command
+def runycsb():
+    path = None
+    rnum = None
+    workload = "A"
+    dist = None
+    mix = None
+    vsiz = 100
+    ops = None
+    scanlen = 100
+    thnum = 1
+    procnum = 1
+    gopts = 0
+    seed = 19780211
+    i = 2
+    while i < len(sys.argv):
+        arg = sys.argv[i]
+        if path is None and arg.startswith("-"):
+            if arg == "-wl":
+                i += 1
+                if i >= len(sys.argv): usage()
+                workload = sys.argv[i].upper()
+            elif arg == "-dist":
+                i += 1
+                if i >= len(sys.argv): usage()
+                dist = sys.argv[i]
+            elif arg == "-mix":
+                i += 1
+                if i >= len(sys.argv): usage()
+                mix = {}
+                for expr in sys.argv[i].split(","):
+                    name, sep, ratio = expr.partition("=")
+                    if not sep: usage()
+                    mix[name] = float(ratio)
+            elif arg == "-vsiz":
+                i += 1
+                if i >= len(sys.argv): usage()
+                vsiz = int(sys.argv[i])
+            elif arg == "-ops":
+                i += 1
+                if i >= len(sys.argv): usage()
+                ops = int(sys.argv[i])
+            elif arg == "-scan":
+                i += 1
+                if i >= len(sys.argv): usage()
+                scanlen = int(sys.argv[i])
+            elif arg == "-th":
+                i += 1
+                if i >= len(sys.argv): usage()
+                thnum = int(sys.argv[i])
+            elif arg == "-proc":
+                i += 1
+                if i >= len(sys.argv): usage()
+                procnum = int(sys.argv[i])
+            elif arg == "-cc":
+                gopts |= DB.GCONCURRENT
+            elif arg == "-seed":
+                i += 1
+                if i >= len(sys.argv): usage()
+                seed = int(sys.argv[i])
+            else:
+                usage()
+        elif path is None:
+            path = arg
+        elif rnum is None:
+            rnum = int(arg)
+        else:
+            usage()
+        i += 1
+    if path is None or rnum is None or rnum < 1 or workload not in YCSBWORKLOADS: usage()
+    if mix is None: mix = YCSBWORKLOADS[workload][0]
+    if dist is None: dist = YCSBWORKLOADS[workload][1]
+    if dist not in ("zipfian", "latest", "uniform"): usage()
+    if not mix or min(mix.values()) < 0 or sum(mix.values()) <= 0: usage()
+    for name in mix:
+        if name not in ("read", "update", "insert", "scan", "rmw"): usage()
+    if ops is None: ops = rnum
+    if vsiz < 0 or ops < 1 or scanlen < 1 or thnum < 1 or procnum < 1: usage()
+    rv = procycsb(path, rnum, workload, dist, mix, vsiz, ops, scanlen, thnum, procnum, gopts, seed)
+    return rv
+
+
+# generator of zipfian distributed numbers
+class Zipfian:
+    def __init__(self, num, theta=0.99):
+        self.num = num
+        self.theta = theta
+        self.alpha = 1.0 / (1.0 - theta)
+        self.zetan = sum(1.0 / (i ** theta) for i in range(1, num + 1))
+        zeta2 = 1.0 + 1.0 / (2 ** theta)
+        self.eta = (1.0 - (2.0 / num) ** (1.0 - theta)) / (1.0 - zeta2 / self.zetan)
+
+    def next(self, rng):
+        u = rng.random()
+        uz = u * self.zetan
+        if uz < 1.0: return 0
+        if uz < 1.0 + 0.5 ** self.theta: return min(1, self.num - 1)
+        return min(int(self.num * (self.eta * u - self.eta + 1.0) ** self.alpha), self.num - 1)
+
+
+# get the key of a record of ycsb command
+def ycsbkey(idx):
+    return "user{:020d}".format(hash_fnv(str(idx)))
+
+
+# get the path of the shard of a process of ycsb command
+def ycsbpath(path, procid, procnum):
+    if procnum < 2: return path
+    name, sep, opts = path.partition("#")
+    if name in (":", "*", "%", "+", "-"): return path
+    base, ext = os.path.splitext(name)
+    return "{}-{}{}{}{}".format(base, procid, ext, sep, opts)
+
+
+# get the percentile of sorted latencies in microseconds
+def ycsbpercentile(lats, ratio):
+    if not lats: return 0.0
+    return lats[min(int(len(lats) * ratio), len(lats) - 1)] * 1000000
+
+
+# run a client process of ycsb command
+def ycsbclient(path, rnum, dist, mix, vsiz, ops, scanlen, thnum, gopts, seed):
+    db = DB(gopts)
+    if not db.open(path, DB.OWRITER | DB.OCREATE | DB.OTRUNCATE):
+        dberrprint(db, "DB::open")
+        return None
+    value = "v" * vsiz
+    err = False
+    stime = time.time()
+    for i in range(0, rnum):
+        if not db.set(ycsbkey(i), value):
+            dberrprint(db, "DB::set")
+            err = True
+            break
+    loadtime = time.time() - stime
+    names = sorted(mix)
+    total = sum(mix.values())
+    bounds = []
+    acc = 0.0
+    for name in names:
+        acc += mix[name] / total
+        bounds.append(acc)
+    zipf = Zipfian(rnum) if dist != "uniform" else None
+    counter = [rnum]
+    cntlock = threading.Lock()
+    lats = dict((name, []) for name in names)
+    fails = [0]
+
+    def choose(rng):
+        if dist == "uniform": return rng.randint(0, counter[0] - 1)
+        idx = zipf.next(rng)
+        if dist == "latest": return max(counter[0] - 1 - idx, 0)
+        return idx
+
+    def worker(thid):
+        rng = random.Random(seed + thid)
+        mylats = dict((name, []) for name in names)
+        myfails = 0
+        for i in range(thid, ops, thnum):
+            u = rng.random()
+            op = names[-1]
+            for name, bound in zip(names, bounds):
+                if u < bound:
+                    op = name
+                    break
+            ostime = time.perf_counter()
+            if op == "read":
+                ok = db.get(ycsbkey(choose(rng))) is not None
+            elif op == "update":
+                ok = db.set(ycsbkey(choose(rng)), value)
+            elif op == "insert":
+                with cntlock:
+                    idx = counter[0]
+                    counter[0] += 1
+                ok = db.set(ycsbkey(idx), value)
+            elif op == "scan":
+                cur = db.cursor()
+                ok = cur.jump(ycsbkey(choose(rng)))
+                num = rng.randint(1, scanlen)
+                while ok and num > 0 and cur.get(True) is not None:
+                    num -= 1
+                cur.disable()
+            else:
+                key = ycsbkey(choose(rng))
+                ok = db.get(key) is not None and db.set(key, value)
+            mylats[op].append(time.perf_counter() - ostime)
+            if not ok: myfails += 1
+        with cntlock:
+            for name in names:
+                lats[name].extend(mylats[name])
+            fails[0] += myfails
+
+    stime = time.time()
+    threads = []
+    for thid in range(0, thnum):
+        th = threading.Thread(target=worker, args=(thid,))
+        th.start()
+        threads.append(th)
+    for th in threads:
+        th.join()
+    runtime = time.time() - stime
+    if not db.close():
+        dberrprint(db, "DB::close")
+        err = True
+    removedb(path)
+    return {"load": loadtime, "run": runtime, "lats": lats, "fails": fails[0], "err": err}
+
+
+# run a client process of ycsb command and put the result into a queue
+def ycsbproc(queue, args):
+    queue.put(ycsbclient(*args))
+
+
+# perform ycsb command
+def procycsb(path, rnum, workload, dist, mix, vsiz, ops, scanlen, thnum, procnum, gopts, seed):
+    print("<YCSB Workload Benchmark>")
+    print("  path={}  rnum={}  workload={}  dist={}  mix={}  vsiz={}  ops={}  scan={}"
+          "  thnum={}  procnum={}  gopts={}  seed={}".
+          format(path, rnum, workload, dist,
+                 ",".join("{}={}".format(name, mix[name]) for name in sorted(mix)),
+                 vsiz, ops, scanlen, thnum, procnum, gopts, seed))
+    print("")
+    err = False
+    prnum = max(rnum // procnum, 1)
+    pops = max(ops // procnum, 1)
+    results = []
+    if procnum > 1:
+        ctx = multiprocessing.get_context("fork")
+        queue = ctx.Queue()
+        procs = []
+        for procid in range(0, procnum):
+            args = (ycsbpath(path, procid, procnum), prnum, dist, mix, vsiz, pops, scanlen,
+                    thnum, gopts, seed + procid * thnum)
+            proc = ctx.Process(target=ycsbproc, args=(queue, args))
+            proc.start()
+            procs.append(proc)
+        for proc in procs:
+            results.append(queue.get())
+        for proc in procs:
+            proc.join()
+    else:
+        results.append(ycsbclient(path, prnum, dist, mix, vsiz, pops, scanlen, thnum, gopts,
+                                  seed))
+    if None in results:
+        print("error")
+        print("")
+        return 1
+    loadtime = max(result["load"] for result in results)
+    runtime = max(result["run"] for result in results)
+    fails = sum(result["fails"] for result in results)
+    print("load: time={:.3f}  throughput={:.0f}".format(
+        loadtime, prnum * procnum / loadtime if loadtime > 0 else 0))
+    total = 0
+    alllats = []
+    for name in sorted(mix):
+        lats = []
+        for result in results:
+            lats.extend(result["lats"][name])
+        lats.sort()
+        total += len(lats)
+        alllats.extend(lats)
+        print("  {:8s} ops={:<10d} p50={:.1f}us  p99={:.1f}us  p999={:.1f}us".format(
+            name, len(lats), ycsbpercentile(lats, 0.5), ycsbpercentile(lats, 0.99),
+            ycsbpercentile(lats, 0.999)))
+    alllats.sort()
+    print("run: time={:.3f}  throughput={:.0f}  p50={:.1f}us  p99={:.1f}us  p999={:.1f}us".format(
+        runtime, total / runtime if runtime > 0 else 0, ycsbpercentile(alllats, 0.5),
+        ycsbpercentile(alllats, 0.99), ycsbpercentile(alllats, 0.999)))
+    print("failures: {}".format(fails))
+    if any(result["err"] for result in results): err = True
+    print("error" if err else "ok")
+    print("")
+    return 1 if err else 0
+
+
+# execute main
+progname = sys.argv[0]
+progname = re.sub(r".*/", "", progname)
+rndstate = random.Random()
+exit(main())
@@ -24,6 +24,7 @@ import random
 import time
 import threading
 import shutil
+import io
 
 
 # main routine
@@ -45,7 +46,8 @@ def usage():
     print("{}: test cases of the Python binding".format(progname), file=sys.stderr)
     print("", file=sys.stderr)
     print("usage:", file=sys.stderr)
-    print("  {} order [-cc] [-th num] [-rnd] [-etc] path rnum".format(progname), file=sys.stderr)
+    print("  {} order [-cc] [-th num] [-rnd] [-etc] [-prof path] path rnum".format(progname),
+          file=sys.stderr)
     print("  {} wicked [-cc] [-th num] [-it num] path rnum".format(progname), file=sys.stderr)
     print("  {} misc path".format(progname), file=sys.stderr)
     print("", file=sys.stderr)
@@ -84,6 +86,7 @@ def runorder():
     thnum = 1
     rnd = False
     etc = False
+    prof = None
     i = 2
     while i < len(sys.argv):
         arg = sys.argv[i]
@@ -98,6 +101,10 @@ def runorder():
                 rnd = True
             elif arg == "-etc":
                 etc = True
+            elif arg == "-prof":
+                i += 1
+                if i >= len(sys.argv): usage()
+                prof = sys.argv[i]
             else:
                 usage()
         elif path is None:
@@ -108,7 +115,7 @@ def runorder():
             usage()
         i += 1
     if path is None or rnum is None or rnum < 1 or thnum < 1: usage()
-    rv = procorder(path, rnum, gopts, thnum, rnd, etc)
+    rv = procorder(path, rnum, gopts, thnum, rnd, etc, prof)
     return rv
 
 
@@ -166,10 +173,10 @@ def runmisc():
 
 
 # perform order command
-def procorder(path, rnum, gopts, thnum, rnd, etc):
+def procorder(path, rnum, gopts, thnum, rnd, etc, prof):
     print("<In-order Test>")
-    print("  path={}  rnum={}  gopts={}  thnum={}  rnd={}  etc={}".
-          format(path, rnum, gopts, thnum, rnd, etc))
+    print("  path={}  rnum={}  gopts={}  thnum={}  rnd={}  etc={}  prof={}".
+          format(path, rnum, gopts, thnum, rnd, etc, prof))
     print("")
     err = False
     db = DB(gopts)
@@ -179,6 +186,7 @@ def procorder(path, rnum, gopts, thnum, rnd, etc):
     if not db.open(path, DB.OWRITER | DB.OCREATE | DB.OTRUNCATE):
         dberrprint(db, "DB::open")
         err = True
+    if prof is not None: db.tune_contention()
     etime = time.time()
     print("time: {:.3f}".format(etime - stime))
     print("setting records:")
@@ -491,6 +499,11 @@ def procorder(path, rnum, gopts, thnum, rnd, etc):
     etime = time.time()
     dbmetaprint(db, True)
     print("time: {:.3f}".format(etime - stime))
+    if prof is not None:
+        print("dumping the contention profile:")
+        if not db.dump_contention(prof) or not db.dump_contention(prof + ".folded", "folded"):
+            dberrprint(db, "DB::dump_contention")
+            err = True
     print("closing the database:")
     stime = time.time()
     if not db.close():
@@ -709,6 +722,14 @@ def procmisc(path):
     hash_murmur(path)
     hash_fnv(path)
     levdist(path, "casket")
+    words = [path, "casket", "casket" * 100]
+    if list(hash_murmur_many(words)) != [hash_murmur(word) for word in words]:
+        print("{}: hash_murmur_many: error".format(progname))
+        err = True
+    if levdist_many("casket", words) != [levdist("casket", word) for word in words] or \
+            levdist_many("casket", words, False, 2)[1:] != [0, None]:
+        print("{}: levdist_many: error".format(progname))
+        err = True
     dcurs = []
     print("opening the database with functor:")
     def myproc(db):
@@ -866,6 +887,28 @@ def procmisc(path):
     else:
         dberrprint(db, "DB::open")
         err = True
+    print("opening the database with tuning hints:")
+    db = DB()
+    if not db.open(path, DB.OREADER, expected_records=10000, avg_key_size=8,
+                   avg_value_size=8, memory_budget="64M", workload="read-heavy"):
+        dberrprint(db, "DB::open")
+        err = True
+    tuning = db.tuning()
+    if tuning is None or "type" not in tuning:
+        dberrprint(db, "DB::tuning")
+        err = True
+    if not db.close():
+        dberrprint(db, "DB::close")
+        err = True
+    if not db.open(path, DB.OREADER, 10000, 8, 8) or db.tuning() is None:
+        dberrprint(db, "DB::open")
+        err = True
+    if not db.close():
+        dberrprint(db, "DB::close")
+        err = True
+    if db.open(path + ".missing.kch", DB.OREADER, 10000) or db.tuning() is not None:
+        dberrprint(db, "DB::open")
+        err = True
     print("re-opening the database as a reader:")
     db = DB()
     if not db.open(path, DB.OREADER):
@@ -933,6 +976,805 @@ def procmisc(path):
             dberrprint(db, "Cursor::get_value")
             err = True
     db.cursor_process(curprocfunc)
+    print("streaming a blob record:")
+    if db.open_blob("blob", "w") is not None or db.error() != Error.INVALID:
+        dberrprint(db, "DB::open_blob")
+        err = True
+    blobdb = DB()
+    if not blobdb.open("%"):
+        dberrprint(blobdb, "DB::open")
+        err = True
+    db.tune_blob_store(blobdb)
+    db.tune_changes(100)
+    rnum = db.count()
+    blob = db.open_blob("blob", "w+", 7)
+    if blob is None:
+        dberrprint(db, "DB::open_blob")
+        err = True
+    else:
+        data = b"".join(str(i).encode() for i in range(0, 100))
+        for i in range(0, len(data), 11):
+            if blob.write(data[i:i+11]) is None:
+                dberrprint(db, "Blob::write")
+                err = True
+        blob.seek(5)
+        buf = bytearray(20)
+        if blob.readinto(buf) != 20 or bytes(buf) != data[5:25]:
+            dberrprint(db, "Blob::readinto")
+            err = True
+        if blob.truncate(50) != 50 or not blob.close():
+            dberrprint(db, "Blob::truncate")
+            err = True
+        with db.open_blob("blob", "a") as blob:
+            blob.write(b"tail")
+        with db.open_blob("blob") as blob:
+            if blob.size() != 54 or blob.read() != data[:50] + b"tail":
+                dberrprint(db, "Blob::read")
+                err = True
+        if db.match_prefix("blob") != ["blob"] or db.count() != rnum + 1 or \
+                blobdb.count() != 8:
+            dberrprint(db, "DB::match_prefix")
+            err = True
+        if set(change[2] for change in db.changes()) != {b"blob"}:
+            dberrprint(db, "DB::changes")
+            err = True
+        with db.open_blob("blob", "r+") as blob:
+            if not blob.remove():
+                dberrprint(db, "Blob::remove")
+                err = True
+        if "blob" in db or blobdb.count() != 0:
+            dberrprint(db, "Blob::remove")
+            err = True
+        db.set("plain", "value")
+        with db.open_blob("plain", "w") as blob:
+            blob.write(b"blob")
+        with db.open_blob("plain", "r+") as blob:
+            if blob.read() != b"blob" or not blob.remove():
+                dberrprint(db, "Blob::read")
+                err = True
+
+        def blobtranfunc():
+            with db.open_blob("nested", "w", 4) as blob:
+                return blob.write(b"0123456789") == 10
+
+        def blobabortfunc():
+            with db.open_blob("nested", "a") as blob:
+                blob.write(b"abcdefgh")
+            return False
+        if not db.transaction(blobtranfunc) or db.transaction(blobabortfunc):
+            dberrprint(db, "DB::transaction")
+            err = True
+        with db.open_blob("nested", "r+") as blob:
+            if blob.read() != b"0123456789" or not blob.remove():
+                dberrprint(db, "Blob::read")
+                err = True
+        if not db.begin_transaction() or db.begin_transaction() or \
+                db.error() != Error.LOGIC or not db.end_transaction():
+            dberrprint(db, "DB::begin_transaction")
+            err = True
+    db.tune_changes(None)
+    db.tune_blob_store(None)
+    if not blobdb.close():
+        dberrprint(blobdb, "DB::close")
+        err = True
+    print("maintaining secondary indexes:")
+    idb = IndexedDB(db)
+    idxdb = DB()
+    if not idxdb.open("+"):
+        dberrprint(idxdb, "DB::open")
+        err = True
+    idb.add_index("color", idxdb, ("field", "\t", 1))
+    for i, color in enumerate(("red", "blue", "red", "green")):
+        if not idb.set("idx:{}".format(i), "item{}\t{}".format(i, color)):
+            dberrprint(db, "IndexedDB::set")
+            err = True
+    if not idb.set("idx:1", "item1\tred") or not idb.remove("idx:0"):
+        dberrprint(db, "IndexedDB::set")
+        err = True
+    if sorted(idb.lookup("color", "red")) != [b"idx:1", b"idx:2"]:
+        dberrprint(db, "IndexedDB::lookup")
+        err = True
+    if not idb.rebuild() or sorted(idb.range("color", "g", "s")) != [b"idx:1", b"idx:2", b"idx:3"]:
+        dberrprint(db, "IndexedDB::range")
+        err = True
+    def idxbroken(key, value):
+        raise ValueError("broken extractor")
+    idb.add_index("broken", idxdb, idxbroken)
+    try:
+        idb.set("idx:9", "item9\tred")
+        dberrprint(db, "IndexedDB::set")
+        err = True
+    except ValueError:
+        pass
+    idb.remove_index("broken")
+    if "idx:9" in db:
+        dberrprint(db, "IndexedDB::set")
+        err = True
+
+    def idxtranfunc():
+        return idb.set("idx:4", "item4\tred") and idb.remove("idx:2")
+
+    def idxabortfunc():
+        idb.set("idx:5", "item5\tred")
+        return False
+    if not db.transaction(idxtranfunc) or db.transaction(idxabortfunc) or \
+            sorted(idb.lookup("color", "red")) != [b"idx:1", b"idx:4"]:
+        dberrprint(db, "IndexedDB::set")
+        err = True
+    hidxdb = DB()
+    if not hidxdb.open("-"):
+        dberrprint(hidxdb, "DB::open")
+        err = True
+    try:
+        idb.add_index("hashed", hidxdb, ("field", "\t", 1))
+        dberrprint(db, "IndexedDB::add_index")
+        err = True
+    except TypeError:
+        pass
+    if not hidxdb.close():
+        dberrprint(hidxdb, "DB::close")
+        err = True
+    if not idxdb.close():
+        dberrprint(idxdb, "DB::close")
+        err = True
+    print("searching similar keys by fuzzy index:")
+    fzdb = DB()
+    if not fzdb.open("+") or not db.tune_fuzzy_index(fzdb):
+        dberrprint(db, "DB::tune_fuzzy_index")
+        err = True
+    for name in ("mikio", "mikia", "hirabayashi", "mikiko"):
+        db.set("fz:" + name, name)
+    db.remove("fz:mikia")
+    fzkeys = db.match_similar("fz:mikio", 2)
+    db.tune_fuzzy_index(None)
+    if fzkeys != db.match_similar("fz:mikio", 2) or fzkeys[0] != "fz:mikio":
+        dberrprint(db, "DB::match_similar")
+        err = True
+    if not fzdb.close():
+        dberrprint(fzdb, "DB::close")
+        err = True
+    print("scanning keys by regular expression prefix:")
+    for name in ("alpha", "alpine", "beta"):
+        db.set("rx:" + name, name)
+    plan = db.explain_regex("^rx:al(pha|pine)$")
+    if plan["prefix"] != "rx:al" or \
+            db.explain_regex("rx:al|rx:beta")["strategy"] != "scan":
+        dberrprint(db, "DB::explain_regex")
+        err = True
+    decdb = DB()
+    if not decdb.open("%#rcomp=dec"):
+        dberrprint(decdb, "DB::open")
+        err = True
+    if decdb.explain_regex("^rx:al")["strategy"] != "scan" or db.tune_journal(decdb):
+        dberrprint(decdb, "DB::explain_regex")
+        err = True
+    if not decdb.close():
+        dberrprint(decdb, "DB::close")
+        err = True
+    rxrecs = db.match_regex("^rx:al(pha|pine)$", -1, True)
+    if rxrecs is None or sorted(rxrecs) != [("rx:alpha", b"alpha"), ("rx:alpine", b"alpine")]:
+        dberrprint(db, "DB::match_regex")
+        err = True
+    print("filtering records natively:")
+    for name in ("alpha", "alpine", "beta"):
+        db.set("pf:" + name, name * 3)
+    pfkeys = []
+    def visitpf(key, value):
+        pfkeys.append(key)
+    flt = {"prefix": "pf:", "min_size": 15, "contains": "pine"}
+    if not db.iterate(visitpf, False, flt) or pfkeys != [b"pf:alpine"]:
+        dberrprint(db, "DB::iterate")
+        err = True
+    if db.match_prefix("pf:", -1, {"regex": "a$"}) is None or \
+            sorted(db.match_prefix("pf:", -1, {"regex": "a$"})) != ["pf:alpha", "pf:beta"]:
+        dberrprint(db, "DB::match_prefix")
+        err = True
+    pfcur = db.cursor()
+    pfcur.jump("pf:")
+    pfrecs = pfcur.fetch(-1, {"prefix": "pf:", "max_size": 12})
+    if pfrecs is None or sorted(pfrecs) != [(b"pf:beta", b"betabetabeta")]:
+        dberrprint(db, "Cursor::fetch")
+        err = True
+    pfcur.disable()
+    decdb = DB()
+    if not decdb.open("%#rcomp=dec"):
+        dberrprint(decdb, "DB::open")
+        err = True
+    for name in ("1", "2", "9", "10", "100"):
+        decdb.set(name, name)
+    if decdb.match_prefix("1", -1, {"max_size": 8}) != ["1", "10", "100"] or \
+            sorted(decdb.match_regex("^1", -1, True)) != \
+            [("1", b"1"), ("10", b"10"), ("100", b"100")]:
+        dberrprint(decdb, "DB::match_prefix")
+        err = True
+    deccur = decdb.cursor()
+    deccur.jump()
+    decrecs = deccur.fetch(-1, {"prefix": "1"})
+    if decrecs is None or [rec[0] for rec in decrecs] != [b"1", b"10", b"100"]:
+        dberrprint(decdb, "Cursor::fetch")
+        err = True
+    deccur.disable()
+    if not decdb.close():
+        dberrprint(decdb, "DB::close")
+        err = True
+    print("expiring records:")
+    expdb = DB()
+    if not expdb.open("+") or not db.tune_expiry(expdb, 0):
+        dberrprint(db, "DB::tune_expiry")
+        err = True
+    if not db.set("ex:short", "short", 0) or not db.set("ex:long", "long", 3600):
+        dberrprint(db, "DB::set")
+        err = True
+    if db.get("ex:short") is not None or db.get("ex:long") != b"long":
+        dberrprint(db, "DB::get")
+        err = True
+    if sorted(db.match_prefix("ex:")) != ["ex:long", "ex:short"]:
+        dberrprint(db, "DB::match_prefix")
+        err = True
+    if db.sweep_expired() != 1 or db.expiry_status()["count"] != "1":
+        dberrprint(db, "DB::sweep_expired")
+        err = True
+    db.set("ex:long", "long")
+    if db.expiry_status()["count"] != "0" or not db.remove("ex:long"):
+        dberrprint(db, "DB::expiry_status")
+        err = True
+    db.tune_expiry(None)
+    if not expdb.close():
+        dberrprint(expdb, "DB::close")
+        err = True
+    swdb = DB()
+    swexpdb = DB()
+    if not swdb.open("%") or not swexpdb.open("+") or not swdb.tune_expiry(swexpdb, 100, 0.01):
+        dberrprint(swdb, "DB::tune_expiry")
+        err = True
+    swdb.set("ex:short", "short", 0)
+    for i in range(0, 100):
+        if swdb.count() == 0:
+            break
+        time.sleep(0.01)
+    if swdb.count() != 0 or swdb.expiry_status()["expired"] != "1":
+        dberrprint(swdb, "DB::tune_expiry")
+        err = True
+    if not swdb.close() or not swexpdb.close():
+        dberrprint(swdb, "DB::close")
+        err = True
+    print("streaming incremental snapshots:")
+    jdb = DB()
+    if not jdb.open("+") or not db.tune_journal(jdb):
+        dberrprint(db, "DB::tune_journal")
+        err = True
+    db.set("sn:a", "a")
+    db.set("sn:b", "b")
+    fullsnap = io.BytesIO()
+    marker = db.dump_snapshot_stream(fullsnap, None, None, 64)
+    db.set("sn:c", "c")
+    db.remove("sn:a")
+    incsnap = io.BytesIO()
+    if marker is None or db.dump_snapshot_stream(incsnap, marker) is None:
+        dberrprint(db, "DB::dump_snapshot_stream")
+        err = True
+    rdb = DB()
+    rdb.open("%")
+    fullsnap.seek(0)
+    incsnap.seek(0)
+    if not rdb.load_snapshot_stream(fullsnap) or not rdb.load_snapshot_stream(incsnap):
+        dberrprint(rdb, "DB::load_snapshot_stream")
+        err = True
+    if rdb.count() != db.count() or rdb.get("sn:a") is not None or rdb.get("sn:c") != b"c":
+        dberrprint(rdb, "DB::load_snapshot_stream")
+        err = True
+    rdb.close()
+    db.tune_journal(None)
+    if not jdb.close():
+        dberrprint(jdb, "DB::close")
+        err = True
+    print("consuming the change feed:")
+    db.tune_changes(3)
+    db.set("cf:a", "a")
+    db.increment("cf:n", 1)
+    db.remove("cf:a")
+    feed = db.changes(None, 2)
+    if feed != [(1, "set", b"cf:a", b"a"), (2, "set", b"cf:n", None)]:
+        dberrprint(db, "DB::changes")
+        err = True
+    if db.changes(feed[-1][0]) != [(3, "remove", b"cf:a", None)]:
+        dberrprint(db, "DB::changes")
+        err = True
+    db.remove("cf:n")
+    if db.changes(0) is not None or db.error() != Error.INVALID or \
+            db.changes_status()["dropped"] != "1":
+        dberrprint(db, "DB::changes")
+        err = True
+    if db.changes(4, -1, 0.01) != []:
+        dberrprint(db, "DB::changes")
+        err = True
+    db.tune_changes(10)
+    if db.set_bulk({"cf:x": "x", "cf:y": "y"}) != 2 or \
+            db.remove_bulk(["cf:x", "cf:missing"]) != 1 or db.remove_bulk(["cf:y"], False) != 1 or \
+            [change[1:3] for change in db.changes()] != \
+            [("set", b"cf:x"), ("set", b"cf:y"), ("remove", b"cf:x"), ("remove", b"cf:y")]:
+        dberrprint(db, "DB::remove_bulk")
+        err = True
+    db.tune_changes(2, "error")
+    for name in ("a", "b", "c"):
+        db.set("cf:" + name, name)
+    feed = db.changes(None)
+    if feed is None or [change[2] for change in feed] != [b"cf:a", b"cf:b"] or \
+            db.changes(feed[-1][0]) is not None or db.error() != Error.INVALID or \
+            db.changes_status()["broken"] != "true":
+        dberrprint(db, "DB::changes")
+        err = True
+    db.tune_changes(2, "block")
+    cfreads = []
+    def consumecf():
+        while db.changes_status()["count"] != "2":
+            time.sleep(0.01)
+        feed = db.changes(0)
+        for change in feed:
+            cfreads.append(db.check(change[2]))
+        since = feed[-1][0]
+        while since < 3:
+            feed = db.changes(since, -1, 1.0)
+            if feed:
+                since = feed[-1][0]
+    cfth = threading.Thread(target=consumecf)
+    cfth.start()
+    for name in ("a", "b", "c"):
+        db.remove("cf:" + name)
+    cfth.join()
+    if cfreads != [-1, -1] or db.changes_status()["dropped"] != "0":
+        dberrprint(db, "DB::changes")
+        err = True
+    db.tune_changes(None)
+    print("defragmenting the database:")
+    if not db.defrag(16) and db.error() != Error.NOIMPL:
+        dberrprint(db, "DB::defrag")
+        err = True
+    if db.status()["defrag_calls"] != "1":
+        dberrprint(db, "DB::status")
+        err = True
+    if db.tune_defrag(16, 0.01, 0.001):
+        time.sleep(0.05)
+        if not db.tune_defrag(0) or db.status()["defrag_running"] != "false":
+            dberrprint(db, "DB::tune_defrag")
+            err = True
+    elif db.error() != Error.NOIMPL:
+        dberrprint(db, "DB::tune_defrag")
+        err = True
+    print("committing durable writes in groups:")
+    db.tune_group_commit(0.005, False, 4)
+    gcthreads = []
+    gcresults = []
+    for i in range(0, 4):
+        def gcwrite(i=i):
+            db.set("gc:{}".format(i), str(i))
+            gcresults.append(db.wait_durable(None, 10))
+        gcthread = threading.Thread(target=gcwrite)
+        gcthread.start()
+        gcthreads.append(gcthread)
+    for gcthread in gcthreads:
+        gcthread.join()
+    ticket = db.request_durable()
+    if gcresults != [True] * 4 or ticket is None or not db.wait_durable(ticket):
+        dberrprint(db, "DB::wait_durable")
+        err = True
+    if db.wait_durable(ticket + 1) or db.error() != Error.INVALID or db.wait_durable(0):
+        dberrprint(db, "DB::wait_durable")
+        err = True
+    gcstatus = db.group_commit_status()
+    if gcstatus["requests"] != "5" or gcstatus["pending"] != "0" or \
+            int(gcstatus["batches"]) > 5:
+        dberrprint(db, "DB::group_commit_status")
+        err = True
+    db.tune_group_commit(None)
+    if db.request_durable() is not None:
+        dberrprint(db, "DB::request_durable")
+        err = True
+    print("synchronizing periodically:")
+    syncdb = DB()
+    if not syncdb.open("*", DB.OWRITER | DB.OCREATE, sync_interval=0.01, sync_after_bytes=64):
+        dberrprint(syncdb, "DB::open")
+        err = True
+    for i in range(0, 16):
+        syncdb.set("sync:{}".format(i), "x" * 16)
+    time.sleep(0.05)
+    syncstatus = syncdb.status()
+    if int(syncstatus["sync_count"]) < 1 or syncstatus["sync_failures"] != "0" or \
+            float(syncstatus["sync_last"]) <= 0:
+        dberrprint(syncdb, "DB::status")
+        err = True
+    if not syncdb.close():
+        dberrprint(syncdb, "DB::close")
+        err = True
+    print("building a tree by external sorting:")
+    tbdb = DB()
+    if not tbdb.open("%", DB.OWRITER | DB.OCREATE):
+        dberrprint(tbdb, "DB::open")
+        err = True
+    builder = TreeBuilder(tbdb, 256)
+    for i in range(400, 0, -1):
+        if not builder.add("{:08d}".format(i), str(i)):
+            dberrprint(tbdb, "TreeBuilder::add")
+            err = True
+            break
+    if builder.add_bulk([("00000001", "first"), ("00000401", "last")]) != 2:
+        dberrprint(tbdb, "TreeBuilder::add_bulk")
+        err = True
+    if int(builder.status()["runs"]) < 2:
+        dberrprint(tbdb, "TreeBuilder::status")
+        err = True
+    if builder.finish() != 401:
+        dberrprint(tbdb, "TreeBuilder::finish")
+        err = True
+    tbcur = tbdb.cursor()
+    tbcur.jump()
+    if tbcur.get_str() != ("00000001", "first") or tbdb.get_str("00000401") != "last":
+        dberrprint(tbdb, "TreeBuilder::finish")
+        err = True
+    tbcur.disable()
+    try:
+        builder.add("x", "x")
+        dberrprint(tbdb, "TreeBuilder::add")
+        err = True
+    except ValueError:
+        pass
+    if not tbdb.close():
+        dberrprint(tbdb, "DB::close")
+        err = True
+    print("exporting records:")
+    exsrc = DB()
+    exdst = DB()
+    if not exsrc.open("%", DB.OWRITER | DB.OCREATE) or \
+            not exdst.open("%", DB.OWRITER | DB.OCREATE):
+        dberrprint(exsrc, "DB::open")
+        err = True
+    for i in range(1, 301):
+        exsrc.set("{}{:08d}".format("a" if i % 3 else "b", i), str(i) * 8)
+    checkpoints = []
+    def exprogress(num, key):
+        checkpoints.append(key)
+        return len(checkpoints) < 2
+    excnt = exsrc.export_to(exdst, 32, 2, {"prefix": "a"}, None, exprogress)
+    if excnt != 96 or exdst.count() != 96 or len(checkpoints) != 2:
+        dberrprint(exsrc, "DB::export_to")
+        err = True
+    excnt = exsrc.export_to(exdst, 32, 2, {"prefix": "a"}, None, None, checkpoints[-1])
+    if excnt != 136 or exdst.count() != 200:
+        dberrprint(exsrc, "DB::export_to")
+        err = True
+    exzip = DB()
+    if not exzip.open("%", DB.OWRITER | DB.OCREATE):
+        dberrprint(exzip, "DB::open")
+        err = True
+    if exsrc.export_to(exzip, 50, 3, None, "compress") != 300 or \
+            exzip.get_str("b00000003") == "3" * 8:
+        dberrprint(exsrc, "DB::export_to")
+        err = True
+    exdst.clear()
+    exdst.tune_changes(1000)
+    if exzip.export_to(exdst, 50, 1, None, "decompress") != 300 or \
+            exdst.get_str("b00000003") != "3" * 8 or exdst.changes_status()["last"] != "300":
+        dberrprint(exzip, "DB::export_to")
+        err = True
+    exdst.tune_changes(None)
+    def exabort(num, key):
+        raise ValueError("abort")
+    try:
+        exsrc.export_to(exdst, 32, 2, None, None, exabort)
+        dberrprint(exsrc, "DB::export_to")
+        err = True
+    except ValueError:
+        pass
+    try:
+        exdst.export_to(exdst)
+        dberrprint(exdst, "DB::export_to")
+        err = True
+    except TypeError:
+        pass
+    for exdb in (exsrc, exdst, exzip):
+        if not exdb.close():
+            dberrprint(exdb, "DB::close")
+            err = True
+    print("collecting call statistics:")
+    stdb = DB()
+    if not stdb.open("%", DB.OWRITER | DB.OCREATE):
+        dberrprint(stdb, "DB::open")
+        err = True
+    if stdb.stats() is not None or not stdb.tune_stats():
+        dberrprint(stdb, "DB::tune_stats")
+        err = True
+    for i in range(1, 101):
+        stdb.set("{:08d}".format(i), "x" * 10)
+        stdb.get("{:08d}".format(i))
+    stcur = stdb.cursor()
+    stcur.jump()
+    stcur.get()
+    stcur.disable()
+    stats = stdb.stats(True)
+    if stats is None or stats["set"]["calls"] != 100 or \
+            stats["set"]["bytes_in"] != 1800 or stats["get"]["bytes_out"] != 1000 or \
+            sum(stats["get"]["native_hist"]) != 100 or len(stats["get"]["lock_hist"]) != 32 or \
+            "cursor.get" not in stats:
+        dberrprint(stdb, "DB::stats")
+        err = True
+    if len(stdb.stats()) != 0 or not stdb.tune_stats(False) or stdb.stats() is not None:
+        dberrprint(stdb, "DB::stats")
+        err = True
+    if not stdb.close():
+        dberrprint(stdb, "DB::close")
+        err = True
+    print("profiling lock contention:")
+    cpdb = DB()
+    if not cpdb.open("%", DB.OWRITER | DB.OCREATE):
+        dberrprint(cpdb, "DB::open")
+        err = True
+    if cpdb.contention() is not None or not cpdb.tune_contention(True, 2):
+        dberrprint(cpdb, "DB::tune_contention")
+        err = True
+    for i in range(1, 101):
+        cpdb.set("{:08d}".format(i), str(i))
+    profile = cpdb.contention()
+    thid = threading.get_ident()
+    kinds = set(kind for th, name, kind, cnt, total, longest in profile
+                if th == thid and name == "set")
+    if kinds != set(["lock", "native"]) or \
+            sum(cnt for th, name, kind, cnt, total, longest in profile if kind == "native") != 50:
+        dberrprint(cpdb, "DB::contention")
+        err = True
+    profpath = "kctest.prof"
+    if not cpdb.dump_contention(profpath, "folded"):
+        dberrprint(cpdb, "DB::dump_contention")
+        err = True
+    with open(profpath) as proffile:
+        if not proffile.readline().startswith("thread-{};".format(thid)):
+            dberrprint(cpdb, "DB::dump_contention")
+            err = True
+    if not cpdb.dump_contention(profpath) or len(cpdb.contention(True)) != 2 or \
+            len(cpdb.contention()) != 0:
+        dberrprint(cpdb, "DB::dump_contention")
+        err = True
+    os.remove(profpath)
+    if not cpdb.tune_contention(False) or not cpdb.close():
+        dberrprint(cpdb, "DB::close")
+        err = True
+    print("getting the memory usage:")
+    usage = memory_usage()
+    if not isinstance(usage, dict) or int(usage.get("mem_rss", "1")) < 1:
+        dberrprint(db, "memory_usage")
+        err = True
+    print("getting the metrics:")
+    mtdb = DB()
+    if not mtdb.open("%", DB.OWRITER | DB.OCREATE):
+        dberrprint(mtdb, "DB::open")
+        err = True
+    for i in range(1, 11):
+        mtdb.set("{:08d}".format(i), str(i))
+    mtdb.get("00000001")
+    mtdb.get("nothing")
+    mtdb.remove("00000002")
+    metrics = mtdb.metrics()
+    if metrics is None or metrics["count"] != 9 or metrics["writes"] != 10 or \
+            metrics["hits"] != 1 or metrics["misses"] != 1 or metrics["removes"] != 1 or \
+            metrics["calls"] < 13:
+        dberrprint(mtdb, "DB::metrics")
+        err = True
+    mtdb2 = DB()
+    if not mtdb2.open("%", DB.OWRITER | DB.OCREATE):
+        dberrprint(mtdb2, "DB::open")
+        err = True
+    mtdb2.set("00000001", "1")
+    mtlabel = "path=\"{}\",id=\"{}\"".format(mtdb.path(), id(mtdb))
+    mtlabel2 = "path=\"{}\",id=\"{}\"".format(mtdb2.path(), id(mtdb2))
+    promtext = prometheus_text()
+    if "kyotocabinet_records{{{}}} 9\n".format(mtlabel) not in promtext or \
+            "kyotocabinet_records{{{}}} 1\n".format(mtlabel2) not in promtext or \
+            mtlabel == mtlabel2 or \
+            "# TYPE kyotocabinet_writes_total counter\n" not in promtext:
+        dberrprint(mtdb, "prometheus_text")
+        err = True
+    promtexts = []
+    def visitmt(key, value):
+        promtexts.append(prometheus_text())
+        return Visitor.NOP
+    if not mtdb.accept("00000001", visitmt, False) or len(promtexts) != 1 or \
+            "kyotocabinet_records{{{}}} 9\n".format(mtlabel) not in promtexts[0]:
+        dberrprint(mtdb, "prometheus_text")
+        err = True
+    if not mtdb.close():
+        dberrprint(mtdb, "DB::close")
+        err = True
+    if not mtdb2.close():
+        dberrprint(mtdb2, "DB::close")
+        err = True
+    print("logging slow operations:")
+    sldb = DB()
+    if not sldb.open("%", DB.OWRITER | DB.OCREATE):
+        dberrprint(sldb, "DB::open")
+        err = True
+    slhooked = []
+    if sldb.slow_log() is not None or not sldb.tune_slow_log(0, 8, slhooked.append):
+        dberrprint(sldb, "DB::tune_slow_log")
+        err = True
+    for i in range(1, 11):
+        sldb.set("{:08d}".format(i), "x" * i)
+    sldb.get("00000010")
+    slentries = sldb.slow_log()
+    if len(slentries) != 8 or slentries[-1]["method"] != "get" or \
+            slentries[-1]["key"] != b"00000010" or slentries[-1]["bytes_out"] != 10 or \
+            slentries[-1]["thread"] != threading.get_ident():
+        dberrprint(sldb, "DB::slow_log")
+        err = True
+    for i in range(0, 100):
+        if slhooked and slhooked[-1]["method"] == "get": break
+        time.sleep(0.01)
+    if len(slhooked) < 8 or slhooked[-1]["method"] != "get":
+        dberrprint(sldb, "DB::tune_slow_log")
+        err = True
+    slreads = []
+    def slread(entry):
+        slreads.append(sldb.get(entry["key"]))
+    sldb.tune_slow_log(0, 8, slread)
+    sldb.set("slow", "x")
+    for i in range(0, 10):
+        time.sleep(0.01)
+    if slreads != [b"x"] or len(sldb.slow_log()) != 1:
+        dberrprint(sldb, "DB::tune_slow_log")
+        err = True
+    if not sldb.tune_slow_log(60) or not sldb.set("slow", "x") or len(sldb.slow_log()) != 0:
+        dberrprint(sldb, "DB::slow_log")
+        err = True
+    if not sldb.tune_slow_log() or not sldb.close():
+        dberrprint(sldb, "DB::close")
+        err = True
+    print("using the mapping protocol:")
+    mpdb = DB()
+    if not mpdb.open("%", DB.OWRITER | DB.OCREATE):
+        dberrprint(mpdb, "DB::open")
+        err = True
+    mpdb.update({"a": "1", "b": "2"}, c="3")
+    mpdb.update([("d", "4")])
+    if "a" not in mpdb or "z" in mpdb or mpdb.get("z", "none") != "none" or \
+            mpdb.get_str("a", "none") != "1":
+        dberrprint(mpdb, "DB::__contains__")
+        err = True
+    if mpdb.pop("d") != b"4" or mpdb.pop("d", None) is not None:
+        dberrprint(mpdb, "DB::pop")
+        err = True
+    try:
+        mpdb.pop("d")
+        dberrprint(mpdb, "DB::pop")
+        err = True
+    except KeyError:
+        pass
+    if mpdb.setdefault("a", "x") != b"1" or mpdb.setdefault("e", "5") != b"5" or \
+            mpdb.get("e") != b"5" or mpdb.setdefault("f") is not None or "f" in mpdb:
+        dberrprint(mpdb, "DB::setdefault")
+        err = True
+    if len(mpdb.keys()) != 4 or list(mpdb.keys()) != [b"a", b"b", b"c", b"e"] or \
+            list(mpdb.values()) != [b"1", b"2", b"3", b"5"] or \
+            ("b", "2") not in mpdb.items() or ("b", "3") in mpdb.items() or \
+            "3" not in mpdb.values() or "c" not in mpdb.keys():
+        dberrprint(mpdb, "DB::items")
+        err = True
+    mpdb.clear()
+    mpdb.update(("{:08d}".format(i), str(i)) for i in range(0, 1000))
+    mpcnt = 0
+    for key, value in mpdb.items():
+        if key[:1] != b"0" or int(key) != int(value):
+            dberrprint(mpdb, "DB::items")
+            err = True
+            break
+        mpcnt += 1
+    if mpcnt != 1000:
+        dberrprint(mpdb, "DB::items")
+        err = True
+    if not mpdb.close():
+        dberrprint(mpdb, "DB::close")
+        err = True
+    print("writing records by a batch:")
+    wbdb = DB()
+    if not wbdb.open("%", DB.OWRITER | DB.OCREATE):
+        dberrprint(wbdb, "DB::open")
+        err = True
+    wbdb.set("gone", "x")
+    with wbdb.write_batch(max_ops=10) as wb:
+        for i in range(0, 25):
+            wb.set("{:08d}".format(i), str(i))
+        wb.append("00000024", "-")
+        wb.increment("counter", 3)
+        wb.increment("counter", 4)
+        wb.remove("gone")
+        if wb.pending() != 9 or wb.get("00000024") != b"24-" or wb.get("gone") is not None or \
+                wb.get("00000000") != b"0" or len(wbdb) != 21:
+            dberrprint(wbdb, "WriteBatch::get")
+            err = True
+    if len(wbdb) != 26 or wbdb.increment("counter") != 7 or "gone" in wbdb or \
+            wbdb.get("00000024") != b"24-":
+        dberrprint(wbdb, "WriteBatch::commit")
+        err = True
+    try:
+        with wbdb.write_batch() as wb:
+            wb.set("aborted", "x")
+            raise ValueError("abort")
+    except ValueError:
+        pass
+    if "aborted" in wbdb:
+        dberrprint(wbdb, "WriteBatch::discard")
+        err = True
+    wbdb.tune_changes(100)
+    wb = wbdb.write_batch(transactional=False)
+    wb.set("00000000", "y")
+    wb.increment("00000001", 1)
+    wb.set("00000001", "z")
+    if wb.commit() or wbdb.error() != Error.LOGIC or wbdb.get("00000000") != b"y" or \
+            wbdb.get("00000001") != b"1" or \
+            [change[2] for change in wbdb.changes()] != [b"00000000"]:
+        dberrprint(wbdb, "WriteBatch::commit")
+        err = True
+    wbdb.tune_changes(None)
+    int64max = (1 << 63) - 1
+    wbdb.increment("o:max", 10)
+    wb = wbdb.write_batch()
+    wb.increment("o:max", 5, int64max)
+    wb.increment("o:new", 5, int64max)
+    wb.increment("o:orig", 1, 100)
+    if wb.get("o:max") != wb.get("o:new"):
+        dberrprint(wbdb, "WriteBatch::get")
+        err = True
+    if not wb.commit() or wbdb.increment("o:max") != 5 or wbdb.increment("o:new") != 5 or \
+            wbdb.increment("o:orig") != 101:
+        dberrprint(wbdb, "WriteBatch::increment")
+        err = True
+    wb.increment("o:min", 1, -int64max - 1)
+    if wb.commit() or wbdb.error() != Error.LOGIC or "o:min" in wbdb:
+        dberrprint(wbdb, "WriteBatch::increment")
+        err = True
+    wb = wbdb.write_batch(max_ops=0, max_bytes=16)
+    wb.set("mb:1", "12345678")
+    if wb.pending() != 1 or not wb.set("mb:2", "x") or wb.pending() != 0 or \
+            wbdb.get("mb:2") != b"x":
+        dberrprint(wbdb, "WriteBatch::set")
+        err = True
+    wb = wbdb.write_batch(max_ops=0, max_delay=0.05)
+    wb.set("md:1", "x")
+    time.sleep(0.1)
+    if wb.pending() != 1 or not wb.set("md:2", "x") or wb.pending() != 0 or \
+            wbdb.get("md:1") != b"x":
+        dberrprint(wbdb, "WriteBatch::set")
+        err = True
+    def wbtranfunc():
+        wb = wbdb.write_batch(max_ops=2)
+        wb.set("nt:1", "x")
+        wb.set("nt:2", "x")
+        with wbdb.write_batch() as nwb:
+            nwb.set("nt:3", "x")
+        wb.set("nt:4", "x")
+        return wb.commit()
+
+    def wbabortfunc():
+        wb = wbdb.write_batch()
+        wb.set("nt:5", "x")
+        wb.commit()
+        return False
+    if not wbdb.transaction(wbtranfunc) or wbdb.transaction(wbabortfunc) or \
+            wbdb.match_prefix("nt:") is None or \
+            sorted(wbdb.match_prefix("nt:")) != ["nt:1", "nt:2", "nt:3", "nt:4"]:
+        dberrprint(wbdb, "WriteBatch::commit")
+        err = True
+    wb = wbdb.write_batch()
+    wb.set("dropped", "x")
+    del wb
+    if "dropped" in wbdb:
+        dberrprint(wbdb, "WriteBatch::dealloc")
+        err = True
+    wb = wbdb.write_batch()
+    wb.set("kept", "x")
+    if not wbdb.close():
+        dberrprint(wbdb, "DB::close")
+        err = True
+    if wb.commit() or wb.pending() != 1:
+        dberrprint(wbdb, "WriteBatch::commit")
+        err = True
     print("dumping records into snapshot:")
     snappath = db.path()
     if re.match(r".*\.(kch|kct)$", snappath):
@@ -955,6 +1797,36 @@ def procmisc(path):
         dberrprint(db, "DB::load_snapshot")
         err = True
     os.remove(snappath)
+    print("dumping records into chunked snapshot:")
+    if not db.dump_snapshot(snappath, 2, 256):
+        dberrprint(db, "DB::dump_snapshot")
+        err = True
+    print("loading records from chunked snapshot into shards:")
+    shards = []
+    for i in range(0, 2):
+        sdb = DB()
+        if not sdb.open("%", DB.OWRITER | DB.OCREATE):
+            dberrprint(sdb, "DB::open")
+            err = True
+        sdb.tune_changes(cnt + 1)
+        shards.append(sdb)
+    if not db.load_snapshot(snappath, 2, shards):
+        dberrprint(db, "DB::load_snapshot")
+        err = True
+    if sum(sdb.count() for sdb in shards) != cnt:
+        dberrprint(db, "DB::load_snapshot")
+        err = True
+    for sdb in shards:
+        feed = sdb.changes()
+        if len(feed) != sdb.count() or any(change[1] != "set" for change in feed):
+            dberrprint(sdb, "DB::changes")
+            err = True
+        sdb.tune_changes(None)
+    for sdb in shards:
+        if not sdb.close():
+            dberrprint(sdb, "DB::close")
+            err = True
+    os.remove(snappath)
     copypath = db.path()
     suffix = None
     if copypath.endswith(".kch"):
@@ -241,6 +241,38 @@ def levdist(a, b, utf):
 
     """
 
+def hash_murmur_many(strs):
+    """
+    Get the hash values of strings by MurMur hashing.
+    @param strs: a sequence of the strings.
+    @return: an array object of the type code "Q" containing the hash values in the same order.
+    @note: The global interpreter lock is released while hashing large inputs.
+    """
+
+def levdist_many(query, candidates, utf = False, max_distance = None):
+    """
+    Calculate the levenshtein distances of a string to candidates.
+    @param query: the query string.
+    @param candidates: a sequence of the candidate strings.
+    @param utf: flag to treat keys as UTF-8 strings.
+    @param max_distance: the maximum distance to calculate.  If it is None, no limit is specified.
+    @return: a list object of the distances in the same order as the candidates.  The element is None for a candidate farther than the maximum distance.
+    @note: The calculation for a candidate gives up as soon as the distance is known to exceed the maximum distance.  The global interpreter lock is released while calculating large inputs.
+    """
+
+def memory_usage():
+    """
+    Get the memory usage of the process.
+    @return: a map object of the memory usage reported by the operating system.  "mem_rss" is the resident set size, "mem_size" is the virtual memory size, "mem_peak" is the peak virtual memory size, and "mem_total", "mem_free", and "mem_cached" are of the whole system.  Every value is a string of the number of bytes.  The available items depend on the platform.
+    @note: The resident set size includes memory allocated by the underlying library, which is not traced by the tracemalloc module.
+    """
+
+def prometheus_text():
+    """
+    Get the metrics of all database objects in the Prometheus text format.
+    @return: the string of the metrics of every opened database object in the process, each of which is labeled by the path and by the identity of the object, which is the same as the value of the built-in id function, so that objects of the same path are distinguished.  The metrics are the same as the ones of the DB#metrics method, and the numbers of calls and the seconds in the library of each method are added for database objects whose statistics are enabled by the DB#tune_stats method.
+    """
+
 
 class Error:
     """
@@ -455,6 +487,14 @@ class Cursor:
         @return: true on success, or false on failure.
         @note: This method is dedicated to tree databases.  Some database types, especially hash databases, may provide a dummy implementation.
         """
+    def fetch(self, max = -1, filter = None):
+        """
+        Get records passing a filter while stepping the cursor.
+        @param max: the maximum number to retrieve.  If it is negative, no limit is specified.
+        @param filter: a map object of the filter conditions.  See the iterate method of the DB class for the format.
+        @return: a list object of pairs of the key and the value of passing records, or None on failure.
+        @note: The scan starts at the current position and the cursor is moved to the record next to the last fetched one.  On tree databases with the default lexical comparator, the scan stops at the first record beyond the prefix or the end of the filter and the cursor is left there.
+        """
     def db(self):
         """
         Get the database object.
@@ -482,6 +522,227 @@ class Cursor:
         """
 
 
+class Blob:
+    """
+    Interface of file-like handle to a chunked blob record.
+    @note: A blob record consists of a small manifest record stored under the key and chunk records stored in the blob store set by the DB#tune_blob_store method, whose keys are the key, a null byte, and the 8-byte big-endian chunk number.  Only the manifest is visible to counting, iteration, and matching of the database, and only updates of the manifest are reported to its journal, change feed, and indexes.  Blob records should be accessed only through blob handles, and the remove method of the database object does not remove the chunks; use the remove method of the handle instead.  Each handle buffers one chunk and writes it back when another chunk is accessed or when the handle is flushed or closed.  Each write which touches another chunk, each truncation, and each flush store the chunks and the manifest in transactions of the blob store and the database, committed in this order.  Inside a transaction begun by the current thread on the same database, blob operations join it instead of beginning their own, so they are committed or aborted with it.  Operations on a closed handle raise ValueError.
+    """
+    def read(self, size = -1):
+        """
+        Read bytes from the current position.
+        @param size: the maximum number of bytes to read.  If it is negative or None, the rest of the blob is read.
+        @return: the bytes read, or None on failure.  An empty bytes object is returned at the end of the blob.
+        """
+    def readinto(self, buf):
+        """
+        Read bytes from the current position into a writable buffer.
+        @param buf: the writable buffer object such as bytearray or memoryview.
+        @return: the number of bytes read, or None on failure.
+        """
+    def write(self, data):
+        """
+        Write bytes at the current position.
+        @param data: the data to write.
+        @return: the number of bytes written, or None on failure.
+        @note: In the append mode, data is always written at the end of the blob.
+        """
+    def seek(self, offset, whence = 0):
+        """
+        Change the current position.
+        @param offset: the offset relative to the position indicated by whence.
+        @param whence: 0 for the top of the blob, 1 for the current position, 2 for the end of the blob.
+        @return: the new absolute position.
+        @note: Seeking beyond the end is allowed.  A gap made by writing there reads as null bytes.
+        """
+    def tell(self):
+        """
+        Get the current position.
+        @return: the current position.
+        """
+    def size(self):
+        """
+        Get the size of the blob.
+        @return: the size of the blob.
+        """
+    def truncate(self, size = None):
+        """
+        Change the size of the blob.
+        @param size: the new size.  If it is None, the current position is specified.
+        @return: the new size, or None on failure.
+        @note: The current position is not changed.  To remove a blob record entirely, truncate it to zero, close it, and then remove the key.
+        """
+    def flush(self):
+        """
+        Write buffered data into the database.
+        @return: true on success, or false on failure.
+        """
+    def close(self):
+        """
+        Flush and close the blob.
+        @return: true on success, or false on failure.
+        @note: Closing a closed blob has no effect.
+        """
+    def readable(self):
+        """
+        Check whether the blob is readable.
+        @return: true if readable, or false if not.
+        """
+    def writable(self):
+        """
+        Check whether the blob is writable.
+        @return: true if writable, or false if not.
+        """
+    def seekable(self):
+        """
+        Check whether the blob is seekable.
+        @return: always true.
+        """
+    def key(self):
+        """
+        Get the key of the blob record.
+        @return: the key of the blob record.
+        """
+    def remove(self):
+        """
+        Remove the blob record with its chunks and close the blob.
+        @return: true on success, or false on failure.
+        @note: The manifest and all chunks are removed in one transaction.
+        """
+    def db(self):
+        """
+        Get the database object.
+        @return: the database object.
+        """
+    def __enter__(self):
+        """
+        Enter the runtime context.
+        @return: the blob object itself.
+        """
+    def __exit__(self, extype, exvalue, extrace):
+        """
+        Exit the runtime context and close the blob.
+        @return: always false.
+        """
+    def __repr__(self):
+        """
+        Get the representing expression.
+        @return: the representing expression.
+        """
+    def __str__(self):
+        """
+        Get the string expression.
+        @return: the string expression.
+        """
+
+
+class View:
+    """
+    Interface of live view of the keys, the values or the records of a database.
+    @note: A view is created by the keys, values and items methods of the database object.  Iterating a view fetches records in batches with a cursor.
+    """
+    def __len__(self):
+        """
+        Get the number of records.
+        @return: the number of records.
+        """
+    def __contains__(self, obj):
+        """
+        Check whether an element is in the view.
+        @param obj: the key, the value, or the pair of the key and the value.
+        @return: true if the element is in the view, or false if not.
+        """
+    def __iter__(self):
+        """
+        Get an iterator of the elements.
+        @return: the iterator object.
+        """
+    def __repr__(self):
+        """
+        Get the representing expression.
+        @return: the representing expression.
+        """
+
+
+class WriteBatch:
+    """
+    Interface of buffer of write operations committed at once.
+    @note: A write batch is created by the write_batch method of the database object.  Operations are kept in memory and committed by one call of the accept_bulk method, which locks all keys of the batch, in a transaction if the batch is transactional.  The thresholds are checked whenever an operation is added, so the delay is not checked while no operation is added.  A write batch should not be shared by threads.  Pending operations are discarded when the object is destroyed, so commit should be called or a with statement be used.
+    """
+    def set(self, key, value):
+        """
+        Set the value of a record.
+        @param key: the key.
+        @param value: the value.
+        @return: true on success, or false if the commit triggered by this operation failed.
+        """
+    def remove(self, key):
+        """
+        Remove a record.
+        @param key: the key.
+        @return: true on success, or false if the commit triggered by this operation failed.
+        @note: Removing a missing record is not regarded as a failure.
+        """
+    def append(self, key, value):
+        """
+        Append the value of a record.
+        @param key: the key.
+        @param value: the value.
+        @return: true on success, or false if the commit triggered by this operation failed.
+        """
+    def increment(self, key, num = 0, orig = 0):
+        """
+        Add a number to the numeric integer value of a record.
+        @param key: the key.
+        @param num: the additional number.
+        @param orig: the same to the one of the increment method of the database object.
+        @return: true on success, or false if the commit triggered by this operation failed.
+        @note: The result value can be retrieved by the get method.  An increment on an incompatible value makes the commit fail with the logical inconsistency error, and the whole commit is aborted if the batch is transactional.  Otherwise, the record is left untouched and the later operations on the same key in the batch are not applied.
+        """
+    def get(self, key, default = None):
+        """
+        Retrieve the value of a record, including the pending operations.
+        @param key: the key.
+        @param default: the value returned when the record is missing.
+        @return: the value of the corresponding record, or the default value on failure.
+        """
+    def commit(self):
+        """
+        Commit the pending operations.
+        @return: true on success, or false on failure.
+        @note: The pending operations are cleared even on failure, except that they are kept if the transaction cannot be begun.  If the current thread is in a transaction of the database, a transactional commit joins it instead of beginning its own, so the operations are settled and rolled back on failure by the outer transaction.
+        """
+    def discard(self):
+        """
+        Discard the pending operations.
+        @return: the number of the discarded operations.
+        """
+    def pending(self):
+        """
+        Get the number of the pending operations.
+        @return: the number of the pending operations.
+        """
+    def db(self):
+        """
+        Get the database object.
+        @return: the database object.
+        """
+    def __enter__(self):
+        """
+        Enter the runtime context.
+        @return: the write batch object itself.
+        """
+    def __exit__(self, extype, exvalue, extrace):
+        """
+        Exit the runtime context, committing the pending operations, or discarding them if an exception is being raised.
+        @return: always false.
+        """
+    def __repr__(self):
+        """
+        Get the representing expression.
+        @return: the representing expression.
+        """
+
+
 class DB:
     """
     Interface of database abstraction.
@@ -528,11 +789,19 @@ class DB:
         Get the last happened error.
         @return: the last happened error.
         """
-    def open(self, path = ":", mode = OWRITER | OCREATE):
+    def open(self, path = ":", mode = OWRITER | OCREATE, expected_records = None, avg_key_size = 16, avg_value_size = 64, memory_budget = None, workload = "balanced", sync_interval = None, sync_hard = False, sync_after_bytes = None):
         """
         Open a database file.
         @param path: the path of a database file.  If it is "-", the database will be a prototype hash database.  If it is "+", the database will be a prototype tree database.  If it is ":", the database will be a stash database.  If it is "*", the database will be a cache hash database.  If it is "%", the database will be a cache tree database.  If its suffix is ".kch", the database will be a file hash database.  If its suffix is ".kct", the database will be a file tree database.  If its suffix is ".kcd", the database will be a directory hash database.  If its suffix is ".kcf", the database will be a directory tree database.  If its suffix is ".kcx", the database will be a plain text database.  Otherwise, this function fails.  Tuning parameters can trail the name, separated by "#".  Each parameter is composed of the name and the value, separated by "=".  If the "type" parameter is specified, the database type is determined by the value in "-", "+", ":", "*", "%", "kch", "kct", "kcd", kcf", and "kcx".  All database types support the logging parameters of "log", "logkinds", and "logpx".  The prototype hash database and the prototype tree database do not support any other tuning parameter.  The stash database supports "bnum".  The cache hash database supports "opts", "bnum", "zcomp", "capcnt", "capsiz", and "zkey".  The cache tree database supports all parameters of the cache hash database except for capacity limitation, and supports "psiz", "rcomp", "pccap" in addition.  The file hash database supports "apow", "fpow", "opts", "bnum", "msiz", "dfunit", "zcomp", and "zkey".  The file tree database supports all parameters of the file hash database and "psiz", "rcomp", "pccap" in addition.  The directory hash database supports "opts", "zcomp", and "zkey".  The directory tree database supports all parameters of the directory hash database and "psiz", "rcomp", "pccap" in addition.  The plain text database does not support any other tuning parameter.
         @param mode: the connection mode.  DB.OWRITER as a writer, DB.OREADER as a reader.  The following may be added to the writer mode by bitwise-or: DB.OCREATE, which means it creates a new database if the file does not exist, DB.OTRUNCATE, which means it creates a new database regardless if the file exists, DB.OAUTOTRAN, which means each updating operation is performed in implicit transaction, DB.OAUTOSYNC, which means each updating operation is followed by implicit synchronization with the file system.  The following may be added to both of the reader mode and the writer mode by bitwise-or: DB.ONOLOCK, which means it opens the database file without file locking, DB.OTRYLOCK, which means locking is performed without blocking, DB.ONOREPAIR, which means the database file is not repaired implicitly even if file destruction is detected.
+        @param expected_records: the expected number of records.  If it is specified, tuning parameters suited to the database type are derived from it and the other hints, and they trail the path.  Parameters given explicitly in the path take precedence.
+        @param avg_key_size: the expected average size of each key.
+        @param avg_value_size: the expected average size of each value.
+        @param memory_budget: the memory in bytes which the database may use.  A string with a metric prefix like "1G" is also accepted.  If it is None, no memory-related parameter is derived.
+        @param workload: the expected access pattern: "balanced", "read-heavy", "write-heavy", or "scan".
+        @param sync_interval: the interval in seconds of periodic synchronization by a native background thread, or None for no periodic synchronization.  It is skipped when nothing has been updated since the last one.
+        @param sync_hard: true for physical synchronization with the device, or false for logical synchronization with the file system.
+        @param sync_after_bytes: the total size in bytes of keys and values updated since the last synchronization which triggers the next one before the interval passes, or None for no limit.
         @return: true on success, or false on failure.
         @note: The tuning parameter "log" is for the original "tune_logger" and the value specifies the path of the log file, or "-" for the standard output, or "+" for the standard error.  "logkinds" specifies kinds of logged messages and the value can be "debug", "info", "warn", or "error".  "logpx" specifies the prefix of each log message.  "opts" is for "tune_options" and the value can contain "s" for the small option, "l" for the linear option, and "c" for the compress option.  "bnum" corresponds to "tune_bucket".  "zcomp" is for "tune_compressor" and the value can be "zlib" for the ZLIB raw compressor, "def" for the ZLIB deflate compressor, "gz" for the ZLIB gzip compressor, "lzo" for the LZO compressor, "lzma" for the LZMA compressor, or "arc" for the Arcfour cipher.  "zkey" specifies the cipher key of the compressor.  "capcnt" is for "cap_count".  "capsiz" is for "cap_size".  "psiz" is for "tune_page".  "rcomp" is for "tune_comparator" and the value can be "lex" for the lexical comparator, "dec" for the decimal comparator, "lexdesc" for the lexical descending comparator, or "decdesc" for the decimal descending comparator.  "pccap" is for "tune_page_cache".  "apow" is for "tune_alignment".  "fpow" is for "tune_fbp".  "msiz" is for "tune_map".  "dfunit" is for "tune_defrag".  Every opened database must be closed by the PolyDB::close method when it is no longer in use.  It is not allowed for two or more database objects in the same process to keep their connections to the same database file at the same time.
         """
@@ -559,21 +828,23 @@ class DB:
         @return: true on success, or false on failure.
         @note: The operations for specified records are performed atomically and other threads accessing the same records are blocked.  To avoid deadlock, any explicit database operation must not be performed in this method.
         """
-    def iterate(self, visitor, writable = True):
+    def iterate(self, visitor, writable = True, filter = None):
         """
         Iterate to accept a visitor for each record.
         @param visitor: a visitor object which implements the Visitor interface, or a function object which receives the key and the value.
         @param writable: true for writable operation, or false for read-only operation.
+        @param filter: a map object of the filter conditions, or None to visit every record.  "prefix" specifies the key prefix, "begin" and "end" specify the key range including the beginning and excluding the end, "min_size" and "max_size" specify the range of the value size, "regex" specifies a regular expression the key must match, and "contains" specifies a substring the value must contain.  Keys are compared in the lexical order of bytes.
         @return: true on success, or false on failure.
-        @note: The whole iteration is performed atomically and other threads are blocked.  To avoid deadlock, any explicit database operation must not be performed in this method.
+        @note: The whole iteration is performed atomically and other threads are blocked.  To avoid deadlock, any explicit database operation must not be performed in this method.  The filter is evaluated natively and records not passing it are never given to the visitor.
         """
-    def set(self, key, value):
+    def set(self, key, value, ttl = None):
         """
         Set the value of a record.
         @param key: the key.
         @param value: the value.
+        @param ttl: the lifetime of the record in seconds.  If it is None, the record does not expire.  An expiration table must be set by the tune_expiry method to specify it.
         @return: true on success, or false on failure.
-        @note: If no record corresponds to the key, a new record is created.  If the corresponding record exists, the value is overwritten.
+        @note: If no record corresponds to the key, a new record is created.  If the corresponding record exists, the value is overwritten.  Overwriting a record cancels its previous lifetime, while appending to it or incrementing it does not.
         """
     def add(self, key, value):
         """
@@ -632,13 +903,14 @@ class DB:
         @return: true on success, or false on failure.
         @note: If no record corresponds to the key, false is returned.
         """
-    def get(self, key):
+    def get(self, key, default = None):
         """
         Retrieve the value of a record.
         @param key: the key.
-        @return: the value of the corresponding record, or None on failure.
+        @param default: the value returned when the record is missing.
+        @return: the value of the corresponding record, or the default value on failure.
         """
-    def get_str(self, key):
+    def get_str(self, key, default = None):
         """
         Retrieve the value of a record.
         @note: Equal to the original DB::get method except that the return value is string.
@@ -666,6 +938,7 @@ class DB:
         @param recs: a map object of the records to store.
         @param atomic: true to perform all operations atomically, or false for non-atomic operations.
         @return: the number of stored records, or -1 on failure.
+        @note: Only the records actually stored are reported to the journal, the change feed, and the indexes, including those stored before a failure of non-atomic operations.
         """
     def remove_bulk(self, keys, atomic = True):
         """
@@ -673,6 +946,7 @@ class DB:
         @param keys: a sequence object of the keys of the records to remove.
         @param atomic: true to perform all operations atomically, or false for non-atomic operations.
         @return: the number of removed records, or -1 on failure.
+        @note: Only the records which existed are reported to the journal, the change feed, and the indexes.  With non-atomic operations, the records removed before a failure are reported too.
         """
     def get_bulk(self, keys, atomic = True):
         """
@@ -686,6 +960,58 @@ class DB:
         Retrieve records at once.
         @note: Equal to the original DB::get_bulk method except that the return value is string map.
         """
+    def pop(self, key, default = None):
+        """
+        Remove a record and return its value.
+        @param key: the key.
+        @param default: the value returned when the record is missing.
+        @return: the value of the corresponding record, or the default value if it is missing.
+        @note: If the record is missing and the default value is omitted, KeyError is raised.  The record is retrieved and removed atomically by the seize method.
+        """
+    def setdefault(self, key, default = None):
+        """
+        Retrieve the value of a record, storing a default value if it is missing.
+        @param key: the key.
+        @param default: the value to store when the record is missing.  If it is None, nothing is ever stored, and this method works as the get method.
+        @return: the value of the corresponding record, or the stored default value, as a byte array, or None if the record is missing with the default None, or on failure.
+        @note: The record is checked and stored atomically by one visit.
+        """
+    def update(self, other = None, **kwargs):
+        """
+        Store records of a mapping or a sequence of pairs at once.
+        @param other: a map object, or a sequence of pairs of the key and the value.
+        @param kwargs: additional records given as keyword arguments.
+        @return: always None.
+        @note: All records are stored atomically by one call of the set_bulk method.  RuntimeError is raised on failure.
+        """
+    def keys(self):
+        """
+        Get a view of the keys.
+        @return: the view object of the keys.
+        @note: A view supports the len function, the in operator, and iteration.  Iteration fetches records in batches with a cursor, so records modified during iteration may or may not be seen.
+        """
+    def values(self):
+        """
+        Get a view of the values.
+        @return: the view object of the values.
+        @note: The in operator of the view scans all records.
+        """
+    def items(self):
+        """
+        Get a view of the records.
+        @return: the view object of pairs of the key and the value.
+        @note: Each key and its value are fetched together by one cursor pass, so iterating this view does not look up each record again.
+        """
+    def write_batch(self, max_ops = 1024, max_bytes = 0, max_delay = 0, transactional = True):
+        """
+        Create a write batch which commits operations at once.
+        @param max_ops: the number of pending operations which triggers a commit.  If it is 0, no limit is specified.
+        @param max_bytes: the total size of the keys and the values of pending operations which triggers a commit.  If it is 0, no limit is specified.
+        @param max_delay: the time in seconds from the first pending operation which triggers a commit.  If it is 0, no limit is specified.  There is no timer and the delay is checked only when the next operation is added, so pending operations older than the delay stay pending until then or until commit is called.
+        @param transactional: true to perform each commit in a transaction, or false not to.
+        @return: the write batch object.
+        @note: The object can be used in a with statement, which commits the pending operations at the end of the block, or discards them if an exception is raised in the block.
+        """
     def clear(self):
         """
         Remove all records.
@@ -718,6 +1044,7 @@ class DB:
         Begin transaction.
         @param hard: true for physical synchronization with the device, or false for logical synchronization with the file system.
         @return: true on success, or false on failure.
+        @note: A transaction of another thread is waited for.  Beginning another transaction in the thread which already has one fails with the logical inconsistency error.
         """
     def end_transaction(self, commit = True):
         """
@@ -732,17 +1059,49 @@ class DB:
         @param hard: true for physical synchronization with the device, or false for logical synchronization with the file system.
         @return: true on success, or false on failure.
         """
-    def dump_snapshot(self, dest):
+    def dump_snapshot(self, dest, threads = None, chunk = 4194304):
         """
         Dump records into a snapshot file.
         @param dest: the name of the destination file.
+        @param threads: the number of threads which compress chunks in parallel, or None to write the plain format of the underlying library.
+        @param chunk: the size of each chunk before compression in bytes.  It is ignored without threads.
         @return: true on success, or false on failure.
+        @note: With threads, records are written in chunks compressed with ZLIB, each of which has a CRC32 checksum.
         """
-    def load_snapshot(self, src):
+    def load_snapshot(self, src, threads = None, shards = None):
         """
         Load records from a snapshot file.
         @param src: the name of the source file.
+        @param threads: the number of threads which decompress and store chunks in parallel, or None for one thread.  It is ignored for the plain format.
+        @param shards: a sequence of database objects among which records are distributed by the MurmurHash of each key, or None to store every record into this database.  It is available only for the chunked format.
+        @return: true on success, or false on failure.
+        @note: The format of the file is detected automatically.  A chunked snapshot whose checksum does not match or which is truncated causes the broken data error, while records of the chunks loaded before it are kept.  Records of a chunked snapshot are stored into each target database object under its locking, a chunk at a time, and reported to its journal, change feed, and the other listeners like any other write.  Loading a plain snapshot resets the listeners instead.
+        """
+    def tune_journal(self, db):
+        """
+        Set the journal of changed keys used for incremental snapshots.
+        @param db: the database object of the journal, which should be an ordered database (tree, forest, cache tree, or prototype tree) with the default lexical comparator opened as a writer.  If it is None, the current journal is detached.
+        @return: true on success, or false on failure.
+        @note: The journal assigns a sequence number to each update through this database object and keeps only the latest number of each key, so its size is bounded by the number of keys.  Updates which cannot be tracked one by one, such as clear, load_snapshot of a plain snapshot, and aborted transactions, reset the journal, and incremental snapshots since an earlier marker are refused after that.
+        """
+    def dump_snapshot_stream(self, dest, since = None, progress = None, chunk = 1048576):
+        """
+        Dump records into a file object or a file descriptor in chunks.
+        @param dest: a file object which implements the write method, or an integer file descriptor.
+        @param since: the marker returned by a previous dump to write only the records changed after it, or None to write every record.  Incremental dumps require the journal set by the tune_journal method.
+        @param progress: a function object which receives the number of dumped records and the number of written bytes after each chunk, or None.
+        @param chunk: the size of each chunk in bytes.
+        @return: the marker of the snapshot, or None on failure.
+        @note: The database is locked only while each chunk is gathered, so other threads can update it during the dump.  The snapshot contains every change up to the returned marker and possibly some later ones, so applying the incremental snapshots since the marker in order brings the state up to date.  Removed records are written as tombstones in incremental snapshots.  The format is independent of the dump_snapshot method.
+        """
+    def load_snapshot_stream(self, src, progress = None, chunk = 1048576):
+        """
+        Load records from a file object or a file descriptor in chunks.
+        @param src: a file object which implements the read method, or an integer file descriptor.
+        @param progress: a function object which receives the number of loaded records and the number of read bytes after each chunk, or None.
+        @param chunk: the size of each chunk in bytes.
         @return: true on success, or false on failure.
+        @note: Records are stored and tombstones are removed in the order of the snapshot.  A full snapshot and the incremental snapshots following it should be loaded in the order they were dumped.
         """
     def count(self):
         """
@@ -763,29 +1122,211 @@ class DB:
         """
         Get the miscellaneous status information.
         @return: a dictionary object of the status information, or None on failure.
+        @note: After the defrag or tune_defrag method is called, the status also has "defrag_calls", "defrag_time", and "defrag_reclaimed", which are the number of defragmentation calls, the total seconds spent in them, and the number of bytes by which they shrank the file, and "defrag_last", "defrag_running", "defrag_step", "defrag_interval", and "defrag_budget" about the scheduler.  If the database was opened with periodic synchronization, the status also has "sync_last" and "sync_duration", which are the time when the last synchronization started and the seconds it took, "sync_count" and "sync_failures", which are the numbers of all and failed synchronizations, "sync_pending_bytes", and the settings "sync_interval", "sync_hard", and "sync_after_bytes".
+        """
+    def tuning(self):
         """
-    def match_prefix(self, prefix, max = -1):
+        Get the tuning parameters derived at opening.
+        @return: a dictionary object of the derived parameters and the database type, or None if the database was opened without the expected number of records or the last opening failed.
+        """
+    def metrics(self):
+        """
+        Get the numeric metrics of the database.
+        @return: a map object of integers, or None on failure.  "count" and "size" are the number of records and the size of the database.  "fragments", "file_size", and "cache_usage" are the number of fragmented free blocks, the size of the file, and the usage of the page cache, which are available only for hash and tree databases.  "calls" is the number of calls of methods, "hits" and "misses" are the numbers of lookups by the get, get_str, check, seize, and seize_str methods and the subscript operator which found a record or not, and "writes" and "removes" are the numbers of stored and removed records.
+        @note: The counters are kept since the object was created, without locking the database or converting strings.  The metrics are read without the locking device of the database object and without the global interpreter lock, so they can be collected while another thread or a visitor is using the object.
+        """
+    def match_prefix(self, prefix, max = -1, filter = None):
         """
         Get keys matching a prefix string.
         @param prefix: the prefix string.
         @param max: the maximum number to retrieve.  If it is negative, no limit is specified.
+        @param filter: a map object of the filter conditions.  See the iterate method for the format.
         @return: a list object of matching keys, or None on failure.
         """
-    def match_regex(self, regex, max = -1):
+    def match_regex(self, regex, max = -1, values = False, filter = None):
         """
         Get keys matching a regular expression string.
         @param regex: the regular expression string.
         @param max: the maximum number to retrieve.  If it is negative, no limit is specified.
-        @return: a list object of matching keys, or None on failure.
+        @param values: true to retrieve the values of the matching records together.
+        @param filter: a map object of the filter conditions.  See the iterate method for the format.
+        @return: a list object of matching keys, or None on failure.  If values is true, each element is a tuple of the key string and the value bytes.
+        @note: If the pattern is anchored with "^" and begins with a literal prefix, tree databases with the default lexical comparator only scan the key range starting with the prefix.  Other patterns and databases scan all records.
+        """
+    def explain_regex(self, regex):
         """
-    def match_similar(self, origin, range = 1, utf = False, max = -1):
+        Get the scan strategy of a regular expression string.
+        @param regex: the regular expression string.
+        @return: a map object of the plan.  "strategy" is "prefix" for a key range scan or "scan" for a full scan, "prefix" is the extracted literal prefix, and "reason" describes why the strategy was chosen.
+        """
+    def match_similar(self, origin, range = 1, utf = False, max = -1, filter = None):
         """
         Get keys similar to a string in terms of the levenshtein distance.
         @param origin: the origin string.
         @param range: the maximum distance of keys to adopt.
         @param utf: flag to treat keys as UTF-8 strings.
         @param max: the maximum number to retrieve.  If it is negative, no limit is specified.
+        @param filter: a map object of the filter conditions.  See the iterate method for the format.
         @return: a list object of matching keys, or None on failure.
+        @note: Keys are ordered by the distance and then by the key itself.  If a fuzzy index set by the tune_fuzzy_index method is usable for the query, candidates are collected from the index instead of scanning every key.  Otherwise, every key is scanned.
+        """
+    def tune_fuzzy_index(self, db, utf = False, gram = 3, rebuild = False):
+        """
+        Set the n-gram index used for similarity search.
+        @param db: the database object of the index, which should be an ordered database (tree, forest, cache tree, or prototype tree) with the default lexical comparator opened as a writer.  If it is None, the current index is detached.
+        @param utf: flag to treat keys as UTF-8 strings.  Only queries by match_similar with the same flag use the index.
+        @param gram: the number of characters of each gram.
+        @param rebuild: true to rebuild the index from every key in any case, or false to reuse an existing index built with the same parameters.
+        @return: true on success, or false on failure.
+        @note: The index is kept in the other database as posting records of grams, so it persists across processes.  Updates through this database object are reflected in the index.  Updates which cannot be reflected one by one, such as merge, load_snapshot of a plain snapshot, and aborted transactions, mark the index stale, and then match_similar scans every key until the index is rebuilt.  The index cannot prune candidates for a query whose distance range is large relative to its length, and such a query also scans every key.  Postings are written and searched under a mutex of the index, so the database of the index should not be modified through other objects while it is attached.
+        """
+    def tune_expiry(self, db, rate = 1000, interval = 1.0):
+        """
+        Set the expiration table and the background sweeper.
+        @param db: the database object of the table, which should be an ordered database (tree, forest, cache tree, or prototype tree) with the default lexical comparator opened as a writer.  If it is None, the current table is detached.
+        @param rate: the maximum number of records removed by each sweep of the background sweeper.  If it is not positive, the sweeper is not started and expired records are removed only by the sweep_expired method.
+        @param interval: the interval between sweeps in seconds.
+        @return: true on success, or false on failure.
+        @note: The table keeps the deadline of each record with a lifetime and a queue of records ordered by deadline, so it persists across processes if the database of the table is persistent.  Until they are removed, expired records are treated as missing only by the methods which read records by key: get, get_str, check, get_bulk, get_bulk_str, pop, setdefault, the in operator, the subscript operator, and the get method of write batches.  The methods which scan or count records do not consult the table and still see expired records: cursors, iteration, iterate, match_prefix, match_regex, match_similar, the views of keys, values, and items, count, and len.  The sweeper is a native thread which waits and sweeps without the global interpreter lock and removes records through the same locking as the other methods.  A record is removed only if its deadline is unchanged when it is visited.  The sweeper is stopped when the database is closed.
+        """
+    def sweep_expired(self, max = -1):
+        """
+        Remove expired records.
+        @param max: the maximum number of records to remove.  If it is negative, no limit is specified.
+        @return: the number of removed records, or -1 on failure.
+        """
+    def expiry_status(self):
+        """
+        Get the status of the expiration table.
+        @return: a map object of the status, or None if no expiration table is set.  "count" is the number of records with a lifetime, "running" tells whether the sweeper is running, "rate" and "interval" are the sweeper parameters, "sweeps", "scanned", and "expired" are the numbers of sweeps, inspected queue entries, and removed records, and "last_sweep" is the time of the last sweep.
+        """
+    def tune_changes(self, capacity = None, overflow = None):
+        """
+        Set the change feed which records updates.
+        @param capacity: the maximum number of updates kept in memory.  If it is None or 0, the current feed is detached.
+        @param overflow: the behavior when the feed is full: "drop", "block", or "error".  If it is None, "drop" is specified.
+        @return: always true.
+        @note: Every update through this database object, including those by visitors, cursors, and transactions, is given a sequence number starting from 1.  With "drop", the oldest update is dropped when the feed is full, so writers are never blocked by slow consumers.  With "block" and "error", calling changes with a sequence number releases the updates up to it.  With "block", a writer waits before it begins an update until a consumer releases one, so every update must be consumed by another thread.  The writer waits without holding the database, so the consumer can read it meanwhile, and the feed may exceed its capacity by the updates of writers already admitted.  With "error", updates are not recorded while the feed is full, and changes fails once the recorded ones are consumed, until the feed is set again.
+        """
+    def changes(self, since = None, max = -1, timeout = 0):
+        """
+        Get updates recorded by the change feed.
+        @param since: the sequence number of the last update already consumed, or None to start from the oldest one kept.
+        @param max: the maximum number of updates to be fetched.  If it is negative, no limit is specified.
+        @param timeout: the time in seconds to wait for an update after since when there is none yet.  The global interpreter lock and the database are not locked while waiting.
+        @return: a list of tuples of the sequence number, the kind, the key, and the value, or None on failure.  The kind is "set", "remove", "clear", or "reset".  The value is the new value of a "set", or None if it is unknown, as with append and increment, and for the other kinds.  A "reset" is recorded when updates cannot be tracked one by one, as by load_snapshot of a plain snapshot and aborted transactions, and consumers should reload the whole database then.
+        @note: If updates after since have already been dropped, or they were not recorded because the feed with the "error" behavior overflowed, the invalid operation error is set.  Comparing the "first" and "last" entries of changes_status with the consumed sequence number tells how far a consumer lags behind.
+        """
+    def changes_status(self):
+        """
+        Get the status of the change feed.
+        @return: a map object of the status, or None if no change feed is set.  "capacity" is the maximum number of updates, "count" is the number of kept updates, "first" and "last" are their sequence numbers, "dropped" is the number of updates dropped or not recorded by overflow, "overflow" is the behavior when the feed is full, and "broken" is "true" if updates were not recorded.
+        """
+    def defrag(self, step = 0):
+        """
+        Defragment the database file.
+        @param step: the number of steps.  If it is 0, the whole region is defragmented.
+        @return: true on success, or false on failure.
+        @note: Only the file hash database, the file tree database, and the directory tree database are supported.  Each call with a positive step resumes where the previous one stopped, so the file can be defragmented incrementally while it is in use.
+        """
+    def tune_defrag(self, step = 0, interval = 1.0, budget = 0.01):
+        """
+        Set the background scheduler of incremental defragmentation.
+        @param step: the number of steps of each defragmentation call.  If it is 0, the current scheduler is stopped.
+        @param interval: the interval in seconds between rounds.
+        @param budget: the time in seconds which each round may spend.  At least one call is done in a round.
+        @return: true on success, or false on failure.
+        @note: The scheduler runs in a native thread and is stopped when the database is closed.
+        """
+    def tune_group_commit(self, window = None, hard = False, max_batch = 0):
+        """
+        Set the group commit which batches synchronization requests of threads.
+        @param window: the time in seconds to wait for more requests after the first one of a batch.  If it is None, the current group commit is stopped after synchronizing pending requests.
+        @param hard: true for physical synchronization with the device, or false for logical synchronization with the file system.
+        @param max_batch: the number of requests which triggers synchronization before the window passes.  If it is 0, no limit is specified.
+        @return: always true.
+        @note: A native thread synchronizes the database once for all requests made during the window, so concurrent writers share the cost of each synchronization.  It is stopped when the database is closed.
+        """
+    def request_durable(self):
+        """
+        Request synchronization of the preceding updates by the group commit.
+        @return: the ticket to be passed to the wait_durable method, or None on failure.
+        @note: The ticket works as a future of durability.  Updates made by the calling thread before this call, including committed transactions, are covered by it.
+        """
+    def wait_durable(self, ticket = None, timeout = None):
+        """
+        Wait until the preceding updates are synchronized by the group commit.
+        @param ticket: the ticket returned by the request_durable method, or None to request synchronization and wait for it.
+        @param timeout: the maximum time in seconds to wait, or None for no limit.
+        @return: true if the updates are durable, or false on failure.
+        @note: The global interpreter lock is released while waiting.  The invalid operation error is set if the ticket has not been issued.  The system error is set if the synchronization failed or the wait timed out.  Only the latest 256 failures are remembered, so the system error is also set for a ticket older than the forgotten ones.
+        """
+    def group_commit_status(self):
+        """
+        Get the status of the group commit.
+        @return: a map object of the status, or None if no group commit has been set.  "running", "window", "hard", and "max_batch" are the settings, "requests" and "pending" are the numbers of all and unsynchronized requests, "batches", "avg_batch", and "biggest_batch" are the number and sizes of synchronizations, "sync_time" is the total seconds spent in them, "avg_latency" and "max_latency" are the seconds from requests until they became durable, and "failures" is the number of failed synchronizations.
+        """
+    def export_to(self, dest, batch = 1024, threads = 1, filter = None, transform = None, progress = None, resume = None):
+        """
+        Export records into another database in pipelined batches.
+        @param dest: a database object other than this one, or the path of a database which is opened as a writer and created if it does not exist.
+        @param batch: the number of records read in each batch.
+        @param threads: the number of threads which store each batch into the destination.
+        @param filter: a map object of the filter conditions, or None to export every record.  See the iterate method for the format.
+        @param transform: "compress" to compress each value with ZLIB, "decompress" to decompress each value compressed that way, or None to copy values as they are.
+        @param progress: a function object which receives the number of exported records and the checkpoint key after each batch, or None.  If it returns false, the export stops after the batches being stored.  If it raises an exception, the export is aborted.
+        @param resume: a checkpoint key passed to the progress function by an interrupted export to restart after it, or None to start from the first record.
+        @return: the number of exported records, or -1 on failure.
+        @note: The next batch is read while the previous one is stored, and the source is locked only while each batch is read, so other threads can use it during the export.  A destination database object is locked by each thread while it stores its slice of a batch, and its updates are reported to its change feed and the other listeners like any other write.  Every record up to the checkpoint has been stored in the destination when the progress function receives it.  A checkpoint key which does not exist any longer causes the no record error for databases which are not ordered.
+        """
+    def tune_stats(self, enabled = True):
+        """
+        Enable or disable the statistics of method calls.
+        @param enabled: true to collect the statistics, or false to discard them and stop collecting.
+        @return: always true.
+        @note: The statistics are not collected by default.  While they are disabled, the overhead of each method call is a pointer check.
+        """
+    def stats(self, reset = False):
+        """
+        Get the statistics of method calls.
+        @param reset: true to clear the statistics after getting them.
+        @return: a map object whose keys are the names of the called methods, or None if the statistics are disabled.  The names of the methods of cursors start with "cursor.".  Each value is a map object where "calls" is the number of calls, "bytes_in" and "bytes_out" are the total sizes of keys and values passed to and returned by record operations, "throughput" is the number of calls per second since the statistics were enabled or reset, "native_time" is the total seconds in the underlying library, "lock_time" is the total seconds waiting for the lock of the database object or the global interpreter lock, and "conv_time" is the total seconds converting the results into Python objects.  "native_hist", "lock_hist", and "conv_hist" are lists of 32 numbers of calls, the i-th of which counts the calls which took less than 2 ** i microseconds and not less than 2 ** (i - 1) microseconds, while the last one counts every longer call.
+        """
+    def tune_contention(self, enabled = True, sample = 1):
+        """
+        Enable or disable the profiler of lock contention.
+        @param enabled: true to start profiling, or false to discard the profile and stop profiling.
+        @param sample: the interval of sampled calls.  1 samples every call of methods, and N samples one of every N calls.
+        @return: always true.
+        @note: Enabling the profiler discards the existing profile.  For each sampled call, the waiting time for the lock of the database object is recorded as "lock" if the database object has it, and the waiting time to reacquire the global interpreter lock is recorded as "gil" otherwise.  The time spent in the underlying library is recorded as "native", which includes the waiting time for its internal locks.
+        """
+    def contention(self, reset = False):
+        """
+        Get the waiting times sampled by the profiler of lock contention.
+        @param reset: true to clear the profile after getting it.
+        @return: a list of tuples of the thread identifier, the method name, the kind of the lock, the number of samples, the total seconds, and the longest seconds, or None if the profiler is disabled.  The thread identifier is the same as the one returned by the threading.get_ident function.
+        """
+    def dump_contention(self, dest, format = "report"):
+        """
+        Dump the profile of lock contention into a file.
+        @param dest: the path of the destination file.
+        @param format: "report" to write the totals of each kind of lock and a table sorted by the total waiting time, or "folded" to write folded stacks of the thread, the method, and the kind of lock with the total microseconds, which can be read by flamegraph tools.
+        @return: true on success, or false on failure.
+        """
+    def tune_slow_log(self, threshold = None, capacity = 1024, hook = None):
+        """
+        Set the log of slow operations.
+        @param threshold: the seconds of a method call above which it is logged, or None to discard the log and stop logging.  0 logs every call, which can be used to emit a span for each call through the hook.
+        @param capacity: the maximum number of entries kept in the log.  The oldest entries are discarded when it is exceeded.
+        @param hook: a function object which receives each entry after the call returns, or None.
+        @return: always true.
+        @note: The hook is called asynchronously by the main thread at the next opportunity of the interpreter, so it does not delay the logged operation.  Exceptions raised by the hook are reported as unraisable and ignored.  Operations made by the hook itself are not logged, so a hook which uses the database does not trigger itself again.
+        """
+    def slow_log(self, reset = False):
+        """
+        Get the entries of the log of slow operations.
+        @param reset: true to clear the log after getting it.
+        @return: a list of map objects in the order of logging, or None if the log is disabled.  In each entry, "time" is the UNIX time when the call started, "method" is the name of the method, "key" is the first 64 bytes of the key or None if the method does not take a key, "bytes_in" and "bytes_out" are the sizes of the keys and values passed and returned by record operations, "lock_time" is the seconds waiting for locks, "native_time" is the seconds in the underlying library, "total_time" is the seconds of the whole call, and "thread" is the identifier of the calling thread.
         """
     def merge(self, srcary, mode = MSET):
         """
@@ -805,6 +1346,22 @@ class DB:
         @param proc: the functor of operations for the cursor.  The cursor is disabled implicitly after the block.
         @return: always None.
         """
+    def tune_blob_store(self, db):
+        """
+        Set the database of chunk records of blob records.
+        @param db: the database object of the blob store, which should be opened as a writer to write blobs.  If it is None, the current blob store is detached.
+        @return: always true.
+        @note: Chunk records are written to the blob store directly, so the blob store should not be modified through other objects while blobs are written.  Blob handles already open keep using the blob store of their opening.
+        """
+    def open_blob(self, key, mode = "r", chunk = 1048576):
+        """
+        Open a file-like handle to a chunked blob record.
+        @param key: the key.
+        @param mode: the open mode.  "r" to read an existing blob, "w" to create or truncate a blob, replacing an existing record which is not a blob, "a" to create a blob or append to it.  "+" can be added for reading and writing.  "b" is ignored.
+        @param chunk: the size of each chunk record.  It is used only when the blob is created or truncated.
+        @return: the blob object, or None on failure.  If no blob store is set, the invalid operation error is set.
+        @note: A large value can be streamed through the returned handle without being held in memory whole.  The handle should be closed with the Blob#close method when it is no longer in use.
+        """
     def shift(self):
         """
         Remove the first record.
@@ -843,6 +1400,13 @@ class DB:
         """
         Alias of the set method.
         """
+    def __contains__(self, key):
+        """
+        Check the existence of a record.
+        @param key: the key.
+        @return: true if the record exists, or false if not.
+        @note: If the check fails for a reason other than a missing record, an exception is raised.
+        """
     def __iter__(self):
         """
         Alias of the cursor method.
@@ -859,4 +1423,156 @@ class DB:
 
 
 
+class IndexedDB:
+    """
+    Interface of database with secondary indexes.
+    @note: Each secondary index is stored in a separate tree database whose record keys are the index key, a null byte, and the primary key, and whose values are the primary key.  Each write through the indexed database begins a transaction on the primary database and on every index database, updates the index entries and the primary record, and commits the index databases before the primary database, so that a crash never leaves index entries missing.  Inside a transaction begun by the current thread on any of those databases, the write joins it instead of beginning its own there, and committing or aborting it is left to the caller.  An index entry whose primary record is missing is skipped by lookups.  Each index should use its own database, and index keys should not contain null bytes.
+    """
+    def __init__(self, db):
+        """
+        Create an indexed database object.
+        @param db: the primary database object, which should be opened beforehand.
+        @return: the indexed database object.
+        """
+    def add_index(self, name, db, extractor):
+        """
+        Register a secondary index.
+        @param name: the name of the index.
+        @param db: the database object of the index.  It must be an ordered database with the default lexical comparator opened as a writer, or TypeError is raised.
+        @param extractor: a callable which receives the key and the value of each record and returns an index key, a list of index keys, or None.  Or, a tuple ("field", sep, index) to extract the field at the index of the value split by the separator natively.
+        @return: always true.
+        @note: Existing records are not indexed until the rebuild method is called.
+        """
+    def remove_index(self, name):
+        """
+        Unregister a secondary index.
+        @param name: the name of the index.
+        @return: true on success, or false if no index corresponds to the name.
+        @note: The database of the index is neither closed nor cleared.
+        """
+    def rebuild(self, name = None):
+        """
+        Rebuild secondary indexes from the primary database.
+        @param name: the name of the index.  If it is None, every index is rebuilt.
+        @return: true on success, or false on failure.
+        """
+    def set(self, key, value):
+        """
+        Set the value of a record and update the indexes.
+        @param key: the key.
+        @param value: the value.
+        @return: true on success, or false on failure.
+        """
+    def remove(self, key):
+        """
+        Remove a record and update the indexes.
+        @param key: the key.
+        @return: true on success, or false on failure.
+        @note: If no record corresponds to the key, false is returned.
+        """
+    def lookup(self, name, key, max = -1):
+        """
+        Get records whose index key is equal to a key.
+        @param name: the name of the index.
+        @param key: the index key.
+        @param max: the maximum number of records to be retrieved.  If it is negative, no limit is specified.
+        @return: a map of retrieved records, or None on failure.
+        @note: The primary records are retrieved in bulk.
+        """
+    def range(self, name, begin = None, end = None, max = -1):
+        """
+        Get records whose index key is in a range.
+        @param name: the name of the index.
+        @param begin: the lower bound of the index key, inclusive.  If it is None, the range starts at the first index key.
+        @param end: the upper bound of the index key, exclusive.  If it is None, the range ends at the last index key.
+        @param max: the maximum number of records to be retrieved.  If it is negative, no limit is specified.
+        @return: a map of retrieved records, or None on failure.
+        @note: The primary records are retrieved in bulk.
+        """
+    def db(self):
+        """
+        Get the primary database object.
+        @return: the primary database object.
+        """
+    def index(self, name):
+        """
+        Get the database object of a secondary index.
+        @param name: the name of the index.
+        @return: the database object of the index, or None if no index corresponds to the name.
+        """
+    def __repr__(self):
+        """
+        Get the representing expression.
+        @return: the representing expression.
+        """
+    def __str__(self):
+        """
+        Get the string expression.
+        @return: the string expression.
+        """
+
+
+
+class TreeBuilder:
+    """
+    Interface of bulk builder of a database from unsorted records.
+    @note: Added records are buffered in memory and, whenever the buffer reaches half of the memory budget, they are sorted and spilled to a temporary file as a run by a native thread while the next records are buffered.  The finish method merges the runs and stores the records into the destination database in ascending order of keys, so a tree database is filled without random page splits.  When there are many runs, groups of them are merged in parallel beforehand.  If a key is added more than once, the last value is stored.  Temporary files are removed when the builder is finished or destroyed.
+    """
+    def __init__(self, db, memory_budget = 67108864, tmpdir = None):
+        """
+        Create a tree builder object.
+        @param db: the destination database object, which should be opened as a writer beforehand.  It is usually an empty file tree database, created with DB.OTRUNCATE.
+        @param memory_budget: the memory in bytes which buffered records may use.  A string with a metric prefix like "1G" is also accepted.
+        @param tmpdir: the directory of temporary files, or None for the default directory of the tempfile module.
+        @return: the tree builder object.
+        """
+    def add(self, key, value):
+        """
+        Add a record.
+        @param key: the key.
+        @param value: the value.
+        @return: true on success, or false on failure.
+        """
+    def add_bulk(self, recs):
+        """
+        Add multiple records at once.
+        @param recs: a map object of the records, or an iterable object of pairs of the key and the value.  It can be a generator of records larger than the memory.
+        @return: the number of added records, or -1 on failure.
+        """
+    def add_db(self, db):
+        """
+        Add all records of a database.
+        @param db: the source database object.
+        @return: the number of added records, or -1 on failure.
+        @note: The records are read natively without the global interpreter lock.  Adding a hash database and finishing into a tree database produces a sorted export of it.
+        """
+    def finish(self):
+        """
+        Merge the added records into the database.
+        @return: the number of stored records, or -1 on failure.
+        @note: The builder cannot be used after this method is called, whether it succeeds or not.  Operations on a finished builder raise ValueError.
+        """
+    def status(self):
+        """
+        Get the miscellaneous status information.
+        @return: a dictionary object of the status information.  "records" is the number of added records, "runs" is the number of spilled runs, "spilled" is the total size of them, "memory" is the size of buffered records, and "budget" is the memory budget.
+        """
+    def db(self):
+        """
+        Get the destination database object.
+        @return: the destination database object.
+        """
+    def __repr__(self):
+        """
+        Get the representing expression.
+        @return: the representing expression.
+        """
+    def __str__(self):
+        """
+        Get the string expression.
+        @return: the string expression.
+        """
+
+
+
 # END OF FILE
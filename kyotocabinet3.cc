@@ -29,16 +29,43 @@ extern "C" {
 class SoftString;
 class CursorBurrow;
 class SoftCursor;
+class SoftBlob;
+class UpdateListener;
+class UpdateHub;
+class FuzzyIndex;
+class ExpiryTable;
+class ChangeJournal;
+class ChangeFeed;
+class Defragmenter;
+class GroupCommitter;
+class SyncScheduler;
+class ExternalSorter;
+class SnapshotWorker;
+class ExportWriter;
+class CallStats;
+class ContentionProfiler;
+class SlowLog;
+struct SlowOperation;
 class SoftVisitor;
+class ScanFilter;
 class SoftFileProcessor;
 struct Error_data;
 struct Visitor_data;
 struct FileProcessor_data;
 struct Cursor_data;
+struct Blob_data;
+struct View_data;
+struct ViewIterator_data;
+struct WriteBatch_data;
+struct BatchOperation;
+struct IndexedDB_data;
+struct TreeBuilder_data;
 struct DB_data;
 class NativeFunction;
 typedef std::map<std::string, std::string> StringMap;
 typedef std::vector<std::string> StringVector;
+typedef std::map<std::string, int64_t> MetricMap;
+typedef std::map<std::string, std::vector<BatchOperation> > BatchMap;
 
 
 /* function prototypes */
@@ -52,6 +79,8 @@ static int64_t pyatoi(PyObject* pyobj);
 static double pyatof(PyObject* pyobj);
 static PyObject* maptopymap(const StringMap* map);
 static PyObject* vectortopylist(const StringVector* vec);
+static bool checkkwargs(PyObject* pykwds, const char** names);
+static PyObject* getkwarg(PyObject* pykwds, const char* name);
 static void threadyield();
 static bool define_module();
 static PyObject* kc_conv_bytes(PyObject* pyself, PyObject* pyargs);
@@ -61,6 +90,13 @@ static PyObject* kc_atof(PyObject* pyself, PyObject* pyargs);
 static PyObject* kc_hash_murmur(PyObject* pyself, PyObject* pyargs);
 static PyObject* kc_hash_fnv(PyObject* pyself, PyObject* pyargs);
 static PyObject* kc_levdist(PyObject* pyself, PyObject* pyargs);
+static PyObject* kc_hash_murmur_many(PyObject* pyself, PyObject* pyargs);
+static PyObject* kc_levdist_many(PyObject* pyself, PyObject* pyargs);
+static PyObject* kc_memory_usage(PyObject* pyself);
+static PyObject* kc_prometheus_text(PyObject* pyself);
+static void kc_str_units(const char* buf, size_t size, bool utf, std::vector<uint32_t>* units);
+static size_t kc_bounded_dist(const uint32_t* aary, size_t anum,
+                              const uint32_t* bary, size_t bnum, size_t bound);
 static bool define_err();
 static bool err_define_child(const char* name, uint32_t code);
 static PyObject* err_new(PyTypeObject* pytype, PyObject* pyargs, PyObject* pykwds);
@@ -106,19 +142,79 @@ static PyObject* cur_jump(Cursor_data* data, PyObject* pyargs);
 static PyObject* cur_jump_back(Cursor_data* data, PyObject* pyargs);
 static PyObject* cur_step(Cursor_data* data);
 static PyObject* cur_step_back(Cursor_data* data);
+static PyObject* cur_fetch(Cursor_data* data, PyObject* pyargs);
 static PyObject* cur_db(Cursor_data* data);
 static PyObject* cur_error(Cursor_data* data);
 static PyObject* cur_op_iter(Cursor_data* data);
 static PyObject* cur_op_iternext(Cursor_data* data);
+static bool define_blob();
+static PyObject* blob_new(PyTypeObject* pytype, PyObject* pyargs, PyObject* pykwds);
+static void blob_dealloc(Blob_data* data);
+static bool blob_check(Blob_data* data);
+static bool blob_begin(DB_data* data, SoftBlob* blob, bool* joined, bool* cjoined);
+static bool blob_commit(DB_data* data, SoftBlob* blob, bool ok, bool joined, bool cjoined);
+static PyObject* blob_repr(Blob_data* data);
+static PyObject* blob_str(Blob_data* data);
+static PyObject* blob_read(Blob_data* data, PyObject* pyargs);
+static PyObject* blob_readinto(Blob_data* data, PyObject* pyargs);
+static PyObject* blob_write(Blob_data* data, PyObject* pyargs);
+static PyObject* blob_seek(Blob_data* data, PyObject* pyargs);
+static PyObject* blob_tell(Blob_data* data);
+static PyObject* blob_size(Blob_data* data);
+static PyObject* blob_truncate(Blob_data* data, PyObject* pyargs);
+static PyObject* blob_flush(Blob_data* data);
+static PyObject* blob_close(Blob_data* data);
+static PyObject* blob_readable(Blob_data* data);
+static PyObject* blob_writable(Blob_data* data);
+static PyObject* blob_seekable(Blob_data* data);
+static PyObject* blob_key(Blob_data* data);
+static PyObject* blob_remove(Blob_data* data);
+static PyObject* blob_db(Blob_data* data);
+static PyObject* blob_op_enter(Blob_data* data);
+static PyObject* blob_op_exit(Blob_data* data, PyObject* pyargs);
+static bool define_view();
+static PyObject* view_new(PyTypeObject* pytype, PyObject* pyargs, PyObject* pykwds);
+static void view_dealloc(View_data* data);
+static PyObject* view_repr(View_data* data);
+static Py_ssize_t view_op_len(View_data* data);
+static int view_op_contains(View_data* data, PyObject* pyobj);
+static PyObject* view_op_iter(View_data* data);
+static PyObject* vit_new(PyTypeObject* pytype, PyObject* pyargs, PyObject* pykwds);
+static void vit_dealloc(ViewIterator_data* data);
+static bool vit_fill(ViewIterator_data* data);
+static PyObject* vit_op_iter(ViewIterator_data* data);
+static PyObject* vit_op_iternext(ViewIterator_data* data);
+static bool define_wb();
+static PyObject* wb_new(PyTypeObject* pytype, PyObject* pyargs, PyObject* pykwds);
+static void wb_dealloc(WriteBatch_data* data);
+static PyObject* wb_repr(WriteBatch_data* data);
+static bool wb_apply(const std::vector<BatchOperation>& ops, std::string* value, bool* exists);
+static bool wb_push(WriteBatch_data* data, PyObject* pykey, const BatchOperation& op);
+static bool wb_commit_impl(WriteBatch_data* data);
+static PyObject* wb_set(WriteBatch_data* data, PyObject* pyargs);
+static PyObject* wb_remove(WriteBatch_data* data, PyObject* pyargs);
+static PyObject* wb_append(WriteBatch_data* data, PyObject* pyargs);
+static PyObject* wb_increment(WriteBatch_data* data, PyObject* pyargs);
+static PyObject* wb_get(WriteBatch_data* data, PyObject* pyargs);
+static PyObject* wb_commit(WriteBatch_data* data);
+static PyObject* wb_discard(WriteBatch_data* data);
+static PyObject* wb_pending(WriteBatch_data* data);
+static PyObject* wb_db(WriteBatch_data* data);
+static PyObject* wb_op_enter(WriteBatch_data* data);
+static PyObject* wb_op_exit(WriteBatch_data* data, PyObject* pyargs);
 static bool define_db();
 static PyObject* db_new(PyTypeObject* pytype, PyObject* pyargs, PyObject* pykwds);
 static void db_dealloc(DB_data* data);
 static bool db_raise(DB_data* data);
+static void db_admit(DB_data* data);
 static int db_init(DB_data* data, PyObject* pyargs, PyObject* pykwds);
 static PyObject* db_repr(DB_data* data);
 static PyObject* db_str(DB_data* data);
 static PyObject* db_error(DB_data* data);
-static PyObject* db_open(DB_data* data, PyObject* pyargs);
+static PyObject* db_open(DB_data* data, PyObject* pyargs, PyObject* pykwds);
+static bool db_autotune(const std::string& path, int64_t rnum, int64_t ksiz, int64_t vsiz,
+                        int64_t mbudget, const std::string& workload, StringMap* params);
+static void db_stop_sync(DB_data* data);
 static PyObject* db_close(DB_data* data);
 static PyObject* db_accept(DB_data* data, PyObject* pyargs);
 static PyObject* db_accept_bulk(DB_data* data, PyObject* pyargs);
@@ -140,40 +236,137 @@ static PyObject* db_set_bulk(DB_data* data, PyObject* pyargs);
 static PyObject* db_remove_bulk(DB_data* data, PyObject* pyargs);
 static PyObject* db_get_bulk(DB_data* data, PyObject* pyargs);
 static PyObject* db_get_bulk_str(DB_data* data, PyObject* pyargs);
+static PyObject* db_pop(DB_data* data, PyObject* pyargs);
+static PyObject* db_setdefault(DB_data* data, PyObject* pyargs);
+static PyObject* db_update(DB_data* data, PyObject* pyargs, PyObject* pykwds);
+static PyObject* db_keys(DB_data* data);
+static PyObject* db_values(DB_data* data);
+static PyObject* db_items(DB_data* data);
+static PyObject* db_view(DB_data* data, int32_t kind);
+static PyObject* db_write_batch(DB_data* data, PyObject* pyargs, PyObject* pykwds);
 static PyObject* db_clear(DB_data* data);
 static PyObject* db_synchronize(DB_data* data, PyObject* pyargs);
 static PyObject* db_occupy(DB_data* data, PyObject* pyargs);
 static PyObject* db_copy(DB_data* data, PyObject* pyargs);
 static PyObject* db_begin_transaction(DB_data* data, PyObject* pyargs);
+static bool db_begin_transaction_impl(DB_data* data, bool hard);
+static bool db_begin_implicit(DB_data* data, bool* joined);
 static PyObject* db_end_transaction(DB_data* data, PyObject* pyargs);
 static PyObject* db_transaction(DB_data* data, PyObject* pyargs);
 static PyObject* db_dump_snapshot(DB_data* data, PyObject* pyargs);
 static PyObject* db_load_snapshot(DB_data* data, PyObject* pyargs);
+static PyObject* db_tune_journal(DB_data* data, PyObject* pyargs);
+static PyObject* db_dump_snapshot_stream(DB_data* data, PyObject* pyargs);
+static PyObject* db_load_snapshot_stream(DB_data* data, PyObject* pyargs);
+static void db_snapshot_record(std::string* buf, char op, const char* kbuf, size_t ksiz,
+                               const char* vbuf, size_t vsiz);
+static bool db_stream_write(PyObject* pydest, const std::string& buf);
+static bool db_stream_read(PyObject* pysrc, int64_t size, std::string* buf);
 static PyObject* db_count(DB_data* data);
 static PyObject* db_size(DB_data* data);
 static PyObject* db_path(DB_data* data);
 static PyObject* db_status(DB_data* data);
+static PyObject* db_tuning(DB_data* data);
+static PyObject* db_metrics(DB_data* data);
+static bool db_collect_metrics(DB_data* data, MetricMap* metrics);
 static PyObject* db_match_prefix(DB_data* data, PyObject* pyargs);
 static PyObject* db_match_regex(DB_data* data, PyObject* pyargs);
+static bool db_regex_prefix(const std::string& regex, std::string* prefix);
+static int64_t db_match_impl(kc::PolyDB* db, bool ordered, const std::string* prefix,
+                             const std::string* regex, const ScanFilter* filter, int64_t max,
+                             StringVector* keys, StringVector* values);
+static PyObject* db_explain_regex(DB_data* data, PyObject* pyargs);
 static PyObject* db_match_similar(DB_data* data, PyObject* pyargs);
+static int64_t db_filter_keys(kc::PolyDB* db, const ScanFilter* filter, int64_t max,
+                              StringVector* keys);
+static PyObject* db_tune_fuzzy_index(DB_data* data, PyObject* pyargs);
+static PyObject* db_tune_expiry(DB_data* data, PyObject* pyargs);
+static PyObject* db_sweep_expired(DB_data* data, PyObject* pyargs);
+static int64_t db_sweep_native(DB_data* data, ExpiryTable* expiry, int64_t max);
+static void db_stop_expiry(DB_data* data);
+static PyObject* db_expiry_status(DB_data* data);
+static bool db_expired(DB_data* data, const char* kbuf, size_t ksiz);
+static PyObject* db_tune_changes(DB_data* data, PyObject* pyargs);
+static PyObject* db_changes(DB_data* data, PyObject* pyargs);
+static PyObject* db_changes_status(DB_data* data);
+static PyObject* db_defrag(DB_data* data, PyObject* pyargs);
+static PyObject* db_tune_defrag(DB_data* data, PyObject* pyargs);
+static PyObject* db_tune_group_commit(DB_data* data, PyObject* pyargs);
+static PyObject* db_request_durable(DB_data* data);
+static PyObject* db_wait_durable(DB_data* data, PyObject* pyargs);
+static PyObject* db_group_commit_status(DB_data* data);
+static bool db_ordered(kc::PolyDB* db);
+static PyObject* db_export_to(DB_data* data, PyObject* pyargs);
+static void db_export_native(DB_data* data, ExportWriter* writer);
+static bool db_load_native(DB_data* data, SnapshotWorker* worker, size_t idx);
+static PyObject* db_tune_stats(DB_data* data, PyObject* pyargs);
+static PyObject* db_stats(DB_data* data, PyObject* pyargs);
+static PyObject* db_tune_contention(DB_data* data, PyObject* pyargs);
+static PyObject* db_contention(DB_data* data, PyObject* pyargs);
+static PyObject* db_dump_contention(DB_data* data, PyObject* pyargs);
+static PyObject* db_tune_slow_log(DB_data* data, PyObject* pyargs);
+static PyObject* db_slow_log(DB_data* data, PyObject* pyargs);
+static PyObject* db_slow_entry(const SlowOperation& entry);
+static int db_slow_hook(void* arg);
 static PyObject* db_merge(DB_data* data, PyObject* pyargs);
 static PyObject* db_cursor(DB_data* data);
 static PyObject* db_cursor_process(DB_data* data, PyObject* pyargs);
+static PyObject* db_tune_blob_store(DB_data* data, PyObject* pyargs);
+static PyObject* db_open_blob(DB_data* data, PyObject* pyargs);
 static PyObject* db_shift(DB_data* data);
 static PyObject* db_shift_str(DB_data* data);
 static char* db_shift_impl(kc::PolyDB* db, size_t* ksp, const char** vbp, size_t* vsp);
 static PyObject* db_tune_exception_rule(DB_data* data, PyObject* pyargs);
 static Py_ssize_t db_op_len(DB_data* data);
+static int db_op_contains(DB_data* data, PyObject* pykey);
 static PyObject* db_op_getitem(DB_data* data, PyObject* pykey);
 static int db_op_setitem(DB_data* data, PyObject* pykey, PyObject* pyvalue);
 static PyObject* db_op_iter(DB_data* data);
 static PyObject* db_process(PyObject* cls, PyObject* pyargs);
+static bool define_idb();
+static PyObject* idb_new(PyTypeObject* pytype, PyObject* pyargs, PyObject* pykwds);
+static void idb_dealloc(IndexedDB_data* data);
+static int idb_init(IndexedDB_data* data, PyObject* pyargs, PyObject* pykwds);
+static PyObject* idb_repr(IndexedDB_data* data);
+static PyObject* idb_str(IndexedDB_data* data);
+static bool idb_check(IndexedDB_data* data);
+static bool idb_extract(PyObject* pyext, const std::string& key,
+                        const char* vbuf, size_t vsiz, StringVector* ikeys);
+static std::string idb_entry_key(const std::string& ikey, const std::string& key);
+static PyObject* idb_write(IndexedDB_data* data, PyObject* pykey, PyObject* pyvalue);
+static bool idb_scan(DB_data* idata, const std::string* begin, const std::string* end,
+                     bool exact, int64_t max, StringVector* keys);
+static PyObject* idb_fetch(IndexedDB_data* data, const StringVector& keys);
+static PyObject* idb_add_index(IndexedDB_data* data, PyObject* pyargs);
+static PyObject* idb_remove_index(IndexedDB_data* data, PyObject* pyargs);
+static PyObject* idb_rebuild(IndexedDB_data* data, PyObject* pyargs);
+static PyObject* idb_set(IndexedDB_data* data, PyObject* pyargs);
+static PyObject* idb_remove(IndexedDB_data* data, PyObject* pyargs);
+static PyObject* idb_lookup(IndexedDB_data* data, PyObject* pyargs);
+static PyObject* idb_range(IndexedDB_data* data, PyObject* pyargs);
+static PyObject* idb_db(IndexedDB_data* data);
+static PyObject* idb_index(IndexedDB_data* data, PyObject* pyargs);
+static bool define_tb();
+static PyObject* tb_new(PyTypeObject* pytype, PyObject* pyargs, PyObject* pykwds);
+static void tb_dealloc(TreeBuilder_data* data);
+static int tb_init(TreeBuilder_data* data, PyObject* pyargs, PyObject* pykwds);
+static PyObject* tb_repr(TreeBuilder_data* data);
+static PyObject* tb_str(TreeBuilder_data* data);
+static bool tb_check(TreeBuilder_data* data);
+static bool tb_append(TreeBuilder_data* data, PyObject* pykey, PyObject* pyvalue);
+static PyObject* tb_add(TreeBuilder_data* data, PyObject* pyargs);
+static PyObject* tb_add_bulk(TreeBuilder_data* data, PyObject* pyargs);
+static PyObject* tb_add_db(TreeBuilder_data* data, PyObject* pyargs);
+static PyObject* tb_finish(TreeBuilder_data* data);
+static PyObject* tb_status(TreeBuilder_data* data);
+static PyObject* tb_db(TreeBuilder_data* data);
 
 
 /* global variables */
 PyObject* mod_kc;
 PyObject* mod_th;
 PyObject* mod_time;
+PyObject* mod_array;
 PyObject* cls_err;
 PyObject* cls_err_children[(int)kc::PolyDB::Error::MISC+1];
 PyObject* cls_vis;
@@ -181,7 +374,44 @@ PyObject* obj_vis_nop;
 PyObject* obj_vis_remove;
 PyObject* cls_fproc;
 PyObject* cls_cur;
+PyObject* cls_blob;
+PyObject* cls_view;
+PyObject* cls_viter;
+PyObject* cls_wb;
 PyObject* cls_db;
+PyObject* cls_idb;
+PyObject* cls_tb;
+std::set<DB_data*> objs_db;
+
+
+/**
+ * Total size of input above which bulk utilities release the global interpreter lock.
+ */
+const size_t GILFREESIZ = 1 << 14;
+
+
+/**
+ * Number of journal entries fetched at once by incremental snapshots.
+ */
+const int64_t SNAPBATCH = 1024;
+
+
+/**
+ * Number of records fetched at once by iterators of mapping views.
+ */
+const int64_t VIEWBATCH = 256;
+
+
+/**
+ * Magic data at the top of a streaming snapshot.
+ */
+const char SNAPMAGIC[8] = { '\0', 'K', 'C', 'S', 'N', 'A', 'P', '\0' };
+
+
+/**
+ * Magic data at the top of a chunked snapshot.
+ */
+const char PSNAPMAGIC[8] = { '\0', 'K', 'C', 'P', 'S', 'N', 'P', '\0' };
 
 
 /**
@@ -193,6 +423,27 @@ enum GenericOption {
 };
 
 
+/**
+ * Kinds of mapping views.
+ */
+enum ViewKind {
+  VKEYS,
+  VVALUES,
+  VITEMS
+};
+
+
+/**
+ * Types of operations of write batches.
+ */
+enum BatchOperationType {
+  BSET,
+  BREMOVE,
+  BAPPEND,
+  BINCREMENT
+};
+
+
 /**
  * Wrapper to treat a Python string as a C++ string.
  */
@@ -312,14 +563,443 @@ private:
 };
 
 
+/**
+ * Listener of record updates made through the binding.
+ */
+class UpdateListener {
+public:
+  enum Kind {
+    USET,
+    UREMOVE,
+    UCLEAR,
+    URESET
+  };
+  virtual ~UpdateListener() {}
+  virtual void update(Kind kind, const char* kbuf, size_t ksiz,
+                      const char* vbuf, size_t vsiz) = 0;
+};
+
+
+/**
+ * Set of update listeners of a database.
+ */
+class UpdateHub {
+private:
+  typedef std::vector<UpdateListener*> ListenerList;
+public:
+  explicit UpdateHub() : lock_(), listeners_() {}
+  ~UpdateHub() {
+    ListenerList::iterator it = listeners_.begin();
+    ListenerList::iterator itend = listeners_.end();
+    while (it != itend) {
+      delete *it;
+      it++;
+    }
+  }
+  void add(UpdateListener* listener) {
+    kc::ScopedSpinRWLock lock(&lock_, true);
+    listeners_.push_back(listener);
+  }
+  bool remove(UpdateListener* listener) {
+    kc::ScopedSpinRWLock lock(&lock_, true);
+    ListenerList::iterator it = std::find(listeners_.begin(), listeners_.end(), listener);
+    if (it == listeners_.end()) return false;
+    listeners_.erase(it);
+    return true;
+  }
+  bool active() {
+    kc::ScopedSpinRWLock lock(&lock_, false);
+    return !listeners_.empty();
+  }
+  void notify(UpdateListener::Kind kind, const char* kbuf, size_t ksiz,
+              const char* vbuf = NULL, size_t vsiz = 0) {
+    kc::ScopedSpinRWLock lock(&lock_, false);
+    ListenerList::iterator it = listeners_.begin();
+    ListenerList::iterator itend = listeners_.end();
+    while (it != itend) {
+      (*it)->update(kind, kbuf, ksiz, vbuf, vsiz);
+      it++;
+    }
+  }
+private:
+  kc::SpinRWLock lock_;
+  ListenerList listeners_;
+};
+
+
+/**
+ * Magic data at the top of the manifest of a blob record.
+ */
+const char BLOBMAGIC[8] = { '\0', 'K', 'C', 'B', 'L', 'O', 'B', '\0' };
+
+
+/**
+ * Wrapper of a blob record split into chunks.
+ */
+class SoftBlob {
+public:
+  explicit SoftBlob(kc::PolyDB* db, UpdateHub* hub, PyObject* pycdb, kc::PolyDB* cdb,
+                    const std::string& key, bool readable, bool writable, bool append) :
+    db_(db), hub_(hub), pycdb_(pycdb), cdb_(cdb), key_(key),
+    readable_(readable), writable_(writable), append_(append),
+    csiz_(0), size_(0), pos_(0), cidx_(-1), cbuf_(), dirty_(false), mdirty_(false) {
+    Py_INCREF(pycdb_);
+  }
+  ~SoftBlob() {
+    Py_DECREF(pycdb_);
+  }
+  bool open(int64_t csiz, bool create, bool truncate) {
+    size_t vsiz;
+    char* vbuf = db_->get(key_.data(), key_.size(), &vsiz);
+    if (vbuf) {
+      bool ok = vsiz == MANIFESTSIZ && !std::memcmp(vbuf, BLOBMAGIC, sizeof(BLOBMAGIC));
+      if (ok) {
+        size_ = kc::readfixnum(vbuf + sizeof(BLOBMAGIC), sizeof(uint64_t));
+        csiz_ = kc::readfixnum(vbuf + sizeof(BLOBMAGIC) + sizeof(uint64_t), sizeof(uint32_t));
+      }
+      delete[] vbuf;
+      if (truncate) {
+        if (ok && csiz_ > 0 && !remove_chunks(0)) return false;
+        size_ = 0;
+        csiz_ = csiz;
+        mdirty_ = true;
+      } else if (!ok || csiz_ < 1) {
+        db_->set_error(kc::PolyDB::Error::LOGIC, "not a blob record");
+        return false;
+      }
+    } else {
+      if (db_->error().code() != kc::PolyDB::Error::NOREC) return false;
+      if (!create) return false;
+      csiz_ = csiz;
+      mdirty_ = true;
+    }
+    if (append_) pos_ = size_;
+    return flush();
+  }
+  int64_t read(char* buf, int64_t max) {
+    int64_t done = 0;
+    while (done < max && pos_ < size_) {
+      int64_t idx = pos_ / csiz_;
+      if (!load(idx)) return -1;
+      int64_t off = pos_ - idx * csiz_;
+      int64_t len = std::min(std::min(max - done, csiz_ - off), size_ - pos_);
+      int64_t hit = std::min(std::max((int64_t)cbuf_.size() - off, (int64_t)0), len);
+      if (hit > 0) std::memcpy(buf + done, cbuf_.data() + off, hit);
+      if (hit < len) std::memset(buf + done + hit, 0, len - hit);
+      done += len;
+      pos_ += len;
+    }
+    return done;
+  }
+  bool spans(size_t size) {
+    if (size < 1) return false;
+    int64_t pos = append_ ? size_ : pos_;
+    return pos / csiz_ != cidx_ || (pos + (int64_t)size - 1) / csiz_ != cidx_;
+  }
+  bool write(const char* buf, size_t size, bool persist) {
+    if (append_) pos_ = size_;
+    size_t done = 0;
+    while (done < size) {
+      int64_t idx = pos_ / csiz_;
+      if (!load(idx)) return false;
+      int64_t off = pos_ - idx * csiz_;
+      int64_t len = std::min((int64_t)(size - done), csiz_ - off);
+      if ((int64_t)cbuf_.size() < off + len) cbuf_.resize(off + len, '\0');
+      cbuf_.replace(off, len, buf + done, len);
+      dirty_ = true;
+      done += len;
+      pos_ += len;
+      if (pos_ > size_) {
+        size_ = pos_;
+        mdirty_ = true;
+      }
+    }
+    return persist ? flush() : true;
+  }
+  bool truncate(int64_t size) {
+    if (size < size_) {
+      if (!store()) return false;
+      cidx_ = -1;
+      if (!remove_chunks(size)) return false;
+      int64_t rem = size % csiz_;
+      if (rem > 0) {
+        if (!load(size / csiz_)) return false;
+        if ((int64_t)cbuf_.size() > rem) {
+          cbuf_.resize(rem);
+          dirty_ = true;
+        }
+      }
+    }
+    if (size != size_) {
+      size_ = size;
+      mdirty_ = true;
+    }
+    return flush();
+  }
+  bool remove() {
+    cidx_ = -1;
+    dirty_ = false;
+    if (!remove_chunks(0)) return false;
+    if (db_->remove(key_.data(), key_.size())) {
+      hub_->notify(UpdateListener::UREMOVE, key_.data(), key_.size());
+    } else if (db_->error().code() != kc::PolyDB::Error::NOREC) {
+      return false;
+    }
+    size_ = 0;
+    pos_ = 0;
+    mdirty_ = false;
+    return true;
+  }
+  bool reload() {
+    cidx_ = -1;
+    cbuf_.clear();
+    dirty_ = false;
+    mdirty_ = false;
+    size_t vsiz;
+    char* vbuf = db_->get(key_.data(), key_.size(), &vsiz);
+    if (!vbuf) {
+      size_ = 0;
+      return db_->error().code() == kc::PolyDB::Error::NOREC;
+    }
+    if (vsiz == MANIFESTSIZ && !std::memcmp(vbuf, BLOBMAGIC, sizeof(BLOBMAGIC))) {
+      size_ = kc::readfixnum(vbuf + sizeof(BLOBMAGIC), sizeof(uint64_t));
+    } else {
+      size_ = 0;
+    }
+    delete[] vbuf;
+    return true;
+  }
+  bool flush() {
+    if (!store()) return false;
+    if (mdirty_) {
+      char mbuf[MANIFESTSIZ];
+      std::memcpy(mbuf, BLOBMAGIC, sizeof(BLOBMAGIC));
+      kc::writefixnum(mbuf + sizeof(BLOBMAGIC), size_, sizeof(uint64_t));
+      kc::writefixnum(mbuf + sizeof(BLOBMAGIC) + sizeof(uint64_t), csiz_, sizeof(uint32_t));
+      if (!db_->set(key_.data(), key_.size(), mbuf, sizeof(mbuf))) return false;
+      hub_->notify(UpdateListener::USET, key_.data(), key_.size(), mbuf, sizeof(mbuf));
+      mdirty_ = false;
+    }
+    return true;
+  }
+  kc::PolyDB* db() {
+    return db_;
+  }
+  PyObject* pystore() {
+    return pycdb_;
+  }
+  const std::string& key() {
+    return key_;
+  }
+  bool readable() {
+    return readable_;
+  }
+  bool writable() {
+    return writable_;
+  }
+  int64_t tell() {
+    return pos_;
+  }
+  void seek(int64_t pos) {
+    pos_ = pos;
+  }
+  int64_t size() {
+    return size_;
+  }
+  bool dirty() {
+    return dirty_ || mdirty_;
+  }
+private:
+  static const size_t MANIFESTSIZ = sizeof(BLOBMAGIC) + sizeof(uint64_t) + sizeof(uint32_t);
+  std::string chunk_key(int64_t idx) {
+    char nbuf[sizeof(uint64_t)];
+    kc::writefixnum(nbuf, idx, sizeof(nbuf));
+    std::string ckey = key_;
+    ckey.append(1, '\0');
+    ckey.append(nbuf, sizeof(nbuf));
+    return ckey;
+  }
+  bool load(int64_t idx) {
+    if (idx == cidx_) return true;
+    if (!store()) return false;
+    cbuf_.clear();
+    if (idx * csiz_ < size_) {
+      std::string ckey = chunk_key(idx);
+      size_t vsiz;
+      char* vbuf = cdb_->get(ckey.data(), ckey.size(), &vsiz);
+      if (vbuf) {
+        cbuf_.append(vbuf, vsiz);
+        delete[] vbuf;
+      } else if (cdb_->error().code() != kc::PolyDB::Error::NOREC) {
+        return fail();
+      }
+    }
+    cidx_ = idx;
+    return true;
+  }
+  bool store() {
+    if (!dirty_) return true;
+    std::string ckey = chunk_key(cidx_);
+    if (!cdb_->set(ckey.data(), ckey.size(), cbuf_.data(), cbuf_.size())) return fail();
+    dirty_ = false;
+    return true;
+  }
+  bool remove_chunks(int64_t size) {
+    int64_t cnum = (size_ + csiz_ - 1) / csiz_;
+    for (int64_t idx = (size + csiz_ - 1) / csiz_; idx < cnum; idx++) {
+      std::string ckey = chunk_key(idx);
+      if (!cdb_->remove(ckey.data(), ckey.size()) &&
+          cdb_->error().code() != kc::PolyDB::Error::NOREC) {
+        return fail();
+      }
+      if (idx == cidx_) {
+        cidx_ = -1;
+        dirty_ = false;
+      }
+    }
+    return true;
+  }
+  bool fail() {
+    kc::PolyDB::Error error = cdb_->error();
+    db_->set_error(error.code(), error.message());
+    return false;
+  }
+  kc::PolyDB* db_;
+  UpdateHub* hub_;
+  PyObject* pycdb_;
+  kc::PolyDB* cdb_;
+  std::string key_;
+  bool readable_;
+  bool writable_;
+  bool append_;
+  int64_t csiz_;
+  int64_t size_;
+  int64_t pos_;
+  int64_t cidx_;
+  std::string cbuf_;
+  bool dirty_;
+  bool mdirty_;
+};
+
+
+/**
+ * Native filter of records.
+ */
+class ScanFilter {
+public:
+  ScanFilter() :
+    prefix_(), begin_(), end_(), contains_(), regex_(NULL), minsiz_(0), maxsiz_(kc::INT64MAX),
+    hasprefix_(false), hasbegin_(false), hasend_(false), hascontains_(false), empty_(true) {}
+  ~ScanFilter() {
+    delete regex_;
+  }
+  bool set(PyObject* pyfilter) {
+    if (pyfilter == Py_None) return true;
+    if (!PyDict_Check(pyfilter)) return false;
+    PyObject* pykey, *pyvalue;
+    Py_ssize_t pos = 0;
+    while (PyDict_Next(pyfilter, &pos, &pykey, &pyvalue)) {
+      SoftString key(pykey);
+      std::string name(key.ptr(), key.size());
+      if (pyvalue == Py_None) continue;
+      if (name == "min_size" || name == "max_size") {
+        int64_t num = pyatoi(pyvalue);
+        if (num < 0) return false;
+        if (name == "min_size") {
+          minsiz_ = num;
+        } else {
+          maxsiz_ = num;
+        }
+      } else {
+        SoftString value(pyvalue);
+        std::string str(value.ptr(), value.size());
+        if (name == "prefix") {
+          prefix_ = str;
+          hasprefix_ = true;
+        } else if (name == "begin") {
+          begin_ = str;
+          hasbegin_ = true;
+        } else if (name == "end") {
+          end_ = str;
+          hasend_ = true;
+        } else if (name == "contains") {
+          contains_ = str;
+          hascontains_ = !str.empty();
+        } else if (name == "regex") {
+          delete regex_;
+          regex_ = new kc::Regex;
+          if (!regex_->compile(str, kc::Regex::MATCHONLY)) return false;
+        } else {
+          return false;
+        }
+      }
+      empty_ = false;
+    }
+    return true;
+  }
+  bool empty() const {
+    return empty_;
+  }
+  bool values() const {
+    return minsiz_ > 0 || maxsiz_ < kc::INT64MAX || hascontains_;
+  }
+  void start(std::string* key) const {
+    if (hasprefix_ && compare(prefix_.data(), prefix_.size(), *key) > 0) *key = prefix_;
+    if (hasbegin_ && compare(begin_.data(), begin_.size(), *key) > 0) *key = begin_;
+  }
+  bool beyond(const char* kbuf, size_t ksiz) const {
+    if (hasprefix_ && (ksiz < prefix_.size() ||
+                       std::memcmp(kbuf, prefix_.data(), prefix_.size())) &&
+        compare(kbuf, ksiz, prefix_) > 0) return true;
+    if (hasend_ && compare(kbuf, ksiz, end_) >= 0) return true;
+    return false;
+  }
+  bool match(const char* kbuf, size_t ksiz, const char* vbuf, size_t vsiz) const {
+    if (hasprefix_ && (ksiz < prefix_.size() ||
+                       std::memcmp(kbuf, prefix_.data(), prefix_.size()))) return false;
+    if (hasbegin_ && compare(kbuf, ksiz, begin_) < 0) return false;
+    if (hasend_ && compare(kbuf, ksiz, end_) >= 0) return false;
+    if (vbuf) {
+      if ((int64_t)vsiz < minsiz_ || (int64_t)vsiz > maxsiz_) return false;
+      if (hascontains_ && std::search(vbuf, vbuf + vsiz, contains_.data(),
+                                      contains_.data() + contains_.size()) == vbuf + vsiz)
+        return false;
+    }
+    if (regex_ && !regex_->match(std::string(kbuf, ksiz))) return false;
+    return true;
+  }
+private:
+  static int32_t compare(const char* kbuf, size_t ksiz, const std::string& str) {
+    size_t msiz = ksiz < str.size() ? ksiz : str.size();
+    int32_t rv = std::memcmp(kbuf, str.data(), msiz);
+    if (rv != 0) return rv;
+    if (ksiz == str.size()) return 0;
+    return ksiz < str.size() ? -1 : 1;
+  }
+  std::string prefix_;
+  std::string begin_;
+  std::string end_;
+  std::string contains_;
+  kc::Regex* regex_;
+  int64_t minsiz_;
+  int64_t maxsiz_;
+  bool hasprefix_;
+  bool hasbegin_;
+  bool hasend_;
+  bool hascontains_;
+  bool empty_;
+};
+
+
 /**
  * Wrapper of a visitor.
  */
 class SoftVisitor : public kc::PolyDB::Visitor {
 public:
-  explicit SoftVisitor(PyObject* pyvisitor, bool writable) :
-    pyvisitor_(pyvisitor), writable_(writable), pyrv_(NULL), rv_(NULL),
-    pyextype_(NULL), pyexvalue_(NULL), pyextrace_(NULL) {
+  explicit SoftVisitor(PyObject* pyvisitor, bool writable, UpdateHub* hub = NULL,
+                       const ScanFilter* filter = NULL) :
+    pyvisitor_(pyvisitor), writable_(writable), hub_(hub), filter_(filter), pyrv_(NULL),
+    rv_(NULL), pyextype_(NULL), pyexvalue_(NULL), pyextrace_(NULL) {
     Py_INCREF(pyvisitor_);
   }
   ~SoftVisitor() {
@@ -337,6 +1017,7 @@ private:
   const char* visit_full(const char* kbuf, size_t ksiz,
                          const char* vbuf, size_t vsiz, size_t* sp) {
     cleanup();
+    if (filter_ && !filter_->match(kbuf, ksiz, vbuf, vsiz)) return NOP;
     PyObject* pyrv;
     if (PyCallable_Check(pyvisitor_)) {
       pyrv = PyObject_CallFunction(pyvisitor_, (char*)"(y#y#)", kbuf, ksiz, vbuf, vsiz);
@@ -360,11 +1041,13 @@ private:
     }
     if (pyrv == obj_vis_remove) {
       Py_DECREF(pyrv);
+      if (hub_) hub_->notify(UpdateListener::UREMOVE, kbuf, ksiz);
       return REMOVE;
     }
     pyrv_ = pyrv;
     rv_ = new SoftString(pyrv);
     *sp = rv_->size();
+    if (hub_) hub_->notify(UpdateListener::USET, kbuf, ksiz, rv_->ptr(), rv_->size());
     return rv_->ptr();
   }
   const char* visit_empty(const char* kbuf, size_t ksiz, size_t* sp) {
@@ -392,11 +1075,13 @@ private:
     }
     if (pyrv == obj_vis_remove) {
       Py_DECREF(pyrv);
+      if (hub_) hub_->notify(UpdateListener::UREMOVE, kbuf, ksiz);
       return REMOVE;
     }
     pyrv_ = pyrv;
     rv_ = new SoftString(pyrv);
     *sp = rv_->size();
+    if (hub_) hub_->notify(UpdateListener::USET, kbuf, ksiz, rv_->ptr(), rv_->size());
     return rv_->ptr();
   }
   void cleanup() {
@@ -421,6 +1106,8 @@ private:
   }
   PyObject* pyvisitor_;
   bool writable_;
+  UpdateHub* hub_;
+  const ScanFilter* filter_;
   PyObject* pyrv_;
   SoftString* rv_;
   PyObject* pyextype_;
@@ -477,1657 +1164,3051 @@ private:
 
 
 /**
- * Internal data of an error object.
- */
-struct Error_data {
-  PyException_HEAD
-  PyObject* pycode;
-  PyObject* pymessage;
-};
-
-
-/**
- * Internal data of a visitor object.
- */
-struct Visitor_data {
-  PyObject_HEAD
-};
-
-
-/**
- * Internal data of a file processor object.
+ * Persistent n-gram index of keys for similarity search.
  */
-struct FileProcessor_data {
-  PyObject_HEAD
+class FuzzyIndex : public UpdateListener {
+public:
+  explicit FuzzyIndex(PyObject* pyidb, kc::PolyDB* idb, bool utf, int32_t gram) :
+    pyidb_(pyidb), idb_(idb), utf_(utf), gram_(gram), stale_(true) {
+    Py_INCREF(pyidb_);
+  }
+  ~FuzzyIndex() {
+    Py_DECREF(pyidb_);
+  }
+  bool utf() {
+    return utf_;
+  }
+  bool stale() {
+    kc::ScopedMutex lock(&mutex_);
+    return stale_;
+  }
+  void update(Kind kind, const char* kbuf, size_t ksiz, const char* vbuf, size_t vsiz) {
+    kc::ScopedMutex lock(&mutex_);
+    switch (kind) {
+      case USET: {
+        if (!stale_ && !post(kbuf, ksiz, true)) mark_stale();
+        break;
+      }
+      case UREMOVE: {
+        if (!stale_ && !post(kbuf, ksiz, false)) mark_stale();
+        break;
+      }
+      case UCLEAR: {
+        stale_ = !idb_->clear() || !save(true);
+        break;
+      }
+      default: {
+        mark_stale();
+        break;
+      }
+    }
+  }
+  bool load() {
+    kc::ScopedMutex lock(&mutex_);
+    std::string meta;
+    stale_ = !idb_->get(std::string("m"), &meta) || meta != meta_value(true);
+    return !stale_;
+  }
+  bool build(kc::PolyDB* db) {
+    kc::ScopedMutex lock(&mutex_);
+    stale_ = false;
+    if (!save(false) || !idb_->clear()) {
+      stale_ = true;
+      return false;
+    }
+    kc::PolyDB::Cursor* cur = db->cursor();
+    bool err = false;
+    if (cur->jump()) {
+      while (true) {
+        size_t ksiz;
+        char* kbuf = cur->get_key(&ksiz, true);
+        if (!kbuf) break;
+        if (!post(kbuf, ksiz, true)) err = true;
+        delete[] kbuf;
+        if (err) break;
+      }
+    }
+    delete cur;
+    if (err || stale_ || !save(true)) {
+      stale_ = true;
+      return false;
+    }
+    return true;
+  }
+  bool search(kc::PolyDB* db, const std::string& origin, size_t range, int64_t max,
+              StringVector* keys) {
+    std::vector<uint32_t> ounits;
+    units(origin.data(), origin.size(), &ounits);
+    std::set<std::string> ograms;
+    grams(ounits, &ograms);
+    int64_t thres = (int64_t)ograms.size() - (int64_t)range * gram_;
+    if (thres < 1) return false;
+    kc::ScopedMutex lock(&mutex_);
+    if (stale_) return false;
+    std::map<std::string, int64_t> counts;
+    kc::PolyDB::Cursor* cur = idb_->cursor();
+    std::set<std::string>::const_iterator git = ograms.begin();
+    std::set<std::string>::const_iterator gitend = ograms.end();
+    while (git != gitend) {
+      const std::string& prefix = *git;
+      if (cur->jump(prefix)) {
+        while (true) {
+          size_t ksiz;
+          char* kbuf = cur->get_key(&ksiz, true);
+          if (!kbuf) break;
+          bool hit = ksiz >= prefix.size() && !std::memcmp(kbuf, prefix.data(), prefix.size());
+          if (hit) counts[std::string(kbuf + prefix.size(), ksiz - prefix.size())]++;
+          delete[] kbuf;
+          if (!hit) break;
+        }
+      }
+      git++;
+    }
+    delete cur;
+    std::vector<std::pair<size_t, std::string> > hits;
+    std::map<std::string, int64_t>::const_iterator cit = counts.begin();
+    std::map<std::string, int64_t>::const_iterator citend = counts.end();
+    while (cit != citend) {
+      if (cit->second >= thres) {
+        const std::string& key = cit->first;
+        std::vector<uint32_t> kunits;
+        units(key.data(), key.size(), &kunits);
+        size_t diff = kunits.size() > ounits.size() ?
+          kunits.size() - ounits.size() : ounits.size() - kunits.size();
+        if (diff <= range) {
+          size_t dist = utf_ ?
+            kc::strucsdist(ounits.empty() ? NULL : &ounits[0], ounits.size(),
+                           kunits.empty() ? NULL : &kunits[0], kunits.size()) :
+            kc::memdist(origin.data(), origin.size(), key.data(), key.size());
+          if (dist <= range && db->check(key.data(), key.size()) >= 0)
+            hits.push_back(std::make_pair(dist, key));
+        }
+      }
+      cit++;
+    }
+    std::sort(hits.begin(), hits.end());
+    for (size_t i = 0; i < hits.size() && (max < 0 || (int64_t)i < max); i++) {
+      keys->push_back(hits[i].second);
+    }
+    return true;
+  }
+private:
+  std::string meta_value(bool built) {
+    std::string meta = "KCFZ";
+    meta.append(1, (char)gram_);
+    meta.append(1, utf_ ? 'u' : 'b');
+    meta.append(1, built ? '1' : '0');
+    return meta;
+  }
+  bool save(bool built) {
+    return idb_->set(std::string("m"), meta_value(built));
+  }
+  void mark_stale() {
+    if (stale_) return;
+    stale_ = true;
+    save(false);
+  }
+  void units(const char* buf, size_t size, std::vector<uint32_t>* units) {
+    if (utf_) {
+      units->resize(size + 1);
+      size_t num;
+      kc::strutftoucs(buf, size, &(*units)[0], &num);
+      units->resize(num);
+    } else {
+      units->assign((const unsigned char*)buf, (const unsigned char*)buf + size);
+    }
+  }
+  void grams(const std::vector<uint32_t>& units, std::set<std::string>* grams) {
+    std::vector<uint32_t> seq(gram_ - 1, 0);
+    seq.insert(seq.end(), units.begin(), units.end());
+    seq.insert(seq.end(), gram_ - 1, 0);
+    for (size_t i = 0; i + gram_ <= seq.size(); i++) {
+      std::string gstr(1, 'g');
+      for (int32_t j = 0; j < gram_; j++) {
+        if (utf_) {
+          char ubuf[sizeof(uint32_t)];
+          kc::writefixnum(ubuf, seq[i+j], sizeof(ubuf));
+          gstr.append(ubuf, sizeof(ubuf));
+        } else {
+          gstr.append(1, (char)seq[i+j]);
+        }
+      }
+      grams->insert(gstr);
+    }
+  }
+  bool post(const char* kbuf, size_t ksiz, bool add) {
+    std::vector<uint32_t> kunits;
+    units(kbuf, ksiz, &kunits);
+    std::set<std::string> kgrams;
+    grams(kunits, &kgrams);
+    std::set<std::string>::const_iterator it = kgrams.begin();
+    std::set<std::string>::const_iterator itend = kgrams.end();
+    while (it != itend) {
+      std::string pkey = *it;
+      pkey.append(kbuf, ksiz);
+      if (add) {
+        if (!idb_->set(pkey.data(), pkey.size(), "", 0)) return false;
+      } else if (!idb_->remove(pkey.data(), pkey.size()) &&
+                 idb_->error() != kc::PolyDB::Error::NOREC) {
+        return false;
+      }
+      it++;
+    }
+    return true;
+  }
+  PyObject* pyidb_;
+  kc::PolyDB* idb_;
+  bool utf_;
+  int32_t gram_;
+  bool stale_;
+  kc::Mutex mutex_;
 };
 
-
 /**
- * Internal data of a cursor object.
+ * Expiration table of records with a background sweeper.
  */
-struct Cursor_data {
-  PyObject_HEAD
-  SoftCursor* cur;
-  PyObject* pydb;
+class ExpiryTable : public UpdateListener {
+public:
+  explicit ExpiryTable(PyObject* pyedb, kc::PolyDB* edb, DB_data* data, kc::PolyDB* db,
+                       UpdateHub* hub) :
+    pyedb_(pyedb), edb_(edb), data_(data), db_(db), hub_(hub), sweeper_(this), mutex_(), cond_(),
+    alive_(false), running_(false), rate_(0), interval_(0), sweeps_(0), scanned_(0),
+    expired_(0), lasttime_(0) {
+    Py_INCREF(pyedb_);
+  }
+  ~ExpiryTable() {
+    stop();
+    Py_DECREF(pyedb_);
+  }
+  void update(Kind kind, const char* kbuf, size_t ksiz, const char* vbuf, size_t vsiz) {
+    switch (kind) {
+      case USET: {
+        if (vbuf) forget(kbuf, ksiz);
+        break;
+      }
+      case UREMOVE: {
+        forget(kbuf, ksiz);
+        break;
+      }
+      case UCLEAR: {
+        edb_->clear();
+        break;
+      }
+      default: {
+        break;
+      }
+    }
+  }
+  bool expire(const char* kbuf, size_t ksiz, double ttl) {
+    if (!forget(kbuf, ksiz)) return false;
+    uint64_t deadline = now() + (int64_t)(ttl * 1000);
+    char dbuf[sizeof(deadline)];
+    kc::writefixnum(dbuf, deadline, sizeof(dbuf));
+    std::string ekey = entry_key(kbuf, ksiz);
+    std::string qkey = queue_key(deadline, kbuf, ksiz);
+    return edb_->set(ekey.data(), ekey.size(), dbuf, sizeof(dbuf)) &&
+      edb_->set(qkey.data(), qkey.size(), "", 0);
+  }
+  bool forget(const char* kbuf, size_t ksiz) {
+    int64_t deadline = this->deadline(kbuf, ksiz);
+    if (deadline < 0) return deadline == -1;
+    std::string ekey = entry_key(kbuf, ksiz);
+    std::string qkey = queue_key(deadline, kbuf, ksiz);
+    return edb_->remove(qkey.data(), qkey.size()) && edb_->remove(ekey.data(), ekey.size());
+  }
+  int64_t deadline(const char* kbuf, size_t ksiz) {
+    std::string ekey = entry_key(kbuf, ksiz);
+    char dbuf[sizeof(uint64_t)];
+    int32_t dsiz = edb_->get(ekey.data(), ekey.size(), dbuf, sizeof(dbuf));
+    if (dsiz != (int32_t)sizeof(dbuf))
+      return dsiz < 0 && edb_->error() == kc::PolyDB::Error::NOREC ? -1 : -2;
+    return kc::readfixnum(dbuf, sizeof(dbuf));
+  }
+  bool expired(const char* kbuf, size_t ksiz) {
+    int64_t deadline = this->deadline(kbuf, ksiz);
+    return deadline >= 0 && deadline <= now();
+  }
+  int64_t sweep(int64_t max) {
+    if (max < 0) max = kc::INT64MAX;
+    int64_t stime = now();
+    StringVector qkeys;
+    kc::PolyDB::Cursor* cur = edb_->cursor();
+    bool err = false;
+    if (cur->jump("q", 1)) {
+      while ((int64_t)qkeys.size() < max) {
+        size_t qsiz;
+        char* qbuf = cur->get_key(&qsiz, true);
+        if (!qbuf) {
+          if (cur->error() != kc::PolyDB::Error::NOREC) err = true;
+          break;
+        }
+        bool hit = qsiz >= QKEYMIN && *qbuf == 'q' &&
+          (int64_t)kc::readfixnum(qbuf + 1, sizeof(uint64_t)) <= stime;
+        if (hit) qkeys.push_back(std::string(qbuf, qsiz));
+        delete[] qbuf;
+        if (!hit) break;
+      }
+    } else if (cur->error() != kc::PolyDB::Error::NOREC) {
+      err = true;
+    }
+    delete cur;
+    int64_t cnt = 0;
+    for (size_t i = 0; !err && i < qkeys.size(); i++) {
+      const std::string& qkey = qkeys[i];
+      const char* kbuf = qkey.data() + QKEYMIN;
+      size_t ksiz = qkey.size() - QKEYMIN;
+      int64_t deadline = this->deadline(kbuf, ksiz);
+      if (deadline != (int64_t)kc::readfixnum(qkey.data() + 1, sizeof(uint64_t))) {
+        if (!edb_->remove(qkey.data(), qkey.size()) &&
+            edb_->error() != kc::PolyDB::Error::NOREC) err = true;
+        continue;
+      }
+      Remover remover(this, deadline);
+      if (!db_->accept(kbuf, ksiz, &remover, true) || remover.error()) {
+        err = true;
+      } else if (remover.hit()) {
+        hub_->notify(UREMOVE, kbuf, ksiz);
+        cnt++;
+      }
+    }
+    kc::ScopedMutex lock(&mutex_);
+    sweeps_++;
+    scanned_ += qkeys.size();
+    expired_ += cnt;
+    lasttime_ = stime;
+    return err ? -1 : cnt;
+  }
+  void start(int64_t rate, double interval) {
+    stop();
+    rate_ = rate;
+    interval_ = interval;
+    alive_ = true;
+    running_ = true;
+    sweeper_.start();
+  }
+  void stop() {
+    if (!running_) return;
+    mutex_.lock();
+    alive_ = false;
+    cond_.signal();
+    mutex_.unlock();
+    sweeper_.join();
+    running_ = false;
+  }
+  void status(StringMap* status) {
+    kc::ScopedMutex lock(&mutex_);
+    (*status)["count"] = kc::strprintf("%lld", (long long)(edb_->count() / 2));
+    (*status)["running"] = running_ ? "true" : "false";
+    (*status)["rate"] = kc::strprintf("%lld", (long long)rate_);
+    (*status)["interval"] = kc::strprintf("%.3f", interval_);
+    (*status)["sweeps"] = kc::strprintf("%lld", (long long)sweeps_);
+    (*status)["scanned"] = kc::strprintf("%lld", (long long)scanned_);
+    (*status)["expired"] = kc::strprintf("%lld", (long long)expired_);
+    (*status)["last_sweep"] = kc::strprintf("%.3f", lasttime_ / 1000.0);
+  }
+private:
+  static const size_t QKEYMIN = 1 + sizeof(uint64_t);
+  class Remover : public kc::PolyDB::Visitor {
+  public:
+    explicit Remover(ExpiryTable* table, int64_t deadline) :
+      table_(table), deadline_(deadline), hit_(false), error_(false) {}
+    bool hit() {
+      return hit_;
+    }
+    bool error() {
+      return error_;
+    }
+  private:
+    const char* visit_full(const char* kbuf, size_t ksiz,
+                           const char* vbuf, size_t vsiz, size_t* sp) {
+      if (!forget(kbuf, ksiz)) return NOP;
+      hit_ = true;
+      return REMOVE;
+    }
+    const char* visit_empty(const char* kbuf, size_t ksiz, size_t* sp) {
+      forget(kbuf, ksiz);
+      return NOP;
+    }
+    bool forget(const char* kbuf, size_t ksiz) {
+      int64_t deadline = table_->deadline(kbuf, ksiz);
+      if (deadline != deadline_) {
+        if (deadline == -2) error_ = true;
+        return false;
+      }
+      if (!table_->forget(kbuf, ksiz)) {
+        error_ = true;
+        return false;
+      }
+      return true;
+    }
+    ExpiryTable* table_;
+    int64_t deadline_;
+    bool hit_;
+    bool error_;
+  };
+  class Sweeper : public kc::Thread {
+  public:
+    explicit Sweeper(ExpiryTable* table) : table_(table) {}
+    void run() {
+      table_->run();
+    }
+  private:
+    ExpiryTable* table_;
+  };
+  static int64_t now() {
+    return (int64_t)(kc::time() * 1000);
+  }
+  static std::string entry_key(const char* kbuf, size_t ksiz) {
+    std::string ekey(1, 'k');
+    ekey.append(kbuf, ksiz);
+    return ekey;
+  }
+  static std::string queue_key(uint64_t deadline, const char* kbuf, size_t ksiz) {
+    char dbuf[sizeof(deadline)];
+    kc::writefixnum(dbuf, deadline, sizeof(dbuf));
+    std::string qkey(1, 'q');
+    qkey.append(dbuf, sizeof(dbuf));
+    qkey.append(kbuf, ksiz);
+    return qkey;
+  }
+  void run() {
+    mutex_.lock();
+    while (alive_) {
+      mutex_.unlock();
+      db_sweep_native(data_, this, rate_);
+      mutex_.lock();
+      if (alive_) cond_.wait(&mutex_, interval_);
+    }
+    mutex_.unlock();
+  }
+  PyObject* pyedb_;
+  kc::PolyDB* edb_;
+  DB_data* data_;
+  kc::PolyDB* db_;
+  UpdateHub* hub_;
+  Sweeper sweeper_;
+  kc::Mutex mutex_;
+  kc::CondVar cond_;
+  bool alive_;
+  bool running_;
+  int64_t rate_;
+  double interval_;
+  int64_t sweeps_;
+  int64_t scanned_;
+  int64_t expired_;
+  int64_t lasttime_;
 };
 
 
 /**
- * Internal data of a database object.
+ * Incremental defragmenter of a database with a background scheduler.
  */
-struct DB_data {
-  PyObject_HEAD
-  kc::PolyDB* db;
-  uint32_t exbits;
-  PyObject* pylock;
+class Defragmenter {
+public:
+  explicit Defragmenter(kc::PolyDB* db) :
+    db_(db), worker_(this), mutex_(), cond_(), alive_(false), running_(false), step_(0),
+    interval_(0), budget_(0), calls_(0), time_(0), reclaimed_(0), lasttime_(0) {}
+  ~Defragmenter() {
+    stop();
+  }
+  bool supported() {
+    kc::BasicDB* idb = db_->reveal_inner_db();
+    return dynamic_cast<kc::HashDB*>(idb) || dynamic_cast<kc::TreeDB*>(idb) ||
+      dynamic_cast<kc::ForestDB*>(idb);
+  }
+  bool defrag(int64_t step) {
+    if (!supported()) {
+      db_->set_error(kc::PolyDB::Error::NOIMPL, "not implemented");
+      return false;
+    }
+    kc::BasicDB* idb = db_->reveal_inner_db();
+    kc::HashDB* hdb = dynamic_cast<kc::HashDB*>(idb);
+    kc::TreeDB* tdb = dynamic_cast<kc::TreeDB*>(idb);
+    kc::ForestDB* fdb = dynamic_cast<kc::ForestDB*>(idb);
+    int64_t osiz = db_->size();
+    double stime = kc::time();
+    bool rv;
+    if (hdb) {
+      rv = hdb->defrag(step);
+    } else if (tdb) {
+      rv = tdb->defrag(step);
+    } else {
+      rv = fdb->defrag(step);
+    }
+    double etime = kc::time();
+    int64_t nsiz = db_->size();
+    kc::ScopedMutex lock(&mutex_);
+    calls_++;
+    time_ += etime - stime;
+    if (osiz > nsiz) reclaimed_ += osiz - nsiz;
+    lasttime_ = etime;
+    return rv;
+  }
+  void start(int64_t step, double interval, double budget) {
+    stop();
+    step_ = step;
+    interval_ = interval;
+    budget_ = budget;
+    alive_ = true;
+    running_ = true;
+    worker_.start();
+  }
+  void stop() {
+    if (!running_) return;
+    mutex_.lock();
+    alive_ = false;
+    cond_.signal();
+    mutex_.unlock();
+    worker_.join();
+    running_ = false;
+  }
+  void status(StringMap* status) {
+    kc::ScopedMutex lock(&mutex_);
+    (*status)["defrag_running"] = running_ ? "true" : "false";
+    (*status)["defrag_step"] = kc::strprintf("%lld", (long long)step_);
+    (*status)["defrag_interval"] = kc::strprintf("%.3f", interval_);
+    (*status)["defrag_budget"] = kc::strprintf("%.3f", budget_);
+    (*status)["defrag_calls"] = kc::strprintf("%lld", (long long)calls_);
+    (*status)["defrag_time"] = kc::strprintf("%.6f", time_);
+    (*status)["defrag_reclaimed"] = kc::strprintf("%lld", (long long)reclaimed_);
+    (*status)["defrag_last"] = kc::strprintf("%.3f", lasttime_);
+  }
+private:
+  class Worker : public kc::Thread {
+  public:
+    explicit Worker(Defragmenter* defrag) : defrag_(defrag) {}
+    void run() {
+      defrag_->run();
+    }
+  private:
+    Defragmenter* defrag_;
+  };
+  void run() {
+    mutex_.lock();
+    while (alive_) {
+      mutex_.unlock();
+      double deadline = kc::time() + budget_;
+      while (defrag(step_) && kc::time() < deadline) {
+        kc::ScopedMutex lock(&mutex_);
+        if (!alive_) break;
+      }
+      mutex_.lock();
+      if (alive_) cond_.wait(&mutex_, interval_);
+    }
+    mutex_.unlock();
+  }
+  kc::PolyDB* db_;
+  Worker worker_;
+  kc::Mutex mutex_;
+  kc::CondVar cond_;
+  bool alive_;
+  bool running_;
+  int64_t step_;
+  double interval_;
+  double budget_;
+  int64_t calls_;
+  double time_;
+  int64_t reclaimed_;
+  double lasttime_;
 };
 
 
 /**
- * Locking device of the database.
+ * Committer which batches durability requests of threads into one synchronization.
  */
-class NativeFunction {
+class GroupCommitter {
 public:
-  NativeFunction(DB_data* data) : data_(data), thstate_(NULL) {
-    PyObject* pylock = data_->pylock;
-    if (pylock == Py_None) {
-      thstate_ = PyEval_SaveThread();
-    } else {
-      PyObject* pyrv = PyObject_CallMethod(pylock, (char*)"acquire", NULL);
-      if (pyrv) Py_DECREF(pyrv);
+  explicit GroupCommitter(kc::PolyDB* db) :
+    db_(db), worker_(this), mutex_(), cond_(), donecond_(), alive_(false), running_(false),
+    window_(0), hard_(false), maxbatch_(0), requested_(0), done_(0), times_(), failures_(),
+    lowmark_(0), failcnt_(0), batches_(0), biggest_(0), synctime_(0), latency_(0), slowest_(0) {}
+  ~GroupCommitter() {
+    stop();
+  }
+  void start(double window, bool hard, int64_t maxbatch) {
+    stop();
+    window_ = window;
+    hard_ = hard;
+    maxbatch_ = maxbatch;
+    alive_ = true;
+    running_ = true;
+    worker_.start();
+  }
+  void stop() {
+    if (!running_) return;
+    mutex_.lock();
+    alive_ = false;
+    cond_.signal();
+    mutex_.unlock();
+    worker_.join();
+    running_ = false;
+  }
+  int64_t request() {
+    kc::ScopedMutex lock(&mutex_);
+    if (!alive_) return -1;
+    times_.push_back(kc::time());
+    requested_++;
+    cond_.signal();
+    return requested_;
+  }
+  bool issued(int64_t ticket) {
+    kc::ScopedMutex lock(&mutex_);
+    return ticket > 0 && ticket <= requested_;
+  }
+  bool wait(int64_t ticket, double timeout, const char** msgp) {
+    kc::ScopedMutex lock(&mutex_);
+    double deadline = kc::time() + timeout;
+    while (done_ < ticket) {
+      if (timeout < 0) {
+        donecond_.wait(&mutex_);
+      } else {
+        double rest = deadline - kc::time();
+        if (rest <= 0) break;
+        donecond_.wait(&mutex_, rest);
+      }
     }
-  }
-  void cleanup() {
-    PyObject* pylock = data_->pylock;
-    if (pylock == Py_None) {
-      if (thstate_) PyEval_RestoreThread(thstate_);
-    } else {
-      PyObject* pyrv = PyObject_CallMethod(pylock, (char*)"release", NULL);
-      if (pyrv) Py_DECREF(pyrv);
+    if (done_ < ticket) {
+      *msgp = "timed out";
+      return false;
+    }
+    if (ticket <= lowmark_) {
+      *msgp = "synchronization result expired";
+      return false;
+    }
+    for (size_t i = 0; i < failures_.size(); i++) {
+      if (ticket > failures_[i].first && ticket <= failures_[i].second) {
+        *msgp = "synchronization failed";
+        return false;
+      }
     }
+    return true;
+  }
+  void status(StringMap* status) {
+    kc::ScopedMutex lock(&mutex_);
+    int64_t synced = done_;
+    (*status)["running"] = running_ ? "true" : "false";
+    (*status)["window"] = kc::strprintf("%.6f", window_);
+    (*status)["hard"] = hard_ ? "true" : "false";
+    (*status)["max_batch"] = kc::strprintf("%lld", (long long)maxbatch_);
+    (*status)["requests"] = kc::strprintf("%lld", (long long)requested_);
+    (*status)["pending"] = kc::strprintf("%lld", (long long)(requested_ - done_));
+    (*status)["batches"] = kc::strprintf("%lld", (long long)batches_);
+    (*status)["avg_batch"] =
+      kc::strprintf("%.3f", batches_ > 0 ? (double)synced / batches_ : 0.0);
+    (*status)["biggest_batch"] = kc::strprintf("%lld", (long long)biggest_);
+    (*status)["sync_time"] = kc::strprintf("%.6f", synctime_);
+    (*status)["avg_latency"] =
+      kc::strprintf("%.6f", synced > 0 ? latency_ / synced : 0.0);
+    (*status)["max_latency"] = kc::strprintf("%.6f", slowest_);
+    (*status)["failures"] = kc::strprintf("%lld", (long long)failcnt_);
   }
 private:
-  DB_data* data_;
-  PyThreadState* thstate_;
+  static const size_t FAILMAX = 256;
+  class Worker : public kc::Thread {
+  public:
+    explicit Worker(GroupCommitter* committer) : committer_(committer) {}
+    void run() {
+      committer_->run();
+    }
+  private:
+    GroupCommitter* committer_;
+  };
+  void run() {
+    mutex_.lock();
+    while (true) {
+      if (done_ >= requested_) {
+        if (!alive_) break;
+        cond_.wait(&mutex_, 1.0);
+        continue;
+      }
+      double deadline = kc::time() + window_;
+      while (alive_ && (maxbatch_ < 1 || requested_ - done_ < maxbatch_)) {
+        double rest = deadline - kc::time();
+        if (rest <= 0) break;
+        cond_.wait(&mutex_, rest);
+      }
+      int64_t upto = requested_;
+      mutex_.unlock();
+      double stime = kc::time();
+      bool rv = db_->synchronize(hard_);
+      double etime = kc::time();
+      mutex_.lock();
+      batches_++;
+      if (upto - done_ > biggest_) biggest_ = upto - done_;
+      synctime_ += etime - stime;
+      for (int64_t i = done_; i < upto; i++) {
+        double elapsed = etime - times_.front();
+        times_.pop_front();
+        latency_ += elapsed;
+        if (elapsed > slowest_) slowest_ = elapsed;
+      }
+      if (!rv) {
+        failcnt_++;
+        failures_.push_back(std::make_pair(done_, upto));
+        if (failures_.size() > FAILMAX) {
+          lowmark_ = failures_.front().second;
+          failures_.erase(failures_.begin());
+        }
+      }
+      done_ = upto;
+      donecond_.broadcast();
+    }
+    mutex_.unlock();
+  }
+  kc::PolyDB* db_;
+  Worker worker_;
+  kc::Mutex mutex_;
+  kc::CondVar cond_;
+  kc::CondVar donecond_;
+  bool alive_;
+  bool running_;
+  double window_;
+  bool hard_;
+  int64_t maxbatch_;
+  int64_t requested_;
+  int64_t done_;
+  std::deque<double> times_;
+  std::vector<std::pair<int64_t, int64_t> > failures_;
+  int64_t lowmark_;
+  int64_t failcnt_;
+  int64_t batches_;
+  int64_t biggest_;
+  double synctime_;
+  double latency_;
+  double slowest_;
 };
 
 
 /**
- * Entry point of the library.
+ * Scheduler of periodic synchronization of a database.
  */
-PyMODINIT_FUNC PyInit_kyotocabinet(void) {
-  if (!define_module()) return NULL;
-  if (!define_err()) return NULL;
-  if (!define_vis()) return NULL;
-  if (!define_fproc()) return NULL;
-  if (!define_cur()) return NULL;
-  if (!define_db()) return NULL;
-  return mod_kc;
-}
+class SyncScheduler : public UpdateListener {
+public:
+  explicit SyncScheduler(kc::PolyDB* db, double interval, bool hard, int64_t after) :
+    db_(db), worker_(this), mutex_(), cond_(), alive_(false), running_(false),
+    interval_(interval), hard_(hard), after_(after), dirty_(false), pending_(0), count_(0),
+    failures_(0), basetime_(0), lasttime_(0), lastdur_(0) {}
+  ~SyncScheduler() {
+    stop();
+  }
+  void update(Kind kind, const char* kbuf, size_t ksiz, const char* vbuf, size_t vsiz) {
+    kc::ScopedMutex lock(&mutex_);
+    dirty_ = true;
+    pending_ += ksiz + vsiz;
+    if (after_ > 0 && pending_ >= after_) cond_.signal();
+  }
+  void start() {
+    stop();
+    basetime_ = kc::time();
+    alive_ = true;
+    running_ = true;
+    worker_.start();
+  }
+  void stop() {
+    if (!running_) return;
+    mutex_.lock();
+    alive_ = false;
+    cond_.signal();
+    mutex_.unlock();
+    worker_.join();
+    running_ = false;
+  }
+  void status(StringMap* status) {
+    kc::ScopedMutex lock(&mutex_);
+    (*status)["sync_interval"] = kc::strprintf("%.3f", interval_);
+    (*status)["sync_hard"] = hard_ ? "true" : "false";
+    (*status)["sync_after_bytes"] = kc::strprintf("%lld", (long long)after_);
+    (*status)["sync_pending_bytes"] = kc::strprintf("%lld", (long long)pending_);
+    (*status)["sync_count"] = kc::strprintf("%lld", (long long)count_);
+    (*status)["sync_failures"] = kc::strprintf("%lld", (long long)failures_);
+    (*status)["sync_last"] = kc::strprintf("%.3f", lasttime_);
+    (*status)["sync_duration"] = kc::strprintf("%.6f", lastdur_);
+  }
+private:
+  class Worker : public kc::Thread {
+  public:
+    explicit Worker(SyncScheduler* scheduler) : scheduler_(scheduler) {}
+    void run() {
+      scheduler_->run();
+    }
+  private:
+    SyncScheduler* scheduler_;
+  };
+  void run() {
+    mutex_.lock();
+    while (alive_) {
+      bool full = after_ > 0 && pending_ >= after_;
+      double rest = interval_ > 0 ? basetime_ + interval_ - kc::time() : 1.0;
+      if (!full && (rest > 0 || !dirty_)) {
+        cond_.wait(&mutex_, rest > 0 ? rest : interval_);
+        continue;
+      }
+      dirty_ = false;
+      pending_ = 0;
+      mutex_.unlock();
+      double stime = kc::time();
+      bool rv = db_->synchronize(hard_);
+      double etime = kc::time();
+      mutex_.lock();
+      count_++;
+      if (!rv) failures_++;
+      basetime_ = stime;
+      lasttime_ = stime;
+      lastdur_ = etime - stime;
+    }
+    mutex_.unlock();
+  }
+  kc::PolyDB* db_;
+  Worker worker_;
+  kc::Mutex mutex_;
+  kc::CondVar cond_;
+  bool alive_;
+  bool running_;
+  double interval_;
+  bool hard_;
+  int64_t after_;
+  bool dirty_;
+  int64_t pending_;
+  int64_t count_;
+  int64_t failures_;
+  double basetime_;
+  double lasttime_;
+  double lastdur_;
+};
 
 
 /**
- * Set a constant of unsigned integer.
+ * External sorter which spills sorted runs of records to temporary files.
  */
-static bool setconstuint32(PyObject* pyobj, const char* name, uint32_t value) {
-  PyObject* pyname = PyUnicode_FromString(name);
-  PyObject* pyvalue = PyLong_FromUnsignedLong(value);
-  return PyObject_GenericSetAttr(pyobj, pyname, pyvalue) == 0;
-}
+class ExternalSorter {
+public:
+  explicit ExternalSorter(const std::string& tmpdir, int64_t budget) :
+    tmpdir_(tmpdir), budget_(budget), recs_(), size_(0), runs_(), spiller_(this), seq_(0),
+    count_(0), spilled_(0), ecode_(kc::PolyDB::Error::SUCCESS), emsg_() {}
+  ~ExternalSorter() {
+    spiller_.wait();
+    for (size_t i = 0; i < runs_.size(); i++) {
+      std::remove(runs_[i].c_str());
+    }
+  }
+  void append(const char* kbuf, size_t ksiz, const char* vbuf, size_t vsiz) {
+    recs_.push_back(Record());
+    Record& rec = recs_.back();
+    rec.key.assign(kbuf, ksiz);
+    rec.value.assign(vbuf, vsiz);
+    size_ += ksiz + vsiz + RECOVERHEAD;
+    count_++;
+  }
+  bool full() {
+    return size_ * 2 >= budget_;
+  }
+  bool spill() {
+    if (!spiller_.wait()) return fail(spiller_);
+    if (recs_.empty()) return true;
+    std::string path = run_path();
+    runs_.push_back(path);
+    spiller_.start(&recs_, path);
+    size_ = 0;
+    return true;
+  }
+  int64_t finish(kc::PolyDB* db) {
+    if (!spiller_.wait()) {
+      fail(spiller_);
+    } else if (runs_.empty()) {
+      int64_t cnt = 0;
+      sort_records(&recs_);
+      if (!write_records(recs_, db, NULL, &cnt)) {
+        fail(db->error().code(), db->error().message());
+      } else {
+        recs_.clear();
+        size_ = 0;
+        return cnt;
+      }
+    } else if (spill() && spiller_.wait()) {
+      while (runs_.size() > MERGEFANIN && merge_runs()) {}
+      if (ecode_ == kc::PolyDB::Error::SUCCESS) {
+        Merger merger(runs_, db, "");
+        merger.run();
+        if (merger.ok()) return merger.count();
+        fail(merger);
+      }
+    } else if (ecode_ == kc::PolyDB::Error::SUCCESS) {
+      fail(spiller_);
+    }
+    db->set_error(ecode_, emsg_.c_str());
+    return -1;
+  }
+  bool error(kc::PolyDB::Error::Code* codep, std::string* msgp) {
+    if (ecode_ == kc::PolyDB::Error::SUCCESS) return false;
+    *codep = ecode_;
+    *msgp = emsg_;
+    return true;
+  }
+  void status(StringMap* status) {
+    (*status)["records"] = kc::strprintf("%lld", (long long)count_);
+    (*status)["runs"] = kc::strprintf("%lld", (long long)runs_.size());
+    (*status)["spilled"] = kc::strprintf("%lld", (long long)spilled_);
+    (*status)["memory"] = kc::strprintf("%lld", (long long)size_);
+    (*status)["budget"] = kc::strprintf("%lld", (long long)budget_);
+  }
+private:
+  struct Record {
+    std::string key;
+    std::string value;
+    bool operator <(const Record& right) const {
+      return key < right.key;
+    }
+  };
+  typedef std::vector<Record> RecordList;
+  static const size_t RECOVERHEAD = sizeof(Record) + 16;
+  static const size_t MERGEFANIN = 64;
+  class Task {
+  public:
+    Task() : ecode_(kc::PolyDB::Error::SUCCESS), emsg_() {}
+    bool ok() {
+      return ecode_ == kc::PolyDB::Error::SUCCESS;
+    }
+    kc::PolyDB::Error::Code ecode_;
+    std::string emsg_;
+  };
+  class Spiller : public kc::Thread, public Task {
+  public:
+    explicit Spiller(ExternalSorter* sorter) :
+      sorter_(sorter), recs_(), path_(), busy_(false), bytes_(0) {}
+    void start(RecordList* recs, const std::string& path) {
+      recs_.swap(*recs);
+      recs->clear();
+      path_ = path;
+      busy_ = true;
+      kc::Thread::start();
+    }
+    bool wait() {
+      if (busy_) {
+        join();
+        busy_ = false;
+        sorter_->spilled_ += bytes_;
+      }
+      return ok();
+    }
+    void run() {
+      int64_t cnt = 0;
+      std::ofstream ofs(path_.c_str(),
+                        std::ios_base::out | std::ios_base::binary | std::ios_base::trunc);
+      sort_records(&recs_);
+      bytes_ = 0;
+      for (size_t i = 0; i < recs_.size(); i++) {
+        bytes_ += sizeof(uint32_t) * 2 + recs_[i].key.size() + recs_[i].value.size();
+      }
+      if (!write_records(recs_, NULL, &ofs, &cnt)) {
+        ecode_ = kc::PolyDB::Error::SYSTEM;
+        emsg_ = "writing a run failed";
+      }
+      recs_.clear();
+    }
+  private:
+    ExternalSorter* sorter_;
+    RecordList recs_;
+    std::string path_;
+    bool busy_;
+    int64_t bytes_;
+  };
+  class Reader {
+  public:
+    explicit Reader(const std::string& path, size_t idx) :
+      ifs_(path.c_str(), std::ios_base::in | std::ios_base::binary), idx_(idx), key_(),
+      value_(), bad_(!ifs_) {}
+    bool next() {
+      char hbuf[sizeof(uint32_t) * 2];
+      if (!ifs_.read(hbuf, sizeof(hbuf))) {
+        if (!ifs_.eof() || ifs_.gcount() > 0) bad_ = true;
+        return false;
+      }
+      size_t ksiz = kc::readfixnum(hbuf, sizeof(uint32_t));
+      size_t vsiz = kc::readfixnum(hbuf + sizeof(uint32_t), sizeof(uint32_t));
+      key_.resize(ksiz);
+      value_.resize(vsiz);
+      if (!ifs_.read((char*)key_.data(), ksiz) || !ifs_.read((char*)value_.data(), vsiz)) {
+        bad_ = true;
+        return false;
+      }
+      return true;
+    }
+    std::ifstream ifs_;
+    size_t idx_;
+    std::string key_;
+    std::string value_;
+    bool bad_;
+  };
+  struct ReaderComparator {
+    bool operator ()(const Reader* a, const Reader* b) const {
+      int32_t rv = a->key_.compare(b->key_);
+      return rv > 0 || (rv == 0 && a->idx_ < b->idx_);
+    }
+  };
+  class Merger : public kc::Thread, public Task {
+  public:
+    explicit Merger(const StringVector& paths, kc::PolyDB* db, const std::string& out) :
+      paths_(paths), db_(db), out_(out), count_(0) {}
+    void run() {
+      std::vector<Reader*> readers;
+      std::vector<Reader*> heap;
+      ReaderComparator comp;
+      bool err = false;
+      for (size_t i = 0; i < paths_.size(); i++) {
+        Reader* reader = new Reader(paths_[i], i);
+        readers.push_back(reader);
+        if (reader->next()) {
+          heap.push_back(reader);
+        } else if (reader->bad_) {
+          err = true;
+        }
+      }
+      std::make_heap(heap.begin(), heap.end(), comp);
+      std::ofstream ofs;
+      if (!db_) ofs.open(out_.c_str(),
+                         std::ios_base::out | std::ios_base::binary | std::ios_base::trunc);
+      while (!err && !heap.empty()) {
+        std::pop_heap(heap.begin(), heap.end(), comp);
+        Reader* top = heap.back();
+        heap.pop_back();
+        if (db_) {
+          if (!db_->set(top->key_, top->value_)) {
+            kc::PolyDB::Error e = db_->error();
+            ecode_ = e.code();
+            emsg_ = e.message();
+            err = true;
+            break;
+          }
+        } else {
+          write_record(&ofs, top->key_, top->value_);
+        }
+        count_++;
+        while (!heap.empty() && heap.front()->key_ == top->key_) {
+          std::pop_heap(heap.begin(), heap.end(), comp);
+          Reader* dup = heap.back();
+          heap.pop_back();
+          push(&heap, dup, &err);
+        }
+        push(&heap, top, &err);
+      }
+      for (size_t i = 0; i < readers.size(); i++) {
+        delete readers[i];
+      }
+      if (!db_ && !err) {
+        ofs.close();
+        if (!ofs) err = true;
+      }
+      if (err && ecode_ == kc::PolyDB::Error::SUCCESS) {
+        ecode_ = kc::PolyDB::Error::SYSTEM;
+        emsg_ = "merging runs failed";
+      }
+    }
+    int64_t count() {
+      return count_;
+    }
+  private:
+    static void push(std::vector<Reader*>* heap, Reader* reader, bool* errp) {
+      if (reader->next()) {
+        heap->push_back(reader);
+        std::push_heap(heap->begin(), heap->end(), ReaderComparator());
+      } else if (reader->bad_) {
+        *errp = true;
+      }
+    }
+    StringVector paths_;
+    kc::PolyDB* db_;
+    std::string out_;
+    int64_t count_;
+  };
+  std::string run_path() {
+    return kc::strprintf("%s%ckctb-%llx-%llx-%lld.run", tmpdir_.c_str(), kc::File::PATHCHR,
+                         (long long)kc::getpid(), (long long)(intptr_t)this, (long long)seq_++);
+  }
+  static void sort_records(RecordList* recs) {
+    std::stable_sort(recs->begin(), recs->end());
+  }
+  static bool write_records(const RecordList& recs, kc::PolyDB* db, std::ofstream* ofs,
+                     int64_t* countp) {
+    for (size_t i = 0; i < recs.size(); i++) {
+      if (i + 1 < recs.size() && recs[i+1].key == recs[i].key) continue;
+      if (db) {
+        if (!db->set(recs[i].key, recs[i].value)) return false;
+      } else {
+        write_record(ofs, recs[i].key, recs[i].value);
+      }
+      (*countp)++;
+    }
+    if (ofs) {
+      ofs->close();
+      if (!*ofs) return false;
+    }
+    return true;
+  }
+  static void write_record(std::ofstream* ofs, const std::string& key, const std::string& value) {
+    char hbuf[sizeof(uint32_t) * 2];
+    kc::writefixnum(hbuf, key.size(), sizeof(uint32_t));
+    kc::writefixnum(hbuf + sizeof(uint32_t), value.size(), sizeof(uint32_t));
+    ofs->write(hbuf, sizeof(hbuf));
+    ofs->write(key.data(), key.size());
+    ofs->write(value.data(), value.size());
+  }
+  bool merge_runs() {
+    std::vector<Merger*> mergers;
+    StringVector outs;
+    for (size_t i = 0; i < runs_.size(); i += MERGEFANIN) {
+      size_t end = std::min(i + MERGEFANIN, runs_.size());
+      StringVector paths(runs_.begin() + i, runs_.begin() + end);
+      std::string out = run_path();
+      outs.push_back(out);
+      Merger* merger = new Merger(paths, NULL, out);
+      mergers.push_back(merger);
+      merger->start();
+    }
+    for (size_t i = 0; i < mergers.size(); i++) {
+      mergers[i]->join();
+      if (!mergers[i]->ok()) fail(*mergers[i]);
+      delete mergers[i];
+    }
+    for (size_t i = 0; i < runs_.size(); i++) {
+      std::remove(runs_[i].c_str());
+    }
+    runs_.swap(outs);
+    return ecode_ == kc::PolyDB::Error::SUCCESS;
+  }
+  bool fail(const Task& task) {
+    return fail(task.ecode_, task.emsg_.c_str());
+  }
+  bool fail(kc::PolyDB::Error::Code code, const char* message) {
+    if (ecode_ == kc::PolyDB::Error::SUCCESS) {
+      ecode_ = code;
+      emsg_ = message;
+    }
+    return false;
+  }
+  std::string tmpdir_;
+  int64_t budget_;
+  RecordList recs_;
+  int64_t size_;
+  StringVector runs_;
+  Spiller spiller_;
+  int64_t seq_;
+  int64_t count_;
+  int64_t spilled_;
+  kc::PolyDB::Error::Code ecode_;
+  std::string emsg_;
+};
 
 
 /**
- * Throw a runtime error.
+ * Journal of changed keys for incremental snapshots.
  */
-static void throwruntime(const char* message) {
-  PyErr_SetString(PyExc_RuntimeError, message);
-}
-
+class ChangeJournal : public UpdateListener {
+public:
+  explicit ChangeJournal(PyObject* pyjdb, kc::PolyDB* jdb) :
+    pyjdb_(pyjdb), jdb_(jdb), mutex_(), seq_(0), reset_(0) {
+    Py_INCREF(pyjdb_);
+  }
+  ~ChangeJournal() {
+    Py_DECREF(pyjdb_);
+  }
+  bool load() {
+    kc::ScopedMutex lock(&mutex_);
+    seq_ = read_number("n");
+    reset_ = read_number("r");
+    return seq_ >= 0 && reset_ >= 0;
+  }
+  void update(Kind kind, const char* kbuf, size_t ksiz, const char* vbuf, size_t vsiz) {
+    kc::ScopedMutex lock(&mutex_);
+    switch (kind) {
+      case USET:
+      case UREMOVE: {
+        std::string ckey(1, 'c');
+        ckey.append(kbuf, ksiz);
+        char nbuf[sizeof(uint64_t)];
+        if (jdb_->get(ckey.data(), ckey.size(), nbuf, sizeof(nbuf)) == (int32_t)sizeof(nbuf)) {
+          std::string okey = log_key(kc::readfixnum(nbuf, sizeof(nbuf)), kbuf, ksiz);
+          jdb_->remove(okey.data(), okey.size());
+        }
+        seq_++;
+        kc::writefixnum(nbuf, seq_, sizeof(nbuf));
+        std::string lkey = log_key(seq_, kbuf, ksiz);
+        jdb_->set(ckey.data(), ckey.size(), nbuf, sizeof(nbuf));
+        jdb_->set(lkey.data(), lkey.size(), "", 0);
+        jdb_->set("n", 1, nbuf, sizeof(nbuf));
+        break;
+      }
+      case UCLEAR:
+      case URESET: {
+        seq_++;
+        reset_ = seq_;
+        char nbuf[sizeof(uint64_t)];
+        kc::writefixnum(nbuf, seq_, sizeof(nbuf));
+        jdb_->clear();
+        jdb_->set("n", 1, nbuf, sizeof(nbuf));
+        jdb_->set("r", 1, nbuf, sizeof(nbuf));
+        break;
+      }
+    }
+  }
+  int64_t marker() {
+    kc::ScopedMutex lock(&mutex_);
+    return seq_;
+  }
+  bool covers(int64_t since) {
+    kc::ScopedMutex lock(&mutex_);
+    return since >= reset_ && since <= seq_;
+  }
+  bool scan(int64_t* from, int64_t upto, int64_t max, StringVector* keys) {
+    kc::PolyDB::Cursor* cur = jdb_->cursor();
+    std::string lkey = log_key(*from + 1, "", 0);
+    bool err = false;
+    if (cur->jump(lkey)) {
+      while ((int64_t)keys->size() < max) {
+        size_t lsiz;
+        char* lbuf = cur->get_key(&lsiz, true);
+        if (!lbuf) {
+          if (cur->error() != kc::PolyDB::Error::NOREC) err = true;
+          *from = upto;
+          break;
+        }
+        int64_t seq = lsiz > sizeof(uint64_t) && *lbuf == 'l' ?
+          kc::readfixnum(lbuf + 1, sizeof(uint64_t)) : upto + 1;
+        if (seq > upto) {
+          delete[] lbuf;
+          *from = upto;
+          break;
+        }
+        keys->push_back(std::string(lbuf + 1 + sizeof(uint64_t), lsiz - 1 - sizeof(uint64_t)));
+        *from = seq;
+        delete[] lbuf;
+      }
+    } else {
+      if (cur->error() != kc::PolyDB::Error::NOREC) err = true;
+      *from = upto;
+    }
+    delete cur;
+    return !err;
+  }
+private:
+  int64_t read_number(const char* name) {
+    char nbuf[sizeof(uint64_t)];
+    int32_t nsiz = jdb_->get(name, std::strlen(name), nbuf, sizeof(nbuf));
+    if (nsiz == (int32_t)sizeof(nbuf)) return kc::readfixnum(nbuf, sizeof(nbuf));
+    return nsiz < 0 && jdb_->error() == kc::PolyDB::Error::NOREC ? 0 : -1;
+  }
+  static std::string log_key(uint64_t seq, const char* kbuf, size_t ksiz) {
+    char nbuf[sizeof(seq)];
+    kc::writefixnum(nbuf, seq, sizeof(nbuf));
+    std::string lkey(1, 'l');
+    lkey.append(nbuf, sizeof(nbuf));
+    lkey.append(kbuf, ksiz);
+    return lkey;
+  }
+  PyObject* pyjdb_;
+  kc::PolyDB* jdb_;
+  kc::Mutex mutex_;
+  int64_t seq_;
+  int64_t reset_;
+};
 
 /**
- * throw the invalid argument error.
+ * Bounded log of updates of a database.
  */
-static void throwinvarg() {
-  PyErr_SetString(PyExc_TypeError, "invalid arguments");
-}
+class ChangeFeed : public UpdateListener {
+public:
+  struct Change {
+    int64_t seq;
+    Kind kind;
+    std::string key;
+    std::string value;
+    bool valued;
+  };
+  enum Overflow {
+    ODROP,
+    OBLOCK,
+    OERROR
+  };
+  explicit ChangeFeed(int64_t capacity, Overflow overflow) :
+    mutex_(), cond_(), changes_(), capacity_(capacity), overflow_(overflow), seq_(0),
+    dropped_(0), broken_(false), closed_(false), refs_(1) {}
+  void update(Kind kind, const char* kbuf, size_t ksiz, const char* vbuf, size_t vsiz) {
+    kc::ScopedMutex lock(&mutex_);
+    if (overflow_ == OERROR && (broken_ || full())) {
+      broken_ = true;
+      dropped_++;
+      return;
+    }
+    changes_.push_back(Change());
+    Change& change = changes_.back();
+    change.seq = ++seq_;
+    change.kind = kind;
+    if (kbuf) change.key.assign(kbuf, ksiz);
+    change.valued = vbuf != NULL;
+    if (vbuf) change.value.assign(vbuf, vsiz);
+    if (overflow_ == ODROP && (int64_t)changes_.size() > capacity_) {
+      changes_.pop_front();
+      dropped_++;
+    }
+    cond_.broadcast();
+  }
+  bool fetch(int64_t since, int64_t max, double timeout, std::vector<Change>* result) {
+    kc::ScopedMutex lock(&mutex_);
+    if (timeout > 0) {
+      double deadline = kc::time() + timeout;
+      while (since >= seq_ && !broken_ && !closed_) {
+        double rest = deadline - kc::time();
+        if (rest <= 0) break;
+        cond_.wait(&mutex_, rest);
+      }
+    }
+    int64_t first = seq_ - (int64_t)changes_.size() + 1;
+    if (since < 0) since = first - 1;
+    if (since < first - 1) return false;
+    if (overflow_ != ODROP && since >= first) {
+      while (!changes_.empty() && changes_.front().seq <= since) {
+        changes_.pop_front();
+      }
+      cond_.broadcast();
+      first = since + 1;
+    }
+    if (broken_ && since >= seq_) return false;
+    std::deque<Change>::iterator it = changes_.begin() + std::min(since - first + 1,
+                                                                  (int64_t)changes_.size());
+    std::deque<Change>::iterator itend = changes_.end();
+    while (it != itend && (max < 0 || (int64_t)result->size() < max)) {
+      result->push_back(*it);
+      ++it;
+    }
+    return true;
+  }
+  void status(StringMap* status) {
+    kc::ScopedMutex lock(&mutex_);
+    (*status)["capacity"] = kc::strprintf("%lld", (long long)capacity_);
+    (*status)["count"] = kc::strprintf("%lld", (long long)changes_.size());
+    (*status)["first"] = kc::strprintf("%lld", (long long)(seq_ - (int64_t)changes_.size() + 1));
+    (*status)["last"] = kc::strprintf("%lld", (long long)seq_);
+    (*status)["dropped"] = kc::strprintf("%lld", (long long)dropped_);
+    (*status)["overflow"] = overflow_ == OBLOCK ? "block" : overflow_ == OERROR ? "error" : "drop";
+    (*status)["broken"] = broken_ ? "true" : "false";
+  }
+  bool broken() {
+    kc::ScopedMutex lock(&mutex_);
+    return broken_;
+  }
+  bool blocking() {
+    return overflow_ == OBLOCK;
+  }
+  void admit() {
+    kc::ScopedMutex lock(&mutex_);
+    while (full() && !closed_) {
+      cond_.wait(&mutex_, 1.0);
+    }
+  }
+  void retain() {
+    kc::ScopedMutex lock(&mutex_);
+    refs_++;
+  }
+  void release() {
+    mutex_.lock();
+    bool last = --refs_ < 1;
+    mutex_.unlock();
+    if (last) delete this;
+  }
+  void close() {
+    kc::ScopedMutex lock(&mutex_);
+    closed_ = true;
+    cond_.broadcast();
+  }
+  static const char* kind_name(Kind kind) {
+    switch (kind) {
+      case USET: return "set";
+      case UREMOVE: return "remove";
+      case UCLEAR: return "clear";
+      default: break;
+    }
+    return "reset";
+  }
+private:
+  bool full() {
+    return (int64_t)changes_.size() >= capacity_;
+  }
+  kc::Mutex mutex_;
+  kc::CondVar cond_;
+  std::deque<Change> changes_;
+  int64_t capacity_;
+  Overflow overflow_;
+  int64_t seq_;
+  int64_t dropped_;
+  bool broken_;
+  bool closed_;
+  int32_t refs_;
+};
 
 
 /**
- * Create a new string.
+ * Worker thread of chunked snapshots.
  */
-static PyObject* newstring(const char* str) {
-  return PyUnicode_DecodeUTF8(str, std::strlen(str), "ignore");
-}
+class SnapshotWorker : public kc::Thread {
+public:
+  SnapshotWorker() :
+    targets_(NULL), load_(false), raw_(), packed_(), rsiz_(0), crc_(0), rnum_(0), buckets_(),
+    ecode_(kc::PolyDB::Error::SUCCESS), emsg_() {}
+  void set_dump() {
+    load_ = false;
+    raw_.clear();
+    packed_.clear();
+    rnum_ = 0;
+    ecode_ = kc::PolyDB::Error::SUCCESS;
+  }
+  void set_load(const std::vector<DB_data*>* targets) {
+    targets_ = targets;
+    load_ = true;
+    raw_.clear();
+    packed_.clear();
+    ecode_ = kc::PolyDB::Error::SUCCESS;
+  }
+  void append(const char* kbuf, size_t ksiz, const char* vbuf, size_t vsiz) {
+    char nbuf[kc::NUMBUFSIZ];
+    raw_.append(nbuf, kc::writevarnum(nbuf, ksiz));
+    raw_.append(nbuf, kc::writevarnum(nbuf, vsiz));
+    raw_.append(kbuf, ksiz);
+    raw_.append(vbuf, vsiz);
+    rnum_++;
+  }
+  size_t size() {
+    return raw_.size();
+  }
+  std::string* packed() {
+    return &packed_;
+  }
+  void write_head(char* hbuf) {
+    kc::writefixnum(hbuf, packed_.size(), sizeof(uint64_t));
+    kc::writefixnum(hbuf + sizeof(uint64_t), raw_.size(), sizeof(uint64_t));
+    kc::writefixnum(hbuf + sizeof(uint64_t) * 2, crc_, sizeof(uint32_t));
+    kc::writefixnum(hbuf + sizeof(uint64_t) * 2 + sizeof(uint32_t), rnum_, sizeof(uint64_t));
+  }
+  void read_head(const char* hbuf) {
+    rsiz_ = kc::readfixnum(hbuf + sizeof(uint64_t), sizeof(uint64_t));
+    crc_ = kc::readfixnum(hbuf + sizeof(uint64_t) * 2, sizeof(uint32_t));
+    rnum_ = kc::readfixnum(hbuf + sizeof(uint64_t) * 2 + sizeof(uint32_t), sizeof(uint64_t));
+  }
+  int64_t rnum() {
+    return rnum_;
+  }
+  bool error(kc::PolyDB::Error::Code* codep, std::string* msgp) {
+    if (ecode_ == kc::PolyDB::Error::SUCCESS) return false;
+    *codep = ecode_;
+    *msgp = emsg_;
+    return true;
+  }
+  bool store(size_t idx, kc::PolyDB* db, UpdateHub* hub) {
+    const RecordList& recs = buckets_[idx];
+    RecordList::const_iterator it = recs.begin();
+    RecordList::const_iterator itend = recs.end();
+    while (it != itend) {
+      if (!db->set(it->kbuf, it->ksiz, it->vbuf, it->vsiz)) {
+        kc::PolyDB::Error err = db->error();
+        fail(err.code(), err.message());
+        return false;
+      }
+      hub->notify(UpdateListener::USET, it->kbuf, it->ksiz, it->vbuf, it->vsiz);
+      it++;
+    }
+    return true;
+  }
+  static const size_t HEADSIZ = sizeof(uint64_t) * 3 + sizeof(uint32_t);
+private:
+  void run() {
+    if (load_) {
+      apply();
+    } else {
+      crc_ = kc::ZLIB::calculate_crc(raw_.data(), raw_.size());
+      size_t zsiz;
+      char* zbuf = kc::ZLIB::compress(raw_.data(), raw_.size(), &zsiz);
+      if (zbuf) {
+        packed_.assign(zbuf, zsiz);
+        delete[] zbuf;
+      } else {
+        fail(kc::PolyDB::Error::SYSTEM, "compression failed");
+      }
+    }
+  }
+  void apply() {
+    size_t zsiz;
+    char* zbuf = kc::ZLIB::decompress(packed_.data(), packed_.size(), &zsiz);
+    if (!zbuf) {
+      fail(kc::PolyDB::Error::BROKEN, "decompression failed");
+      return;
+    }
+    if (zsiz != rsiz_ || kc::ZLIB::calculate_crc(zbuf, zsiz) != crc_) {
+      delete[] zbuf;
+      fail(kc::PolyDB::Error::BROKEN, "checksum mismatch");
+      return;
+    }
+    size_t tnum = targets_->size();
+    buckets_.clear();
+    buckets_.resize(tnum);
+    const char* rp = zbuf;
+    size_t size = zsiz;
+    int64_t cnt = 0;
+    while (size > 0) {
+      uint64_t ksiz, vsiz;
+      size_t step = kc::readvarnum(rp, size, &ksiz);
+      if (step < 1) break;
+      rp += step;
+      size -= step;
+      step = kc::readvarnum(rp, size, &vsiz);
+      if (step < 1 || size - step < ksiz + vsiz) break;
+      rp += step;
+      size -= step;
+      Record rec = { rp, ksiz, rp + ksiz, vsiz };
+      buckets_[tnum > 1 ? kc::hashmurmur(rp, ksiz) % tnum : 0].push_back(rec);
+      rp += ksiz + vsiz;
+      size -= ksiz + vsiz;
+      cnt++;
+    }
+    if (size > 0 || cnt != rnum_) {
+      fail(kc::PolyDB::Error::BROKEN, "invalid chunk");
+    } else {
+      for (size_t i = 0; i < tnum; i++) {
+        if (!buckets_[i].empty() && !db_load_native((*targets_)[i], this, i)) break;
+      }
+    }
+    buckets_.clear();
+    delete[] zbuf;
+  }
+  struct Record {
+    const char* kbuf;
+    size_t ksiz;
+    const char* vbuf;
+    size_t vsiz;
+  };
+  typedef std::vector<Record> RecordList;
+  void fail(kc::PolyDB::Error::Code code, const char* message) {
+    ecode_ = code;
+    emsg_ = message;
+  }
+  const std::vector<DB_data*>* targets_;
+  bool load_;
+  std::string raw_;
+  std::string packed_;
+  uint64_t rsiz_;
+  uint32_t crc_;
+  int64_t rnum_;
+  std::vector<RecordList> buckets_;
+  kc::PolyDB::Error::Code ecode_;
+  std::string emsg_;
+};
 
 
 /**
- * Create a new byte array.
+ * Worker thread which writes a slice of a batch of exported records.
  */
-static PyObject* newbytes(const char* ptr, size_t size) {
-  return PyBytes_FromStringAndSize(ptr, size);
-}
+class ExportWriter : public kc::Thread {
+public:
+  enum Transform {
+    TNONE,
+    TCOMPRESS,
+    TDECOMPRESS
+  };
+  ExportWriter() :
+    data_(NULL), db_(NULL), hub_(NULL), transform_(TNONE), keys_(NULL), values_(NULL),
+    begin_(0), end_(0), ecode_(kc::PolyDB::Error::SUCCESS), emsg_() {}
+  void set(DB_data* data, kc::PolyDB* db, UpdateHub* hub, Transform transform,
+           const StringVector* keys, const StringVector* values, size_t begin, size_t end) {
+    data_ = data;
+    db_ = db;
+    hub_ = hub;
+    transform_ = transform;
+    keys_ = keys;
+    values_ = values;
+    begin_ = begin;
+    end_ = end;
+  }
+  bool error(kc::PolyDB::Error::Code* codep, std::string* msgp) {
+    if (ecode_ == kc::PolyDB::Error::SUCCESS) return false;
+    *codep = ecode_;
+    *msgp = emsg_;
+    return true;
+  }
+  void write() {
+    for (size_t i = begin_; i < end_; i++) {
+      const std::string& key = (*keys_)[i];
+      const std::string& value = (*values_)[i];
+      char* zbuf = NULL;
+      size_t zsiz = 0;
+      if (transform_ == TCOMPRESS) {
+        zbuf = kc::ZLIB::compress(value.data(), value.size(), &zsiz);
+      } else if (transform_ == TDECOMPRESS) {
+        zbuf = kc::ZLIB::decompress(value.data(), value.size(), &zsiz);
+      }
+      if (transform_ != TNONE && !zbuf) {
+        ecode_ = kc::PolyDB::Error::BROKEN;
+        emsg_ = "transformation failed";
+        break;
+      }
+      const char* vbuf = zbuf ? zbuf : value.data();
+      size_t vsiz = zbuf ? zsiz : value.size();
+      bool rv = db_->set(key.data(), key.size(), vbuf, vsiz);
+      if (rv && hub_) hub_->notify(UpdateListener::USET, key.data(), key.size(), vbuf, vsiz);
+      delete[] zbuf;
+      if (!rv) {
+        kc::PolyDB::Error err = db_->error();
+        ecode_ = err.code();
+        emsg_ = err.message();
+        break;
+      }
+    }
+  }
+private:
+  void run() {
+    if (data_) {
+      db_export_native(data_, this);
+    } else {
+      write();
+    }
+  }
+  DB_data* data_;
+  kc::PolyDB* db_;
+  UpdateHub* hub_;
+  Transform transform_;
+  const StringVector* keys_;
+  const StringVector* values_;
+  size_t begin_;
+  size_t end_;
+  kc::PolyDB::Error::Code ecode_;
+  std::string emsg_;
+};
 
 
 /**
- * Convert a numeric parameter to an integer.
+ * Statistics of calls of the methods of a database.
  */
-static int64_t pyatoi(PyObject* pyobj) {
-  if (PyLong_Check(pyobj)) {
-    return PyLong_AsLong(pyobj);
-  } else if (PyFloat_Check(pyobj)) {
-    double dnum = PyFloat_AsDouble(pyobj);
-    if (kc::chknan(dnum)) {
-      return kc::INT64MIN;
-    } else if (kc::chkinf(dnum)) {
-      return dnum < 0 ? kc::INT64MIN : kc::INT64MAX;
+class CallStats {
+public:
+  enum Kind {
+    KNATIVE,
+    KLOCK,
+    KCONV,
+    KNUM
+  };
+  static const int32_t BUCKETNUM = 32;
+  struct Entry {
+    int64_t calls;
+    int64_t isiz;
+    int64_t osiz;
+    double times[KNUM];
+    int64_t hists[KNUM][BUCKETNUM];
+  };
+  struct NameLess {
+    bool operator()(const char* a, const char* b) const {
+      return std::strcmp(a, b) < 0;
     }
-    return dnum;
-  } else if (PyUnicode_Check(pyobj) || PyBytes_Check(pyobj)) {
-    SoftString numstr(pyobj);
-    const char* str = numstr.ptr();
-    double dnum = kc::atof(str);
-    if (kc::chknan(dnum)) {
-      return kc::INT64MIN;
-    } else if (kc::chkinf(dnum)) {
-      return dnum < 0 ? kc::INT64MIN : kc::INT64MAX;
+  };
+  typedef std::map<const char*, Entry, NameLess> EntryMap;
+  CallStats() : entries_(), stime_(kc::time()) {}
+  void record(const char* name, double native, double lock, double conv,
+              int64_t isiz, int64_t osiz) {
+    EntryMap::iterator it = entries_.find(name);
+    if (it == entries_.end()) {
+      Entry entry;
+      std::memset(&entry, 0, sizeof(entry));
+      it = entries_.insert(std::make_pair(name, entry)).first;
     }
-    return dnum;
-  } else if (pyobj != Py_None) {
-    int64_t inum = 0;
-    PyObject* pylong = PyNumber_Long(pyobj);
-    if (pylong) {
-      inum = PyLong_AsLong(pyobj);
-      Py_DECREF(pylong);
+    Entry* entry = &it->second;
+    entry->calls++;
+    entry->isiz += isiz;
+    entry->osiz += osiz;
+    double times[KNUM] = { native, lock, conv };
+    for (int32_t i = 0; i < KNUM; i++) {
+      if (times[i] < 0) times[i] = 0;
+      entry->times[i] += times[i];
+      entry->hists[i][bucket(times[i])]++;
     }
-    return inum;
   }
-  return 0;
-}
+  void reset() {
+    entries_.clear();
+    stime_ = kc::time();
+  }
+  const EntryMap& entries() const {
+    return entries_;
+  }
+  double elapsed() const {
+    return kc::time() - stime_;
+  }
+private:
+  static int32_t bucket(double sec) {
+    int64_t usec = sec * 1000000;
+    int32_t idx = 0;
+    while (usec > 0 && idx < BUCKETNUM - 1) {
+      usec >>= 1;
+      idx++;
+    }
+    return idx;
+  }
+  EntryMap entries_;
+  double stime_;
+};
 
 
 /**
- * Convert a numeric parameter to a real number.
+ * Profiler of waiting times for locks.
  */
-static double pyatof(PyObject* pyobj) {
-  if (PyLong_Check(pyobj)) {
-    return PyLong_AsLong(pyobj);
-  } else if (PyFloat_Check(pyobj)) {
-    return PyFloat_AsDouble(pyobj);
-  } else if (PyUnicode_Check(pyobj) || PyBytes_Check(pyobj)) {
-    SoftString numstr(pyobj);
-    const char* str = numstr.ptr();
-    return kc::atof(str);
-  } else if (pyobj != Py_None) {
-    double dnum = 0;
-    PyObject* pyfloat = PyNumber_Float(pyobj);
-    if (pyfloat) {
-      dnum = PyFloat_AsDouble(pyfloat);
-      Py_DECREF(pyfloat);
+class ContentionProfiler {
+public:
+  enum Kind {
+    KLOCK,
+    KGIL,
+    KNATIVE,
+    KNUM
+  };
+  struct Key {
+    unsigned long thid;
+    const char* name;
+    int32_t kind;
+  };
+  struct KeyLess {
+    bool operator()(const Key& a, const Key& b) const {
+      if (a.thid != b.thid) return a.thid < b.thid;
+      int32_t cmp = std::strcmp(a.name, b.name);
+      if (cmp != 0) return cmp < 0;
+      return a.kind < b.kind;
     }
-    return dnum;
+  };
+  struct Entry {
+    int64_t count;
+    double total;
+    double max;
+  };
+  typedef std::map<Key, Entry, KeyLess> EntryMap;
+  explicit ContentionProfiler(int64_t sample) : sample_(sample), calls_(0), entries_() {}
+  bool sample() {
+    return calls_++ % sample_ == 0;
+  }
+  void record(unsigned long thid, const char* name, Kind kind, double wait) {
+    if (wait < 0) wait = 0;
+    Key key = { thid, name, kind };
+    EntryMap::iterator it = entries_.find(key);
+    if (it == entries_.end()) {
+      Entry entry = { 0, 0, 0 };
+      it = entries_.insert(std::make_pair(key, entry)).first;
+    }
+    Entry* entry = &it->second;
+    entry->count++;
+    entry->total += wait;
+    if (wait > entry->max) entry->max = wait;
+  }
+  void reset() {
+    calls_ = 0;
+    entries_.clear();
+  }
+  const EntryMap& entries() const {
+    return entries_;
+  }
+  static const char* kindname(int32_t kind) {
+    switch (kind) {
+      case KLOCK: return "lock";
+      case KGIL: return "gil";
+      case KNATIVE: return "native";
+    }
+    return "unknown";
+  }
+  bool dump(const std::string& path, bool folded) const {
+    std::ofstream ofs(path.c_str(), std::ios_base::out | std::ios_base::trunc);
+    if (!ofs) return false;
+    std::vector<std::pair<double, EntryMap::const_iterator> > ranks;
+    double totals[KNUM] = { 0, 0, 0 };
+    int64_t counts[KNUM] = { 0, 0, 0 };
+    EntryMap::const_iterator it = entries_.begin();
+    EntryMap::const_iterator itend = entries_.end();
+    while (it != itend) {
+      ranks.push_back(std::make_pair(-it->second.total, it));
+      totals[it->first.kind] += it->second.total;
+      counts[it->first.kind] += it->second.count;
+      ++it;
+    }
+    std::sort(ranks.begin(), ranks.end(), RankLess());
+    if (folded) {
+      for (size_t i = 0; i < ranks.size(); i++) {
+        const Key& key = ranks[i].second->first;
+        const Entry& entry = ranks[i].second->second;
+        ofs << kc::strprintf("thread-%lu;%s;%s %lld\n", key.thid, key.name, kindname(key.kind),
+                             (long long)(entry.total * 1000000));
+      }
+    } else {
+      ofs << kc::strprintf("%-8s %12s %14s\n", "kind", "count", "total");
+      for (int32_t i = 0; i < KNUM; i++) {
+        ofs << kc::strprintf("%-8s %12lld %14.6f\n", kindname(i), (long long)counts[i],
+                             totals[i]);
+      }
+      ofs << "\n";
+      ofs << kc::strprintf("%-20s %-24s %-8s %12s %14s %14s %14s\n",
+                           "thread", "method", "kind", "count", "total", "average", "max");
+      for (size_t i = 0; i < ranks.size(); i++) {
+        const Key& key = ranks[i].second->first;
+        const Entry& entry = ranks[i].second->second;
+        ofs << kc::strprintf("%-20lu %-24s %-8s %12lld %14.6f %14.6f %14.6f\n",
+                             key.thid, key.name, kindname(key.kind), (long long)entry.count,
+                             entry.total, entry.total / entry.count, entry.max);
+      }
+    }
+    ofs.close();
+    return !ofs.fail();
   }
-  return 0;
-}
+private:
+  struct RankLess {
+    bool operator()(const std::pair<double, EntryMap::const_iterator>& a,
+                    const std::pair<double, EntryMap::const_iterator>& b) const {
+      return a.first < b.first;
+    }
+  };
+  int64_t sample_;
+  int64_t calls_;
+  EntryMap entries_;
+};
 
 
 /**
- * Convert an internal map to a Python map.
+ * Record of a slow operation.
  */
-static PyObject* maptopymap(const StringMap* map) {
-  PyObject* pymap = PyDict_New();
-  StringMap::const_iterator it = map->begin();
-  StringMap::const_iterator itend = map->end();
-  while (it != itend) {
-    PyObject* pyvalue = newstring(it->second.c_str());
-    PyDict_SetItemString(pymap, it->first.c_str(), pyvalue);
-    Py_DECREF(pyvalue);
-    it++;
-  }
-  return pymap;
-}
+struct SlowOperation {
+  double time;
+  const char* name;
+  std::string key;
+  bool keyed;
+  int64_t isiz;
+  int64_t osiz;
+  double lock;
+  double native;
+  double total;
+  unsigned long thid;
+};
 
 
 /**
- * Convert an internal vector to a Python list.
+ * Bounded log of slow operations.
  */
-static PyObject* vectortopylist(const StringVector* vec) {
-  size_t num = vec->size();
-  PyObject* pylist = PyList_New(num);
-  for (size_t i = 0; i < num; i++) {
-    PyObject* pystr = newstring((*vec)[i].c_str());
-    PyList_SET_ITEM(pylist, i, pystr);
+class SlowLog {
+public:
+  static const size_t KEYMAX = 64;
+  SlowLog(double threshold, size_t capacity, PyObject* pyhook) :
+    threshold_(threshold), capacity_(capacity), pyhook_(pyhook), entries_(), pending_(),
+    scheduled_(false), hooking_(false), hookthid_(0), dropped_(0) {
+    Py_INCREF(pyhook_);
+  }
+  ~SlowLog() {
+    Py_DECREF(pyhook_);
+  }
+  double threshold() const {
+    return threshold_;
+  }
+  bool record(const SlowOperation& entry) {
+    if (hooking_ && entry.thid == hookthid_) return false;
+    entries_.push_back(entry);
+    if (entries_.size() > capacity_) {
+      entries_.pop_front();
+      dropped_++;
+    }
+    if (pyhook_ == Py_None) return false;
+    pending_.push_back(entry);
+    if (pending_.size() > capacity_) pending_.pop_front();
+    if (scheduled_) return false;
+    scheduled_ = true;
+    return true;
   }
-  return pylist;
-}
+  void unschedule() {
+    scheduled_ = false;
+  }
+  const std::deque<SlowOperation>& entries() const {
+    return entries_;
+  }
+  void reset() {
+    entries_.clear();
+    dropped_ = 0;
+  }
+  int64_t dropped() const {
+    return dropped_;
+  }
+  PyObject* hook() const {
+    return pyhook_;
+  }
+  void take_pending(std::deque<SlowOperation>* entries) {
+    entries->swap(pending_);
+    pending_.clear();
+    scheduled_ = false;
+  }
+  void begin_hook(unsigned long thid) {
+    hooking_ = true;
+    hookthid_ = thid;
+  }
+  void end_hook() {
+    hooking_ = false;
+  }
+private:
+  double threshold_;
+  size_t capacity_;
+  PyObject* pyhook_;
+  std::deque<SlowOperation> entries_;
+  std::deque<SlowOperation> pending_;
+  bool scheduled_;
+  bool hooking_;
+  unsigned long hookthid_;
+  int64_t dropped_;
+};
 
 
 /**
- * Pass the current execution state.
+ * Internal data of an error object.
  */
-static void threadyield() {
-  PyObject* pyrv = PyObject_CallMethod(mod_time, (char*)"sleep", (char*)"(I)", 0);
-  if (pyrv) Py_DECREF(pyrv);
-}
+struct Error_data {
+  PyException_HEAD
+  PyObject* pycode;
+  PyObject* pymessage;
+};
 
 
 /**
- * Define objects of the module.
+ * Internal data of a visitor object.
  */
-static bool define_module() {
-  static PyModuleDef module_def = { PyModuleDef_HEAD_INIT };
-  size_t zoff = offsetof(PyModuleDef, m_name);
-  std::memset((char*)&module_def + zoff, 0, sizeof(module_def) - zoff);
-  module_def.m_name = "kyotocabinet";
-  module_def.m_doc = "a straightforward implementation of DBM";
-  module_def.m_size = -1;
-  static PyMethodDef method_table[] = {
-    { "conv_bytes", (PyCFunction)kc_conv_bytes, METH_VARARGS,
-      "Convert any object to a byte array." },
-    { "atoi", (PyCFunction)kc_atoi, METH_VARARGS,
-      "Convert a string to an integer." },
-    { "atoix", (PyCFunction)kc_atoix, METH_VARARGS,
-      "Convert a string with a metric prefix to an integer." },
-    { "atof", (PyCFunction)kc_atof, METH_VARARGS,
-      "Convert a string to a real number." },
-    { "hash_murmur", (PyCFunction)kc_hash_murmur, METH_VARARGS,
-      "Get the hash value of a string by MurMur hashing." },
-    { "hash_fnv", (PyCFunction)kc_hash_fnv, METH_VARARGS,
-      "Get the hash value of a string by FNV hashing." },
-    { "levdist", (PyCFunction)kc_levdist, METH_VARARGS,
-      "Calculate the levenshtein distance of two strings." },
-    { NULL, NULL, 0, NULL }
-  };
-  module_def.m_methods = method_table;
-  mod_kc = PyModule_Create(&module_def);
-  if (PyModule_AddStringConstant(mod_kc, "VERSION", kc::VERSION) != 0) return false;
-  mod_th = PyImport_ImportModule("threading");
-  mod_time = PyImport_ImportModule("time");
-  if (!mod_th) return false;
-  return true;
-}
+struct Visitor_data {
+  PyObject_HEAD
+};
 
 
 /**
- * Implementation of conv_bytes.
+ * Internal data of a file processor object.
  */
-static PyObject* kc_conv_bytes(PyObject* pyself, PyObject* pyargs) {
-  int32_t argc = PyTuple_Size(pyargs);
-  if (argc != 1) {
-    throwinvarg();
-    return NULL;
-  }
-  PyObject* pyobj = PyTuple_GetItem(pyargs, 0);
-  SoftString str(pyobj);
-  return PyBytes_FromStringAndSize(str.ptr(), str.size());
-}
+struct FileProcessor_data {
+  PyObject_HEAD
+};
 
 
 /**
- * Implementation of atoi.
+ * Internal data of a cursor object.
  */
-static PyObject* kc_atoi(PyObject* pyself, PyObject* pyargs) {
-  int32_t argc = PyTuple_Size(pyargs);
-  if (argc != 1) {
-    throwinvarg();
-    return NULL;
-  }
-  PyObject* pystr = PyTuple_GetItem(pyargs, 0);
-  SoftString str(pystr);
-  return PyLong_FromLongLong(kc::atoi(str.ptr()));
-}
+struct Cursor_data {
+  PyObject_HEAD
+  SoftCursor* cur;
+  PyObject* pydb;
+};
 
 
 /**
- * Implementation of atoix.
+ * Internal data of a blob object.
  */
-static PyObject* kc_atoix(PyObject* pyself, PyObject* pyargs) {
-  int32_t argc = PyTuple_Size(pyargs);
-  if (argc != 1) {
-    throwinvarg();
-    return NULL;
-  }
-  PyObject* pystr = PyTuple_GetItem(pyargs, 0);
-  SoftString str(pystr);
-  return PyLong_FromLongLong(kc::atoix(str.ptr()));
-}
+struct Blob_data {
+  PyObject_HEAD
+  SoftBlob* blob;
+  PyObject* pydb;
+};
 
 
 /**
- * Implementation of atof.
+ * Internal data of a view object.
  */
-static PyObject* kc_atof(PyObject* pyself, PyObject* pyargs) {
-  int32_t argc = PyTuple_Size(pyargs);
-  if (argc != 1) {
-    throwinvarg();
-    return NULL;
-  }
-  PyObject* pystr = PyTuple_GetItem(pyargs, 0);
-  SoftString str(pystr);
-  return PyFloat_FromDouble(kc::atof(str.ptr()));
-}
+struct View_data {
+  PyObject_HEAD
+  PyObject* pydb;
+  int32_t kind;
+};
 
 
 /**
- * Implementation of hash_murmur.
+ * Internal data of a view iterator object.
  */
-static PyObject* kc_hash_murmur(PyObject* pyself, PyObject* pyargs) {
-  int32_t argc = PyTuple_Size(pyargs);
-  if (argc != 1) {
-    throwinvarg();
-    return NULL;
-  }
-  PyObject* pystr = PyTuple_GetItem(pyargs, 0);
-  SoftString str(pystr);
-  return PyLong_FromUnsignedLongLong(kc::hashmurmur(str.ptr(), str.size()));
-}
+struct ViewIterator_data {
+  PyObject_HEAD
+  PyObject* pycur;
+  int32_t kind;
+  std::deque<std::pair<std::string, std::string> >* recs;
+};
 
 
 /**
- * Implementation of hash_fnv.
+ * Pending operation of a write batch.
  */
-static PyObject* kc_hash_fnv(PyObject* pyself, PyObject* pyargs) {
-  int32_t argc = PyTuple_Size(pyargs);
-  if (argc != 1) {
-    throwinvarg();
-    return NULL;
-  }
-  PyObject* pystr = PyTuple_GetItem(pyargs, 0);
-  SoftString str(pystr);
-  return PyLong_FromUnsignedLongLong(kc::hashfnv(str.ptr(), str.size()));
-}
+struct BatchOperation {
+  int32_t type;
+  std::string value;
+  int64_t num;
+  int64_t orig;
+};
 
 
 /**
- * Implementation of levdist.
+ * Internal data of a write batch object.
  */
-static PyObject* kc_levdist(PyObject* pyself, PyObject* pyargs) {
-  int32_t argc = PyTuple_Size(pyargs);
-  if (argc < 2) {
-    throwinvarg();
-    return NULL;
-  }
-  PyObject* pya = PyTuple_GetItem(pyargs, 0);
-  PyObject* pyb = PyTuple_GetItem(pyargs, 1);
-  PyObject* pyutf = Py_None;
-  if (argc > 2) pyutf = PyTuple_GetItem(pyargs, 2);
-  SoftString astr(pya);
-  const char* abuf = astr.ptr();
-  size_t asiz = astr.size();
-  SoftString bstr(pyb);
-  const char* bbuf = bstr.ptr();
-  size_t bsiz = bstr.size();
-  bool utf = PyObject_IsTrue(pyutf);
-  size_t dist;
-  if (utf) {
-    uint32_t astack[128];
-    uint32_t* aary = asiz > sizeof(astack) / sizeof(*astack) ? new uint32_t[asiz] : astack;
-    size_t anum;
-    kc::strutftoucs(abuf, asiz, aary, &anum);
-    uint32_t bstack[128];
-    uint32_t* bary = bsiz > sizeof(bstack) / sizeof(*bstack) ? new uint32_t[bsiz] : bstack;
-    size_t bnum;
-    kc::strutftoucs(bbuf, bsiz, bary, &bnum);
-    dist = kc::strucsdist(aary, anum, bary, bnum);
-    if (bary != bstack) delete[] bary;
-    if (aary != astack) delete[] aary;
-  } else {
-    dist = kc::memdist(abuf, asiz, bbuf, bsiz);
-  }
-  return PyLong_FromUnsignedLongLong(dist);
-}
+struct WriteBatch_data {
+  PyObject_HEAD
+  PyObject* pydb;
+  BatchMap* ops;
+  int64_t opnum;
+  int64_t bytes;
+  double stime;
+  int64_t max_ops;
+  int64_t max_bytes;
+  double max_delay;
+  bool transactional;
+};
 
 
 /**
- * Define objects of the Error class.
+ * Counters of operations of a database object.
  */
-static bool define_err() {
-  static PyTypeObject type_err = { PyVarObject_HEAD_INIT(NULL, 0) };
-  size_t zoff = offsetof(PyTypeObject, tp_name);
-  std::memset((char*)&type_err + zoff, 0, sizeof(type_err) - zoff);
-  type_err.tp_name = "kyotocabinet.Error";
-  type_err.tp_basicsize = sizeof(Error_data);
-  type_err.tp_itemsize = 0;
-  type_err.tp_flags = Py_TPFLAGS_DEFAULT | Py_TPFLAGS_BASETYPE;
-  type_err.tp_doc = "Error data.";
-  type_err.tp_new = err_new;
-  type_err.tp_dealloc = (destructor)err_dealloc;
-  type_err.tp_init = (initproc)err_init;
-  type_err.tp_repr = (unaryfunc)err_repr;
-  type_err.tp_str = (unaryfunc)err_str;
-  type_err.tp_richcompare = (richcmpfunc)err_richcmp;
-  static PyMethodDef err_methods[] = {
-    { "set", (PyCFunction)err_set, METH_VARARGS,
-      "Set the error information." },
-    { "code", (PyCFunction)err_code, METH_NOARGS,
-      "Get the error code." },
-    { "name", (PyCFunction)err_name, METH_NOARGS,
-      "Get the readable string of the code." },
-    { "message", (PyCFunction)err_message, METH_NOARGS,
-      "Get the supplement message." },
-    { NULL, NULL, 0, NULL }
-  };
-  type_err.tp_methods = err_methods;
-  type_err.tp_base = (PyTypeObject*)PyExc_RuntimeError;
-  if (PyType_Ready(&type_err) != 0) return false;
-  cls_err = (PyObject*)&type_err;
-  for (size_t i = 0; i < sizeof(cls_err_children) / sizeof(*cls_err_children); i++) {
-    cls_err_children[i] = NULL;
-  }
-  if (!err_define_child("SUCCESS", kc::PolyDB::Error::SUCCESS)) return false;
-  if (!err_define_child("NOIMPL", kc::PolyDB::Error::NOIMPL)) return false;
-  if (!err_define_child("INVALID", kc::PolyDB::Error::INVALID)) return false;
-  if (!err_define_child("NOREPOS", kc::PolyDB::Error::NOREPOS)) return false;
-  if (!err_define_child("NOPERM", kc::PolyDB::Error::NOPERM)) return false;
-  if (!err_define_child("BROKEN", kc::PolyDB::Error::BROKEN)) return false;
-  if (!err_define_child("DUPREC", kc::PolyDB::Error::DUPREC)) return false;
-  if (!err_define_child("NOREC", kc::PolyDB::Error::NOREC)) return false;
-  if (!err_define_child("LOGIC", kc::PolyDB::Error::LOGIC)) return false;
-  if (!err_define_child("SYSTEM", kc::PolyDB::Error::SYSTEM)) return false;
-  if (!err_define_child("MISC", kc::PolyDB::Error::MISC)) return false;
-  Py_INCREF(cls_err);
-  if (PyModule_AddObject(mod_kc, "Error", cls_err) != 0) return false;
-  return true;
-}
+struct OpCounters {
+  int64_t calls;
+  int64_t hits;
+  int64_t misses;
+  int64_t writes;
+  int64_t removes;
+};
 
 
 /**
- * Define the constant and the subclass of an error code.
+ * Internal data of a database object.
  */
-static bool err_define_child(const char* name, uint32_t code) {
-  if (!setconstuint32(cls_err, name, code)) return false;
-  char xname[kc::NUMBUFSIZ];
-  std::sprintf(xname, "X%s", name);
-  char fname[kc::NUMBUFSIZ*2];
-  std::sprintf(fname, "kyotocabinet.Error.%s", xname);
-  PyObject* pyxname = PyUnicode_FromString(xname);
-  PyObject* pyvalue = PyErr_NewException(fname, cls_err, NULL);
-  cls_err_children[code] = pyvalue;
-  return PyObject_GenericSetAttr(cls_err, pyxname, pyvalue) == 0;
-}
+struct DB_data {
+  PyObject_HEAD
+  kc::PolyDB* db;
+  uint32_t exbits;
+  PyObject* pylock;
+  StringMap* tuning;
+  bool tranopen;
+  unsigned long tranthid;
+  UpdateHub* hub;
+  FuzzyIndex* fuzzy;
+  ExpiryTable* expiry;
+  ChangeJournal* journal;
+  ChangeFeed* feed;
+  Defragmenter* defrag;
+  GroupCommitter* committer;
+  SyncScheduler* syncer;
+  CallStats* stats;
+  ContentionProfiler* contention;
+  SlowLog* slowlog;
+  PyObject* blobstore;
+  OpCounters counters;
+};
 
 
 /**
- * Implementation of new.
+ * Internal data of an indexed database object.
  */
-static PyObject* err_new(PyTypeObject* pytype, PyObject* pyargs, PyObject* pykwds) {
-  Error_data* data = (Error_data*)pytype->tp_alloc(pytype, 0);
-  if (!data) return NULL;
-  data->pycode = PyLong_FromUnsignedLong(kc::PolyDB::Error::SUCCESS);
-  data->pymessage = PyUnicode_FromString("error");
-  return (PyObject*)data;
-}
+struct IndexedDB_data {
+  PyObject_HEAD
+  PyObject* pydb;
+  PyObject* pyindexes;
+};
 
 
 /**
- * Implementation of dealloc.
+ * Internal data of a tree builder object.
  */
-static void err_dealloc(Error_data* data) {
-  Py_DECREF(data->pymessage);
-  Py_DECREF(data->pycode);
-  Py_CLEAR(data->dict);
-  Py_CLEAR(data->args);
-  Py_CLEAR(data->traceback);
-  Py_CLEAR(data->cause);
-  Py_CLEAR(data->context);
-  Py_TYPE(data)->tp_free((PyObject*)data);
-}
+struct TreeBuilder_data {
+  PyObject_HEAD
+  ExternalSorter* sorter;
+  PyObject* pydb;
+};
 
 
 /**
- * Implementation of init.
+ * Locking device of the database.
  */
-static int err_init(Error_data* data, PyObject* pyargs, PyObject* pykwds) {
-  int32_t argc = PyTuple_Size(pyargs);
-  if (argc > 2) {
-    throwinvarg();
-    return -1;
-  }
-  if (argc > 1) {
-    PyObject* pycode = PyTuple_GetItem(pyargs, 0);
-    PyObject* pymessage = PyTuple_GetItem(pyargs, 1);
-    if (PyLong_Check(pycode) && PyUnicode_Check(pymessage)) {
-      Py_DECREF(data->pycode);
-      Py_DECREF(data->pymessage);
-      Py_INCREF(pycode);
-      data->pycode = pycode;
-      Py_INCREF(pymessage);
-      data->pymessage = pymessage;
+class NativeFunction {
+public:
+  NativeFunction(DB_data* data, const char* name = NULL) :
+    data_(data), thstate_(NULL),
+    name_(data->stats || data->contention || data->slowlog ? name : NULL),
+    stime_(0), atime_(0), etime_(0), ctime_(0), isiz_(0), osiz_(0), kbuf_(NULL), ksiz_(0),
+    done_(false) {
+    if (name) data_->counters.calls++;
+    if (name_) stime_ = kc::time();
+    PyObject* pylock = data_->pylock;
+    if (pylock == Py_None) {
+      thstate_ = PyEval_SaveThread();
+    } else {
+      PyObject* pyrv = PyObject_CallMethod(pylock, (char*)"acquire", NULL);
+      if (pyrv) Py_DECREF(pyrv);
     }
-  } else if (argc > 0) {
-    PyObject* pyexpr = PyTuple_GetItem(pyargs, 0);
-    if (PyUnicode_Check(pyexpr)) {
-      pyexpr = PyUnicode_AsUTF8String(pyexpr);
-      const char* expr = PyBytes_AS_STRING(pyexpr);
-      uint32_t code = kc::atoi(expr);
-      const char* rp = std::strchr(expr, ':');
-      if (rp) expr = rp + 1;
-      while (*expr == ' ') {
-        expr++;
+    if (name_) atime_ = kc::time();
+  }
+  ~NativeFunction() {
+    if (!name_ || !done_) return;
+    double now = kc::time();
+    CallStats* stats = data_->stats;
+    if (stats) stats->record(name_, etime_ - atime_, atime_ - stime_ + ctime_ - etime_,
+                             now - ctime_, isiz_, osiz_);
+    ContentionProfiler* prof = data_->contention;
+    if (prof && prof->sample()) {
+      unsigned long thid = PyThread_get_thread_ident();
+      if (data_->pylock == Py_None) {
+        prof->record(thid, name_, ContentionProfiler::KGIL, ctime_ - etime_);
+      } else {
+        prof->record(thid, name_, ContentionProfiler::KLOCK, atime_ - stime_);
+      }
+      prof->record(thid, name_, ContentionProfiler::KNATIVE, etime_ - atime_);
+    }
+    SlowLog* slowlog = data_->slowlog;
+    if (slowlog && now - stime_ >= slowlog->threshold()) {
+      SlowOperation op;
+      op.time = stime_;
+      op.name = name_;
+      op.keyed = kbuf_ != NULL;
+      if (kbuf_) op.key.assign(kbuf_, ksiz_ < SlowLog::KEYMAX ? ksiz_ : SlowLog::KEYMAX);
+      op.isiz = isiz_;
+      op.osiz = osiz_;
+      op.lock = atime_ - stime_ + ctime_ - etime_;
+      op.native = etime_ - atime_;
+      op.total = now - stime_;
+      op.thid = PyThread_get_thread_ident();
+      if (slowlog->record(op)) {
+        Py_INCREF((PyObject*)data_);
+        if (Py_AddPendingCall(db_slow_hook, data_) != 0) {
+          slowlog->unschedule();
+          Py_DECREF((PyObject*)data_);
+        }
       }
-      Py_DECREF(data->pycode);
-      Py_DECREF(data->pymessage);
-      data->pycode = PyLong_FromLongLong(code);
-      data->pymessage = PyUnicode_FromString(expr);
-      Py_DECREF(pyexpr);
     }
   }
-  return 0;
-}
-
-
-/**
- * Implementation of repr.
- */
-static PyObject* err_repr(Error_data* data) {
-  uint32_t code = (uint32_t)PyLong_AsLong(data->pycode);
-  const char* name = kc::PolyDB::Error::codename((kc::PolyDB::Error::Code)code);
-  return PyUnicode_FromFormat("<kyotocabinet.Error: %s: %U>", name, data->pymessage);
-}
+  void cleanup() {
+    if (name_) etime_ = kc::time();
+    PyObject* pylock = data_->pylock;
+    if (pylock == Py_None) {
+      if (thstate_) PyEval_RestoreThread(thstate_);
+    } else {
+      PyObject* pyrv = PyObject_CallMethod(pylock, (char*)"release", NULL);
+      if (pyrv) Py_DECREF(pyrv);
+    }
+    if (name_) {
+      ctime_ = kc::time();
+      done_ = true;
+    }
+  }
+  void transfer(int64_t isiz, int64_t osiz) {
+    isiz_ += isiz;
+    osiz_ += osiz;
+  }
+  void set_key(const char* kbuf, size_t ksiz) {
+    kbuf_ = kbuf;
+    ksiz_ = ksiz;
+  }
+private:
+  DB_data* data_;
+  PyThreadState* thstate_;
+  const char* name_;
+  double stime_;
+  double atime_;
+  double etime_;
+  double ctime_;
+  int64_t isiz_;
+  int64_t osiz_;
+  const char* kbuf_;
+  size_t ksiz_;
+  bool done_;
+};
 
 
 /**
- * Implementation of str.
+ * Entry point of the library.
  */
-static PyObject* err_str(Error_data* data) {
-  uint32_t code = (uint32_t)PyLong_AsLong(data->pycode);
-  const char* name = kc::PolyDB::Error::codename((kc::PolyDB::Error::Code)code);
-  return PyUnicode_FromFormat("%s: %U", name, data->pymessage);
+PyMODINIT_FUNC PyInit_kyotocabinet(void) {
+  if (!define_module()) return NULL;
+  if (!define_err()) return NULL;
+  if (!define_vis()) return NULL;
+  if (!define_fproc()) return NULL;
+  if (!define_cur()) return NULL;
+  if (!define_blob()) return NULL;
+  if (!define_view()) return NULL;
+  if (!define_wb()) return NULL;
+  if (!define_db()) return NULL;
+  if (!define_idb()) return NULL;
+  if (!define_tb()) return NULL;
+  return mod_kc;
 }
 
 
 /**
- * Implementation of richcmp.
+ * Set a constant of unsigned integer.
  */
-static PyObject* err_richcmp(Error_data* data, PyObject* pyright, int op) {
-  bool rv;
-  uint32_t code = (uint32_t)PyLong_AsLong(data->pycode);
-  uint32_t rcode;
-  if (PyObject_IsInstance(pyright, cls_err)) {
-    Error_data* rdata = (Error_data*)pyright;
-    rcode = (uint32_t)PyLong_AsLong(rdata->pycode);
-  } else if (PyLong_Check(pyright)) {
-    rcode = (uint32_t)PyLong_AsLong(pyright);
-  } else {
-    rcode = kc::INT32MAX;
-  }
-  switch (op) {
-    case Py_LT: rv = code < rcode; break;
-    case Py_LE: rv = code <= rcode; break;
-    case Py_EQ: rv = code == rcode; break;
-    case Py_NE: rv = code != rcode; break;
-    case Py_GT: rv = code > rcode; break;
-    case Py_GE: rv = code >= rcode; break;
-    default: rv = false; break;
-  }
-  if (rv) Py_RETURN_TRUE;
-  Py_RETURN_FALSE;
+static bool setconstuint32(PyObject* pyobj, const char* name, uint32_t value) {
+  PyObject* pyname = PyUnicode_FromString(name);
+  PyObject* pyvalue = PyLong_FromUnsignedLong(value);
+  return PyObject_GenericSetAttr(pyobj, pyname, pyvalue) == 0;
 }
 
 
 /**
- * Implementation of set.
+ * Throw a runtime error.
  */
-static PyObject* err_set(Error_data* data, PyObject* pyargs) {
-  int32_t argc = PyTuple_Size(pyargs);
-  if (argc != 2) {
-    throwinvarg();
-    return NULL;
-  }
-  PyObject* pycode = PyTuple_GetItem(pyargs, 0);
-  PyObject* pymessage = PyTuple_GetItem(pyargs, 1);
-  if (!PyLong_Check(pycode) && !PyUnicode_Check(pymessage)) {
-    throwinvarg();
-    return NULL;
-  }
-  Py_DECREF(data->pycode);
-  Py_DECREF(data->pymessage);
-  Py_INCREF(pycode);
-  data->pycode = pycode;
-  Py_INCREF(pymessage);
-  data->pymessage = pymessage;
-  Py_RETURN_NONE;
+static void throwruntime(const char* message) {
+  PyErr_SetString(PyExc_RuntimeError, message);
 }
 
 
 /**
- * Implementation of code.
+ * throw the invalid argument error.
  */
-static PyObject* err_code(Error_data* data) {
-  Py_INCREF(data->pycode);
-  return data->pycode;
+static void throwinvarg() {
+  PyErr_SetString(PyExc_TypeError, "invalid arguments");
 }
 
 
 /**
- * Implementation of name.
+ * Create a new string.
  */
-static PyObject* err_name(Error_data* data) {
-  uint32_t code = PyLong_AsLong(data->pycode);
-  const char* name = kc::PolyDB::Error::codename((kc::PolyDB::Error::Code)code);
-  return newstring(name);
+static PyObject* newstring(const char* str) {
+  return PyUnicode_DecodeUTF8(str, std::strlen(str), "ignore");
 }
 
 
 /**
- * Implementation of message.
+ * Create a new byte array.
  */
-static PyObject* err_message(Error_data* data) {
-  Py_INCREF(data->pymessage);
-  return data->pymessage;
+static PyObject* newbytes(const char* ptr, size_t size) {
+  return PyBytes_FromStringAndSize(ptr, size);
 }
 
 
 /**
- * Define objects of the Visitor class.
+ * Convert a numeric parameter to an integer.
  */
-static bool define_vis() {
-  static PyTypeObject type_vis = { PyVarObject_HEAD_INIT(NULL, 0) };
-  size_t zoff = offsetof(PyTypeObject, tp_name);
-  std::memset((char*)&type_vis + zoff, 0, sizeof(type_vis) - zoff);
-  type_vis.tp_name = "kyotocabinet.Visitor";
-  type_vis.tp_basicsize = sizeof(Visitor_data);
-  type_vis.tp_itemsize = 0;
-  type_vis.tp_flags = Py_TPFLAGS_DEFAULT | Py_TPFLAGS_BASETYPE;
-  type_vis.tp_doc = "Interface to access a record.";
-  type_vis.tp_new = vis_new;
-  type_vis.tp_dealloc = (destructor)vis_dealloc;
-  type_vis.tp_init = (initproc)vis_init;
-  static PyMethodDef vis_methods[] = {
-    { "visit_full", (PyCFunction)vis_visit_full, METH_VARARGS,
-      "Visit a record.", },
-    { "visit_empty", (PyCFunction)vis_visit_empty, METH_VARARGS,
-      "Visit a empty record space." },
-    { NULL, NULL, 0, NULL }
-  };
-  type_vis.tp_methods = vis_methods;
-  if (PyType_Ready(&type_vis) != 0) return false;
-  cls_vis = (PyObject*)&type_vis;
-  PyObject* pyname = PyUnicode_FromString("NOP");
-  obj_vis_nop = PyUnicode_FromString("[NOP]");
-  if (PyObject_GenericSetAttr(cls_vis, pyname, obj_vis_nop) != 0) return false;
-  pyname = PyUnicode_FromString("REMOVE");
-  obj_vis_remove = PyUnicode_FromString("[REMOVE]");
-  if (PyObject_GenericSetAttr(cls_vis, pyname, obj_vis_remove) != 0) return false;
-  Py_INCREF(cls_vis);
-  if (PyModule_AddObject(mod_kc, "Visitor", cls_vis) != 0) return false;
-  return true;
+static int64_t pyatoi(PyObject* pyobj) {
+  if (PyLong_Check(pyobj)) {
+    return PyLong_AsLong(pyobj);
+  } else if (PyFloat_Check(pyobj)) {
+    double dnum = PyFloat_AsDouble(pyobj);
+    if (kc::chknan(dnum)) {
+      return kc::INT64MIN;
+    } else if (kc::chkinf(dnum)) {
+      return dnum < 0 ? kc::INT64MIN : kc::INT64MAX;
+    }
+    return dnum;
+  } else if (PyUnicode_Check(pyobj) || PyBytes_Check(pyobj)) {
+    SoftString numstr(pyobj);
+    const char* str = numstr.ptr();
+    double dnum = kc::atof(str);
+    if (kc::chknan(dnum)) {
+      return kc::INT64MIN;
+    } else if (kc::chkinf(dnum)) {
+      return dnum < 0 ? kc::INT64MIN : kc::INT64MAX;
+    }
+    return dnum;
+  } else if (pyobj != Py_None) {
+    int64_t inum = 0;
+    PyObject* pylong = PyNumber_Long(pyobj);
+    if (pylong) {
+      inum = PyLong_AsLong(pyobj);
+      Py_DECREF(pylong);
+    }
+    return inum;
+  }
+  return 0;
 }
 
 
 /**
- * Implementation of new.
+ * Convert a numeric parameter to a real number.
  */
-static PyObject* vis_new(PyTypeObject* pytype, PyObject* pyargs, PyObject* pykwds) {
-  Visitor_data* data = (Visitor_data*)pytype->tp_alloc(pytype, 0);
-  if (!data) return NULL;
-  return (PyObject*)data;
+static double pyatof(PyObject* pyobj) {
+  if (PyLong_Check(pyobj)) {
+    return PyLong_AsLong(pyobj);
+  } else if (PyFloat_Check(pyobj)) {
+    return PyFloat_AsDouble(pyobj);
+  } else if (PyUnicode_Check(pyobj) || PyBytes_Check(pyobj)) {
+    SoftString numstr(pyobj);
+    const char* str = numstr.ptr();
+    return kc::atof(str);
+  } else if (pyobj != Py_None) {
+    double dnum = 0;
+    PyObject* pyfloat = PyNumber_Float(pyobj);
+    if (pyfloat) {
+      dnum = PyFloat_AsDouble(pyfloat);
+      Py_DECREF(pyfloat);
+    }
+    return dnum;
+  }
+  return 0;
 }
 
 
 /**
- * Implementation of dealloc.
+ * Convert an internal map to a Python map.
  */
-static void vis_dealloc(Visitor_data* data) {
-  Py_TYPE(data)->tp_free((PyObject*)data);
+static PyObject* maptopymap(const StringMap* map) {
+  PyObject* pymap = PyDict_New();
+  StringMap::const_iterator it = map->begin();
+  StringMap::const_iterator itend = map->end();
+  while (it != itend) {
+    PyObject* pyvalue = newstring(it->second.c_str());
+    PyDict_SetItemString(pymap, it->first.c_str(), pyvalue);
+    Py_DECREF(pyvalue);
+    it++;
+  }
+  return pymap;
 }
 
 
 /**
- * Implementation of init.
+ * Convert an internal vector to a Python list.
  */
-static int vis_init(Visitor_data* data, PyObject* pyargs, PyObject* pykwds) {
-  int32_t argc = PyTuple_Size(pyargs);
-  if (argc != 0) {
-    throwinvarg();
-    return -1;
+static PyObject* vectortopylist(const StringVector* vec) {
+  size_t num = vec->size();
+  PyObject* pylist = PyList_New(num);
+  for (size_t i = 0; i < num; i++) {
+    PyObject* pystr = newstring((*vec)[i].c_str());
+    PyList_SET_ITEM(pylist, i, pystr);
   }
-  return 0;
+  return pylist;
 }
 
 
 /**
- * Implementation of visit_full.
+ * Check whether every keyword argument is known.
  */
-static PyObject* vis_visit_full(Visitor_data* data, PyObject* pyargs) {
-  int32_t argc = PyTuple_Size(pyargs);
-  if (argc != 2) {
-    throwinvarg();
-    return NULL;
+static bool checkkwargs(PyObject* pykwds, const char** names) {
+  if (!pykwds) return true;
+  if (!PyDict_Check(pykwds)) return false;
+  PyObject* pykey;
+  PyObject* pyvalue;
+  Py_ssize_t pos = 0;
+  while (PyDict_Next(pykwds, &pos, &pykey, &pyvalue)) {
+    SoftString key(pykey);
+    bool hit = false;
+    for (const char** np = names; *np; np++) {
+      if (!std::strcmp(key.ptr(), *np)) {
+        hit = true;
+        break;
+      }
+    }
+    if (!hit) return false;
   }
-  Py_INCREF(obj_vis_nop);
-  return obj_vis_nop;
+  return true;
 }
 
 
 /**
- * Implementation of visit_empty.
+ * Get a keyword argument, or None if it is not specified.
  */
-static PyObject* vis_visit_empty(Visitor_data* data, PyObject* pyargs) {
-  int32_t argc = PyTuple_Size(pyargs);
-  if (argc != 1) {
-    throwinvarg();
-    return NULL;
-  }
-  Py_INCREF(obj_vis_nop);
-  return obj_vis_nop;
+static PyObject* getkwarg(PyObject* pykwds, const char* name) {
+  if (!pykwds) return Py_None;
+  PyObject* pyvalue = PyDict_GetItemString(pykwds, name);
+  return pyvalue ? pyvalue : Py_None;
 }
 
 
 /**
- * Define objects of the FileProcessor class.
+ * Pass the current execution state.
  */
-static bool define_fproc() {
-  static PyTypeObject type_fproc = { PyVarObject_HEAD_INIT(NULL, 0) };
-  size_t zoff = offsetof(PyTypeObject, tp_name);
-  std::memset((char*)&type_fproc + zoff, 0, sizeof(type_fproc) - zoff);
-  type_fproc.tp_name = "kyotocabinet.FileProcessor";
-  type_fproc.tp_basicsize = sizeof(FileProcessor_data);
-  type_fproc.tp_itemsize = 0;
-  type_fproc.tp_flags = Py_TPFLAGS_DEFAULT | Py_TPFLAGS_BASETYPE;
-  type_fproc.tp_doc = "Interface to process the database file.";
-  type_fproc.tp_new = fproc_new;
-  type_fproc.tp_dealloc = (destructor)fproc_dealloc;
-  type_fproc.tp_init = (initproc)fproc_init;
-  static PyMethodDef fproc_methods[] = {
-    { "process", (PyCFunction)fproc_process, METH_VARARGS,
-      "Process the database file.", },
+static void threadyield() {
+  PyObject* pyrv = PyObject_CallMethod(mod_time, (char*)"sleep", (char*)"(I)", 0);
+  if (pyrv) Py_DECREF(pyrv);
+}
+
+
+/**
+ * Define objects of the module.
+ */
+static bool define_module() {
+  static PyModuleDef module_def = { PyModuleDef_HEAD_INIT };
+  size_t zoff = offsetof(PyModuleDef, m_name);
+  std::memset((char*)&module_def + zoff, 0, sizeof(module_def) - zoff);
+  module_def.m_name = "kyotocabinet";
+  module_def.m_doc = "a straightforward implementation of DBM";
+  module_def.m_size = -1;
+  static PyMethodDef method_table[] = {
+    { "conv_bytes", (PyCFunction)kc_conv_bytes, METH_VARARGS,
+      "Convert any object to a byte array." },
+    { "atoi", (PyCFunction)kc_atoi, METH_VARARGS,
+      "Convert a string to an integer." },
+    { "atoix", (PyCFunction)kc_atoix, METH_VARARGS,
+      "Convert a string with a metric prefix to an integer." },
+    { "atof", (PyCFunction)kc_atof, METH_VARARGS,
+      "Convert a string to a real number." },
+    { "hash_murmur", (PyCFunction)kc_hash_murmur, METH_VARARGS,
+      "Get the hash value of a string by MurMur hashing." },
+    { "hash_fnv", (PyCFunction)kc_hash_fnv, METH_VARARGS,
+      "Get the hash value of a string by FNV hashing." },
+    { "levdist", (PyCFunction)kc_levdist, METH_VARARGS,
+      "Calculate the levenshtein distance of two strings." },
+    { "hash_murmur_many", (PyCFunction)kc_hash_murmur_many, METH_VARARGS,
+      "Get the hash values of strings by MurMur hashing." },
+    { "levdist_many", (PyCFunction)kc_levdist_many, METH_VARARGS,
+      "Calculate the levenshtein distances of a string to candidates." },
+    { "memory_usage", (PyCFunction)kc_memory_usage, METH_NOARGS,
+      "Get the memory usage of the process." },
+    { "prometheus_text", (PyCFunction)kc_prometheus_text, METH_NOARGS,
+      "Get the metrics of all database objects in the Prometheus text format." },
     { NULL, NULL, 0, NULL }
   };
-  type_fproc.tp_methods = fproc_methods;
-  if (PyType_Ready(&type_fproc) != 0) return false;
-  cls_fproc = (PyObject*)&type_fproc;
-  Py_INCREF(cls_fproc);
-  if (PyModule_AddObject(mod_kc, "FileProcessor", cls_fproc) != 0) return false;
+  module_def.m_methods = method_table;
+  mod_kc = PyModule_Create(&module_def);
+  if (PyModule_AddStringConstant(mod_kc, "VERSION", kc::VERSION) != 0) return false;
+  mod_th = PyImport_ImportModule("threading");
+  mod_time = PyImport_ImportModule("time");
+  mod_array = PyImport_ImportModule("array");
+  if (!mod_th) return false;
   return true;
 }
 
 
 /**
- * Implementation of new.
+ * Implementation of conv_bytes.
  */
-static PyObject* fproc_new(PyTypeObject* pytype, PyObject* pyargs, PyObject* pykwds) {
-  FileProcessor_data* data = (FileProcessor_data*)pytype->tp_alloc(pytype, 0);
-  if (!data) return NULL;
-  return (PyObject*)data;
+static PyObject* kc_conv_bytes(PyObject* pyself, PyObject* pyargs) {
+  int32_t argc = PyTuple_Size(pyargs);
+  if (argc != 1) {
+    throwinvarg();
+    return NULL;
+  }
+  PyObject* pyobj = PyTuple_GetItem(pyargs, 0);
+  SoftString str(pyobj);
+  return PyBytes_FromStringAndSize(str.ptr(), str.size());
 }
 
 
 /**
- * Implementation of dealloc.
+ * Implementation of atoi.
  */
-static void fproc_dealloc(FileProcessor_data* data) {
-  Py_TYPE(data)->tp_free((PyObject*)data);
+static PyObject* kc_atoi(PyObject* pyself, PyObject* pyargs) {
+  int32_t argc = PyTuple_Size(pyargs);
+  if (argc != 1) {
+    throwinvarg();
+    return NULL;
+  }
+  PyObject* pystr = PyTuple_GetItem(pyargs, 0);
+  SoftString str(pystr);
+  return PyLong_FromLongLong(kc::atoi(str.ptr()));
 }
 
 
 /**
- * Implementation of init.
+ * Implementation of atoix.
  */
-static int fproc_init(FileProcessor_data* data, PyObject* pyargs, PyObject* pykwds) {
+static PyObject* kc_atoix(PyObject* pyself, PyObject* pyargs) {
   int32_t argc = PyTuple_Size(pyargs);
-  if (argc != 0) {
+  if (argc != 1) {
     throwinvarg();
-    return -1;
+    return NULL;
   }
-  return 0;
+  PyObject* pystr = PyTuple_GetItem(pyargs, 0);
+  SoftString str(pystr);
+  return PyLong_FromLongLong(kc::atoix(str.ptr()));
 }
 
 
 /**
- * Implementation of process.
+ * Implementation of atof.
  */
-static PyObject* fproc_process(FileProcessor_data* data, PyObject* pyargs) {
+static PyObject* kc_atof(PyObject* pyself, PyObject* pyargs) {
   int32_t argc = PyTuple_Size(pyargs);
-  if (argc != 3) {
+  if (argc != 1) {
     throwinvarg();
     return NULL;
   }
-  Py_RETURN_TRUE;
+  PyObject* pystr = PyTuple_GetItem(pyargs, 0);
+  SoftString str(pystr);
+  return PyFloat_FromDouble(kc::atof(str.ptr()));
 }
 
 
 /**
- * Define objects of the Cursor class.
+ * Implementation of hash_murmur.
  */
-static bool define_cur() {
-  static PyTypeObject type_cur = { PyVarObject_HEAD_INIT(NULL, 0) };
-  size_t zoff = offsetof(PyTypeObject, tp_name);
-  std::memset((char*)&type_cur + zoff, 0, sizeof(type_cur) - zoff);
-  type_cur.tp_name = "kyotocabinet.Cursor";
-  type_cur.tp_basicsize = sizeof(Cursor_data);
-  type_cur.tp_itemsize = 0;
-  type_cur.tp_flags = Py_TPFLAGS_DEFAULT | Py_TPFLAGS_BASETYPE;
-  type_cur.tp_doc = "Interface of cursor to indicate a record.";
-  type_cur.tp_new = cur_new;
-  type_cur.tp_dealloc = (destructor)cur_dealloc;
-  type_cur.tp_init = (initproc)cur_init;
-  type_cur.tp_repr = (unaryfunc)cur_repr;
-  type_cur.tp_str = (unaryfunc)cur_str;
-  static PyMethodDef cur_methods[] = {
-    { "disable", (PyCFunction)cur_disable, METH_NOARGS,
-      "Disable the cursor." },
-    { "accept", (PyCFunction)cur_accept, METH_VARARGS,
-      "Accept a visitor to the current record." },
-    { "set_value", (PyCFunction)cur_set_value, METH_VARARGS,
-      "Set the value of the current record." },
-    { "remove", (PyCFunction)cur_remove, METH_NOARGS,
-      "Remove the current record." },
-    { "get_key", (PyCFunction)cur_get_key, METH_VARARGS,
-      "Get the key of the current record." },
-    { "get_key_str", (PyCFunction)cur_get_key_str, METH_VARARGS,
-      "Get the key of the current record." },
-    { "get_value", (PyCFunction)cur_get_value, METH_VARARGS,
-      "Get the value of the current record." },
-    { "get_value_str", (PyCFunction)cur_get_value_str, METH_VARARGS,
-      "Get the value of the current record." },
-    { "get", (PyCFunction)cur_get, METH_VARARGS,
-      "Get a pair of the key and the value of the current record." },
-    { "get_str", (PyCFunction)cur_get_str, METH_VARARGS,
-      "Get a pair of the key and the value of the current record." },
-    { "seize", (PyCFunction)cur_seize, METH_NOARGS,
-      "Get a pair of the key and the value of the current record and remove it atomically." },
-    { "seize_str", (PyCFunction)cur_seize_str, METH_NOARGS,
-      "Get a pair of the key and the value of the current record and remove it atomically." },
-    { "jump", (PyCFunction)cur_jump, METH_VARARGS,
-      "Jump the cursor to a record for forward scan." },
-    { "jump_back", (PyCFunction)cur_jump_back, METH_VARARGS,
-      "Jump the cursor to a record for backward scan." },
-    { "step", (PyCFunction)cur_step, METH_NOARGS,
-      "Step the cursor to the next record." },
-    { "step_back", (PyCFunction)cur_step_back, METH_NOARGS,
-      "Step the cursor to the previous record." },
-    { "db", (PyCFunction)cur_db, METH_NOARGS,
-      "Get the database object." },
-    { "error", (PyCFunction)cur_error, METH_NOARGS,
-      "Get the last happened error." },
-    { NULL, NULL, 0, NULL }
-  };
-  type_cur.tp_methods = cur_methods;
-  type_cur.tp_iter = (getiterfunc)cur_op_iter;
-  type_cur.tp_iternext = (iternextfunc)cur_op_iternext;
-  if (PyType_Ready(&type_cur) != 0) return false;
-  cls_cur = (PyObject*)&type_cur;
-  Py_INCREF(cls_cur);
-  if (PyModule_AddObject(mod_kc, "Cursor", cls_cur) != 0) return false;
-  return true;
+static PyObject* kc_hash_murmur(PyObject* pyself, PyObject* pyargs) {
+  int32_t argc = PyTuple_Size(pyargs);
+  if (argc != 1) {
+    throwinvarg();
+    return NULL;
+  }
+  PyObject* pystr = PyTuple_GetItem(pyargs, 0);
+  SoftString str(pystr);
+  return PyLong_FromUnsignedLongLong(kc::hashmurmur(str.ptr(), str.size()));
 }
 
 
 /**
- * Implementation of new.
+ * Implementation of hash_fnv.
  */
-static PyObject* cur_new(PyTypeObject* pytype, PyObject* pyargs, PyObject* pykwds) {
-  Cursor_data* data = (Cursor_data*)pytype->tp_alloc(pytype, 0);
-  if (!data) return NULL;
-  Py_INCREF(Py_None);
-  data->cur = NULL;
-  data->pydb = Py_None;
-  return (PyObject*)data;
+static PyObject* kc_hash_fnv(PyObject* pyself, PyObject* pyargs) {
+  int32_t argc = PyTuple_Size(pyargs);
+  if (argc != 1) {
+    throwinvarg();
+    return NULL;
+  }
+  PyObject* pystr = PyTuple_GetItem(pyargs, 0);
+  SoftString str(pystr);
+  return PyLong_FromUnsignedLongLong(kc::hashfnv(str.ptr(), str.size()));
 }
 
 
 /**
- * Implementation of dealloc.
+ * Implementation of levdist.
  */
-static void cur_dealloc(Cursor_data* data) {
-  SoftCursor* cur = data->cur;
-  PyObject* pydb = data->pydb;
-  Py_DECREF(pydb);
-  delete cur;
-  Py_TYPE(data)->tp_free((PyObject*)data);
+static PyObject* kc_levdist(PyObject* pyself, PyObject* pyargs) {
+  int32_t argc = PyTuple_Size(pyargs);
+  if (argc < 2) {
+    throwinvarg();
+    return NULL;
+  }
+  PyObject* pya = PyTuple_GetItem(pyargs, 0);
+  PyObject* pyb = PyTuple_GetItem(pyargs, 1);
+  PyObject* pyutf = Py_None;
+  if (argc > 2) pyutf = PyTuple_GetItem(pyargs, 2);
+  SoftString astr(pya);
+  const char* abuf = astr.ptr();
+  size_t asiz = astr.size();
+  SoftString bstr(pyb);
+  const char* bbuf = bstr.ptr();
+  size_t bsiz = bstr.size();
+  bool utf = PyObject_IsTrue(pyutf);
+  size_t dist;
+  if (utf) {
+    uint32_t astack[128];
+    uint32_t* aary = asiz > sizeof(astack) / sizeof(*astack) ? new uint32_t[asiz] : astack;
+    size_t anum;
+    kc::strutftoucs(abuf, asiz, aary, &anum);
+    uint32_t bstack[128];
+    uint32_t* bary = bsiz > sizeof(bstack) / sizeof(*bstack) ? new uint32_t[bsiz] : bstack;
+    size_t bnum;
+    kc::strutftoucs(bbuf, bsiz, bary, &bnum);
+    dist = kc::strucsdist(aary, anum, bary, bnum);
+    if (bary != bstack) delete[] bary;
+    if (aary != astack) delete[] aary;
+  } else {
+    dist = kc::memdist(abuf, asiz, bbuf, bsiz);
+  }
+  return PyLong_FromUnsignedLongLong(dist);
 }
 
 
 /**
- * Implementation of init.
+ * Implementation of hash_murmur_many.
  */
-static int cur_init(Cursor_data* data, PyObject* pyargs, PyObject* pykwds) {
+static PyObject* kc_hash_murmur_many(PyObject* pyself, PyObject* pyargs) {
   int32_t argc = PyTuple_Size(pyargs);
   if (argc != 1) {
     throwinvarg();
-    return -1;
+    return NULL;
   }
-  PyObject* pydb = PyTuple_GetItem(pyargs, 0);
-  if (!PyObject_IsInstance(pydb, cls_db)) {
+  PyObject* pykeys = PySequence_Fast(PyTuple_GetItem(pyargs, 0), "keys must be a sequence");
+  if (!pykeys) return NULL;
+  Py_ssize_t num = PySequence_Fast_GET_SIZE(pykeys);
+  std::string buf;
+  std::vector<size_t> offs;
+  offs.reserve(num + 1);
+  offs.push_back(0);
+  for (Py_ssize_t i = 0; i < num; i++) {
+    SoftString key(PySequence_Fast_GET_ITEM(pykeys, i));
+    buf.append(key.ptr(), key.size());
+    offs.push_back(buf.size());
+  }
+  Py_DECREF(pykeys);
+  std::string hashes(num * sizeof(uint64_t), '\0');
+  PyThreadState* thstate = buf.size() >= GILFREESIZ ? PyEval_SaveThread() : NULL;
+  for (Py_ssize_t i = 0; i < num; i++) {
+    uint64_t hash = kc::hashmurmur(buf.data() + offs[i], offs[i+1] - offs[i]);
+    std::memcpy(&hashes[i*sizeof(hash)], &hash, sizeof(hash));
+  }
+  if (thstate) PyEval_RestoreThread(thstate);
+  return PyObject_CallMethod(mod_array, (char*)"array", (char*)"(sy#)",
+                             "Q", hashes.data(), (Py_ssize_t)hashes.size());
+}
+
+
+/**
+ * Implementation of levdist_many.
+ */
+static PyObject* kc_levdist_many(PyObject* pyself, PyObject* pyargs) {
+  int32_t argc = PyTuple_Size(pyargs);
+  if (argc < 2 || argc > 4) {
     throwinvarg();
-    return -1;
+    return NULL;
   }
-  DB_data* dbdata = (DB_data*)pydb;
-  kc::PolyDB* db = dbdata->db;
-  NativeFunction nf((DB_data*)pydb);
-  g_curbur.sweap();
-  data->cur = new SoftCursor(db);
-  nf.cleanup();
-  Py_INCREF(pydb);
-  data->pydb = pydb;
-  return 0;
+  PyObject* pyquery = PyTuple_GetItem(pyargs, 0);
+  PyObject* pycands = PySequence_Fast(PyTuple_GetItem(pyargs, 1),
+                                      "candidates must be a sequence");
+  if (!pycands) return NULL;
+  PyObject* pyutf = Py_None;
+  if (argc > 2) pyutf = PyTuple_GetItem(pyargs, 2);
+  bool utf = PyObject_IsTrue(pyutf);
+  PyObject* pymaxdist = Py_None;
+  if (argc > 3) pymaxdist = PyTuple_GetItem(pyargs, 3);
+  int64_t maxdist = pymaxdist == Py_None ? -1 : pyatoi(pymaxdist);
+  std::vector<uint32_t> query;
+  SoftString qstr(pyquery);
+  kc_str_units(qstr.ptr(), qstr.size(), utf, &query);
+  Py_ssize_t num = PySequence_Fast_GET_SIZE(pycands);
+  std::vector<uint32_t> units;
+  std::vector<size_t> offs;
+  offs.reserve(num + 1);
+  offs.push_back(0);
+  for (Py_ssize_t i = 0; i < num; i++) {
+    SoftString cand(PySequence_Fast_GET_ITEM(pycands, i));
+    kc_str_units(cand.ptr(), cand.size(), utf, &units);
+    offs.push_back(units.size());
+  }
+  Py_DECREF(pycands);
+  size_t bound = maxdist < 0 ? (size_t)kc::INT64MAX : (size_t)maxdist;
+  std::vector<size_t> dists(num);
+  PyThreadState* thstate =
+    units.size() * sizeof(uint32_t) >= GILFREESIZ ? PyEval_SaveThread() : NULL;
+  const uint32_t* qary = query.empty() ? NULL : &query[0];
+  const uint32_t* uary = units.empty() ? NULL : &units[0];
+  for (Py_ssize_t i = 0; i < num; i++) {
+    dists[i] = kc_bounded_dist(qary, query.size(), uary + offs[i], offs[i+1] - offs[i], bound);
+  }
+  if (thstate) PyEval_RestoreThread(thstate);
+  PyObject* pyrv = PyList_New(num);
+  for (Py_ssize_t i = 0; i < num; i++) {
+    PyObject* pydist;
+    if (dists[i] > bound) {
+      Py_INCREF(Py_None);
+      pydist = Py_None;
+    } else {
+      pydist = PyLong_FromUnsignedLongLong(dists[i]);
+    }
+    PyList_SET_ITEM(pyrv, i, pydist);
+  }
+  return pyrv;
 }
 
 
 /**
- * Implementation of repr.
+ * Append the character units of a string to a vector.
  */
-static PyObject* cur_repr(Cursor_data* data) {
-  SoftCursor* cur = data->cur;
-  PyObject* pydb = data->pydb;
-  kc::PolyDB::Cursor* icur = cur->cur();
-  if (!icur) return newstring("<kyotocabinet.Cursor: (disabled)>");
-  NativeFunction nf((DB_data*)pydb);
-  kc::PolyDB* db = icur->db();
-  std::string path = db->path();
-  if (path.size() < 1) path = "(None)";
-  std::string str;
-  kc::strprintf(&str, "<kyotocabinet.Cursor: %s: ", path.c_str());
-  size_t ksiz;
-  char* kbuf = icur->get_key(&ksiz);
-  if (kbuf) {
-    str.append(kbuf, ksiz);
-    delete[] kbuf;
+static void kc_str_units(const char* buf, size_t size, bool utf, std::vector<uint32_t>* units) {
+  size_t base = units->size();
+  if (utf) {
+    units->resize(base + size);
+    size_t num = 0;
+    if (size > 0) kc::strutftoucs(buf, size, &(*units)[base], &num);
+    units->resize(base + num);
   } else {
-    str.append("(None)");
+    for (size_t i = 0; i < size; i++) {
+      units->push_back(((const unsigned char*)buf)[i]);
+    }
   }
-  str.append(">");
-  nf.cleanup();
-  return PyUnicode_FromString(str.c_str());
 }
 
 
 /**
- * Implementation of str.
- */
-static PyObject* cur_str(Cursor_data* data) {
-  SoftCursor* cur = data->cur;
-  PyObject* pydb = data->pydb;
-  kc::PolyDB::Cursor* icur = cur->cur();
-  if (!icur) return newstring("(disabled)");
-  NativeFunction nf((DB_data*)pydb);
-  kc::PolyDB* db = icur->db();
-  std::string path = db->path();
-  if (path.size() < 1) path = "(None)";
-  std::string str;
-  kc::strprintf(&str, "%s: ", path.c_str());
-  size_t ksiz;
-  char* kbuf = icur->get_key(&ksiz);
-  if (kbuf) {
-    str.append(kbuf, ksiz);
-    delete[] kbuf;
-  } else {
-    str.append("(None)");
+ * Calculate the levenshtein distance of two unit arrays giving up beyond a bound.
+ */
+static size_t kc_bounded_dist(const uint32_t* aary, size_t anum,
+                              const uint32_t* bary, size_t bnum, size_t bound) {
+  size_t diff = anum > bnum ? anum - bnum : bnum - anum;
+  if (diff > bound) return bound + 1;
+  std::vector<size_t> prev(bnum + 1);
+  std::vector<size_t> cur(bnum + 1);
+  for (size_t j = 0; j <= bnum; j++) {
+    prev[j] = j;
+  }
+  for (size_t i = 1; i <= anum; i++) {
+    cur[0] = i;
+    size_t rowmin = cur[0];
+    for (size_t j = 1; j <= bnum; j++) {
+      size_t cost = aary[i-1] == bary[j-1] ? 0 : 1;
+      size_t dist = prev[j-1] + cost;
+      if (prev[j] + 1 < dist) dist = prev[j] + 1;
+      if (cur[j-1] + 1 < dist) dist = cur[j-1] + 1;
+      cur[j] = dist;
+      if (dist < rowmin) rowmin = dist;
+    }
+    if (rowmin > bound) return bound + 1;
+    prev.swap(cur);
   }
-  nf.cleanup();
-  return PyUnicode_FromString(str.c_str());
+  return prev[bnum] > bound ? bound + 1 : prev[bnum];
 }
 
 
 /**
- * Implementation of disable.
+ * Implementation of memory_usage.
  */
-static PyObject* cur_disable(Cursor_data* data) {
-  SoftCursor* cur = data->cur;
-  PyObject* pydb = data->pydb;
-  kc::PolyDB::Cursor* icur = cur->cur();
-  if (!icur) Py_RETURN_NONE;
-  NativeFunction nf((DB_data*)pydb);
-  cur->disable();
-  nf.cleanup();
-  Py_RETURN_NONE;
+static PyObject* kc_memory_usage(PyObject* pyself) {
+  StringMap info;
+  kc::getsysinfo(&info);
+  StringMap usage;
+  StringMap::iterator it = info.begin();
+  StringMap::iterator itend = info.end();
+  while (it != itend) {
+    if (!it->first.compare(0, 4, "mem_")) usage[it->first] = it->second;
+    ++it;
+  }
+  return maptopymap(&usage);
 }
 
 
 /**
- * Implementation of accept.
- */
-static PyObject* cur_accept(Cursor_data* data, PyObject* pyargs) {
-  int32_t argc = PyTuple_Size(pyargs);
-  if (argc < 1) {
-    throwinvarg();
-    return NULL;
+ * Implementation of prometheus_text.
+ */
+static PyObject* kc_prometheus_text(PyObject* pyself) {
+  std::vector<DB_data*> dbs(objs_db.begin(), objs_db.end());
+  std::vector<std::string> labels;
+  std::vector<MetricMap> metrics;
+  for (size_t i = 0; i < dbs.size(); i++) {
+    Py_INCREF((PyObject*)dbs[i]);
+  }
+  for (size_t i = 0; i < dbs.size(); i++) {
+    DB_data* data = dbs[i];
+    MetricMap dbmetrics;
+    std::string path = data->db->path();
+    if (!path.empty() && db_collect_metrics(data, &dbmetrics)) {
+      std::string label = "path=\"";
+      for (size_t j = 0; j < path.size(); j++) {
+        char c = path[j];
+        if (c == '\\' || c == '"') {
+          label.push_back('\\');
+          label.push_back(c);
+        } else if (c == '\n') {
+          label.append("\\n");
+        } else {
+          label.push_back(c);
+        }
+      }
+      kc::strprintf(&label, "\",id=\"%llu\"", (unsigned long long)(uintptr_t)data);
+      labels.push_back(label);
+      metrics.push_back(dbmetrics);
+    } else {
+      labels.push_back("");
+      metrics.push_back(MetricMap());
+    }
   }
-  SoftCursor* cur = data->cur;
-  PyObject* pydb = data->pydb;
-  kc::PolyDB::Cursor* icur = cur->cur();
-  if (!icur) Py_RETURN_FALSE;
-  if (((DB_data*)pydb)->pylock == Py_None) {
-    icur->db()->set_error(kc::PolyDB::Error::INVALID, "unsupported method");
-    if (db_raise((DB_data*)pydb)) return NULL;
-    Py_RETURN_NONE;
+  const char* defs[][4] = {
+    { "count", "kyotocabinet_records", "gauge", "Number of records." },
+    { "size", "kyotocabinet_size_bytes", "gauge", "Size of the database in bytes." },
+    { "file_size", "kyotocabinet_file_size_bytes", "gauge", "Size of the database file in bytes." },
+    { "fragments", "kyotocabinet_fragments", "gauge", "Number of fragmented free blocks." },
+    { "cache_usage", "kyotocabinet_cache_usage_bytes", "gauge", "Usage of the page cache in bytes." },
+    { "calls", "kyotocabinet_calls_total", "counter", "Number of method calls." },
+    { "hits", "kyotocabinet_hits_total", "counter", "Number of lookups which found a record." },
+    { "misses", "kyotocabinet_misses_total", "counter", "Number of lookups which found no record." },
+    { "writes", "kyotocabinet_writes_total", "counter", "Number of stored records." },
+    { "removes", "kyotocabinet_removes_total", "counter", "Number of removed records." },
+  };
+  std::string text;
+  for (size_t i = 0; i < sizeof(defs) / sizeof(*defs); i++) {
+    bool head = false;
+    for (size_t j = 0; j < dbs.size(); j++) {
+      MetricMap::iterator it = metrics[j].find(defs[i][0]);
+      if (it == metrics[j].end()) continue;
+      if (!head) {
+        kc::strprintf(&text, "# HELP %s %s\n", defs[i][1], defs[i][3]);
+        kc::strprintf(&text, "# TYPE %s %s\n", defs[i][1], defs[i][2]);
+        head = true;
+      }
+      kc::strprintf(&text, "%s{%s} %lld\n",
+                    defs[i][1], labels[j].c_str(), (long long)it->second);
+    }
   }
-  PyObject* pyvisitor = PyTuple_GetItem(pyargs, 0);
-  PyObject* pywritable = Py_None;
-  if (argc > 1) pywritable = PyTuple_GetItem(pyargs, 1);
-  PyObject* pystep = Py_None;
-  if (argc > 2) pystep = PyTuple_GetItem(pyargs, 2);
-  bool writable = pywritable == Py_None || PyObject_IsTrue(pywritable);
-  bool step = PyObject_IsTrue(pystep);
-  bool rv;
-  if (PyObject_IsInstance(pyvisitor, cls_vis) || PyCallable_Check(pyvisitor)) {
-    SoftVisitor visitor(pyvisitor, writable);
-    NativeFunction nf((DB_data*)pydb);
-    rv = icur->accept(&visitor, writable, step);
-    nf.cleanup();
-    PyObject* pyextype, *pyexvalue, *pyextrace;
-    if (visitor.exception(&pyextype, &pyexvalue, &pyextrace)) {
-      PyErr_SetObject(pyextype, pyexvalue);
-      return NULL;
+  const char* mdefs[][2] = {
+    { "kyotocabinet_method_calls_total", "Number of calls of each method." },
+    { "kyotocabinet_method_native_seconds_total", "Seconds spent in the library by each method." },
+  };
+  for (size_t i = 0; i < sizeof(mdefs) / sizeof(*mdefs); i++) {
+    bool head = false;
+    for (size_t j = 0; j < dbs.size(); j++) {
+      CallStats* stats = dbs[j]->stats;
+      if (!stats || metrics[j].empty()) continue;
+      const CallStats::EntryMap& entries = stats->entries();
+      CallStats::EntryMap::const_iterator it = entries.begin();
+      CallStats::EntryMap::const_iterator itend = entries.end();
+      while (it != itend) {
+        if (!head) {
+          kc::strprintf(&text, "# HELP %s %s\n", mdefs[i][0], mdefs[i][1]);
+          kc::strprintf(&text, "# TYPE %s counter\n", mdefs[i][0]);
+          head = true;
+        }
+        if (i == 0) {
+          kc::strprintf(&text, "%s{%s,method=\"%s\"} %lld\n", mdefs[i][0],
+                        labels[j].c_str(), it->first, (long long)it->second.calls);
+        } else {
+          kc::strprintf(&text, "%s{%s,method=\"%s\"} %.6f\n", mdefs[i][0],
+                        labels[j].c_str(), it->first, it->second.times[CallStats::KNATIVE]);
+        }
+        ++it;
+      }
     }
-  } else {
-    throwinvarg();
-    return NULL;
   }
-  if (rv) Py_RETURN_TRUE;
-  if (db_raise((DB_data*)pydb)) return NULL;
-  Py_RETURN_FALSE;
+  for (size_t i = 0; i < dbs.size(); i++) {
+    Py_DECREF((PyObject*)dbs[i]);
+  }
+  return newstring(text.c_str());
 }
 
 
 /**
- * Implementation of set_value.
+ * Define objects of the Error class.
  */
-static PyObject* cur_set_value(Cursor_data* data, PyObject* pyargs) {
-  int32_t argc = PyTuple_Size(pyargs);
-  if (argc < 1 || argc > 2) {
-    throwinvarg();
-    return NULL;
-  }
-  PyObject* pyvalue = PyTuple_GetItem(pyargs, 0);
-  PyObject* pystep = Py_None;
-  if (argc > 1) pystep = PyTuple_GetItem(pyargs, 1);
-  SoftCursor* cur = data->cur;
-  PyObject* pydb = data->pydb;
-  kc::PolyDB::Cursor* icur = cur->cur();
-  if (!icur) Py_RETURN_FALSE;
-  SoftString value(pyvalue);
-  bool step = PyObject_IsTrue(pystep);
-  NativeFunction nf((DB_data*)pydb);
-  bool rv = icur->set_value(value.ptr(), value.size(), step);
-  nf.cleanup();
-  if (rv) Py_RETURN_TRUE;
-  if (db_raise((DB_data*)pydb)) return NULL;
-  Py_RETURN_FALSE;
+static bool define_err() {
+  static PyTypeObject type_err = { PyVarObject_HEAD_INIT(NULL, 0) };
+  size_t zoff = offsetof(PyTypeObject, tp_name);
+  std::memset((char*)&type_err + zoff, 0, sizeof(type_err) - zoff);
+  type_err.tp_name = "kyotocabinet.Error";
+  type_err.tp_basicsize = sizeof(Error_data);
+  type_err.tp_itemsize = 0;
+  type_err.tp_flags = Py_TPFLAGS_DEFAULT | Py_TPFLAGS_BASETYPE;
+  type_err.tp_doc = "Error data.";
+  type_err.tp_new = err_new;
+  type_err.tp_dealloc = (destructor)err_dealloc;
+  type_err.tp_init = (initproc)err_init;
+  type_err.tp_repr = (unaryfunc)err_repr;
+  type_err.tp_str = (unaryfunc)err_str;
+  type_err.tp_richcompare = (richcmpfunc)err_richcmp;
+  static PyMethodDef err_methods[] = {
+    { "set", (PyCFunction)err_set, METH_VARARGS,
+      "Set the error information." },
+    { "code", (PyCFunction)err_code, METH_NOARGS,
+      "Get the error code." },
+    { "name", (PyCFunction)err_name, METH_NOARGS,
+      "Get the readable string of the code." },
+    { "message", (PyCFunction)err_message, METH_NOARGS,
+      "Get the supplement message." },
+    { NULL, NULL, 0, NULL }
+  };
+  type_err.tp_methods = err_methods;
+  type_err.tp_base = (PyTypeObject*)PyExc_RuntimeError;
+  if (PyType_Ready(&type_err) != 0) return false;
+  cls_err = (PyObject*)&type_err;
+  for (size_t i = 0; i < sizeof(cls_err_children) / sizeof(*cls_err_children); i++) {
+    cls_err_children[i] = NULL;
+  }
+  if (!err_define_child("SUCCESS", kc::PolyDB::Error::SUCCESS)) return false;
+  if (!err_define_child("NOIMPL", kc::PolyDB::Error::NOIMPL)) return false;
+  if (!err_define_child("INVALID", kc::PolyDB::Error::INVALID)) return false;
+  if (!err_define_child("NOREPOS", kc::PolyDB::Error::NOREPOS)) return false;
+  if (!err_define_child("NOPERM", kc::PolyDB::Error::NOPERM)) return false;
+  if (!err_define_child("BROKEN", kc::PolyDB::Error::BROKEN)) return false;
+  if (!err_define_child("DUPREC", kc::PolyDB::Error::DUPREC)) return false;
+  if (!err_define_child("NOREC", kc::PolyDB::Error::NOREC)) return false;
+  if (!err_define_child("LOGIC", kc::PolyDB::Error::LOGIC)) return false;
+  if (!err_define_child("SYSTEM", kc::PolyDB::Error::SYSTEM)) return false;
+  if (!err_define_child("MISC", kc::PolyDB::Error::MISC)) return false;
+  Py_INCREF(cls_err);
+  if (PyModule_AddObject(mod_kc, "Error", cls_err) != 0) return false;
+  return true;
 }
 
 
 /**
- * Implementation of remove.
+ * Define the constant and the subclass of an error code.
  */
-static PyObject* cur_remove(Cursor_data* data) {
-  SoftCursor* cur = data->cur;
-  PyObject* pydb = data->pydb;
-  kc::PolyDB::Cursor* icur = cur->cur();
-  if (!icur) Py_RETURN_FALSE;
-  NativeFunction nf((DB_data*)pydb);
-  bool rv = icur->remove();
-  nf.cleanup();
-  if (rv) Py_RETURN_TRUE;
-  if (db_raise((DB_data*)pydb)) return NULL;
-  Py_RETURN_FALSE;
+static bool err_define_child(const char* name, uint32_t code) {
+  if (!setconstuint32(cls_err, name, code)) return false;
+  char xname[kc::NUMBUFSIZ];
+  std::sprintf(xname, "X%s", name);
+  char fname[kc::NUMBUFSIZ*2];
+  std::sprintf(fname, "kyotocabinet.Error.%s", xname);
+  PyObject* pyxname = PyUnicode_FromString(xname);
+  PyObject* pyvalue = PyErr_NewException(fname, cls_err, NULL);
+  cls_err_children[code] = pyvalue;
+  return PyObject_GenericSetAttr(cls_err, pyxname, pyvalue) == 0;
 }
 
 
 /**
- * Implementation of get_key.
+ * Implementation of new.
  */
-static PyObject* cur_get_key(Cursor_data* data, PyObject* pyargs) {
-  int32_t argc = PyTuple_Size(pyargs);
-  if (argc > 1) {
-    throwinvarg();
-    return NULL;
-  }
-  PyObject* pystep = Py_None;
-  if (argc > 0) pystep = PyTuple_GetItem(pyargs, 0);
-  SoftCursor* cur = data->cur;
-  PyObject* pydb = data->pydb;
-  kc::PolyDB::Cursor* icur = cur->cur();
-  if (!icur) Py_RETURN_NONE;
-  bool step = PyObject_IsTrue(pystep);
-  NativeFunction nf((DB_data*)pydb);
-  size_t ksiz;
-  char* kbuf = icur->get_key(&ksiz, step);
-  nf.cleanup();
-  PyObject* pyrv;
-  if (kbuf) {
-    pyrv = newbytes(kbuf, ksiz);
-    delete[] kbuf;
-  } else {
-    if (db_raise((DB_data*)pydb)) return NULL;
-    Py_INCREF(Py_None);
-    pyrv = Py_None;
-  }
-  return pyrv;
+static PyObject* err_new(PyTypeObject* pytype, PyObject* pyargs, PyObject* pykwds) {
+  Error_data* data = (Error_data*)pytype->tp_alloc(pytype, 0);
+  if (!data) return NULL;
+  data->pycode = PyLong_FromUnsignedLong(kc::PolyDB::Error::SUCCESS);
+  data->pymessage = PyUnicode_FromString("error");
+  return (PyObject*)data;
 }
 
 
 /**
- * Implementation of get_key_str.
+ * Implementation of dealloc.
  */
-static PyObject* cur_get_key_str(Cursor_data* data, PyObject* pyargs) {
-  int32_t argc = PyTuple_Size(pyargs);
-  if (argc > 1) {
-    throwinvarg();
-    return NULL;
-  }
-  PyObject* pystep = Py_None;
-  if (argc > 0) pystep = PyTuple_GetItem(pyargs, 0);
-  SoftCursor* cur = data->cur;
-  PyObject* pydb = data->pydb;
-  kc::PolyDB::Cursor* icur = cur->cur();
-  if (!icur) Py_RETURN_NONE;
-  bool step = PyObject_IsTrue(pystep);
-  NativeFunction nf((DB_data*)pydb);
-  size_t ksiz;
-  char* kbuf = icur->get_key(&ksiz, step);
-  nf.cleanup();
-  PyObject* pyrv;
-  if (kbuf) {
-    pyrv = newstring(kbuf);
-    delete[] kbuf;
-  } else {
-    if (db_raise((DB_data*)pydb)) return NULL;
-    Py_INCREF(Py_None);
-    pyrv = Py_None;
-  }
-  return pyrv;
+static void err_dealloc(Error_data* data) {
+  Py_DECREF(data->pymessage);
+  Py_DECREF(data->pycode);
+  Py_CLEAR(data->dict);
+  Py_CLEAR(data->args);
+  Py_CLEAR(data->traceback);
+  Py_CLEAR(data->cause);
+  Py_CLEAR(data->context);
+  Py_TYPE(data)->tp_free((PyObject*)data);
 }
 
 
 /**
- * Implementation of get_value.
+ * Implementation of init.
  */
-static PyObject* cur_get_value(Cursor_data* data, PyObject* pyargs) {
+static int err_init(Error_data* data, PyObject* pyargs, PyObject* pykwds) {
   int32_t argc = PyTuple_Size(pyargs);
-  if (argc > 1) {
+  if (argc > 2) {
     throwinvarg();
-    return NULL;
+    return -1;
   }
-  PyObject* pystep = Py_None;
-  if (argc > 0) pystep = PyTuple_GetItem(pyargs, 0);
-  SoftCursor* cur = data->cur;
-  PyObject* pydb = data->pydb;
-  kc::PolyDB::Cursor* icur = cur->cur();
-  if (!icur) Py_RETURN_NONE;
-  bool step = PyObject_IsTrue(pystep);
-  NativeFunction nf((DB_data*)pydb);
-  size_t vsiz;
-  char* vbuf = icur->get_value(&vsiz, step);
-  nf.cleanup();
-  PyObject* pyrv;
-  if (vbuf) {
-    pyrv = newbytes(vbuf, vsiz);
-    delete[] vbuf;
-  } else {
-    if (db_raise((DB_data*)pydb)) return NULL;
-    Py_INCREF(Py_None);
-    pyrv = Py_None;
+  if (argc > 1) {
+    PyObject* pycode = PyTuple_GetItem(pyargs, 0);
+    PyObject* pymessage = PyTuple_GetItem(pyargs, 1);
+    if (PyLong_Check(pycode) && PyUnicode_Check(pymessage)) {
+      Py_DECREF(data->pycode);
+      Py_DECREF(data->pymessage);
+      Py_INCREF(pycode);
+      data->pycode = pycode;
+      Py_INCREF(pymessage);
+      data->pymessage = pymessage;
+    }
+  } else if (argc > 0) {
+    PyObject* pyexpr = PyTuple_GetItem(pyargs, 0);
+    if (PyUnicode_Check(pyexpr)) {
+      pyexpr = PyUnicode_AsUTF8String(pyexpr);
+      const char* expr = PyBytes_AS_STRING(pyexpr);
+      uint32_t code = kc::atoi(expr);
+      const char* rp = std::strchr(expr, ':');
+      if (rp) expr = rp + 1;
+      while (*expr == ' ') {
+        expr++;
+      }
+      Py_DECREF(data->pycode);
+      Py_DECREF(data->pymessage);
+      data->pycode = PyLong_FromLongLong(code);
+      data->pymessage = PyUnicode_FromString(expr);
+      Py_DECREF(pyexpr);
+    }
   }
-  return pyrv;
+  return 0;
 }
 
 
 /**
- * Implementation of get_value_str.
+ * Implementation of repr.
  */
-static PyObject* cur_get_value_str(Cursor_data* data, PyObject* pyargs) {
-  int32_t argc = PyTuple_Size(pyargs);
-  if (argc > 1) {
-    throwinvarg();
-    return NULL;
-  }
-  PyObject* pystep = Py_None;
-  if (argc > 0) pystep = PyTuple_GetItem(pyargs, 0);
-  SoftCursor* cur = data->cur;
-  PyObject* pydb = data->pydb;
-  kc::PolyDB::Cursor* icur = cur->cur();
-  if (!icur) Py_RETURN_NONE;
-  bool step = PyObject_IsTrue(pystep);
-  NativeFunction nf((DB_data*)pydb);
-  size_t vsiz;
-  char* vbuf = icur->get_value(&vsiz, step);
-  nf.cleanup();
-  PyObject* pyrv;
-  if (vbuf) {
-    pyrv = newstring(vbuf);
-    delete[] vbuf;
-  } else {
-    if (db_raise((DB_data*)pydb)) return NULL;
-    Py_INCREF(Py_None);
-    pyrv = Py_None;
-  }
-  return pyrv;
+static PyObject* err_repr(Error_data* data) {
+  uint32_t code = (uint32_t)PyLong_AsLong(data->pycode);
+  const char* name = kc::PolyDB::Error::codename((kc::PolyDB::Error::Code)code);
+  return PyUnicode_FromFormat("<kyotocabinet.Error: %s: %U>", name, data->pymessage);
 }
 
 
 /**
- * Implementation of get.
+ * Implementation of str.
  */
-static PyObject* cur_get(Cursor_data* data, PyObject* pyargs) {
-  int32_t argc = PyTuple_Size(pyargs);
-  if (argc > 1) {
-    throwinvarg();
-    return NULL;
-  }
-  PyObject* pystep = Py_None;
-  if (argc > 0) pystep = PyTuple_GetItem(pyargs, 0);
-  SoftCursor* cur = data->cur;
-  PyObject* pydb = data->pydb;
-  kc::PolyDB::Cursor* icur = cur->cur();
-  if (!icur) Py_RETURN_NONE;
-  bool step = PyObject_IsTrue(pystep);
-  NativeFunction nf((DB_data*)pydb);
-  const char* vbuf;
-  size_t ksiz, vsiz;
-  char* kbuf = icur->get(&ksiz, &vbuf, &vsiz, step);
-  nf.cleanup();
-  PyObject* pyrv;
-  if (kbuf) {
-    pyrv = PyTuple_New(2);
-    PyObject* pykey = newbytes(kbuf, ksiz);
-    PyObject* pyvalue = newbytes(vbuf, vsiz);
-    PyTuple_SetItem(pyrv, 0, pykey);
-    PyTuple_SetItem(pyrv, 1, pyvalue);
-    delete[] kbuf;
-  } else {
-    if (db_raise((DB_data*)pydb)) return NULL;
-    Py_INCREF(Py_None);
-    pyrv = Py_None;
-  }
-  return pyrv;
-}
-
-
-/**
- * Implementation of get_str.
- */
-static PyObject* cur_get_str(Cursor_data* data, PyObject* pyargs) {
-  int32_t argc = PyTuple_Size(pyargs);
-  if (argc > 1) {
-    throwinvarg();
-    return NULL;
-  }
-  PyObject* pystep = Py_None;
-  if (argc > 0) pystep = PyTuple_GetItem(pyargs, 0);
-  SoftCursor* cur = data->cur;
-  PyObject* pydb = data->pydb;
-  kc::PolyDB::Cursor* icur = cur->cur();
-  if (!icur) Py_RETURN_NONE;
-  bool step = PyObject_IsTrue(pystep);
-  NativeFunction nf((DB_data*)pydb);
-  const char* vbuf;
-  size_t ksiz, vsiz;
-  char* kbuf = icur->get(&ksiz, &vbuf, &vsiz, step);
-  nf.cleanup();
-  PyObject* pyrv;
-  if (kbuf) {
-    pyrv = PyTuple_New(2);
-    PyObject* pykey = newstring(kbuf);
-    PyObject* pyvalue = newstring(vbuf);
-    PyTuple_SetItem(pyrv, 0, pykey);
-    PyTuple_SetItem(pyrv, 1, pyvalue);
-    delete[] kbuf;
-  } else {
-    if (db_raise((DB_data*)pydb)) return NULL;
-    Py_INCREF(Py_None);
-    pyrv = Py_None;
-  }
-  return pyrv;
-}
-
-
-/**
- * Implementation of seize.
- */
-static PyObject* cur_seize(Cursor_data* data) {
-  SoftCursor* cur = data->cur;
-  PyObject* pydb = data->pydb;
-  kc::PolyDB::Cursor* icur = cur->cur();
-  if (!icur) Py_RETURN_NONE;
-  NativeFunction nf((DB_data*)pydb);
-  const char* vbuf;
-  size_t ksiz, vsiz;
-  char* kbuf = icur->seize(&ksiz, &vbuf, &vsiz);
-  nf.cleanup();
-  PyObject* pyrv;
-  if (kbuf) {
-    pyrv = PyTuple_New(2);
-    PyObject* pykey = newbytes(kbuf, ksiz);
-    PyObject* pyvalue = newbytes(vbuf, vsiz);
-    PyTuple_SetItem(pyrv, 0, pykey);
-    PyTuple_SetItem(pyrv, 1, pyvalue);
-    delete[] kbuf;
-  } else {
-    if (db_raise((DB_data*)pydb)) return NULL;
-    Py_INCREF(Py_None);
-    pyrv = Py_None;
-  }
-  return pyrv;
-}
-
-
-/**
- * Implementation of seize_str.
- */
-static PyObject* cur_seize_str(Cursor_data* data) {
-  SoftCursor* cur = data->cur;
-  PyObject* pydb = data->pydb;
-  kc::PolyDB::Cursor* icur = cur->cur();
-  if (!icur) Py_RETURN_NONE;
-  NativeFunction nf((DB_data*)pydb);
-  const char* vbuf;
-  size_t ksiz, vsiz;
-  char* kbuf = icur->seize(&ksiz, &vbuf, &vsiz);
-  nf.cleanup();
-  PyObject* pyrv;
-  if (kbuf) {
-    pyrv = PyTuple_New(2);
-    PyObject* pykey = newstring(kbuf);
-    PyObject* pyvalue = newstring(vbuf);
-    PyTuple_SetItem(pyrv, 0, pykey);
-    PyTuple_SetItem(pyrv, 1, pyvalue);
-    delete[] kbuf;
-  } else {
-    if (db_raise((DB_data*)pydb)) return NULL;
-    Py_INCREF(Py_None);
-    pyrv = Py_None;
-  }
-  return pyrv;
+static PyObject* err_str(Error_data* data) {
+  uint32_t code = (uint32_t)PyLong_AsLong(data->pycode);
+  const char* name = kc::PolyDB::Error::codename((kc::PolyDB::Error::Code)code);
+  return PyUnicode_FromFormat("%s: %U", name, data->pymessage);
 }
 
 
 /**
- * Implementation of jump.
+ * Implementation of richcmp.
  */
-static PyObject* cur_jump(Cursor_data* data, PyObject* pyargs) {
-  int32_t argc = PyTuple_Size(pyargs);
-  if (argc > 1) {
-    throwinvarg();
-    return NULL;
-  }
-  PyObject* pykey = Py_None;
-  if (argc > 0) pykey = PyTuple_GetItem(pyargs, 0);
-  SoftCursor* cur = data->cur;
-  PyObject* pydb = data->pydb;
-  kc::PolyDB::Cursor* icur = cur->cur();
-  if (!icur) Py_RETURN_FALSE;
+static PyObject* err_richcmp(Error_data* data, PyObject* pyright, int op) {
   bool rv;
-  if (pykey == Py_None) {
-    NativeFunction nf((DB_data*)pydb);
-    rv = icur->jump();
-    nf.cleanup();
+  uint32_t code = (uint32_t)PyLong_AsLong(data->pycode);
+  uint32_t rcode;
+  if (PyObject_IsInstance(pyright, cls_err)) {
+    Error_data* rdata = (Error_data*)pyright;
+    rcode = (uint32_t)PyLong_AsLong(rdata->pycode);
+  } else if (PyLong_Check(pyright)) {
+    rcode = (uint32_t)PyLong_AsLong(pyright);
   } else {
-    SoftString key(pykey);
-    NativeFunction nf((DB_data*)pydb);
-    rv = icur->jump(key.ptr(), key.size());
-    nf.cleanup();
+    rcode = kc::INT32MAX;
+  }
+  switch (op) {
+    case Py_LT: rv = code < rcode; break;
+    case Py_LE: rv = code <= rcode; break;
+    case Py_EQ: rv = code == rcode; break;
+    case Py_NE: rv = code != rcode; break;
+    case Py_GT: rv = code > rcode; break;
+    case Py_GE: rv = code >= rcode; break;
+    default: rv = false; break;
   }
   if (rv) Py_RETURN_TRUE;
-  if (db_raise((DB_data*)pydb)) return NULL;
   Py_RETURN_FALSE;
 }
 
 
 /**
- * Implementation of jump_back.
+ * Implementation of set.
  */
-static PyObject* cur_jump_back(Cursor_data* data, PyObject* pyargs) {
+static PyObject* err_set(Error_data* data, PyObject* pyargs) {
   int32_t argc = PyTuple_Size(pyargs);
-  if (argc > 1) {
+  if (argc != 2) {
     throwinvarg();
     return NULL;
   }
-  PyObject* pykey = Py_None;
-  if (argc > 0) pykey = PyTuple_GetItem(pyargs, 0);
-  SoftCursor* cur = data->cur;
-  PyObject* pydb = data->pydb;
-  kc::PolyDB::Cursor* icur = cur->cur();
-  if (!icur) Py_RETURN_FALSE;
-  bool rv;
-  if (pykey == Py_None) {
-    NativeFunction nf((DB_data*)pydb);
-    rv = icur->jump_back();
-    nf.cleanup();
-  } else {
-    SoftString key(pykey);
-    NativeFunction nf((DB_data*)pydb);
-    rv = icur->jump_back(key.ptr(), key.size());
-    nf.cleanup();
+  PyObject* pycode = PyTuple_GetItem(pyargs, 0);
+  PyObject* pymessage = PyTuple_GetItem(pyargs, 1);
+  if (!PyLong_Check(pycode) && !PyUnicode_Check(pymessage)) {
+    throwinvarg();
+    return NULL;
   }
-  if (rv) Py_RETURN_TRUE;
-  if (db_raise((DB_data*)pydb)) return NULL;
-  Py_RETURN_FALSE;
+  Py_DECREF(data->pycode);
+  Py_DECREF(data->pymessage);
+  Py_INCREF(pycode);
+  data->pycode = pycode;
+  Py_INCREF(pymessage);
+  data->pymessage = pymessage;
+  Py_RETURN_NONE;
 }
 
 
 /**
- * Implementation of step.
+ * Implementation of code.
  */
-static PyObject* cur_step(Cursor_data* data) {
-  SoftCursor* cur = data->cur;
-  PyObject* pydb = data->pydb;
-  kc::PolyDB::Cursor* icur = cur->cur();
-  if (!icur) Py_RETURN_FALSE;
-  NativeFunction nf((DB_data*)pydb);
-  bool rv = icur->step();
-  nf.cleanup();
-  if (rv) Py_RETURN_TRUE;
-  if (db_raise((DB_data*)pydb)) return NULL;
-  Py_RETURN_FALSE;
+static PyObject* err_code(Error_data* data) {
+  Py_INCREF(data->pycode);
+  return data->pycode;
 }
 
 
 /**
- * Implementation of step_back.
+ * Implementation of name.
  */
-static PyObject* cur_step_back(Cursor_data* data) {
-  SoftCursor* cur = data->cur;
-  PyObject* pydb = data->pydb;
-  kc::PolyDB::Cursor* icur = cur->cur();
-  if (!icur) Py_RETURN_FALSE;
-  NativeFunction nf((DB_data*)pydb);
-  bool rv = icur->step_back();
-  nf.cleanup();
-  if (rv) Py_RETURN_TRUE;
-  if (db_raise((DB_data*)pydb)) return NULL;
-  Py_RETURN_FALSE;
+static PyObject* err_name(Error_data* data) {
+  uint32_t code = PyLong_AsLong(data->pycode);
+  const char* name = kc::PolyDB::Error::codename((kc::PolyDB::Error::Code)code);
+  return newstring(name);
 }
 
 
 /**
- * Implementation of db.
+ * Implementation of message.
  */
-static PyObject* cur_db(Cursor_data* data) {
-  SoftCursor* cur = data->cur;
-  PyObject* pydb = data->pydb;
-  kc::PolyDB::Cursor* icur = cur->cur();
-  if (!icur) Py_RETURN_FALSE;
-  Py_INCREF(data->pydb);
-  return pydb;
+static PyObject* err_message(Error_data* data) {
+  Py_INCREF(data->pymessage);
+  return data->pymessage;
 }
 
 
 /**
- * Implementation of error.
+ * Define objects of the Visitor class.
  */
-static PyObject* cur_error(Cursor_data* data) {
-  SoftCursor* cur = data->cur;
-  kc::PolyDB::Cursor* icur = cur->cur();
-  if (!icur) Py_RETURN_NONE;
-  kc::PolyDB::Error err = icur->error();
-  PyObject* pyerr = PyObject_CallMethod(mod_kc, (char*)"Error",
-                                        (char*)"(IU)", err.code(), err.message());
-  return pyerr;
-}
-
-
-/**
- * Implementation of __iter__.
- */
-static PyObject* cur_op_iter(Cursor_data* data) {
-  Py_INCREF((PyObject*)data);
-  return (PyObject*)data;
-}
-
-
-/**
- * Implementation of __next__.
- */
-static PyObject* cur_op_iternext(Cursor_data* data) {
-  SoftCursor* cur = data->cur;
-  PyObject* pydb = data->pydb;
-  kc::PolyDB::Cursor* icur = cur->cur();
-  if (!icur) return NULL;
-  NativeFunction nf((DB_data*)pydb);
-  size_t ksiz;
-  char* kbuf = icur->get_key(&ksiz, true);
-  nf.cleanup();
-  PyObject* pyrv;
-  if (kbuf) {
-    pyrv = newbytes(kbuf, ksiz);
-    delete[] kbuf;
-  } else {
-    pyrv = NULL;
-  }
-  return pyrv;
-}
-
-
-/**
- * Define objects of the DB class.
- */
-static bool define_db() {
-  static PyTypeObject type_db = { PyVarObject_HEAD_INIT(NULL, 0) };
+static bool define_vis() {
+  static PyTypeObject type_vis = { PyVarObject_HEAD_INIT(NULL, 0) };
   size_t zoff = offsetof(PyTypeObject, tp_name);
-  std::memset((char*)&type_db + zoff, 0, sizeof(type_db) - zoff);
-  type_db.tp_name = "kyotocabinet.DB";
-  type_db.tp_basicsize = sizeof(DB_data);
-  type_db.tp_itemsize = 0;
-  type_db.tp_flags = Py_TPFLAGS_DEFAULT | Py_TPFLAGS_BASETYPE;
-  type_db.tp_doc = "Interface of database abstraction.";
-  type_db.tp_new = db_new;
-  type_db.tp_dealloc = (destructor)db_dealloc;
-  type_db.tp_init = (initproc)db_init;
-  type_db.tp_repr = (unaryfunc)db_repr;
-  type_db.tp_str = (unaryfunc)db_str;
-  static PyMethodDef db_methods[] = {
-    { "error", (PyCFunction)db_error, METH_NOARGS,
-      "Get the last happened error." },
-    { "open", (PyCFunction)db_open, METH_VARARGS,
-      "Open a database file." },
-    { "close", (PyCFunction)db_close, METH_NOARGS,
-      "Close the database file." },
-    { "accept", (PyCFunction)db_accept, METH_VARARGS,
-      "Accept a visitor to a record." },
-    { "accept_bulk", (PyCFunction)db_accept_bulk, METH_VARARGS,
-      "Accept a visitor to multiple records at once." },
-    { "iterate", (PyCFunction)db_iterate, METH_VARARGS,
-      "Iterate to accept a visitor for each record." },
-    { "set", (PyCFunction)db_set, METH_VARARGS,
-      "Set the value of a record." },
-    { "add", (PyCFunction)db_add, METH_VARARGS,
-      "Add a record." },
-    { "replace", (PyCFunction)db_replace, METH_VARARGS,
-      "Replace the value of a record." },
-    { "append", (PyCFunction)db_append, METH_VARARGS,
-      "Append the value of a record." },
-    { "increment", (PyCFunction)db_increment, METH_VARARGS,
-      "Add a number to the numeric integer value of a record." },
-    { "increment_double", (PyCFunction)db_increment_double, METH_VARARGS,
-      "Add a number to the numeric double value of a record." },
-    { "cas", (PyCFunction)db_cas, METH_VARARGS,
-      "Perform compare-and-swap." },
-    { "remove", (PyCFunction)db_remove, METH_VARARGS,
-      "Remove a record." },
-    { "get", (PyCFunction)db_get, METH_VARARGS,
-      "Retrieve the value of a record." },
-    { "get_str", (PyCFunction)db_get_str, METH_VARARGS,
-      "Retrieve the value of a record." },
-    { "check", (PyCFunction)db_check, METH_VARARGS,
-      "Check the existence of a record." },
-    { "seize", (PyCFunction)db_seize, METH_VARARGS,
-      "Retrieve the value of a record and remove it atomically." },
-    { "get_seize", (PyCFunction)db_seize_str, METH_VARARGS,
-      "Retrieve the value of a record and remove it atomically." },
-    { "set_bulk", (PyCFunction)db_set_bulk, METH_VARARGS,
-      "Store records at once." },
-    { "remove_bulk", (PyCFunction)db_remove_bulk, METH_VARARGS,
-      "Remove records at once." },
-    { "get_bulk", (PyCFunction)db_get_bulk, METH_VARARGS,
-      "Retrieve records at once." },
-    { "get_bulk_str", (PyCFunction)db_get_bulk_str, METH_VARARGS,
-      "Retrieve records at once." },
-    { "clear", (PyCFunction)db_clear, METH_NOARGS,
-      "Remove all records." },
-    { "synchronize", (PyCFunction)db_synchronize, METH_VARARGS,
-      "Synchronize updated contents with the file and the device." },
-    { "occupy", (PyCFunction)db_occupy, METH_VARARGS,
-      "Occupy database by locking and do something meanwhile." },
-    { "copy", (PyCFunction)db_copy, METH_VARARGS,
-      "Create a copy of the database file." },
-    { "begin_transaction", (PyCFunction)db_begin_transaction, METH_VARARGS,
-      "Begin transaction." },
-    { "end_transaction", (PyCFunction)db_end_transaction, METH_VARARGS,
-      "End transaction." },
-    { "transaction", (PyCFunction)db_transaction, METH_VARARGS,
-      "Perform entire transaction by a functor." },
-    { "dump_snapshot", (PyCFunction)db_dump_snapshot, METH_VARARGS,
-      "Dump records into a snapshot file." },
-    { "load_snapshot", (PyCFunction)db_load_snapshot, METH_VARARGS,
-      "Load records from a snapshot file." },
-    { "count", (PyCFunction)db_count, METH_NOARGS,
-      "Get the number of records." },
-    { "size", (PyCFunction)db_size, METH_NOARGS,
-      "Get the size of the database file." },
-    { "path", (PyCFunction)db_path, METH_NOARGS,
-      "Get the path of the database file." },
-    { "status", (PyCFunction)db_status, METH_NOARGS,
-      "Get the miscellaneous status information." },
-    { "match_prefix", (PyCFunction)db_match_prefix, METH_VARARGS,
-      "Get keys matching a prefix string." },
-    { "match_regex", (PyCFunction)db_match_regex, METH_VARARGS,
-      "Get keys matching a regular expression string." },
-    { "match_similar", (PyCFunction)db_match_similar, METH_VARARGS,
-      "Get keys similar to a string in terms of the levenshtein distance." },
-    { "merge", (PyCFunction)db_merge, METH_VARARGS,
-      "Merge records from other databases." },
-    { "cursor", (PyCFunction)db_cursor, METH_NOARGS,
-      "Create a cursor object." },
-    { "cursor_process", (PyCFunction)db_cursor_process, METH_VARARGS,
-      "Process a cursor by the block parameter." },
-    { "shift", (PyCFunction)db_shift, METH_NOARGS,
-      "Remove the first record." },
-    { "shift_str", (PyCFunction)db_shift_str, METH_NOARGS,
-      "Remove the first record." },
-    { "tune_exception_rule", (PyCFunction)db_tune_exception_rule, METH_VARARGS,
-      "Set the rule about throwing exception." },
-    { "process", (PyCFunction)db_process, METH_VARARGS | METH_CLASS,
-      "Process a database by a functor" },
+  std::memset((char*)&type_vis + zoff, 0, sizeof(type_vis) - zoff);
+  type_vis.tp_name = "kyotocabinet.Visitor";
+  type_vis.tp_basicsize = sizeof(Visitor_data);
+  type_vis.tp_itemsize = 0;
+  type_vis.tp_flags = Py_TPFLAGS_DEFAULT | Py_TPFLAGS_BASETYPE;
+  type_vis.tp_doc = "Interface to access a record.";
+  type_vis.tp_new = vis_new;
+  type_vis.tp_dealloc = (destructor)vis_dealloc;
+  type_vis.tp_init = (initproc)vis_init;
+  static PyMethodDef vis_methods[] = {
+    { "visit_full", (PyCFunction)vis_visit_full, METH_VARARGS,
+      "Visit a record.", },
+    { "visit_empty", (PyCFunction)vis_visit_empty, METH_VARARGS,
+      "Visit a empty record space." },
     { NULL, NULL, 0, NULL }
   };
-  type_db.tp_methods = db_methods;
-  static PyMappingMethods type_db_map;
-  std::memset(&type_db_map, 0, sizeof(type_db_map));
-  type_db_map.mp_length = (lenfunc)db_op_len;
-  type_db_map.mp_subscript = (binaryfunc)db_op_getitem;
-  type_db_map.mp_ass_subscript = (objobjargproc)db_op_setitem;
-  type_db.tp_as_mapping = &type_db_map;
-  type_db.tp_iter = (getiterfunc)db_op_iter;
-  if (PyType_Ready(&type_db) != 0) return false;
-  cls_db = (PyObject*)&type_db;
-  if (!setconstuint32(cls_db, "GEXCEPTIONAL", GEXCEPTIONAL)) return false;
-  if (!setconstuint32(cls_db, "GCONCURRENT", GCONCURRENT)) return false;
-  if (!setconstuint32(cls_db, "OREADER", kc::PolyDB::OREADER)) return false;
-  if (!setconstuint32(cls_db, "OWRITER", kc::PolyDB::OWRITER)) return false;
-  if (!setconstuint32(cls_db, "OCREATE", kc::PolyDB::OCREATE)) return false;
-  if (!setconstuint32(cls_db, "OTRUNCATE", kc::PolyDB::OTRUNCATE)) return false;
-  if (!setconstuint32(cls_db, "OAUTOTRAN", kc::PolyDB::OAUTOTRAN)) return false;
-  if (!setconstuint32(cls_db, "OAUTOSYNC", kc::PolyDB::OAUTOSYNC)) return false;
-  if (!setconstuint32(cls_db, "ONOLOCK", kc::PolyDB::ONOLOCK)) return false;
-  if (!setconstuint32(cls_db, "OTRYLOCK", kc::PolyDB::OTRYLOCK)) return false;
-  if (!setconstuint32(cls_db, "ONOREPAIR", kc::PolyDB::ONOREPAIR)) return false;
-  if (!setconstuint32(cls_db, "MSET", kc::PolyDB::MSET)) return false;
-  if (!setconstuint32(cls_db, "MADD", kc::PolyDB::MADD)) return false;
-  if (!setconstuint32(cls_db, "MREPLACE", kc::PolyDB::MREPLACE)) return false;
-  if (!setconstuint32(cls_db, "MAPPEND", kc::PolyDB::MAPPEND)) return false;
-  Py_INCREF(cls_db);
-  if (PyModule_AddObject(mod_kc, "DB", cls_db) != 0) return false;
+  type_vis.tp_methods = vis_methods;
+  if (PyType_Ready(&type_vis) != 0) return false;
+  cls_vis = (PyObject*)&type_vis;
+  PyObject* pyname = PyUnicode_FromString("NOP");
+  obj_vis_nop = PyUnicode_FromString("[NOP]");
+  if (PyObject_GenericSetAttr(cls_vis, pyname, obj_vis_nop) != 0) return false;
+  pyname = PyUnicode_FromString("REMOVE");
+  obj_vis_remove = PyUnicode_FromString("[REMOVE]");
+  if (PyObject_GenericSetAttr(cls_vis, pyname, obj_vis_remove) != 0) return false;
+  Py_INCREF(cls_vis);
+  if (PyModule_AddObject(mod_kc, "Visitor", cls_vis) != 0) return false;
   return true;
 }
 
@@ -2135,12 +4216,9 @@ static bool define_db() {
 /**
  * Implementation of new.
  */
-static PyObject* db_new(PyTypeObject* pytype, PyObject* pyargs, PyObject* pykwds) {
-  DB_data* data = (DB_data*)pytype->tp_alloc(pytype, 0);
+static PyObject* vis_new(PyTypeObject* pytype, PyObject* pyargs, PyObject* pykwds) {
+  Visitor_data* data = (Visitor_data*)pytype->tp_alloc(pytype, 0);
   if (!data) return NULL;
-  data->db = NULL;
-  data->exbits = 0;
-  data->pylock = NULL;
   return (PyObject*)data;
 }
 
@@ -2148,126 +4226,5183 @@ static PyObject* db_new(PyTypeObject* pytype, PyObject* pyargs, PyObject* pykwds
 /**
  * Implementation of dealloc.
  */
-static void db_dealloc(DB_data* data) {
-  kc::PolyDB* db = data->db;
-  PyObject* pylock = data->pylock;
-  Py_DECREF(pylock);
-  delete db;
+static void vis_dealloc(Visitor_data* data) {
   Py_TYPE(data)->tp_free((PyObject*)data);
 }
 
 
 /**
- * Raise the exception of an error code.
+ * Implementation of init.
  */
-static bool db_raise(DB_data* data) {
-  if (data->exbits == 0) return false;
-  kc::PolyDB::Error err = data->db->error();
-  uint32_t code = err.code();
-  if (data->exbits & (1 << code)) {
-    PyErr_Format(cls_err_children[code], "%u: %s", code, err.message());
-    return true;
+static int vis_init(Visitor_data* data, PyObject* pyargs, PyObject* pykwds) {
+  int32_t argc = PyTuple_Size(pyargs);
+  if (argc != 0) {
+    throwinvarg();
+    return -1;
   }
-  return false;
+  return 0;
 }
 
 
 /**
- * Implementation of init.
+ * Implementation of visit_full.
  */
-static int db_init(DB_data* data, PyObject* pyargs, PyObject* pykwds) {
+static PyObject* vis_visit_full(Visitor_data* data, PyObject* pyargs) {
   int32_t argc = PyTuple_Size(pyargs);
-  PyObject* pyopts = Py_None;
-  if (argc > 0) pyopts = PyTuple_GetItem(pyargs, 0);
-  data->db = new kc::PolyDB();
-  uint32_t opts = PyLong_Check(pyopts) ? (uint32_t)PyLong_AsLong(pyopts) : 0;
-  if (opts & GEXCEPTIONAL) {
-    uint32_t exbits = 0;
-    exbits |= 1 << kc::PolyDB::Error::NOIMPL;
-    exbits |= 1 << kc::PolyDB::Error::INVALID;
-    exbits |= 1 << kc::PolyDB::Error::NOREPOS;
-    exbits |= 1 << kc::PolyDB::Error::NOPERM;
-    exbits |= 1 << kc::PolyDB::Error::BROKEN;
-    exbits |= 1 << kc::PolyDB::Error::SYSTEM;
-    exbits |= 1 << kc::PolyDB::Error::MISC;
-    data->exbits = exbits;
-  } else {
-    data->exbits = 0;
+  if (argc != 2) {
+    throwinvarg();
+    return NULL;
   }
-  if (opts & GCONCURRENT) {
-    Py_INCREF(Py_None);
-    data->pylock = Py_None;
-  } else {
-    data->pylock = PyObject_CallMethod(mod_th, (char*)"Lock", NULL);
+  Py_INCREF(obj_vis_nop);
+  return obj_vis_nop;
+}
+
+
+/**
+ * Implementation of visit_empty.
+ */
+static PyObject* vis_visit_empty(Visitor_data* data, PyObject* pyargs) {
+  int32_t argc = PyTuple_Size(pyargs);
+  if (argc != 1) {
+    throwinvarg();
+    return NULL;
+  }
+  Py_INCREF(obj_vis_nop);
+  return obj_vis_nop;
+}
+
+
+/**
+ * Define objects of the FileProcessor class.
+ */
+static bool define_fproc() {
+  static PyTypeObject type_fproc = { PyVarObject_HEAD_INIT(NULL, 0) };
+  size_t zoff = offsetof(PyTypeObject, tp_name);
+  std::memset((char*)&type_fproc + zoff, 0, sizeof(type_fproc) - zoff);
+  type_fproc.tp_name = "kyotocabinet.FileProcessor";
+  type_fproc.tp_basicsize = sizeof(FileProcessor_data);
+  type_fproc.tp_itemsize = 0;
+  type_fproc.tp_flags = Py_TPFLAGS_DEFAULT | Py_TPFLAGS_BASETYPE;
+  type_fproc.tp_doc = "Interface to process the database file.";
+  type_fproc.tp_new = fproc_new;
+  type_fproc.tp_dealloc = (destructor)fproc_dealloc;
+  type_fproc.tp_init = (initproc)fproc_init;
+  static PyMethodDef fproc_methods[] = {
+    { "process", (PyCFunction)fproc_process, METH_VARARGS,
+      "Process the database file.", },
+    { NULL, NULL, 0, NULL }
+  };
+  type_fproc.tp_methods = fproc_methods;
+  if (PyType_Ready(&type_fproc) != 0) return false;
+  cls_fproc = (PyObject*)&type_fproc;
+  Py_INCREF(cls_fproc);
+  if (PyModule_AddObject(mod_kc, "FileProcessor", cls_fproc) != 0) return false;
+  return true;
+}
+
+
+/**
+ * Implementation of new.
+ */
+static PyObject* fproc_new(PyTypeObject* pytype, PyObject* pyargs, PyObject* pykwds) {
+  FileProcessor_data* data = (FileProcessor_data*)pytype->tp_alloc(pytype, 0);
+  if (!data) return NULL;
+  return (PyObject*)data;
+}
+
+
+/**
+ * Implementation of dealloc.
+ */
+static void fproc_dealloc(FileProcessor_data* data) {
+  Py_TYPE(data)->tp_free((PyObject*)data);
+}
+
+
+/**
+ * Implementation of init.
+ */
+static int fproc_init(FileProcessor_data* data, PyObject* pyargs, PyObject* pykwds) {
+  int32_t argc = PyTuple_Size(pyargs);
+  if (argc != 0) {
+    throwinvarg();
+    return -1;
+  }
+  return 0;
+}
+
+
+/**
+ * Implementation of process.
+ */
+static PyObject* fproc_process(FileProcessor_data* data, PyObject* pyargs) {
+  int32_t argc = PyTuple_Size(pyargs);
+  if (argc != 3) {
+    throwinvarg();
+    return NULL;
+  }
+  Py_RETURN_TRUE;
+}
+
+
+/**
+ * Define objects of the Cursor class.
+ */
+static bool define_cur() {
+  static PyTypeObject type_cur = { PyVarObject_HEAD_INIT(NULL, 0) };
+  size_t zoff = offsetof(PyTypeObject, tp_name);
+  std::memset((char*)&type_cur + zoff, 0, sizeof(type_cur) - zoff);
+  type_cur.tp_name = "kyotocabinet.Cursor";
+  type_cur.tp_basicsize = sizeof(Cursor_data);
+  type_cur.tp_itemsize = 0;
+  type_cur.tp_flags = Py_TPFLAGS_DEFAULT | Py_TPFLAGS_BASETYPE;
+  type_cur.tp_doc = "Interface of cursor to indicate a record.";
+  type_cur.tp_new = cur_new;
+  type_cur.tp_dealloc = (destructor)cur_dealloc;
+  type_cur.tp_init = (initproc)cur_init;
+  type_cur.tp_repr = (unaryfunc)cur_repr;
+  type_cur.tp_str = (unaryfunc)cur_str;
+  static PyMethodDef cur_methods[] = {
+    { "disable", (PyCFunction)cur_disable, METH_NOARGS,
+      "Disable the cursor." },
+    { "accept", (PyCFunction)cur_accept, METH_VARARGS,
+      "Accept a visitor to the current record." },
+    { "set_value", (PyCFunction)cur_set_value, METH_VARARGS,
+      "Set the value of the current record." },
+    { "remove", (PyCFunction)cur_remove, METH_NOARGS,
+      "Remove the current record." },
+    { "get_key", (PyCFunction)cur_get_key, METH_VARARGS,
+      "Get the key of the current record." },
+    { "get_key_str", (PyCFunction)cur_get_key_str, METH_VARARGS,
+      "Get the key of the current record." },
+    { "get_value", (PyCFunction)cur_get_value, METH_VARARGS,
+      "Get the value of the current record." },
+    { "get_value_str", (PyCFunction)cur_get_value_str, METH_VARARGS,
+      "Get the value of the current record." },
+    { "get", (PyCFunction)cur_get, METH_VARARGS,
+      "Get a pair of the key and the value of the current record." },
+    { "get_str", (PyCFunction)cur_get_str, METH_VARARGS,
+      "Get a pair of the key and the value of the current record." },
+    { "seize", (PyCFunction)cur_seize, METH_NOARGS,
+      "Get a pair of the key and the value of the current record and remove it atomically." },
+    { "seize_str", (PyCFunction)cur_seize_str, METH_NOARGS,
+      "Get a pair of the key and the value of the current record and remove it atomically." },
+    { "jump", (PyCFunction)cur_jump, METH_VARARGS,
+      "Jump the cursor to a record for forward scan." },
+    { "jump_back", (PyCFunction)cur_jump_back, METH_VARARGS,
+      "Jump the cursor to a record for backward scan." },
+    { "step", (PyCFunction)cur_step, METH_NOARGS,
+      "Step the cursor to the next record." },
+    { "step_back", (PyCFunction)cur_step_back, METH_NOARGS,
+      "Step the cursor to the previous record." },
+    { "fetch", (PyCFunction)cur_fetch, METH_VARARGS,
+      "Get records passing a filter while stepping the cursor." },
+    { "db", (PyCFunction)cur_db, METH_NOARGS,
+      "Get the database object." },
+    { "error", (PyCFunction)cur_error, METH_NOARGS,
+      "Get the last happened error." },
+    { NULL, NULL, 0, NULL }
+  };
+  type_cur.tp_methods = cur_methods;
+  type_cur.tp_iter = (getiterfunc)cur_op_iter;
+  type_cur.tp_iternext = (iternextfunc)cur_op_iternext;
+  if (PyType_Ready(&type_cur) != 0) return false;
+  cls_cur = (PyObject*)&type_cur;
+  Py_INCREF(cls_cur);
+  if (PyModule_AddObject(mod_kc, "Cursor", cls_cur) != 0) return false;
+  return true;
+}
+
+
+/**
+ * Implementation of new.
+ */
+static PyObject* cur_new(PyTypeObject* pytype, PyObject* pyargs, PyObject* pykwds) {
+  Cursor_data* data = (Cursor_data*)pytype->tp_alloc(pytype, 0);
+  if (!data) return NULL;
+  Py_INCREF(Py_None);
+  data->cur = NULL;
+  data->pydb = Py_None;
+  return (PyObject*)data;
+}
+
+
+/**
+ * Implementation of dealloc.
+ */
+static void cur_dealloc(Cursor_data* data) {
+  SoftCursor* cur = data->cur;
+  PyObject* pydb = data->pydb;
+  Py_DECREF(pydb);
+  delete cur;
+  Py_TYPE(data)->tp_free((PyObject*)data);
+}
+
+
+/**
+ * Implementation of init.
+ */
+static int cur_init(Cursor_data* data, PyObject* pyargs, PyObject* pykwds) {
+  int32_t argc = PyTuple_Size(pyargs);
+  if (argc != 1) {
+    throwinvarg();
+    return -1;
+  }
+  PyObject* pydb = PyTuple_GetItem(pyargs, 0);
+  if (!PyObject_IsInstance(pydb, cls_db)) {
+    throwinvarg();
+    return -1;
+  }
+  DB_data* dbdata = (DB_data*)pydb;
+  kc::PolyDB* db = dbdata->db;
+  NativeFunction nf((DB_data*)pydb);
+  g_curbur.sweap();
+  data->cur = new SoftCursor(db);
+  nf.cleanup();
+  Py_INCREF(pydb);
+  data->pydb = pydb;
+  return 0;
+}
+
+
+/**
+ * Implementation of repr.
+ */
+static PyObject* cur_repr(Cursor_data* data) {
+  SoftCursor* cur = data->cur;
+  PyObject* pydb = data->pydb;
+  kc::PolyDB::Cursor* icur = cur->cur();
+  if (!icur) return newstring("<kyotocabinet.Cursor: (disabled)>");
+  NativeFunction nf((DB_data*)pydb);
+  kc::PolyDB* db = icur->db();
+  std::string path = db->path();
+  if (path.size() < 1) path = "(None)";
+  std::string str;
+  kc::strprintf(&str, "<kyotocabinet.Cursor: %s: ", path.c_str());
+  size_t ksiz;
+  char* kbuf = icur->get_key(&ksiz);
+  if (kbuf) {
+    str.append(kbuf, ksiz);
+    delete[] kbuf;
+  } else {
+    str.append("(None)");
+  }
+  str.append(">");
+  nf.cleanup();
+  return PyUnicode_FromString(str.c_str());
+}
+
+
+/**
+ * Implementation of str.
+ */
+static PyObject* cur_str(Cursor_data* data) {
+  SoftCursor* cur = data->cur;
+  PyObject* pydb = data->pydb;
+  kc::PolyDB::Cursor* icur = cur->cur();
+  if (!icur) return newstring("(disabled)");
+  NativeFunction nf((DB_data*)pydb);
+  kc::PolyDB* db = icur->db();
+  std::string path = db->path();
+  if (path.size() < 1) path = "(None)";
+  std::string str;
+  kc::strprintf(&str, "%s: ", path.c_str());
+  size_t ksiz;
+  char* kbuf = icur->get_key(&ksiz);
+  if (kbuf) {
+    str.append(kbuf, ksiz);
+    delete[] kbuf;
+  } else {
+    str.append("(None)");
+  }
+  nf.cleanup();
+  return PyUnicode_FromString(str.c_str());
+}
+
+
+/**
+ * Implementation of disable.
+ */
+static PyObject* cur_disable(Cursor_data* data) {
+  SoftCursor* cur = data->cur;
+  PyObject* pydb = data->pydb;
+  kc::PolyDB::Cursor* icur = cur->cur();
+  if (!icur) Py_RETURN_NONE;
+  NativeFunction nf((DB_data*)pydb, "cursor.disable");
+  cur->disable();
+  nf.cleanup();
+  Py_RETURN_NONE;
+}
+
+
+/**
+ * Implementation of accept.
+ */
+static PyObject* cur_accept(Cursor_data* data, PyObject* pyargs) {
+  int32_t argc = PyTuple_Size(pyargs);
+  if (argc < 1) {
+    throwinvarg();
+    return NULL;
+  }
+  SoftCursor* cur = data->cur;
+  PyObject* pydb = data->pydb;
+  kc::PolyDB::Cursor* icur = cur->cur();
+  if (!icur) Py_RETURN_FALSE;
+  if (((DB_data*)pydb)->pylock == Py_None) {
+    icur->db()->set_error(kc::PolyDB::Error::INVALID, "unsupported method");
+    if (db_raise((DB_data*)pydb)) return NULL;
+    Py_RETURN_NONE;
+  }
+  PyObject* pyvisitor = PyTuple_GetItem(pyargs, 0);
+  PyObject* pywritable = Py_None;
+  if (argc > 1) pywritable = PyTuple_GetItem(pyargs, 1);
+  PyObject* pystep = Py_None;
+  if (argc > 2) pystep = PyTuple_GetItem(pyargs, 2);
+  bool writable = pywritable == Py_None || PyObject_IsTrue(pywritable);
+  bool step = PyObject_IsTrue(pystep);
+  bool rv;
+  if (PyObject_IsInstance(pyvisitor, cls_vis) || PyCallable_Check(pyvisitor)) {
+    SoftVisitor visitor(pyvisitor, writable, ((DB_data*)pydb)->hub);
+    if (writable) db_admit((DB_data*)pydb);
+    NativeFunction nf((DB_data*)pydb, "cursor.accept");
+    rv = icur->accept(&visitor, writable, step);
+    nf.cleanup();
+    PyObject* pyextype, *pyexvalue, *pyextrace;
+    if (visitor.exception(&pyextype, &pyexvalue, &pyextrace)) {
+      PyErr_SetObject(pyextype, pyexvalue);
+      return NULL;
+    }
+  } else {
+    throwinvarg();
+    return NULL;
+  }
+  if (rv) Py_RETURN_TRUE;
+  if (db_raise((DB_data*)pydb)) return NULL;
+  Py_RETURN_FALSE;
+}
+
+
+/**
+ * Implementation of set_value.
+ */
+static PyObject* cur_set_value(Cursor_data* data, PyObject* pyargs) {
+  int32_t argc = PyTuple_Size(pyargs);
+  if (argc < 1 || argc > 2) {
+    throwinvarg();
+    return NULL;
+  }
+  PyObject* pyvalue = PyTuple_GetItem(pyargs, 0);
+  PyObject* pystep = Py_None;
+  if (argc > 1) pystep = PyTuple_GetItem(pyargs, 1);
+  SoftCursor* cur = data->cur;
+  PyObject* pydb = data->pydb;
+  kc::PolyDB::Cursor* icur = cur->cur();
+  if (!icur) Py_RETURN_FALSE;
+  SoftString value(pyvalue);
+  bool step = PyObject_IsTrue(pystep);
+  UpdateHub* hub = ((DB_data*)pydb)->hub;
+  db_admit((DB_data*)pydb);
+  NativeFunction nf((DB_data*)pydb, "cursor.set_value");
+  size_t ksiz = 0;
+  char* kbuf = hub->active() ? icur->get_key(&ksiz, false) : NULL;
+  bool rv = icur->set_value(value.ptr(), value.size(), step);
+  nf.transfer(value.size(), 0);
+  if (rv && kbuf) hub->notify(UpdateListener::USET, kbuf, ksiz, value.ptr(), value.size());
+  nf.cleanup();
+  delete[] kbuf;
+  if (rv) Py_RETURN_TRUE;
+  if (db_raise((DB_data*)pydb)) return NULL;
+  Py_RETURN_FALSE;
+}
+
+
+/**
+ * Implementation of remove.
+ */
+static PyObject* cur_remove(Cursor_data* data) {
+  SoftCursor* cur = data->cur;
+  PyObject* pydb = data->pydb;
+  kc::PolyDB::Cursor* icur = cur->cur();
+  if (!icur) Py_RETURN_FALSE;
+  UpdateHub* hub = ((DB_data*)pydb)->hub;
+  db_admit((DB_data*)pydb);
+  NativeFunction nf((DB_data*)pydb, "cursor.remove");
+  size_t ksiz = 0;
+  char* kbuf = hub->active() ? icur->get_key(&ksiz, false) : NULL;
+  bool rv = icur->remove();
+  if (rv && kbuf) hub->notify(UpdateListener::UREMOVE, kbuf, ksiz);
+  nf.cleanup();
+  delete[] kbuf;
+  if (rv) Py_RETURN_TRUE;
+  if (db_raise((DB_data*)pydb)) return NULL;
+  Py_RETURN_FALSE;
+}
+
+
+/**
+ * Implementation of get_key.
+ */
+static PyObject* cur_get_key(Cursor_data* data, PyObject* pyargs) {
+  int32_t argc = PyTuple_Size(pyargs);
+  if (argc > 1) {
+    throwinvarg();
+    return NULL;
+  }
+  PyObject* pystep = Py_None;
+  if (argc > 0) pystep = PyTuple_GetItem(pyargs, 0);
+  SoftCursor* cur = data->cur;
+  PyObject* pydb = data->pydb;
+  kc::PolyDB::Cursor* icur = cur->cur();
+  if (!icur) Py_RETURN_NONE;
+  bool step = PyObject_IsTrue(pystep);
+  NativeFunction nf((DB_data*)pydb, "cursor.get_key");
+  size_t ksiz;
+  char* kbuf = icur->get_key(&ksiz, step);
+  nf.transfer(0, kbuf ? ksiz : 0);
+  nf.cleanup();
+  PyObject* pyrv;
+  if (kbuf) {
+    pyrv = newbytes(kbuf, ksiz);
+    delete[] kbuf;
+  } else {
+    if (db_raise((DB_data*)pydb)) return NULL;
+    Py_INCREF(Py_None);
+    pyrv = Py_None;
+  }
+  return pyrv;
+}
+
+
+/**
+ * Implementation of get_key_str.
+ */
+static PyObject* cur_get_key_str(Cursor_data* data, PyObject* pyargs) {
+  int32_t argc = PyTuple_Size(pyargs);
+  if (argc > 1) {
+    throwinvarg();
+    return NULL;
+  }
+  PyObject* pystep = Py_None;
+  if (argc > 0) pystep = PyTuple_GetItem(pyargs, 0);
+  SoftCursor* cur = data->cur;
+  PyObject* pydb = data->pydb;
+  kc::PolyDB::Cursor* icur = cur->cur();
+  if (!icur) Py_RETURN_NONE;
+  bool step = PyObject_IsTrue(pystep);
+  NativeFunction nf((DB_data*)pydb, "cursor.get_key_str");
+  size_t ksiz;
+  char* kbuf = icur->get_key(&ksiz, step);
+  nf.cleanup();
+  PyObject* pyrv;
+  if (kbuf) {
+    pyrv = newstring(kbuf);
+    delete[] kbuf;
+  } else {
+    if (db_raise((DB_data*)pydb)) return NULL;
+    Py_INCREF(Py_None);
+    pyrv = Py_None;
+  }
+  return pyrv;
+}
+
+
+/**
+ * Implementation of get_value.
+ */
+static PyObject* cur_get_value(Cursor_data* data, PyObject* pyargs) {
+  int32_t argc = PyTuple_Size(pyargs);
+  if (argc > 1) {
+    throwinvarg();
+    return NULL;
+  }
+  PyObject* pystep = Py_None;
+  if (argc > 0) pystep = PyTuple_GetItem(pyargs, 0);
+  SoftCursor* cur = data->cur;
+  PyObject* pydb = data->pydb;
+  kc::PolyDB::Cursor* icur = cur->cur();
+  if (!icur) Py_RETURN_NONE;
+  bool step = PyObject_IsTrue(pystep);
+  NativeFunction nf((DB_data*)pydb, "cursor.get_value");
+  size_t vsiz;
+  char* vbuf = icur->get_value(&vsiz, step);
+  nf.transfer(0, vbuf ? vsiz : 0);
+  nf.cleanup();
+  PyObject* pyrv;
+  if (vbuf) {
+    pyrv = newbytes(vbuf, vsiz);
+    delete[] vbuf;
+  } else {
+    if (db_raise((DB_data*)pydb)) return NULL;
+    Py_INCREF(Py_None);
+    pyrv = Py_None;
+  }
+  return pyrv;
+}
+
+
+/**
+ * Implementation of get_value_str.
+ */
+static PyObject* cur_get_value_str(Cursor_data* data, PyObject* pyargs) {
+  int32_t argc = PyTuple_Size(pyargs);
+  if (argc > 1) {
+    throwinvarg();
+    return NULL;
+  }
+  PyObject* pystep = Py_None;
+  if (argc > 0) pystep = PyTuple_GetItem(pyargs, 0);
+  SoftCursor* cur = data->cur;
+  PyObject* pydb = data->pydb;
+  kc::PolyDB::Cursor* icur = cur->cur();
+  if (!icur) Py_RETURN_NONE;
+  bool step = PyObject_IsTrue(pystep);
+  NativeFunction nf((DB_data*)pydb, "cursor.get_value_str");
+  size_t vsiz;
+  char* vbuf = icur->get_value(&vsiz, step);
+  nf.cleanup();
+  PyObject* pyrv;
+  if (vbuf) {
+    pyrv = newstring(vbuf);
+    delete[] vbuf;
+  } else {
+    if (db_raise((DB_data*)pydb)) return NULL;
+    Py_INCREF(Py_None);
+    pyrv = Py_None;
+  }
+  return pyrv;
+}
+
+
+/**
+ * Implementation of get.
+ */
+static PyObject* cur_get(Cursor_data* data, PyObject* pyargs) {
+  int32_t argc = PyTuple_Size(pyargs);
+  if (argc > 1) {
+    throwinvarg();
+    return NULL;
+  }
+  PyObject* pystep = Py_None;
+  if (argc > 0) pystep = PyTuple_GetItem(pyargs, 0);
+  SoftCursor* cur = data->cur;
+  PyObject* pydb = data->pydb;
+  kc::PolyDB::Cursor* icur = cur->cur();
+  if (!icur) Py_RETURN_NONE;
+  bool step = PyObject_IsTrue(pystep);
+  NativeFunction nf((DB_data*)pydb, "cursor.get");
+  const char* vbuf;
+  size_t ksiz, vsiz;
+  char* kbuf = icur->get(&ksiz, &vbuf, &vsiz, step);
+  nf.transfer(0, kbuf ? ksiz + vsiz : 0);
+  nf.cleanup();
+  PyObject* pyrv;
+  if (kbuf) {
+    pyrv = PyTuple_New(2);
+    PyObject* pykey = newbytes(kbuf, ksiz);
+    PyObject* pyvalue = newbytes(vbuf, vsiz);
+    PyTuple_SetItem(pyrv, 0, pykey);
+    PyTuple_SetItem(pyrv, 1, pyvalue);
+    delete[] kbuf;
+  } else {
+    if (db_raise((DB_data*)pydb)) return NULL;
+    Py_INCREF(Py_None);
+    pyrv = Py_None;
+  }
+  return pyrv;
+}
+
+
+/**
+ * Implementation of get_str.
+ */
+static PyObject* cur_get_str(Cursor_data* data, PyObject* pyargs) {
+  int32_t argc = PyTuple_Size(pyargs);
+  if (argc > 1) {
+    throwinvarg();
+    return NULL;
+  }
+  PyObject* pystep = Py_None;
+  if (argc > 0) pystep = PyTuple_GetItem(pyargs, 0);
+  SoftCursor* cur = data->cur;
+  PyObject* pydb = data->pydb;
+  kc::PolyDB::Cursor* icur = cur->cur();
+  if (!icur) Py_RETURN_NONE;
+  bool step = PyObject_IsTrue(pystep);
+  NativeFunction nf((DB_data*)pydb, "cursor.get_str");
+  const char* vbuf;
+  size_t ksiz, vsiz;
+  char* kbuf = icur->get(&ksiz, &vbuf, &vsiz, step);
+  nf.cleanup();
+  PyObject* pyrv;
+  if (kbuf) {
+    pyrv = PyTuple_New(2);
+    PyObject* pykey = newstring(kbuf);
+    PyObject* pyvalue = newstring(vbuf);
+    PyTuple_SetItem(pyrv, 0, pykey);
+    PyTuple_SetItem(pyrv, 1, pyvalue);
+    delete[] kbuf;
+  } else {
+    if (db_raise((DB_data*)pydb)) return NULL;
+    Py_INCREF(Py_None);
+    pyrv = Py_None;
+  }
+  return pyrv;
+}
+
+
+/**
+ * Implementation of seize.
+ */
+static PyObject* cur_seize(Cursor_data* data) {
+  SoftCursor* cur = data->cur;
+  PyObject* pydb = data->pydb;
+  kc::PolyDB::Cursor* icur = cur->cur();
+  if (!icur) Py_RETURN_NONE;
+  db_admit((DB_data*)pydb);
+  NativeFunction nf((DB_data*)pydb, "cursor.seize");
+  const char* vbuf;
+  size_t ksiz, vsiz;
+  char* kbuf = icur->seize(&ksiz, &vbuf, &vsiz);
+  if (kbuf) ((DB_data*)pydb)->hub->notify(UpdateListener::UREMOVE, kbuf, ksiz);
+  nf.cleanup();
+  PyObject* pyrv;
+  if (kbuf) {
+    pyrv = PyTuple_New(2);
+    PyObject* pykey = newbytes(kbuf, ksiz);
+    PyObject* pyvalue = newbytes(vbuf, vsiz);
+    PyTuple_SetItem(pyrv, 0, pykey);
+    PyTuple_SetItem(pyrv, 1, pyvalue);
+    delete[] kbuf;
+  } else {
+    if (db_raise((DB_data*)pydb)) return NULL;
+    Py_INCREF(Py_None);
+    pyrv = Py_None;
+  }
+  return pyrv;
+}
+
+
+/**
+ * Implementation of seize_str.
+ */
+static PyObject* cur_seize_str(Cursor_data* data) {
+  SoftCursor* cur = data->cur;
+  PyObject* pydb = data->pydb;
+  kc::PolyDB::Cursor* icur = cur->cur();
+  if (!icur) Py_RETURN_NONE;
+  db_admit((DB_data*)pydb);
+  NativeFunction nf((DB_data*)pydb, "cursor.seize_str");
+  const char* vbuf;
+  size_t ksiz, vsiz;
+  char* kbuf = icur->seize(&ksiz, &vbuf, &vsiz);
+  if (kbuf) ((DB_data*)pydb)->hub->notify(UpdateListener::UREMOVE, kbuf, ksiz);
+  nf.cleanup();
+  PyObject* pyrv;
+  if (kbuf) {
+    pyrv = PyTuple_New(2);
+    PyObject* pykey = newstring(kbuf);
+    PyObject* pyvalue = newstring(vbuf);
+    PyTuple_SetItem(pyrv, 0, pykey);
+    PyTuple_SetItem(pyrv, 1, pyvalue);
+    delete[] kbuf;
+  } else {
+    if (db_raise((DB_data*)pydb)) return NULL;
+    Py_INCREF(Py_None);
+    pyrv = Py_None;
+  }
+  return pyrv;
+}
+
+
+/**
+ * Implementation of jump.
+ */
+static PyObject* cur_jump(Cursor_data* data, PyObject* pyargs) {
+  int32_t argc = PyTuple_Size(pyargs);
+  if (argc > 1) {
+    throwinvarg();
+    return NULL;
+  }
+  PyObject* pykey = Py_None;
+  if (argc > 0) pykey = PyTuple_GetItem(pyargs, 0);
+  SoftCursor* cur = data->cur;
+  PyObject* pydb = data->pydb;
+  kc::PolyDB::Cursor* icur = cur->cur();
+  if (!icur) Py_RETURN_FALSE;
+  bool rv;
+  if (pykey == Py_None) {
+    NativeFunction nf((DB_data*)pydb, "cursor.jump");
+    rv = icur->jump();
+    nf.cleanup();
+  } else {
+    SoftString key(pykey);
+    NativeFunction nf((DB_data*)pydb, "cursor.jump");
+    rv = icur->jump(key.ptr(), key.size());
+    nf.cleanup();
+  }
+  if (rv) Py_RETURN_TRUE;
+  if (db_raise((DB_data*)pydb)) return NULL;
+  Py_RETURN_FALSE;
+}
+
+
+/**
+ * Implementation of jump_back.
+ */
+static PyObject* cur_jump_back(Cursor_data* data, PyObject* pyargs) {
+  int32_t argc = PyTuple_Size(pyargs);
+  if (argc > 1) {
+    throwinvarg();
+    return NULL;
+  }
+  PyObject* pykey = Py_None;
+  if (argc > 0) pykey = PyTuple_GetItem(pyargs, 0);
+  SoftCursor* cur = data->cur;
+  PyObject* pydb = data->pydb;
+  kc::PolyDB::Cursor* icur = cur->cur();
+  if (!icur) Py_RETURN_FALSE;
+  bool rv;
+  if (pykey == Py_None) {
+    NativeFunction nf((DB_data*)pydb, "cursor.jump_back");
+    rv = icur->jump_back();
+    nf.cleanup();
+  } else {
+    SoftString key(pykey);
+    NativeFunction nf((DB_data*)pydb, "cursor.jump_back");
+    rv = icur->jump_back(key.ptr(), key.size());
+    nf.cleanup();
+  }
+  if (rv) Py_RETURN_TRUE;
+  if (db_raise((DB_data*)pydb)) return NULL;
+  Py_RETURN_FALSE;
+}
+
+
+/**
+ * Implementation of step.
+ */
+static PyObject* cur_step(Cursor_data* data) {
+  SoftCursor* cur = data->cur;
+  PyObject* pydb = data->pydb;
+  kc::PolyDB::Cursor* icur = cur->cur();
+  if (!icur) Py_RETURN_FALSE;
+  NativeFunction nf((DB_data*)pydb, "cursor.step");
+  bool rv = icur->step();
+  nf.cleanup();
+  if (rv) Py_RETURN_TRUE;
+  if (db_raise((DB_data*)pydb)) return NULL;
+  Py_RETURN_FALSE;
+}
+
+
+/**
+ * Implementation of step_back.
+ */
+static PyObject* cur_step_back(Cursor_data* data) {
+  SoftCursor* cur = data->cur;
+  PyObject* pydb = data->pydb;
+  kc::PolyDB::Cursor* icur = cur->cur();
+  if (!icur) Py_RETURN_FALSE;
+  NativeFunction nf((DB_data*)pydb, "cursor.step_back");
+  bool rv = icur->step_back();
+  nf.cleanup();
+  if (rv) Py_RETURN_TRUE;
+  if (db_raise((DB_data*)pydb)) return NULL;
+  Py_RETURN_FALSE;
+}
+
+
+/**
+ * Implementation of fetch.
+ */
+static PyObject* cur_fetch(Cursor_data* data, PyObject* pyargs) {
+  int32_t argc = PyTuple_Size(pyargs);
+  if (argc > 2) {
+    throwinvarg();
+    return NULL;
+  }
+  PyObject* pymax = Py_None;
+  if (argc > 0) pymax = PyTuple_GetItem(pyargs, 0);
+  int64_t max = pymax == Py_None ? -1 : pyatoi(pymax);
+  if (max < 0) max = kc::INT64MAX;
+  PyObject* pyfilter = Py_None;
+  if (argc > 1) pyfilter = PyTuple_GetItem(pyargs, 1);
+  ScanFilter filter;
+  if (!filter.set(pyfilter)) {
+    throwinvarg();
+    return NULL;
+  }
+  SoftCursor* cur = data->cur;
+  PyObject* pydb = data->pydb;
+  kc::PolyDB::Cursor* icur = cur->cur();
+  if (!icur) Py_RETURN_NONE;
+  NativeFunction nf((DB_data*)pydb, "cursor.fetch");
+  bool ordered = db_ordered(((DB_data*)pydb)->db);
+  StringVector keys;
+  StringVector values;
+  bool err = false;
+  while ((int64_t)keys.size() < max) {
+    const char* vbuf;
+    size_t ksiz, vsiz;
+    char* kbuf = icur->get(&ksiz, &vbuf, &vsiz, false);
+    if (!kbuf) {
+      if (icur->error() != kc::PolyDB::Error::NOREC) err = true;
+      break;
+    }
+    if (ordered && filter.beyond(kbuf, ksiz)) {
+      delete[] kbuf;
+      break;
+    }
+    if (filter.match(kbuf, ksiz, vbuf, vsiz)) {
+      keys.push_back(std::string(kbuf, ksiz));
+      values.push_back(std::string(vbuf, vsiz));
+    }
+    delete[] kbuf;
+    if (!icur->step()) {
+      if (icur->error() != kc::PolyDB::Error::NOREC) err = true;
+      break;
+    }
+  }
+  nf.cleanup();
+  if (err) {
+    if (db_raise((DB_data*)pydb)) return NULL;
+    Py_RETURN_NONE;
+  }
+  PyObject* pyrv = PyList_New(keys.size());
+  for (size_t i = 0; i < keys.size(); i++) {
+    PyObject* pykey = newbytes(keys[i].data(), keys[i].size());
+    PyObject* pyvalue = newbytes(values[i].data(), values[i].size());
+    PyList_SET_ITEM(pyrv, i, PyTuple_Pack(2, pykey, pyvalue));
+    Py_DECREF(pyvalue);
+    Py_DECREF(pykey);
+  }
+  return pyrv;
+}
+
+
+/**
+ * Implementation of db.
+ */
+static PyObject* cur_db(Cursor_data* data) {
+  SoftCursor* cur = data->cur;
+  PyObject* pydb = data->pydb;
+  kc::PolyDB::Cursor* icur = cur->cur();
+  if (!icur) Py_RETURN_FALSE;
+  Py_INCREF(data->pydb);
+  return pydb;
+}
+
+
+/**
+ * Implementation of error.
+ */
+static PyObject* cur_error(Cursor_data* data) {
+  SoftCursor* cur = data->cur;
+  kc::PolyDB::Cursor* icur = cur->cur();
+  if (!icur) Py_RETURN_NONE;
+  kc::PolyDB::Error err = icur->error();
+  PyObject* pyerr = PyObject_CallMethod(mod_kc, (char*)"Error",
+                                        (char*)"(IU)", err.code(), err.message());
+  return pyerr;
+}
+
+
+/**
+ * Implementation of __iter__.
+ */
+static PyObject* cur_op_iter(Cursor_data* data) {
+  Py_INCREF((PyObject*)data);
+  return (PyObject*)data;
+}
+
+
+/**
+ * Implementation of __next__.
+ */
+static PyObject* cur_op_iternext(Cursor_data* data) {
+  SoftCursor* cur = data->cur;
+  PyObject* pydb = data->pydb;
+  kc::PolyDB::Cursor* icur = cur->cur();
+  if (!icur) return NULL;
+  NativeFunction nf((DB_data*)pydb, "cursor.__next__");
+  size_t ksiz;
+  char* kbuf = icur->get_key(&ksiz, true);
+  nf.cleanup();
+  PyObject* pyrv;
+  if (kbuf) {
+    pyrv = newbytes(kbuf, ksiz);
+    delete[] kbuf;
+  } else {
+    pyrv = NULL;
+  }
+  return pyrv;
+}
+
+
+/**
+ * Define objects of the Blob class.
+ */
+static bool define_blob() {
+  static PyTypeObject type_blob = { PyVarObject_HEAD_INIT(NULL, 0) };
+  size_t zoff = offsetof(PyTypeObject, tp_name);
+  std::memset((char*)&type_blob + zoff, 0, sizeof(type_blob) - zoff);
+  type_blob.tp_name = "kyotocabinet.Blob";
+  type_blob.tp_basicsize = sizeof(Blob_data);
+  type_blob.tp_itemsize = 0;
+  type_blob.tp_flags = Py_TPFLAGS_DEFAULT;
+  type_blob.tp_doc = "Interface of file-like handle to a chunked blob record.";
+  type_blob.tp_new = blob_new;
+  type_blob.tp_dealloc = (destructor)blob_dealloc;
+  type_blob.tp_repr = (unaryfunc)blob_repr;
+  type_blob.tp_str = (unaryfunc)blob_str;
+  static PyMethodDef blob_methods[] = {
+    { "read", (PyCFunction)blob_read, METH_VARARGS,
+      "Read bytes from the current position." },
+    { "readinto", (PyCFunction)blob_readinto, METH_VARARGS,
+      "Read bytes from the current position into a writable buffer." },
+    { "write", (PyCFunction)blob_write, METH_VARARGS,
+      "Write bytes at the current position." },
+    { "seek", (PyCFunction)blob_seek, METH_VARARGS,
+      "Change the current position." },
+    { "tell", (PyCFunction)blob_tell, METH_NOARGS,
+      "Get the current position." },
+    { "size", (PyCFunction)blob_size, METH_NOARGS,
+      "Get the size of the blob." },
+    { "truncate", (PyCFunction)blob_truncate, METH_VARARGS,
+      "Change the size of the blob." },
+    { "flush", (PyCFunction)blob_flush, METH_NOARGS,
+      "Write buffered data into the database." },
+    { "close", (PyCFunction)blob_close, METH_NOARGS,
+      "Flush and close the blob." },
+    { "readable", (PyCFunction)blob_readable, METH_NOARGS,
+      "Check whether the blob is readable." },
+    { "writable", (PyCFunction)blob_writable, METH_NOARGS,
+      "Check whether the blob is writable." },
+    { "seekable", (PyCFunction)blob_seekable, METH_NOARGS,
+      "Check whether the blob is seekable." },
+    { "key", (PyCFunction)blob_key, METH_NOARGS,
+      "Get the key of the blob record." },
+    { "remove", (PyCFunction)blob_remove, METH_NOARGS,
+      "Remove the blob record with its chunks and close the blob." },
+    { "db", (PyCFunction)blob_db, METH_NOARGS,
+      "Get the database object." },
+    { "__enter__", (PyCFunction)blob_op_enter, METH_NOARGS,
+      "Enter the runtime context." },
+    { "__exit__", (PyCFunction)blob_op_exit, METH_VARARGS,
+      "Exit the runtime context and close the blob." },
+    { NULL, NULL, 0, NULL }
+  };
+  type_blob.tp_methods = blob_methods;
+  if (PyType_Ready(&type_blob) != 0) return false;
+  cls_blob = (PyObject*)&type_blob;
+  Py_INCREF(cls_blob);
+  if (PyModule_AddObject(mod_kc, "Blob", cls_blob) != 0) return false;
+  return true;
+}
+
+
+/**
+ * Implementation of new.
+ */
+static PyObject* blob_new(PyTypeObject* pytype, PyObject* pyargs, PyObject* pykwds) {
+  Blob_data* data = (Blob_data*)pytype->tp_alloc(pytype, 0);
+  if (!data) return NULL;
+  Py_INCREF(Py_None);
+  data->blob = NULL;
+  data->pydb = Py_None;
+  return (PyObject*)data;
+}
+
+
+/**
+ * Implementation of dealloc.
+ */
+static void blob_dealloc(Blob_data* data) {
+  SoftBlob* blob = data->blob;
+  PyObject* pydb = data->pydb;
+  if (blob) {
+    PyObject* pyextype;
+    PyObject* pyexvalue;
+    PyObject* pyextrace;
+    PyErr_Fetch(&pyextype, &pyexvalue, &pyextrace);
+    bool joined, cjoined;
+    if (blob->dirty() && blob_begin((DB_data*)pydb, blob, &joined, &cjoined)) {
+      NativeFunction nf((DB_data*)pydb);
+      blob_commit((DB_data*)pydb, blob, blob->flush(), joined, cjoined);
+      nf.cleanup();
+    }
+    PyErr_Restore(pyextype, pyexvalue, pyextrace);
+    delete blob;
+  }
+  Py_DECREF(pydb);
+  Py_TYPE(data)->tp_free((PyObject*)data);
+}
+
+
+/**
+ * Check whether the blob is open.
+ */
+static bool blob_check(Blob_data* data) {
+  if (data->blob) return true;
+  PyErr_SetString(PyExc_ValueError, "I/O operation on closed blob");
+  return false;
+}
+
+
+/**
+ * Begin the transactions of a blob operation on the database and the blob store.
+ */
+static bool blob_begin(DB_data* data, SoftBlob* blob, bool* joined, bool* cjoined) {
+  DB_data* cdata = (DB_data*)blob->pystore();
+  db_admit(data);
+  if (!db_begin_implicit(data, joined)) return false;
+  if (db_begin_implicit(cdata, cjoined)) return true;
+  kc::PolyDB* db = data->db;
+  kc::PolyDB::Error error = cdata->db->error();
+  if (!*joined) {
+    NativeFunction nf(data);
+    db->end_transaction(false);
+    nf.cleanup();
+  }
+  db->set_error(error.code(), error.message());
+  return false;
+}
+
+
+/**
+ * End the transactions of a blob operation.
+ */
+static bool blob_commit(DB_data* data, SoftBlob* blob, bool ok, bool joined, bool cjoined) {
+  kc::PolyDB* db = data->db;
+  kc::PolyDB* cdb = ((DB_data*)blob->pystore())->db;
+  if (!cjoined && !cdb->end_transaction(ok)) {
+    kc::PolyDB::Error error = cdb->error();
+    db->set_error(error.code(), error.message());
+    ok = false;
+  }
+  if (!joined && !db->end_transaction(ok)) ok = false;
+  if (!ok) {
+    if (!joined) data->hub->notify(UpdateListener::URESET, NULL, 0);
+    kc::PolyDB::Error error = db->error();
+    blob->reload();
+    db->set_error(error.code(), error.message());
+  }
+  return ok;
+}
+
+
+/**
+ * Implementation of repr.
+ */
+static PyObject* blob_repr(Blob_data* data) {
+  SoftBlob* blob = data->blob;
+  if (!blob) return newstring("<kyotocabinet.Blob: (closed)>");
+  NativeFunction nf((DB_data*)data->pydb);
+  std::string path = blob->db()->path();
+  nf.cleanup();
+  if (path.size() < 1) path = "(None)";
+  std::string str;
+  kc::strprintf(&str, "<kyotocabinet.Blob: %s: ", path.c_str());
+  str.append(blob->key());
+  kc::strprintf(&str, ": %lld/%lld>", (long long)blob->tell(), (long long)blob->size());
+  return PyUnicode_FromString(str.c_str());
+}
+
+
+/**
+ * Implementation of str.
+ */
+static PyObject* blob_str(Blob_data* data) {
+  SoftBlob* blob = data->blob;
+  if (!blob) return newstring("(closed)");
+  NativeFunction nf((DB_data*)data->pydb);
+  std::string path = blob->db()->path();
+  nf.cleanup();
+  if (path.size() < 1) path = "(None)";
+  std::string str;
+  kc::strprintf(&str, "%s: ", path.c_str());
+  str.append(blob->key());
+  return PyUnicode_FromString(str.c_str());
+}
+
+
+/**
+ * Implementation of read.
+ */
+static PyObject* blob_read(Blob_data* data, PyObject* pyargs) {
+  int32_t argc = PyTuple_Size(pyargs);
+  if (argc > 1) {
+    throwinvarg();
+    return NULL;
+  }
+  PyObject* pysize = Py_None;
+  if (argc > 0) pysize = PyTuple_GetItem(pyargs, 0);
+  if (!blob_check(data)) return NULL;
+  SoftBlob* blob = data->blob;
+  PyObject* pydb = data->pydb;
+  if (!blob->readable()) {
+    blob->db()->set_error(kc::PolyDB::Error::INVALID, "not readable");
+    if (db_raise((DB_data*)pydb)) return NULL;
+    Py_RETURN_NONE;
+  }
+  int64_t size = pysize == Py_None ? -1 : pyatoi(pysize);
+  int64_t rest = std::max(blob->size() - blob->tell(), (int64_t)0);
+  if (size < 0 || size > rest) size = rest;
+  char* buf = new char[size+1];
+  NativeFunction nf((DB_data*)pydb);
+  int64_t rsiz = blob->read(buf, size);
+  nf.cleanup();
+  PyObject* pyrv;
+  if (rsiz >= 0) {
+    pyrv = newbytes(buf, rsiz);
+  } else {
+    if (db_raise((DB_data*)pydb)) {
+      delete[] buf;
+      return NULL;
+    }
+    Py_INCREF(Py_None);
+    pyrv = Py_None;
+  }
+  delete[] buf;
+  return pyrv;
+}
+
+
+/**
+ * Implementation of readinto.
+ */
+static PyObject* blob_readinto(Blob_data* data, PyObject* pyargs) {
+  int32_t argc = PyTuple_Size(pyargs);
+  if (argc != 1) {
+    throwinvarg();
+    return NULL;
+  }
+  PyObject* pybuf = PyTuple_GetItem(pyargs, 0);
+  if (!blob_check(data)) return NULL;
+  SoftBlob* blob = data->blob;
+  PyObject* pydb = data->pydb;
+  if (!blob->readable()) {
+    blob->db()->set_error(kc::PolyDB::Error::INVALID, "not readable");
+    if (db_raise((DB_data*)pydb)) return NULL;
+    Py_RETURN_NONE;
+  }
+  Py_buffer view;
+  if (PyObject_GetBuffer(pybuf, &view, PyBUF_WRITABLE) != 0) return NULL;
+  NativeFunction nf((DB_data*)pydb);
+  int64_t rsiz = blob->read((char*)view.buf, view.len);
+  nf.cleanup();
+  PyBuffer_Release(&view);
+  if (rsiz >= 0) return PyLong_FromLongLong(rsiz);
+  if (db_raise((DB_data*)pydb)) return NULL;
+  Py_RETURN_NONE;
+}
+
+
+/**
+ * Implementation of write.
+ */
+static PyObject* blob_write(Blob_data* data, PyObject* pyargs) {
+  int32_t argc = PyTuple_Size(pyargs);
+  if (argc != 1) {
+    throwinvarg();
+    return NULL;
+  }
+  PyObject* pyvalue = PyTuple_GetItem(pyargs, 0);
+  if (!blob_check(data)) return NULL;
+  SoftBlob* blob = data->blob;
+  PyObject* pydb = data->pydb;
+  if (!blob->writable()) {
+    blob->db()->set_error(kc::PolyDB::Error::INVALID, "not writable");
+    if (db_raise((DB_data*)pydb)) return NULL;
+    Py_RETURN_NONE;
+  }
+  SoftString value(pyvalue);
+  bool tran = blob->spans(value.size());
+  bool joined = false;
+  bool cjoined = false;
+  if (tran && !blob_begin((DB_data*)pydb, blob, &joined, &cjoined)) {
+    if (db_raise((DB_data*)pydb)) return NULL;
+    Py_RETURN_NONE;
+  }
+  NativeFunction nf((DB_data*)pydb);
+  bool rv = blob->write(value.ptr(), value.size(), tran);
+  if (tran) rv = blob_commit((DB_data*)pydb, blob, rv, joined, cjoined);
+  nf.cleanup();
+  if (rv) return PyLong_FromLongLong(value.size());
+  if (db_raise((DB_data*)pydb)) return NULL;
+  Py_RETURN_NONE;
+}
+
+
+/**
+ * Implementation of seek.
+ */
+static PyObject* blob_seek(Blob_data* data, PyObject* pyargs) {
+  int32_t argc = PyTuple_Size(pyargs);
+  if (argc < 1 || argc > 2) {
+    throwinvarg();
+    return NULL;
+  }
+  PyObject* pyoff = PyTuple_GetItem(pyargs, 0);
+  PyObject* pywhence = Py_None;
+  if (argc > 1) pywhence = PyTuple_GetItem(pyargs, 1);
+  if (!blob_check(data)) return NULL;
+  SoftBlob* blob = data->blob;
+  int64_t off = pyatoi(pyoff);
+  int32_t whence = pywhence == Py_None ? 0 : pyatoi(pywhence);
+  int64_t pos;
+  switch (whence) {
+    case 0: pos = off; break;
+    case 1: pos = blob->tell() + off; break;
+    case 2: pos = blob->size() + off; break;
+    default: pos = -1; break;
+  }
+  if (pos < 0) {
+    throwinvarg();
+    return NULL;
+  }
+  blob->seek(pos);
+  return PyLong_FromLongLong(pos);
+}
+
+
+/**
+ * Implementation of tell.
+ */
+static PyObject* blob_tell(Blob_data* data) {
+  if (!blob_check(data)) return NULL;
+  return PyLong_FromLongLong(data->blob->tell());
+}
+
+
+/**
+ * Implementation of size.
+ */
+static PyObject* blob_size(Blob_data* data) {
+  if (!blob_check(data)) return NULL;
+  return PyLong_FromLongLong(data->blob->size());
+}
+
+
+/**
+ * Implementation of truncate.
+ */
+static PyObject* blob_truncate(Blob_data* data, PyObject* pyargs) {
+  int32_t argc = PyTuple_Size(pyargs);
+  if (argc > 1) {
+    throwinvarg();
+    return NULL;
+  }
+  PyObject* pysize = Py_None;
+  if (argc > 0) pysize = PyTuple_GetItem(pyargs, 0);
+  if (!blob_check(data)) return NULL;
+  SoftBlob* blob = data->blob;
+  PyObject* pydb = data->pydb;
+  int64_t size = pysize == Py_None ? blob->tell() : pyatoi(pysize);
+  if (size < 0) {
+    throwinvarg();
+    return NULL;
+  }
+  if (!blob->writable()) {
+    blob->db()->set_error(kc::PolyDB::Error::INVALID, "not writable");
+    if (db_raise((DB_data*)pydb)) return NULL;
+    Py_RETURN_NONE;
+  }
+  bool joined, cjoined;
+  if (!blob_begin((DB_data*)pydb, blob, &joined, &cjoined)) {
+    if (db_raise((DB_data*)pydb)) return NULL;
+    Py_RETURN_NONE;
+  }
+  NativeFunction nf((DB_data*)pydb);
+  bool rv = blob_commit((DB_data*)pydb, blob, blob->truncate(size), joined, cjoined);
+  nf.cleanup();
+  if (rv) return PyLong_FromLongLong(size);
+  if (db_raise((DB_data*)pydb)) return NULL;
+  Py_RETURN_NONE;
+}
+
+
+/**
+ * Implementation of flush.
+ */
+static PyObject* blob_flush(Blob_data* data) {
+  if (!blob_check(data)) return NULL;
+  SoftBlob* blob = data->blob;
+  PyObject* pydb = data->pydb;
+  if (!blob->dirty()) Py_RETURN_TRUE;
+  bool joined, cjoined;
+  if (!blob_begin((DB_data*)pydb, blob, &joined, &cjoined)) {
+    if (db_raise((DB_data*)pydb)) return NULL;
+    Py_RETURN_FALSE;
+  }
+  NativeFunction nf((DB_data*)pydb);
+  bool rv = blob_commit((DB_data*)pydb, blob, blob->flush(), joined, cjoined);
+  nf.cleanup();
+  if (rv) Py_RETURN_TRUE;
+  if (db_raise((DB_data*)pydb)) return NULL;
+  Py_RETURN_FALSE;
+}
+
+
+/**
+ * Implementation of close.
+ */
+static PyObject* blob_close(Blob_data* data) {
+  SoftBlob* blob = data->blob;
+  PyObject* pydb = data->pydb;
+  if (!blob) Py_RETURN_TRUE;
+  bool rv = true;
+  if (blob->dirty()) {
+    bool joined, cjoined;
+    rv = blob_begin((DB_data*)pydb, blob, &joined, &cjoined);
+    if (rv) {
+      NativeFunction nf((DB_data*)pydb);
+      rv = blob_commit((DB_data*)pydb, blob, blob->flush(), joined, cjoined);
+      nf.cleanup();
+    }
+  }
+  delete blob;
+  data->blob = NULL;
+  if (rv) Py_RETURN_TRUE;
+  if (db_raise((DB_data*)pydb)) return NULL;
+  Py_RETURN_FALSE;
+}
+
+
+/**
+ * Implementation of readable.
+ */
+static PyObject* blob_readable(Blob_data* data) {
+  if (!blob_check(data)) return NULL;
+  if (data->blob->readable()) Py_RETURN_TRUE;
+  Py_RETURN_FALSE;
+}
+
+
+/**
+ * Implementation of writable.
+ */
+static PyObject* blob_writable(Blob_data* data) {
+  if (!blob_check(data)) return NULL;
+  if (data->blob->writable()) Py_RETURN_TRUE;
+  Py_RETURN_FALSE;
+}
+
+
+/**
+ * Implementation of seekable.
+ */
+static PyObject* blob_seekable(Blob_data* data) {
+  if (!blob_check(data)) return NULL;
+  Py_RETURN_TRUE;
+}
+
+
+/**
+ * Implementation of key.
+ */
+static PyObject* blob_key(Blob_data* data) {
+  if (!blob_check(data)) return NULL;
+  const std::string& key = data->blob->key();
+  return newbytes(key.data(), key.size());
+}
+
+
+/**
+ * Implementation of remove.
+ */
+static PyObject* blob_remove(Blob_data* data) {
+  if (!blob_check(data)) return NULL;
+  SoftBlob* blob = data->blob;
+  PyObject* pydb = data->pydb;
+  if (!blob->writable()) {
+    blob->db()->set_error(kc::PolyDB::Error::INVALID, "not writable");
+    if (db_raise((DB_data*)pydb)) return NULL;
+    Py_RETURN_FALSE;
+  }
+  bool joined, cjoined;
+  if (!blob_begin((DB_data*)pydb, blob, &joined, &cjoined)) {
+    if (db_raise((DB_data*)pydb)) return NULL;
+    Py_RETURN_FALSE;
+  }
+  NativeFunction nf((DB_data*)pydb);
+  bool rv = blob_commit((DB_data*)pydb, blob, blob->remove(), joined, cjoined);
+  nf.cleanup();
+  if (rv) {
+    delete blob;
+    data->blob = NULL;
+    Py_RETURN_TRUE;
+  }
+  if (db_raise((DB_data*)pydb)) return NULL;
+  Py_RETURN_FALSE;
+}
+
+
+/**
+ * Implementation of db.
+ */
+static PyObject* blob_db(Blob_data* data) {
+  Py_INCREF(data->pydb);
+  return data->pydb;
+}
+
+
+/**
+ * Implementation of __enter__.
+ */
+static PyObject* blob_op_enter(Blob_data* data) {
+  Py_INCREF((PyObject*)data);
+  return (PyObject*)data;
+}
+
+
+/**
+ * Implementation of __exit__.
+ */
+static PyObject* blob_op_exit(Blob_data* data, PyObject* pyargs) {
+  PyObject* pyrv = blob_close(data);
+  if (!pyrv) return NULL;
+  Py_DECREF(pyrv);
+  Py_RETURN_FALSE;
+}
+
+
+/**
+ * Define objects of the View class.
+ */
+static bool define_view() {
+  static PyTypeObject type_view = { PyVarObject_HEAD_INIT(NULL, 0) };
+  size_t zoff = offsetof(PyTypeObject, tp_name);
+  std::memset((char*)&type_view + zoff, 0, sizeof(type_view) - zoff);
+  type_view.tp_name = "kyotocabinet.View";
+  type_view.tp_basicsize = sizeof(View_data);
+  type_view.tp_itemsize = 0;
+  type_view.tp_flags = Py_TPFLAGS_DEFAULT;
+  type_view.tp_doc = "Interface of live view of the keys, the values or the records of a database.";
+  type_view.tp_new = view_new;
+  type_view.tp_dealloc = (destructor)view_dealloc;
+  type_view.tp_repr = (unaryfunc)view_repr;
+  static PySequenceMethods type_view_seq;
+  std::memset(&type_view_seq, 0, sizeof(type_view_seq));
+  type_view_seq.sq_length = (lenfunc)view_op_len;
+  type_view_seq.sq_contains = (objobjproc)view_op_contains;
+  type_view.tp_as_sequence = &type_view_seq;
+  type_view.tp_iter = (getiterfunc)view_op_iter;
+  if (PyType_Ready(&type_view) != 0) return false;
+  cls_view = (PyObject*)&type_view;
+  Py_INCREF(cls_view);
+  if (PyModule_AddObject(mod_kc, "View", cls_view) != 0) return false;
+  static PyTypeObject type_vit = { PyVarObject_HEAD_INIT(NULL, 0) };
+  std::memset((char*)&type_vit + zoff, 0, sizeof(type_vit) - zoff);
+  type_vit.tp_name = "kyotocabinet.ViewIterator";
+  type_vit.tp_basicsize = sizeof(ViewIterator_data);
+  type_vit.tp_itemsize = 0;
+  type_vit.tp_flags = Py_TPFLAGS_DEFAULT;
+  type_vit.tp_doc = "Iterator of a view, fetching records in batches.";
+  type_vit.tp_new = vit_new;
+  type_vit.tp_dealloc = (destructor)vit_dealloc;
+  type_vit.tp_iter = (getiterfunc)vit_op_iter;
+  type_vit.tp_iternext = (iternextfunc)vit_op_iternext;
+  if (PyType_Ready(&type_vit) != 0) return false;
+  cls_viter = (PyObject*)&type_vit;
+  Py_INCREF(cls_viter);
+  return true;
+}
+
+
+/**
+ * Implementation of new.
+ */
+static PyObject* view_new(PyTypeObject* pytype, PyObject* pyargs, PyObject* pykwds) {
+  View_data* data = (View_data*)pytype->tp_alloc(pytype, 0);
+  if (!data) return NULL;
+  Py_INCREF(Py_None);
+  data->pydb = Py_None;
+  data->kind = VKEYS;
+  return (PyObject*)data;
+}
+
+
+/**
+ * Implementation of dealloc.
+ */
+static void view_dealloc(View_data* data) {
+  Py_DECREF(data->pydb);
+  Py_TYPE(data)->tp_free((PyObject*)data);
+}
+
+
+/**
+ * Implementation of repr.
+ */
+static PyObject* view_repr(View_data* data) {
+  const char* name = "keys";
+  if (data->kind == VVALUES) {
+    name = "values";
+  } else if (data->kind == VITEMS) {
+    name = "items";
+  }
+  PyObject* pydbstr = PyObject_Repr(data->pydb);
+  if (!pydbstr) return NULL;
+  std::string str;
+  kc::strprintf(&str, "<kyotocabinet.View: %s of ", name);
+  {
+    SoftString dbstr(pydbstr);
+    str.append(dbstr.ptr(), dbstr.size());
+  }
+  Py_DECREF(pydbstr);
+  str.append(">");
+  return PyUnicode_FromString(str.c_str());
+}
+
+
+/**
+ * Implementation of __len__.
+ */
+static Py_ssize_t view_op_len(View_data* data) {
+  return PyObject_Size(data->pydb);
+}
+
+
+/**
+ * Implementation of __contains__.
+ */
+static int view_op_contains(View_data* data, PyObject* pyobj) {
+  if (data->kind == VKEYS) return PySequence_Contains(data->pydb, pyobj);
+  if (data->kind == VITEMS) {
+    if (!PyTuple_Check(pyobj) || PyTuple_Size(pyobj) != 2) return 0;
+    PyObject* pyvalue = PyObject_CallMethod(data->pydb, (char*)"get", (char*)"(O)",
+                                            PyTuple_GetItem(pyobj, 0));
+    if (!pyvalue) return -1;
+    bool hit = false;
+    if (pyvalue != Py_None) {
+      SoftString value(pyvalue);
+      SoftString target(PyTuple_GetItem(pyobj, 1));
+      hit = value.size() == target.size() &&
+          !std::memcmp(value.ptr(), target.ptr(), value.size());
+    }
+    Py_DECREF(pyvalue);
+    return hit ? 1 : 0;
+  }
+  PyObject* pyiter = PyObject_GetIter((PyObject*)data);
+  if (!pyiter) return -1;
+  SoftString target(pyobj);
+  bool hit = false;
+  PyObject* pyvalue;
+  while (!hit && (pyvalue = PyIter_Next(pyiter)) != NULL) {
+    {
+      SoftString value(pyvalue);
+      hit = value.size() == target.size() &&
+          !std::memcmp(value.ptr(), target.ptr(), value.size());
+    }
+    Py_DECREF(pyvalue);
+  }
+  Py_DECREF(pyiter);
+  if (PyErr_Occurred()) return -1;
+  return hit ? 1 : 0;
+}
+
+
+/**
+ * Implementation of __iter__.
+ */
+static PyObject* view_op_iter(View_data* data) {
+  PyObject* pycur = PyObject_CallMethod(mod_kc, (char*)"Cursor",
+                                        (char*)"(O)", data->pydb);
+  if (!pycur) return NULL;
+  PyObject* pyrv = PyObject_CallMethod(pycur, (char*)"jump", NULL);
+  if (pyrv) {
+    Py_DECREF(pyrv);
+  } else {
+    PyErr_Clear();
+  }
+  PyObject* pyiter = PyObject_CallObject(cls_viter, NULL);
+  if (!pyiter) {
+    Py_DECREF(pycur);
+    return NULL;
+  }
+  ViewIterator_data* idata = (ViewIterator_data*)pyiter;
+  Py_DECREF(idata->pycur);
+  idata->pycur = pycur;
+  idata->kind = data->kind;
+  return pyiter;
+}
+
+
+/**
+ * Implementation of new.
+ */
+static PyObject* vit_new(PyTypeObject* pytype, PyObject* pyargs, PyObject* pykwds) {
+  ViewIterator_data* data = (ViewIterator_data*)pytype->tp_alloc(pytype, 0);
+  if (!data) return NULL;
+  Py_INCREF(Py_None);
+  data->pycur = Py_None;
+  data->kind = VKEYS;
+  data->recs = new std::deque<std::pair<std::string, std::string> >;
+  return (PyObject*)data;
+}
+
+
+/**
+ * Implementation of dealloc.
+ */
+static void vit_dealloc(ViewIterator_data* data) {
+  delete data->recs;
+  Py_DECREF(data->pycur);
+  Py_TYPE(data)->tp_free((PyObject*)data);
+}
+
+
+/**
+ * Fetch the next batch of records with one native call.
+ */
+static bool vit_fill(ViewIterator_data* data) {
+  if (data->pycur == Py_None) return false;
+  Cursor_data* cdata = (Cursor_data*)data->pycur;
+  kc::PolyDB::Cursor* icur = cdata->cur->cur();
+  if (!icur) return false;
+  std::deque<std::pair<std::string, std::string> >* recs = data->recs;
+  bool keyonly = data->kind == VKEYS;
+  NativeFunction nf((DB_data*)cdata->pydb, "view.__next__");
+  size_t osiz = 0;
+  for (int64_t i = 0; i < VIEWBATCH; i++) {
+    const char* vbuf = NULL;
+    size_t ksiz = 0;
+    size_t vsiz = 0;
+    char* kbuf = keyonly ? icur->get_key(&ksiz, true) : icur->get(&ksiz, &vbuf, &vsiz, true);
+    if (!kbuf) break;
+    recs->push_back(std::make_pair(std::string(kbuf, ksiz), std::string(vbuf ? vbuf : "", vsiz)));
+    osiz += ksiz + vsiz;
+    delete[] kbuf;
+  }
+  nf.transfer(0, osiz);
+  nf.cleanup();
+  if (recs->empty()) {
+    Py_DECREF(data->pycur);
+    Py_INCREF(Py_None);
+    data->pycur = Py_None;
+    return false;
+  }
+  return true;
+}
+
+
+/**
+ * Implementation of __iter__.
+ */
+static PyObject* vit_op_iter(ViewIterator_data* data) {
+  Py_INCREF((PyObject*)data);
+  return (PyObject*)data;
+}
+
+
+/**
+ * Implementation of __next__.
+ */
+static PyObject* vit_op_iternext(ViewIterator_data* data) {
+  std::deque<std::pair<std::string, std::string> >* recs = data->recs;
+  if (recs->empty() && !vit_fill(data)) return NULL;
+  const std::pair<std::string, std::string>& rec = recs->front();
+  PyObject* pyrv;
+  if (data->kind == VVALUES) {
+    pyrv = newbytes(rec.second.data(), rec.second.size());
+  } else if (data->kind == VITEMS) {
+    pyrv = PyTuple_New(2);
+    PyTuple_SetItem(pyrv, 0, newbytes(rec.first.data(), rec.first.size()));
+    PyTuple_SetItem(pyrv, 1, newbytes(rec.second.data(), rec.second.size()));
+  } else {
+    pyrv = newbytes(rec.first.data(), rec.first.size());
+  }
+  recs->pop_front();
+  return pyrv;
+}
+
+
+/**
+ * Define objects of the WriteBatch class.
+ */
+static bool define_wb() {
+  static PyTypeObject type_wb = { PyVarObject_HEAD_INIT(NULL, 0) };
+  size_t zoff = offsetof(PyTypeObject, tp_name);
+  std::memset((char*)&type_wb + zoff, 0, sizeof(type_wb) - zoff);
+  type_wb.tp_name = "kyotocabinet.WriteBatch";
+  type_wb.tp_basicsize = sizeof(WriteBatch_data);
+  type_wb.tp_itemsize = 0;
+  type_wb.tp_flags = Py_TPFLAGS_DEFAULT;
+  type_wb.tp_doc = "Interface of buffer of write operations committed at once.";
+  type_wb.tp_new = wb_new;
+  type_wb.tp_dealloc = (destructor)wb_dealloc;
+  type_wb.tp_repr = (unaryfunc)wb_repr;
+  static PyMethodDef wb_methods[] = {
+    { "set", (PyCFunction)wb_set, METH_VARARGS,
+      "Set the value of a record." },
+    { "remove", (PyCFunction)wb_remove, METH_VARARGS,
+      "Remove a record." },
+    { "append", (PyCFunction)wb_append, METH_VARARGS,
+      "Append the value of a record." },
+    { "increment", (PyCFunction)wb_increment, METH_VARARGS,
+      "Add a number to the numeric integer value of a record." },
+    { "get", (PyCFunction)wb_get, METH_VARARGS,
+      "Retrieve the value of a record, including the pending operations." },
+    { "commit", (PyCFunction)wb_commit, METH_NOARGS,
+      "Commit the pending operations." },
+    { "discard", (PyCFunction)wb_discard, METH_NOARGS,
+      "Discard the pending operations." },
+    { "pending", (PyCFunction)wb_pending, METH_NOARGS,
+      "Get the number of the pending operations." },
+    { "db", (PyCFunction)wb_db, METH_NOARGS,
+      "Get the database object." },
+    { "__enter__", (PyCFunction)wb_op_enter, METH_NOARGS,
+      "Enter the runtime context." },
+    { "__exit__", (PyCFunction)wb_op_exit, METH_VARARGS,
+      "Exit the runtime context and commit the pending operations." },
+    { NULL, NULL, 0, NULL }
+  };
+  type_wb.tp_methods = wb_methods;
+  if (PyType_Ready(&type_wb) != 0) return false;
+  cls_wb = (PyObject*)&type_wb;
+  Py_INCREF(cls_wb);
+  if (PyModule_AddObject(mod_kc, "WriteBatch", cls_wb) != 0) return false;
+  return true;
+}
+
+
+/**
+ * Implementation of new.
+ */
+static PyObject* wb_new(PyTypeObject* pytype, PyObject* pyargs, PyObject* pykwds) {
+  WriteBatch_data* data = (WriteBatch_data*)pytype->tp_alloc(pytype, 0);
+  if (!data) return NULL;
+  Py_INCREF(Py_None);
+  data->pydb = Py_None;
+  data->ops = new BatchMap;
+  data->opnum = 0;
+  data->bytes = 0;
+  data->stime = 0;
+  data->max_ops = 0;
+  data->max_bytes = 0;
+  data->max_delay = 0;
+  data->transactional = false;
+  return (PyObject*)data;
+}
+
+
+/**
+ * Implementation of dealloc.
+ */
+static void wb_dealloc(WriteBatch_data* data) {
+  delete data->ops;
+  Py_DECREF(data->pydb);
+  Py_TYPE(data)->tp_free((PyObject*)data);
+}
+
+
+/**
+ * Implementation of repr.
+ */
+static PyObject* wb_repr(WriteBatch_data* data) {
+  if (data->pydb == Py_None) return newstring("<kyotocabinet.WriteBatch: (None)>");
+  kc::PolyDB* db = ((DB_data*)data->pydb)->db;
+  NativeFunction nf((DB_data*)data->pydb);
+  std::string path = db->path();
+  nf.cleanup();
+  if (path.size() < 1) path = "(None)";
+  std::string str;
+  kc::strprintf(&str, "<kyotocabinet.WriteBatch: %s: %lld/%lld>", path.c_str(),
+                (long long)data->opnum, (long long)data->bytes);
+  return PyUnicode_FromString(str.c_str());
+}
+
+
+/**
+ * Apply pending operations to the value of a record.
+ */
+static bool wb_apply(const std::vector<BatchOperation>& ops, std::string* value, bool* exists) {
+  std::vector<BatchOperation>::const_iterator it = ops.begin();
+  std::vector<BatchOperation>::const_iterator itend = ops.end();
+  while (it != itend) {
+    switch (it->type) {
+      case BSET: {
+        value->assign(it->value);
+        *exists = true;
+        break;
+      }
+      case BREMOVE: {
+        value->clear();
+        *exists = false;
+        break;
+      }
+      case BAPPEND: {
+        if (!*exists) value->clear();
+        value->append(it->value);
+        *exists = true;
+        break;
+      }
+      case BINCREMENT: {
+        int64_t num = it->num;
+        if (*exists) {
+          if (value->size() != sizeof(num)) return false;
+          if (it->orig != kc::INT64MAX) {
+            uint64_t cur = 0;
+            for (size_t i = 0; i < sizeof(cur); i++) {
+              cur = (cur << 8) | (unsigned char)(*value)[i];
+            }
+            num += (int64_t)cur;
+          }
+        } else {
+          if (it->orig == kc::INT64MIN) return false;
+          if (it->orig != kc::INT64MAX) num += it->orig;
+        }
+        char buf[sizeof(num)];
+        uint64_t unum = (uint64_t)num;
+        for (int32_t i = sizeof(buf) - 1; i >= 0; i--) {
+          buf[i] = (char)(unum & 0xff);
+          unum >>= 8;
+        }
+        value->assign(buf, sizeof(buf));
+        *exists = true;
+        break;
+      }
+    }
+    it++;
+  }
+  return true;
+}
+
+
+/**
+ * Add an operation and commit the batch if a threshold is reached.
+ */
+static bool wb_push(WriteBatch_data* data, PyObject* pykey, const BatchOperation& op) {
+  SoftString key(pykey);
+  if (data->opnum < 1) data->stime = kc::time();
+  (*data->ops)[std::string(key.ptr(), key.size())].push_back(op);
+  data->opnum++;
+  data->bytes += key.size() + op.value.size();
+  if ((data->max_ops > 0 && data->opnum >= data->max_ops) ||
+      (data->max_bytes > 0 && data->bytes >= data->max_bytes) ||
+      (data->max_delay > 0 && kc::time() - data->stime >= data->max_delay)) {
+    return wb_commit_impl(data);
+  }
+  return true;
+}
+
+
+/**
+ * Commit the pending operations by one native call.
+ */
+static bool wb_commit_impl(WriteBatch_data* data) {
+  if (data->opnum < 1) return true;
+  DB_data* dbdata = (DB_data*)data->pydb;
+  kc::PolyDB* db = dbdata->db;
+  BatchMap* ops = data->ops;
+  class VisitorImpl : public kc::PolyDB::Visitor {
+  public:
+    explicit VisitorImpl(const BatchMap* ops) : ops_(ops), buf_(), failed_(false),
+                                                sets_(), removes_() {}
+    bool failed() {
+      return failed_;
+    }
+    const StringMap& sets() {
+      return sets_;
+    }
+    const StringVector& removes() {
+      return removes_;
+    }
+  private:
+    const char* visit_full(const char* kbuf, size_t ksiz,
+                           const char* vbuf, size_t vsiz, size_t* sp) {
+      return visit(kbuf, ksiz, vbuf, vsiz, sp);
+    }
+    const char* visit_empty(const char* kbuf, size_t ksiz, size_t* sp) {
+      return visit(kbuf, ksiz, NULL, 0, sp);
+    }
+    const char* visit(const char* kbuf, size_t ksiz,
+                      const char* vbuf, size_t vsiz, size_t* sp) {
+      std::string key(kbuf, ksiz);
+      BatchMap::const_iterator it = ops_->find(key);
+      if (it == ops_->end()) return NOP;
+      bool exists = vbuf != NULL;
+      if (vbuf) {
+        buf_.assign(vbuf, vsiz);
+      } else {
+        buf_.clear();
+      }
+      if (!wb_apply(it->second, &buf_, &exists)) {
+        failed_ = true;
+        return NOP;
+      }
+      if (!exists) {
+        if (!vbuf) return NOP;
+        removes_.push_back(key);
+        return REMOVE;
+      }
+      sets_[key] = buf_;
+      *sp = buf_.size();
+      return buf_.data();
+    }
+    const BatchMap* ops_;
+    std::string buf_;
+    bool failed_;
+    StringMap sets_;
+    StringVector removes_;
+  } visitor(ops);
+  bool transactional = data->transactional;
+  bool joined = false;
+  db_admit(dbdata);
+  if (transactional && !db_begin_implicit(dbdata, &joined)) return false;
+  StringVector keys;
+  keys.reserve(ops->size());
+  BatchMap::const_iterator oit = ops->begin();
+  BatchMap::const_iterator oitend = ops->end();
+  while (oit != oitend) {
+    keys.push_back(oit->first);
+    oit++;
+  }
+  NativeFunction nf(dbdata, "write_batch.commit");
+  nf.transfer(data->bytes, 0);
+  bool rv = db->accept_bulk(keys, &visitor, true);
+  bool failed = visitor.failed();
+  if (transactional && !joined && !db->end_transaction(rv && !failed)) rv = false;
+  if (failed) {
+    db->set_error(kc::PolyDB::Error::LOGIC, "incompatible existing value");
+    rv = false;
+  }
+  bool applied = transactional && !joined ? rv : true;
+  if (applied) {
+    const StringMap& sets = visitor.sets();
+    StringMap::const_iterator sit = sets.begin();
+    StringMap::const_iterator sitend = sets.end();
+    while (sit != sitend) {
+      dbdata->hub->notify(UpdateListener::USET, sit->first.data(), sit->first.size(),
+                          sit->second.data(), sit->second.size());
+      sit++;
+    }
+    const StringVector& removes = visitor.removes();
+    StringVector::const_iterator rit = removes.begin();
+    StringVector::const_iterator ritend = removes.end();
+    while (rit != ritend) {
+      dbdata->hub->notify(UpdateListener::UREMOVE, rit->data(), rit->size());
+      rit++;
+    }
+  }
+  nf.cleanup();
+  if (applied) {
+    dbdata->counters.writes += visitor.sets().size();
+    dbdata->counters.removes += visitor.removes().size();
+  }
+  ops->clear();
+  data->opnum = 0;
+  data->bytes = 0;
+  return rv;
+}
+
+
+/**
+ * Implementation of set.
+ */
+static PyObject* wb_set(WriteBatch_data* data, PyObject* pyargs) {
+  int32_t argc = PyTuple_Size(pyargs);
+  if (argc != 2 || data->pydb == Py_None) {
+    throwinvarg();
+    return NULL;
+  }
+  SoftString value(PyTuple_GetItem(pyargs, 1));
+  BatchOperation op;
+  op.type = BSET;
+  op.value.assign(value.ptr(), value.size());
+  op.num = 0;
+  op.orig = 0;
+  if (wb_push(data, PyTuple_GetItem(pyargs, 0), op)) Py_RETURN_TRUE;
+  if (db_raise((DB_data*)data->pydb)) return NULL;
+  Py_RETURN_FALSE;
+}
+
+
+/**
+ * Implementation of remove.
+ */
+static PyObject* wb_remove(WriteBatch_data* data, PyObject* pyargs) {
+  int32_t argc = PyTuple_Size(pyargs);
+  if (argc != 1 || data->pydb == Py_None) {
+    throwinvarg();
+    return NULL;
+  }
+  BatchOperation op;
+  op.type = BREMOVE;
+  op.num = 0;
+  op.orig = 0;
+  if (wb_push(data, PyTuple_GetItem(pyargs, 0), op)) Py_RETURN_TRUE;
+  if (db_raise((DB_data*)data->pydb)) return NULL;
+  Py_RETURN_FALSE;
+}
+
+
+/**
+ * Implementation of append.
+ */
+static PyObject* wb_append(WriteBatch_data* data, PyObject* pyargs) {
+  int32_t argc = PyTuple_Size(pyargs);
+  if (argc != 2 || data->pydb == Py_None) {
+    throwinvarg();
+    return NULL;
+  }
+  SoftString value(PyTuple_GetItem(pyargs, 1));
+  BatchOperation op;
+  op.type = BAPPEND;
+  op.value.assign(value.ptr(), value.size());
+  op.num = 0;
+  op.orig = 0;
+  if (wb_push(data, PyTuple_GetItem(pyargs, 0), op)) Py_RETURN_TRUE;
+  if (db_raise((DB_data*)data->pydb)) return NULL;
+  Py_RETURN_FALSE;
+}
+
+
+/**
+ * Implementation of increment.
+ */
+static PyObject* wb_increment(WriteBatch_data* data, PyObject* pyargs) {
+  int32_t argc = PyTuple_Size(pyargs);
+  if (argc < 1 || argc > 3 || data->pydb == Py_None) {
+    throwinvarg();
+    return NULL;
+  }
+  PyObject* pynum = Py_None;
+  if (argc > 1) pynum = PyTuple_GetItem(pyargs, 1);
+  PyObject* pyorig = Py_None;
+  if (argc > 2) pyorig = PyTuple_GetItem(pyargs, 2);
+  BatchOperation op;
+  op.type = BINCREMENT;
+  op.num = pynum == Py_None ? 0 : pyatoi(pynum);
+  op.orig = pyorig == Py_None ? 0 : pyatoi(pyorig);
+  if (wb_push(data, PyTuple_GetItem(pyargs, 0), op)) Py_RETURN_TRUE;
+  if (db_raise((DB_data*)data->pydb)) return NULL;
+  Py_RETURN_FALSE;
+}
+
+
+/**
+ * Implementation of get.
+ */
+static PyObject* wb_get(WriteBatch_data* data, PyObject* pyargs) {
+  int32_t argc = PyTuple_Size(pyargs);
+  if (argc < 1 || argc > 2 || data->pydb == Py_None) {
+    throwinvarg();
+    return NULL;
+  }
+  PyObject* pydefault = Py_None;
+  if (argc > 1) pydefault = PyTuple_GetItem(pyargs, 1);
+  DB_data* dbdata = (DB_data*)data->pydb;
+  kc::PolyDB* db = dbdata->db;
+  SoftString key(PyTuple_GetItem(pyargs, 0));
+  BatchMap::const_iterator it = data->ops->find(std::string(key.ptr(), key.size()));
+  bool blind = it != data->ops->end() &&
+      (it->second.front().type == BSET || it->second.front().type == BREMOVE);
+  std::string value;
+  bool exists = false;
+  bool ok = true;
+  if (!blind) {
+    NativeFunction nf(dbdata, "write_batch.get");
+    nf.set_key(key.ptr(), key.size());
+    size_t vsiz;
+    char* vbuf = db->get(key.ptr(), key.size(), &vsiz);
+    if (vbuf && db_expired(dbdata, key.ptr(), key.size())) {
+      delete[] vbuf;
+      vbuf = NULL;
+    }
+    nf.transfer(key.size(), vbuf ? vsiz : 0);
+    nf.cleanup();
+    if (vbuf) {
+      value.assign(vbuf, vsiz);
+      exists = true;
+      delete[] vbuf;
+    } else if (db->error() != kc::PolyDB::Error::NOREC) {
+      ok = false;
+    }
+  }
+  if (ok && it != data->ops->end() && !wb_apply(it->second, &value, &exists)) {
+    db->set_error(kc::PolyDB::Error::LOGIC, "incompatible existing value");
+    ok = false;
+  }
+  if (ok && !exists) db->set_error(kc::PolyDB::Error::NOREC, "no record");
+  dbdata->counters.hits += exists ? 1 : 0;
+  dbdata->counters.misses += exists ? 0 : 1;
+  if (ok && exists) return newbytes(value.data(), value.size());
+  if (db_raise(dbdata)) return NULL;
+  Py_INCREF(pydefault);
+  return pydefault;
+}
+
+
+/**
+ * Implementation of commit.
+ */
+static PyObject* wb_commit(WriteBatch_data* data) {
+  if (data->pydb == Py_None) Py_RETURN_TRUE;
+  if (wb_commit_impl(data)) Py_RETURN_TRUE;
+  if (db_raise((DB_data*)data->pydb)) return NULL;
+  Py_RETURN_FALSE;
+}
+
+
+/**
+ * Implementation of discard.
+ */
+static PyObject* wb_discard(WriteBatch_data* data) {
+  int64_t num = data->opnum;
+  data->ops->clear();
+  data->opnum = 0;
+  data->bytes = 0;
+  return PyLong_FromLongLong(num);
+}
+
+
+/**
+ * Implementation of pending.
+ */
+static PyObject* wb_pending(WriteBatch_data* data) {
+  return PyLong_FromLongLong(data->opnum);
+}
+
+
+/**
+ * Implementation of db.
+ */
+static PyObject* wb_db(WriteBatch_data* data) {
+  Py_INCREF(data->pydb);
+  return data->pydb;
+}
+
+
+/**
+ * Implementation of __enter__.
+ */
+static PyObject* wb_op_enter(WriteBatch_data* data) {
+  Py_INCREF((PyObject*)data);
+  return (PyObject*)data;
+}
+
+
+/**
+ * Implementation of __exit__.
+ */
+static PyObject* wb_op_exit(WriteBatch_data* data, PyObject* pyargs) {
+  PyObject* pyextype = Py_None;
+  if (PyTuple_Size(pyargs) > 0) pyextype = PyTuple_GetItem(pyargs, 0);
+  if (pyextype != Py_None) {
+    PyObject* pyrv = wb_discard(data);
+    if (!pyrv) return NULL;
+    Py_DECREF(pyrv);
+    Py_RETURN_FALSE;
+  }
+  PyObject* pyrv = wb_commit(data);
+  if (!pyrv) return NULL;
+  Py_DECREF(pyrv);
+  Py_RETURN_FALSE;
+}
+
+
+/**
+ * Define objects of the DB class.
+ */
+static bool define_db() {
+  static PyTypeObject type_db = { PyVarObject_HEAD_INIT(NULL, 0) };
+  size_t zoff = offsetof(PyTypeObject, tp_name);
+  std::memset((char*)&type_db + zoff, 0, sizeof(type_db) - zoff);
+  type_db.tp_name = "kyotocabinet.DB";
+  type_db.tp_basicsize = sizeof(DB_data);
+  type_db.tp_itemsize = 0;
+  type_db.tp_flags = Py_TPFLAGS_DEFAULT | Py_TPFLAGS_BASETYPE;
+  type_db.tp_doc = "Interface of database abstraction.";
+  type_db.tp_new = db_new;
+  type_db.tp_dealloc = (destructor)db_dealloc;
+  type_db.tp_init = (initproc)db_init;
+  type_db.tp_repr = (unaryfunc)db_repr;
+  type_db.tp_str = (unaryfunc)db_str;
+  static PyMethodDef db_methods[] = {
+    { "error", (PyCFunction)db_error, METH_NOARGS,
+      "Get the last happened error." },
+    { "open", (PyCFunction)db_open, METH_VARARGS | METH_KEYWORDS,
+      "Open a database file." },
+    { "close", (PyCFunction)db_close, METH_NOARGS,
+      "Close the database file." },
+    { "accept", (PyCFunction)db_accept, METH_VARARGS,
+      "Accept a visitor to a record." },
+    { "accept_bulk", (PyCFunction)db_accept_bulk, METH_VARARGS,
+      "Accept a visitor to multiple records at once." },
+    { "iterate", (PyCFunction)db_iterate, METH_VARARGS,
+      "Iterate to accept a visitor for each record." },
+    { "set", (PyCFunction)db_set, METH_VARARGS,
+      "Set the value of a record." },
+    { "add", (PyCFunction)db_add, METH_VARARGS,
+      "Add a record." },
+    { "replace", (PyCFunction)db_replace, METH_VARARGS,
+      "Replace the value of a record." },
+    { "append", (PyCFunction)db_append, METH_VARARGS,
+      "Append the value of a record." },
+    { "increment", (PyCFunction)db_increment, METH_VARARGS,
+      "Add a number to the numeric integer value of a record." },
+    { "increment_double", (PyCFunction)db_increment_double, METH_VARARGS,
+      "Add a number to the numeric double value of a record." },
+    { "cas", (PyCFunction)db_cas, METH_VARARGS,
+      "Perform compare-and-swap." },
+    { "remove", (PyCFunction)db_remove, METH_VARARGS,
+      "Remove a record." },
+    { "get", (PyCFunction)db_get, METH_VARARGS,
+      "Retrieve the value of a record." },
+    { "get_str", (PyCFunction)db_get_str, METH_VARARGS,
+      "Retrieve the value of a record." },
+    { "check", (PyCFunction)db_check, METH_VARARGS,
+      "Check the existence of a record." },
+    { "seize", (PyCFunction)db_seize, METH_VARARGS,
+      "Retrieve the value of a record and remove it atomically." },
+    { "get_seize", (PyCFunction)db_seize_str, METH_VARARGS,
+      "Retrieve the value of a record and remove it atomically." },
+    { "set_bulk", (PyCFunction)db_set_bulk, METH_VARARGS,
+      "Store records at once." },
+    { "remove_bulk", (PyCFunction)db_remove_bulk, METH_VARARGS,
+      "Remove records at once." },
+    { "get_bulk", (PyCFunction)db_get_bulk, METH_VARARGS,
+      "Retrieve records at once." },
+    { "get_bulk_str", (PyCFunction)db_get_bulk_str, METH_VARARGS,
+      "Retrieve records at once." },
+    { "pop", (PyCFunction)db_pop, METH_VARARGS,
+      "Remove a record and return its value." },
+    { "setdefault", (PyCFunction)db_setdefault, METH_VARARGS,
+      "Retrieve the value of a record, storing a default value if it is missing." },
+    { "update", (PyCFunction)db_update, METH_VARARGS | METH_KEYWORDS,
+      "Store records of a mapping or a sequence of pairs at once." },
+    { "keys", (PyCFunction)db_keys, METH_NOARGS,
+      "Get a view of the keys." },
+    { "values", (PyCFunction)db_values, METH_NOARGS,
+      "Get a view of the values." },
+    { "items", (PyCFunction)db_items, METH_NOARGS,
+      "Get a view of the records." },
+    { "write_batch", (PyCFunction)db_write_batch, METH_VARARGS | METH_KEYWORDS,
+      "Create a write batch which commits operations at once." },
+    { "clear", (PyCFunction)db_clear, METH_NOARGS,
+      "Remove all records." },
+    { "synchronize", (PyCFunction)db_synchronize, METH_VARARGS,
+      "Synchronize updated contents with the file and the device." },
+    { "occupy", (PyCFunction)db_occupy, METH_VARARGS,
+      "Occupy database by locking and do something meanwhile." },
+    { "copy", (PyCFunction)db_copy, METH_VARARGS,
+      "Create a copy of the database file." },
+    { "begin_transaction", (PyCFunction)db_begin_transaction, METH_VARARGS,
+      "Begin transaction." },
+    { "end_transaction", (PyCFunction)db_end_transaction, METH_VARARGS,
+      "End transaction." },
+    { "transaction", (PyCFunction)db_transaction, METH_VARARGS,
+      "Perform entire transaction by a functor." },
+    { "dump_snapshot", (PyCFunction)db_dump_snapshot, METH_VARARGS,
+      "Dump records into a snapshot file." },
+    { "load_snapshot", (PyCFunction)db_load_snapshot, METH_VARARGS,
+      "Load records from a snapshot file." },
+    { "tune_journal", (PyCFunction)db_tune_journal, METH_VARARGS,
+      "Set the journal of changed keys used for incremental snapshots." },
+    { "dump_snapshot_stream", (PyCFunction)db_dump_snapshot_stream, METH_VARARGS,
+      "Dump records into a file object or a file descriptor in chunks." },
+    { "load_snapshot_stream", (PyCFunction)db_load_snapshot_stream, METH_VARARGS,
+      "Load records from a file object or a file descriptor in chunks." },
+    { "count", (PyCFunction)db_count, METH_NOARGS,
+      "Get the number of records." },
+    { "size", (PyCFunction)db_size, METH_NOARGS,
+      "Get the size of the database file." },
+    { "path", (PyCFunction)db_path, METH_NOARGS,
+      "Get the path of the database file." },
+    { "status", (PyCFunction)db_status, METH_NOARGS,
+      "Get the miscellaneous status information." },
+    { "tuning", (PyCFunction)db_tuning, METH_NOARGS,
+      "Get the tuning parameters derived at opening." },
+    { "metrics", (PyCFunction)db_metrics, METH_NOARGS,
+      "Get the numeric metrics of the database." },
+    { "match_prefix", (PyCFunction)db_match_prefix, METH_VARARGS,
+      "Get keys matching a prefix string." },
+    { "match_regex", (PyCFunction)db_match_regex, METH_VARARGS,
+      "Get keys matching a regular expression string." },
+    { "explain_regex", (PyCFunction)db_explain_regex, METH_VARARGS,
+      "Get the scan strategy of a regular expression string." },
+    { "match_similar", (PyCFunction)db_match_similar, METH_VARARGS,
+      "Get keys similar to a string in terms of the levenshtein distance." },
+    { "tune_fuzzy_index", (PyCFunction)db_tune_fuzzy_index, METH_VARARGS,
+      "Set the n-gram index used for similarity search." },
+    { "tune_expiry", (PyCFunction)db_tune_expiry, METH_VARARGS,
+      "Set the expiration table and the background sweeper." },
+    { "sweep_expired", (PyCFunction)db_sweep_expired, METH_VARARGS,
+      "Remove expired records." },
+    { "expiry_status", (PyCFunction)db_expiry_status, METH_NOARGS,
+      "Get the status of the expiration table." },
+    { "tune_changes", (PyCFunction)db_tune_changes, METH_VARARGS,
+      "Set the change feed which records updates." },
+    { "changes", (PyCFunction)db_changes, METH_VARARGS,
+      "Get updates recorded by the change feed." },
+    { "changes_status", (PyCFunction)db_changes_status, METH_NOARGS,
+      "Get the status of the change feed." },
+    { "defrag", (PyCFunction)db_defrag, METH_VARARGS,
+      "Defragment the database file." },
+    { "tune_defrag", (PyCFunction)db_tune_defrag, METH_VARARGS,
+      "Set the background scheduler of incremental defragmentation." },
+    { "tune_group_commit", (PyCFunction)db_tune_group_commit, METH_VARARGS,
+      "Set the group commit which batches synchronization requests of threads." },
+    { "request_durable", (PyCFunction)db_request_durable, METH_NOARGS,
+      "Request synchronization of the preceding updates by the group commit." },
+    { "wait_durable", (PyCFunction)db_wait_durable, METH_VARARGS,
+      "Wait until the preceding updates are synchronized by the group commit." },
+    { "group_commit_status", (PyCFunction)db_group_commit_status, METH_NOARGS,
+      "Get the status of the group commit." },
+    { "export_to", (PyCFunction)db_export_to, METH_VARARGS,
+      "Export records into another database in pipelined batches." },
+    { "tune_stats", (PyCFunction)db_tune_stats, METH_VARARGS,
+      "Enable or disable the statistics of method calls." },
+    { "stats", (PyCFunction)db_stats, METH_VARARGS,
+      "Get the statistics of method calls." },
+    { "tune_contention", (PyCFunction)db_tune_contention, METH_VARARGS,
+      "Enable or disable the profiler of lock contention." },
+    { "contention", (PyCFunction)db_contention, METH_VARARGS,
+      "Get the waiting times sampled by the profiler of lock contention." },
+    { "dump_contention", (PyCFunction)db_dump_contention, METH_VARARGS,
+      "Dump the profile of lock contention into a file." },
+    { "tune_slow_log", (PyCFunction)db_tune_slow_log, METH_VARARGS,
+      "Set the log of slow operations." },
+    { "slow_log", (PyCFunction)db_slow_log, METH_VARARGS,
+      "Get the entries of the log of slow operations." },
+    { "merge", (PyCFunction)db_merge, METH_VARARGS,
+      "Merge records from other databases." },
+    { "cursor", (PyCFunction)db_cursor, METH_NOARGS,
+      "Create a cursor object." },
+    { "cursor_process", (PyCFunction)db_cursor_process, METH_VARARGS,
+      "Process a cursor by the block parameter." },
+    { "tune_blob_store", (PyCFunction)db_tune_blob_store, METH_VARARGS,
+      "Set the database of chunk records of blob records." },
+    { "open_blob", (PyCFunction)db_open_blob, METH_VARARGS,
+      "Open a file-like handle to a chunked blob record." },
+    { "shift", (PyCFunction)db_shift, METH_NOARGS,
+      "Remove the first record." },
+    { "shift_str", (PyCFunction)db_shift_str, METH_NOARGS,
+      "Remove the first record." },
+    { "tune_exception_rule", (PyCFunction)db_tune_exception_rule, METH_VARARGS,
+      "Set the rule about throwing exception." },
+    { "process", (PyCFunction)db_process, METH_VARARGS | METH_CLASS,
+      "Process a database by a functor" },
+    { NULL, NULL, 0, NULL }
+  };
+  type_db.tp_methods = db_methods;
+  static PyMappingMethods type_db_map;
+  std::memset(&type_db_map, 0, sizeof(type_db_map));
+  type_db_map.mp_length = (lenfunc)db_op_len;
+  type_db_map.mp_subscript = (binaryfunc)db_op_getitem;
+  type_db_map.mp_ass_subscript = (objobjargproc)db_op_setitem;
+  type_db.tp_as_mapping = &type_db_map;
+  static PySequenceMethods type_db_seq;
+  std::memset(&type_db_seq, 0, sizeof(type_db_seq));
+  type_db_seq.sq_contains = (objobjproc)db_op_contains;
+  type_db.tp_as_sequence = &type_db_seq;
+  type_db.tp_iter = (getiterfunc)db_op_iter;
+  if (PyType_Ready(&type_db) != 0) return false;
+  cls_db = (PyObject*)&type_db;
+  if (!setconstuint32(cls_db, "GEXCEPTIONAL", GEXCEPTIONAL)) return false;
+  if (!setconstuint32(cls_db, "GCONCURRENT", GCONCURRENT)) return false;
+  if (!setconstuint32(cls_db, "OREADER", kc::PolyDB::OREADER)) return false;
+  if (!setconstuint32(cls_db, "OWRITER", kc::PolyDB::OWRITER)) return false;
+  if (!setconstuint32(cls_db, "OCREATE", kc::PolyDB::OCREATE)) return false;
+  if (!setconstuint32(cls_db, "OTRUNCATE", kc::PolyDB::OTRUNCATE)) return false;
+  if (!setconstuint32(cls_db, "OAUTOTRAN", kc::PolyDB::OAUTOTRAN)) return false;
+  if (!setconstuint32(cls_db, "OAUTOSYNC", kc::PolyDB::OAUTOSYNC)) return false;
+  if (!setconstuint32(cls_db, "ONOLOCK", kc::PolyDB::ONOLOCK)) return false;
+  if (!setconstuint32(cls_db, "OTRYLOCK", kc::PolyDB::OTRYLOCK)) return false;
+  if (!setconstuint32(cls_db, "ONOREPAIR", kc::PolyDB::ONOREPAIR)) return false;
+  if (!setconstuint32(cls_db, "MSET", kc::PolyDB::MSET)) return false;
+  if (!setconstuint32(cls_db, "MADD", kc::PolyDB::MADD)) return false;
+  if (!setconstuint32(cls_db, "MREPLACE", kc::PolyDB::MREPLACE)) return false;
+  if (!setconstuint32(cls_db, "MAPPEND", kc::PolyDB::MAPPEND)) return false;
+  Py_INCREF(cls_db);
+  if (PyModule_AddObject(mod_kc, "DB", cls_db) != 0) return false;
+  return true;
+}
+
+
+/**
+ * Implementation of new.
+ */
+static PyObject* db_new(PyTypeObject* pytype, PyObject* pyargs, PyObject* pykwds) {
+  DB_data* data = (DB_data*)pytype->tp_alloc(pytype, 0);
+  if (!data) return NULL;
+  data->db = NULL;
+  data->exbits = 0;
+  data->pylock = NULL;
+  data->tuning = NULL;
+  data->tranopen = false;
+  data->tranthid = 0;
+  data->hub = new UpdateHub;
+  data->fuzzy = NULL;
+  data->expiry = NULL;
+  data->journal = NULL;
+  data->feed = NULL;
+  data->defrag = NULL;
+  data->committer = NULL;
+  data->syncer = NULL;
+  data->stats = NULL;
+  data->contention = NULL;
+  data->slowlog = NULL;
+  data->blobstore = NULL;
+  std::memset(&data->counters, 0, sizeof(data->counters));
+  objs_db.insert(data);
+  return (PyObject*)data;
+}
+
+
+/**
+ * Implementation of dealloc.
+ */
+static void db_dealloc(DB_data* data) {
+  objs_db.erase(data);
+  kc::PolyDB* db = data->db;
+  db_stop_expiry(data);
+  PyObject* pylock = data->pylock;
+  Py_DECREF(pylock);
+  delete data->tuning;
+  db_stop_sync(data);
+  delete data->defrag;
+  delete data->committer;
+  delete data->stats;
+  delete data->contention;
+  delete data->slowlog;
+  Py_XDECREF(data->blobstore);
+  delete data->hub;
+  delete db;
+  Py_TYPE(data)->tp_free((PyObject*)data);
+}
+
+
+/**
+ * Raise the exception of an error code.
+ */
+static bool db_raise(DB_data* data) {
+  if (data->exbits == 0) return false;
+  kc::PolyDB::Error err = data->db->error();
+  uint32_t code = err.code();
+  if (data->exbits & (1 << code)) {
+    PyErr_Format(cls_err_children[code], "%u: %s", code, err.message());
+    return true;
+  }
+  return false;
+}
+
+
+/**
+ * Wait until the change feed with the blocking behavior has room for an update.
+ */
+static void db_admit(DB_data* data) {
+  ChangeFeed* feed = data->feed;
+  if (!feed || !feed->blocking()) return;
+  feed->retain();
+  Py_BEGIN_ALLOW_THREADS
+  feed->admit();
+  Py_END_ALLOW_THREADS
+  feed->release();
+}
+
+
+/**
+ * Implementation of init.
+ */
+static int db_init(DB_data* data, PyObject* pyargs, PyObject* pykwds) {
+  int32_t argc = PyTuple_Size(pyargs);
+  PyObject* pyopts = Py_None;
+  if (argc > 0) pyopts = PyTuple_GetItem(pyargs, 0);
+  data->db = new kc::PolyDB();
+  uint32_t opts = PyLong_Check(pyopts) ? (uint32_t)PyLong_AsLong(pyopts) : 0;
+  if (opts & GEXCEPTIONAL) {
+    uint32_t exbits = 0;
+    exbits |= 1 << kc::PolyDB::Error::NOIMPL;
+    exbits |= 1 << kc::PolyDB::Error::INVALID;
+    exbits |= 1 << kc::PolyDB::Error::NOREPOS;
+    exbits |= 1 << kc::PolyDB::Error::NOPERM;
+    exbits |= 1 << kc::PolyDB::Error::BROKEN;
+    exbits |= 1 << kc::PolyDB::Error::SYSTEM;
+    exbits |= 1 << kc::PolyDB::Error::MISC;
+    data->exbits = exbits;
+  } else {
+    data->exbits = 0;
+  }
+  if (opts & GCONCURRENT) {
+    Py_INCREF(Py_None);
+    data->pylock = Py_None;
+  } else {
+    data->pylock = PyObject_CallMethod(mod_th, (char*)"Lock", NULL);
+  }
+  return 0;
+}
+
+
+/**
+ * Implementation of repr.
+ */
+static PyObject* db_repr(DB_data* data) {
+  kc::PolyDB* db = data->db;
+  std::string path = db->path();
+  if (path.size() < 1) path = "(None)";
+  std::string str;
+  NativeFunction nf(data);
+  kc::strprintf(&str, "<kyotocabinet.DB: %s: %lld: %lld>",
+                path.c_str(), (long long)db->count(), (long long)db->size());
+  nf.cleanup();
+  return PyUnicode_FromString(str.c_str());
+}
+
+
+/**
+ * Implementation of str.
+ */
+static PyObject* db_str(DB_data* data) {
+  kc::PolyDB* db = data->db;
+  std::string path = db->path();
+  if (path.size() < 1) path = "(None)";
+  std::string str;
+  NativeFunction nf(data);
+  kc::strprintf(&str, "%s: %lld: %lld",
+                path.c_str(), (long long)db->count(), (long long)db->size());
+  nf.cleanup();
+  return PyUnicode_FromString(str.c_str());
+}
+
+
+/**
+ * Implementation of error.
+ */
+static PyObject* db_error(DB_data* data) {
+  kc::PolyDB* db = data->db;
+  kc::PolyDB::Error err = db->error();
+  PyObject* pyerr = PyObject_CallMethod(mod_kc, (char*)"Error",
+                                        (char*)"(IU)", err.code(), err.message());
+  return pyerr;
+}
+
+
+/**
+ * Implementation of open.
+ */
+static PyObject* db_open(DB_data* data, PyObject* pyargs, PyObject* pykwds) {
+  int32_t argc = PyTuple_Size(pyargs);
+  static const char* kwnames[] = {
+    "expected_records", "avg_key_size", "avg_value_size", "memory_budget", "workload",
+    "sync_interval", "sync_hard", "sync_after_bytes", NULL
+  };
+  if (argc > 10 || !checkkwargs(pykwds, kwnames)) {
+    throwinvarg();
+    return NULL;
+  }
+  PyObject* pypath = Py_None;
+  if (argc > 0) pypath = PyTuple_GetItem(pyargs, 0);
+  PyObject* pymode = Py_None;
+  if (argc > 1) pymode = PyTuple_GetItem(pyargs, 1);
+  PyObject* pyparams[8];
+  for (int32_t i = 0; i < 8; i++) {
+    pyparams[i] = i + 2 < argc ? PyTuple_GetItem(pyargs, i + 2) : getkwarg(pykwds, kwnames[i]);
+  }
+  kc::PolyDB* db = data->db;
+  SoftString path(pypath);
+  std::string tpath = path.size() > 0 ? std::string(path.ptr(), path.size()) : ":";
+  uint32_t mode = PyLong_Check(pymode) ? (uint32_t)PyLong_AsLong(pymode) :
+    kc::PolyDB::OWRITER | kc::PolyDB::OCREATE;
+  StringMap* tuning = NULL;
+  PyObject* pyrnum = pyparams[0];
+  if (pyrnum != Py_None) {
+    int64_t rnum = pyatoi(pyrnum);
+    PyObject* pyksiz = pyparams[1];
+    int64_t ksiz = pyksiz == Py_None ? 16 : pyatoi(pyksiz);
+    PyObject* pyvsiz = pyparams[2];
+    int64_t vsiz = pyvsiz == Py_None ? 64 : pyatoi(pyvsiz);
+    PyObject* pymbudget = pyparams[3];
+    int64_t mbudget = -1;
+    if (PyUnicode_Check(pymbudget) || PyBytes_Check(pymbudget)) {
+      SoftString mstr(pymbudget);
+      mbudget = kc::atoix(mstr.ptr());
+    } else if (pymbudget != Py_None) {
+      mbudget = pyatoi(pymbudget);
+    }
+    PyObject* pyworkload = pyparams[4];
+    SoftString workload(pyworkload);
+    StringMap params;
+    if (rnum < 1 || ksiz < 0 || vsiz < 0 ||
+        !db_autotune(tpath, rnum, ksiz, vsiz, mbudget,
+                     std::string(workload.ptr(), workload.size()), &params)) {
+      throwinvarg();
+      return NULL;
+    }
+    StringMap::iterator it = params.begin();
+    StringMap::iterator itend = params.end();
+    while (it != itend) {
+      if (it->first != "type") tpath.append("#" + it->first + "=" + it->second);
+      it++;
+    }
+    tuning = new StringMap(params);
+  }
+  PyObject* pysyncint = pyparams[5];
+  double syncint = pysyncint == Py_None ? 0 : pyatof(pysyncint);
+  bool synchard = PyObject_IsTrue(pyparams[6]);
+  PyObject* pysyncsiz = pyparams[7];
+  int64_t syncsiz = pysyncsiz == Py_None ? 0 : pyatoi(pysyncsiz);
+  if (syncint < 0 || syncsiz < 0) {
+    delete tuning;
+    throwinvarg();
+    return NULL;
+  }
+  NativeFunction nf(data, "open");
+  db_stop_sync(data);
+  bool rv = db->open(tpath, mode);
+  if (rv && (syncint > 0 || syncsiz > 0)) {
+    data->syncer = new SyncScheduler(db, syncint, synchard, syncsiz);
+    data->hub->add(data->syncer);
+    data->syncer->start();
+  }
+  nf.cleanup();
+  if (rv) {
+    delete data->tuning;
+    data->tuning = tuning;
+    Py_RETURN_TRUE;
+  }
+  delete tuning;
+  delete data->tuning;
+  data->tuning = NULL;
+  if (db_raise(data)) return NULL;
+  Py_RETURN_FALSE;
+}
+
+
+/**
+ * Derive tuning parameters from the expected workload.
+ */
+static bool db_autotune(const std::string& path, int64_t rnum, int64_t ksiz, int64_t vsiz,
+                        int64_t mbudget, const std::string& workload, StringMap* params) {
+  bool read = false;
+  bool write = false;
+  bool scan = false;
+  if (workload == "read-heavy") {
+    read = true;
+  } else if (workload == "write-heavy") {
+    write = true;
+  } else if (workload == "scan") {
+    scan = true;
+  } else if (!workload.empty() && workload != "balanced") {
+    return false;
+  }
+  StringVector elems;
+  kc::strsplit(path, '#', &elems);
+  std::string name = elems.empty() ? path : elems.front();
+  StringMap given;
+  for (size_t i = 1; i < elems.size(); i++) {
+    size_t pos = elems[i].find('=');
+    if (pos == std::string::npos) continue;
+    given[elems[i].substr(0, pos)] = elems[i].substr(pos + 1);
+  }
+  std::string type;
+  StringMap::iterator git = given.find("type");
+  if (git != given.end()) {
+    type = git->second;
+  } else if (name == "-" || name == "+" || name == ":" || name == "*" || name == "%") {
+    type = name;
+  } else {
+    size_t pos = name.rfind('.');
+    if (pos != std::string::npos) type = name.substr(pos + 1);
+  }
+  kc::strtolower(&type);
+  int64_t recsiz = ksiz + vsiz;
+  int64_t fsiz = rnum * (recsiz + 16);
+  StringMap derived;
+  if (type == "kch") {
+    int64_t bnum = rnum * (write ? 4 : 2);
+    int32_t apow = recsiz < 64 ? 2 : 3;
+    if (write) {
+      apow = 3;
+      while (apow < 10 && (1LL << (apow + 2)) < recsiz) {
+        apow++;
+      }
+      derived["fpow"] = "12";
+      derived["dfunit"] = "8";
+    }
+    derived["bnum"] = kc::strprintf("%lld", (long long)bnum);
+    derived["apow"] = kc::strprintf("%d", (int)apow);
+    fsiz += bnum * 6;
+    if (fsiz * 2 < (1LL << (32 + apow))) derived["opts"] = "s";
+    if (mbudget > 0) derived["msiz"] = kc::strprintf("%lld", (long long)std::min(mbudget, fsiz));
+  } else if (type == "kct" || type == "kcf" || type == "%") {
+    int64_t psiz = scan ? 32768 : read ? 4096 : 8192;
+    while (psiz < recsiz * 4 && psiz < 65536) {
+      psiz *= 2;
+    }
+    derived["psiz"] = kc::strprintf("%lld", (long long)psiz);
+    if (type != "kcf") {
+      int64_t bnum = std::max(rnum / 10, (int64_t)1024);
+      derived["bnum"] = kc::strprintf("%lld", (long long)bnum);
+    }
+    if (mbudget > 0) {
+      int64_t pccap = type == "kct" ? (write ? mbudget / 2 : mbudget / 4 * 3) : mbudget;
+      derived["pccap"] = kc::strprintf("%lld", (long long)pccap);
+      if (type == "kct")
+        derived["msiz"] = kc::strprintf("%lld", (long long)std::min(mbudget - pccap, fsiz));
+    }
+  } else if (type == "*") {
+    derived["bnum"] = kc::strprintf("%lld", (long long)(rnum * 2));
+    if (mbudget > 0) derived["capsiz"] = kc::strprintf("%lld", (long long)mbudget);
+  } else if (type == ":") {
+    derived["bnum"] = kc::strprintf("%lld", (long long)rnum);
+  } else if (type != "-" && type != "+" && type != "kcd" && type != "kcx") {
+    return false;
+  }
+  params->clear();
+  (*params)["type"] = type;
+  StringMap::iterator it = derived.begin();
+  StringMap::iterator itend = derived.end();
+  while (it != itend) {
+    if (given.find(it->first) == given.end()) (*params)[it->first] = it->second;
+    it++;
+  }
+  return true;
+}
+
+
+/**
+ * Stop and detach the synchronization scheduler.
+ */
+static void db_stop_sync(DB_data* data) {
+  if (!data->syncer) return;
+  data->syncer->stop();
+  data->hub->remove(data->syncer);
+  delete data->syncer;
+  data->syncer = NULL;
+}
+
+
+/**
+ * Implementation of close.
+ */
+static PyObject* db_close(DB_data* data) {
+  kc::PolyDB* db = data->db;
+  db_stop_expiry(data);
+  NativeFunction nf(data, "close");
+  g_curbur.sweap();
+  if (data->defrag) data->defrag->stop();
+  if (data->committer) data->committer->stop();
+  db_stop_sync(data);
+  bool rv = db->close();
+  nf.cleanup();
+  data->tranopen = false;
+  if (rv) Py_RETURN_TRUE;
+  if (db_raise(data)) return NULL;
+  Py_RETURN_FALSE;
+}
+
+
+/**
+ * Implementation of accept.
+ */
+static PyObject* db_accept(DB_data* data, PyObject* pyargs) {
+  int32_t argc = PyTuple_Size(pyargs);
+  if (argc < 2 || argc > 3) {
+    throwinvarg();
+    return NULL;
+  }
+  kc::PolyDB* db = data->db;
+  if (data->pylock == Py_None) {
+    db->set_error(kc::PolyDB::Error::INVALID, "unsupported method");
+    if (db_raise(data)) return NULL;
+    Py_RETURN_NONE;
+  }
+  PyObject* pykey = PyTuple_GetItem(pyargs, 0);
+  SoftString key(pykey);
+  PyObject* pyvisitor = PyTuple_GetItem(pyargs, 1);
+  PyObject* pywritable = Py_None;
+  if (argc > 2) pywritable = PyTuple_GetItem(pyargs, 2);
+  bool writable = pywritable == Py_None || PyObject_IsTrue(pywritable);
+  bool rv;
+  if (PyObject_IsInstance(pyvisitor, cls_vis) || PyCallable_Check(pyvisitor)) {
+    SoftVisitor visitor(pyvisitor, writable, data->hub);
+    if (writable) db_admit(data);
+    NativeFunction nf(data, "accept");
+    nf.set_key(key.ptr(), key.size());
+    rv = db->accept(key.ptr(), key.size(), &visitor, writable);
+    nf.cleanup();
+    PyObject* pyextype, *pyexvalue, *pyextrace;
+    if (visitor.exception(&pyextype, &pyexvalue, &pyextrace)) {
+      PyErr_SetObject(pyextype, pyexvalue);
+      return NULL;
+    }
+  } else {
+    throwinvarg();
+    return NULL;
+  }
+  if (rv) Py_RETURN_TRUE;
+  if (db_raise(data)) return NULL;
+  Py_RETURN_FALSE;
+}
+
+
+/**
+ * Implementation of accept_bulk.
+ */
+static PyObject* db_accept_bulk(DB_data* data, PyObject* pyargs) {
+  int32_t argc = PyTuple_Size(pyargs);
+  if (argc < 2 || argc > 3) {
+    throwinvarg();
+    return NULL;
+  }
+  kc::PolyDB* db = data->db;
+  if (data->pylock == Py_None) {
+    db->set_error(kc::PolyDB::Error::INVALID, "unsupported method");
+    if (db_raise(data)) return NULL;
+    Py_RETURN_NONE;
+  }
+  PyObject* pykeys = PyTuple_GetItem(pyargs, 0);
+  if (!PySequence_Check(pykeys)) {
+    throwinvarg();
+    return NULL;
+  }
+  StringVector keys;
+  int32_t knum = PySequence_Length(pykeys);
+  for (int32_t i = 0; i < knum; i++) {
+    PyObject* pykey = PySequence_GetItem(pykeys, i);
+    SoftString key(pykey);
+    keys.push_back(std::string(key.ptr(), key.size()));
+    Py_DECREF(pykey);
+  }
+  PyObject* pyvisitor = PyTuple_GetItem(pyargs, 1);
+  PyObject* pywritable = Py_None;
+  if (argc > 2) pywritable = PyTuple_GetItem(pyargs, 2);
+  bool writable = pywritable == Py_None || PyObject_IsTrue(pywritable);
+  bool rv;
+  if (PyObject_IsInstance(pyvisitor, cls_vis) || PyCallable_Check(pyvisitor)) {
+    SoftVisitor visitor(pyvisitor, writable, data->hub);
+    if (writable) db_admit(data);
+    NativeFunction nf(data, "accept_bulk");
+    rv = db->accept_bulk(keys, &visitor, writable);
+    nf.cleanup();
+    PyObject* pyextype, *pyexvalue, *pyextrace;
+    if (visitor.exception(&pyextype, &pyexvalue, &pyextrace)) {
+      PyErr_SetObject(pyextype, pyexvalue);
+      return NULL;
+    }
+  } else {
+    throwinvarg();
+    return NULL;
+  }
+  if (rv) Py_RETURN_TRUE;
+  if (db_raise(data)) return NULL;
+  Py_RETURN_FALSE;
+}
+
+
+/**
+ * Implementation of iterate.
+ */
+static PyObject* db_iterate(DB_data* data, PyObject* pyargs) {
+  int32_t argc = PyTuple_Size(pyargs);
+  if (argc < 1 || argc > 3) {
+    throwinvarg();
+    return NULL;
+  }
+  kc::PolyDB* db = data->db;
+  if (data->pylock == Py_None) {
+    db->set_error(kc::PolyDB::Error::INVALID, "unsupported method");
+    if (db_raise(data)) return NULL;
+    Py_RETURN_NONE;
+  }
+  PyObject* pyvisitor = PyTuple_GetItem(pyargs, 0);
+  PyObject* pywritable = Py_None;
+  if (argc > 1) pywritable = PyTuple_GetItem(pyargs, 1);
+  bool writable = pywritable == Py_None || PyObject_IsTrue(pywritable);
+  PyObject* pyfilter = Py_None;
+  if (argc > 2) pyfilter = PyTuple_GetItem(pyargs, 2);
+  ScanFilter filter;
+  if (!filter.set(pyfilter)) {
+    throwinvarg();
+    return NULL;
+  }
+  bool rv;
+  if (PyObject_IsInstance(pyvisitor, cls_vis) || PyCallable_Check(pyvisitor)) {
+    SoftVisitor visitor(pyvisitor, writable, data->hub, filter.empty() ? NULL : &filter);
+    if (writable) db_admit(data);
+    NativeFunction nf(data, "iterate");
+    rv = db->iterate(&visitor, writable);
+    nf.cleanup();
+    PyObject* pyextype, *pyexvalue, *pyextrace;
+    if (visitor.exception(&pyextype, &pyexvalue, &pyextrace)) {
+      PyErr_SetObject(pyextype, pyexvalue);
+      return NULL;
+    }
+  } else {
+    throwinvarg();
+    return NULL;
+  }
+  if (rv) Py_RETURN_TRUE;
+  if (db_raise(data)) return NULL;
+  Py_RETURN_FALSE;
+}
+
+
+/**
+ * Implementation of set.
+ */
+static PyObject* db_set(DB_data* data, PyObject* pyargs) {
+  int32_t argc = PyTuple_Size(pyargs);
+  if (argc < 2 || argc > 3) {
+    throwinvarg();
+    return NULL;
+  }
+  kc::PolyDB* db = data->db;
+  PyObject* pykey = PyTuple_GetItem(pyargs, 0);
+  PyObject* pyvalue = PyTuple_GetItem(pyargs, 1);
+  PyObject* pyttl = Py_None;
+  if (argc > 2) pyttl = PyTuple_GetItem(pyargs, 2);
+  SoftString key(pykey);
+  SoftString value(pyvalue);
+  double ttl = pyttl == Py_None ? -1 : pyatof(pyttl);
+  ExpiryTable* expiry = data->expiry;
+  db_admit(data);
+  NativeFunction nf(data, "set");
+  nf.set_key(key.ptr(), key.size());
+  nf.transfer(key.size() + value.size(), 0);
+  bool rv;
+  if (pyttl != Py_None && !expiry) {
+    db->set_error(kc::PolyDB::Error::INVALID, "no expiration table");
+    rv = false;
+  } else {
+    rv = db->set(key.ptr(), key.size(), value.ptr(), value.size());
+    if (rv) data->hub->notify(UpdateListener::USET, key.ptr(), key.size(),
+                              value.ptr(), value.size());
+    if (rv && pyttl != Py_None && !expiry->expire(key.ptr(), key.size(), ttl)) {
+      db->set_error(kc::PolyDB::Error::MISC, "expiration table failed");
+      rv = false;
+    }
+  }
+  nf.cleanup();
+  if (rv) data->counters.writes++;
+  if (rv) Py_RETURN_TRUE;
+  if (db_raise(data)) return NULL;
+  Py_RETURN_FALSE;
+}
+
+
+/**
+ * Implementation of add.
+ */
+static PyObject* db_add(DB_data* data, PyObject* pyargs) {
+  int32_t argc = PyTuple_Size(pyargs);
+  if (argc != 2) {
+    throwinvarg();
+    return NULL;
+  }
+  kc::PolyDB* db = data->db;
+  PyObject* pykey = PyTuple_GetItem(pyargs, 0);
+  PyObject* pyvalue = PyTuple_GetItem(pyargs, 1);
+  SoftString key(pykey);
+  SoftString value(pyvalue);
+  db_admit(data);
+  NativeFunction nf(data, "add");
+  nf.set_key(key.ptr(), key.size());
+  nf.transfer(key.size() + value.size(), 0);
+  bool rv = db->add(key.ptr(), key.size(), value.ptr(), value.size());
+  if (rv) data->hub->notify(UpdateListener::USET, key.ptr(), key.size(), value.ptr(), value.size());
+  nf.cleanup();
+  if (rv) data->counters.writes++;
+  if (rv) Py_RETURN_TRUE;
+  if (db_raise(data)) return NULL;
+  Py_RETURN_FALSE;
+}
+
+
+/**
+ * Implementation of replace.
+ */
+static PyObject* db_replace(DB_data* data, PyObject* pyargs) {
+  int32_t argc = PyTuple_Size(pyargs);
+  if (argc != 2) {
+    throwinvarg();
+    return NULL;
+  }
+  kc::PolyDB* db = data->db;
+  PyObject* pykey = PyTuple_GetItem(pyargs, 0);
+  PyObject* pyvalue = PyTuple_GetItem(pyargs, 1);
+  SoftString key(pykey);
+  SoftString value(pyvalue);
+  db_admit(data);
+  NativeFunction nf(data, "replace");
+  nf.set_key(key.ptr(), key.size());
+  nf.transfer(key.size() + value.size(), 0);
+  bool rv = db->replace(key.ptr(), key.size(), value.ptr(), value.size());
+  if (rv) data->hub->notify(UpdateListener::USET, key.ptr(), key.size(), value.ptr(), value.size());
+  nf.cleanup();
+  if (rv) data->counters.writes++;
+  if (rv) Py_RETURN_TRUE;
+  if (db_raise(data)) return NULL;
+  Py_RETURN_FALSE;
+}
+
+
+/**
+ * Implementation of append.
+ */
+static PyObject* db_append(DB_data* data, PyObject* pyargs) {
+  int32_t argc = PyTuple_Size(pyargs);
+  if (argc != 2) {
+    throwinvarg();
+    return NULL;
+  }
+  kc::PolyDB* db = data->db;
+  PyObject* pykey = PyTuple_GetItem(pyargs, 0);
+  PyObject* pyvalue = PyTuple_GetItem(pyargs, 1);
+  SoftString key(pykey);
+  SoftString value(pyvalue);
+  db_admit(data);
+  NativeFunction nf(data, "append");
+  nf.set_key(key.ptr(), key.size());
+  nf.transfer(key.size() + value.size(), 0);
+  bool rv = db->append(key.ptr(), key.size(), value.ptr(), value.size());
+  if (rv) data->hub->notify(UpdateListener::USET, key.ptr(), key.size());
+  nf.cleanup();
+  if (rv) data->counters.writes++;
+  if (rv) Py_RETURN_TRUE;
+  if (db_raise(data)) return NULL;
+  Py_RETURN_FALSE;
+}
+
+
+/**
+ * Implementation of increment.
+ */
+static PyObject* db_increment(DB_data* data, PyObject* pyargs) {
+  int32_t argc = PyTuple_Size(pyargs);
+  if (argc < 1 || argc > 3) {
+    throwinvarg();
+    return NULL;
+  }
+  kc::PolyDB* db = data->db;
+  PyObject* pykey = PyTuple_GetItem(pyargs, 0);
+  SoftString key(pykey);
+  PyObject* pynum = Py_None;
+  if (argc > 1) pynum = PyTuple_GetItem(pyargs, 1);
+  int64_t num = pynum == Py_None ? 0 : pyatoi(pynum);
+  PyObject* pyorig = Py_None;
+  if (argc > 2) pyorig = PyTuple_GetItem(pyargs, 2);
+  int64_t orig = pyorig == Py_None ? 0 : pyatoi(pyorig);
+  PyObject* pyrv;
+  db_admit(data);
+  NativeFunction nf(data, "increment");
+  nf.set_key(key.ptr(), key.size());
+  num = db->increment(key.ptr(), key.size(), num, orig);
+  if (num != kc::INT64MIN) data->hub->notify(UpdateListener::USET, key.ptr(), key.size());
+  nf.cleanup();
+  if (num != kc::INT64MIN) data->counters.writes++;
+  if (num == kc::INT64MIN) {
+    if (db_raise(data)) return NULL;
+    Py_INCREF(Py_None);
+    pyrv = Py_None;
+  } else {
+    pyrv = PyLong_FromLongLong(num);
+  }
+  return pyrv;
+}
+
+
+/**
+ * Implementation of increment_double.
+ */
+static PyObject* db_increment_double(DB_data* data, PyObject* pyargs) {
+  int32_t argc = PyTuple_Size(pyargs);
+  if (argc < 1 || argc > 3) {
+    throwinvarg();
+    return NULL;
+  }
+  kc::PolyDB* db = data->db;
+  PyObject* pykey = PyTuple_GetItem(pyargs, 0);
+  SoftString key(pykey);
+  PyObject* pynum = Py_None;
+  if (argc > 1) pynum = PyTuple_GetItem(pyargs, 1);
+  double num = pynum == Py_None ? 0 : pyatof(pynum);
+  PyObject* pyorig = Py_None;
+  if (argc > 2) pyorig = PyTuple_GetItem(pyargs, 2);
+  double orig = pyorig == Py_None ? 0 : pyatof(pyorig);
+  PyObject* pyrv;
+  db_admit(data);
+  NativeFunction nf(data, "increment_double");
+  nf.set_key(key.ptr(), key.size());
+  num = db->increment_double(key.ptr(), key.size(), num, orig);
+  if (!kc::chknan(num)) data->hub->notify(UpdateListener::USET, key.ptr(), key.size());
+  nf.cleanup();
+  if (!kc::chknan(num)) data->counters.writes++;
+  if (kc::chknan(num)) {
+    if (db_raise(data)) return NULL;
+    Py_INCREF(Py_None);
+    pyrv = Py_None;
+  } else {
+    pyrv = PyFloat_FromDouble(num);
+  }
+  return pyrv;
+}
+
+
+/**
+ * Implementation of cas.
+ */
+static PyObject* db_cas(DB_data* data, PyObject* pyargs) {
+  int32_t argc = PyTuple_Size(pyargs);
+  if (argc != 3) {
+    throwinvarg();
+    return NULL;
+  }
+  kc::PolyDB* db = data->db;
+  PyObject* pykey = PyTuple_GetItem(pyargs, 0);
+  SoftString key(pykey);
+  PyObject* pyoval = PyTuple_GetItem(pyargs, 1);
+  SoftString oval(pyoval);
+  const char* ovbuf = NULL;
+  size_t ovsiz = 0;
+  if (pyoval != Py_None) {
+    ovbuf = oval.ptr();
+    ovsiz = oval.size();
+  }
+  PyObject* pynval = PyTuple_GetItem(pyargs, 2);
+  SoftString nval(pynval);
+  const char* nvbuf = NULL;
+  size_t nvsiz = 0;
+  if (pynval != Py_None) {
+    nvbuf = nval.ptr();
+    nvsiz = nval.size();
+  }
+  db_admit(data);
+  NativeFunction nf(data, "cas");
+  nf.set_key(key.ptr(), key.size());
+  bool rv = db->cas(key.ptr(), key.size(), ovbuf, ovsiz, nvbuf, nvsiz);
+  if (rv) data->hub->notify(nvbuf ? UpdateListener::USET : UpdateListener::UREMOVE,
+                            key.ptr(), key.size(), nvbuf, nvsiz);
+  nf.cleanup();
+  if (rv && nvbuf) data->counters.writes++;
+  if (rv && !nvbuf) data->counters.removes++;
+  if (rv) Py_RETURN_TRUE;
+  if (db_raise(data)) return NULL;
+  Py_RETURN_FALSE;
+}
+
+
+/**
+ * Implementation of remove.
+ */
+static PyObject* db_remove(DB_data* data, PyObject* pyargs) {
+  int32_t argc = PyTuple_Size(pyargs);
+  if (argc != 1) {
+    throwinvarg();
+    return NULL;
+  }
+  kc::PolyDB* db = data->db;
+  PyObject* pykey = PyTuple_GetItem(pyargs, 0);
+  SoftString key(pykey);
+  db_admit(data);
+  NativeFunction nf(data, "remove");
+  nf.set_key(key.ptr(), key.size());
+  nf.transfer(key.size(), 0);
+  bool rv = db->remove(key.ptr(), key.size());
+  if (rv) data->hub->notify(UpdateListener::UREMOVE, key.ptr(), key.size());
+  nf.cleanup();
+  if (rv) data->counters.removes++;
+  if (rv) Py_RETURN_TRUE;
+  if (db_raise(data)) return NULL;
+  Py_RETURN_FALSE;
+}
+
+
+/**
+ * Implementation of get.
+ */
+static PyObject* db_get(DB_data* data, PyObject* pyargs) {
+  int32_t argc = PyTuple_Size(pyargs);
+  if (argc < 1 || argc > 2) {
+    throwinvarg();
+    return NULL;
+  }
+  kc::PolyDB* db = data->db;
+  PyObject* pykey = PyTuple_GetItem(pyargs, 0);
+  PyObject* pydefault = Py_None;
+  if (argc > 1) pydefault = PyTuple_GetItem(pyargs, 1);
+  SoftString key(pykey);
+  NativeFunction nf(data, "get");
+  nf.set_key(key.ptr(), key.size());
+  size_t vsiz;
+  char* vbuf = db->get(key.ptr(), key.size(), &vsiz);
+  if (vbuf && db_expired(data, key.ptr(), key.size())) {
+    delete[] vbuf;
+    vbuf = NULL;
+  }
+  nf.transfer(key.size(), vbuf ? vsiz : 0);
+  nf.cleanup();
+  data->counters.hits += vbuf ? 1 : 0;
+  data->counters.misses += vbuf ? 0 : 1;
+  PyObject* pyrv;
+  if (vbuf) {
+    pyrv = newbytes(vbuf, vsiz);
+    delete[] vbuf;
+  } else {
+    if (db_raise(data)) return NULL;
+    Py_INCREF(pydefault);
+    pyrv = pydefault;
+  }
+  return pyrv;
+}
+
+
+/**
+ * Implementation of get_str.
+ */
+static PyObject* db_get_str(DB_data* data, PyObject* pyargs) {
+  int32_t argc = PyTuple_Size(pyargs);
+  if (argc < 1 || argc > 2) {
+    throwinvarg();
+    return NULL;
+  }
+  kc::PolyDB* db = data->db;
+  PyObject* pykey = PyTuple_GetItem(pyargs, 0);
+  PyObject* pydefault = Py_None;
+  if (argc > 1) pydefault = PyTuple_GetItem(pyargs, 1);
+  SoftString key(pykey);
+  NativeFunction nf(data, "get_str");
+  nf.set_key(key.ptr(), key.size());
+  size_t vsiz;
+  char* vbuf = db->get(key.ptr(), key.size(), &vsiz);
+  if (vbuf && db_expired(data, key.ptr(), key.size())) {
+    delete[] vbuf;
+    vbuf = NULL;
+  }
+  nf.transfer(key.size(), vbuf ? vsiz : 0);
+  nf.cleanup();
+  data->counters.hits += vbuf ? 1 : 0;
+  data->counters.misses += vbuf ? 0 : 1;
+  PyObject* pyrv;
+  if (vbuf) {
+    pyrv = newstring(vbuf);
+    delete[] vbuf;
+  } else {
+    if (db_raise(data)) return NULL;
+    Py_INCREF(pydefault);
+    pyrv = pydefault;
+  }
+  return pyrv;
+}
+
+
+/**
+ * Implementation of check.
+ */
+static PyObject* db_check(DB_data* data, PyObject* pyargs) {
+  int32_t argc = PyTuple_Size(pyargs);
+  if (argc != 1) {
+    throwinvarg();
+    return NULL;
+  }
+  kc::PolyDB* db = data->db;
+  PyObject* pykey = PyTuple_GetItem(pyargs, 0);
+  SoftString key(pykey);
+  NativeFunction nf(data, "check");
+  nf.set_key(key.ptr(), key.size());
+  int32_t vsiz = db->check(key.ptr(), key.size());
+  if (vsiz >= 0 && db_expired(data, key.ptr(), key.size())) vsiz = -1;
+  nf.cleanup();
+  data->counters.hits += vsiz >= 0 ? 1 : 0;
+  data->counters.misses += vsiz >= 0 ? 0 : 1;
+  if (vsiz < 0 && db_raise(data)) return NULL;
+  return PyLong_FromLongLong(vsiz);
+}
+
+
+/**
+ * Implementation of seize.
+ */
+static PyObject* db_seize(DB_data* data, PyObject* pyargs) {
+  int32_t argc = PyTuple_Size(pyargs);
+  if (argc != 1) {
+    throwinvarg();
+    return NULL;
+  }
+  kc::PolyDB* db = data->db;
+  PyObject* pykey = PyTuple_GetItem(pyargs, 0);
+  SoftString key(pykey);
+  db_admit(data);
+  NativeFunction nf(data, "seize");
+  nf.set_key(key.ptr(), key.size());
+  size_t vsiz;
+  char* vbuf = db->seize(key.ptr(), key.size(), &vsiz);
+  nf.transfer(key.size(), vbuf ? vsiz : 0);
+  if (vbuf) data->hub->notify(UpdateListener::UREMOVE, key.ptr(), key.size());
+  nf.cleanup();
+  data->counters.hits += vbuf ? 1 : 0;
+  data->counters.misses += vbuf ? 0 : 1;
+  data->counters.removes += vbuf ? 1 : 0;
+  PyObject* pyrv;
+  if (vbuf) {
+    pyrv = newbytes(vbuf, vsiz);
+    delete[] vbuf;
+  } else {
+    if (db_raise(data)) return NULL;
+    Py_INCREF(Py_None);
+    pyrv = Py_None;
+  }
+  return pyrv;
+}
+
+
+/**
+ * Implementation of seize_str.
+ */
+static PyObject* db_seize_str(DB_data* data, PyObject* pyargs) {
+  int32_t argc = PyTuple_Size(pyargs);
+  if (argc != 1) {
+    throwinvarg();
+    return NULL;
+  }
+  kc::PolyDB* db = data->db;
+  PyObject* pykey = PyTuple_GetItem(pyargs, 0);
+  SoftString key(pykey);
+  db_admit(data);
+  NativeFunction nf(data, "seize_str");
+  nf.set_key(key.ptr(), key.size());
+  size_t vsiz;
+  char* vbuf = db->seize(key.ptr(), key.size(), &vsiz);
+  nf.transfer(key.size(), vbuf ? vsiz : 0);
+  if (vbuf) data->hub->notify(UpdateListener::UREMOVE, key.ptr(), key.size());
+  nf.cleanup();
+  data->counters.hits += vbuf ? 1 : 0;
+  data->counters.misses += vbuf ? 0 : 1;
+  data->counters.removes += vbuf ? 1 : 0;
+  PyObject* pyrv;
+  if (vbuf) {
+    pyrv = newstring(vbuf);
+    delete[] vbuf;
+  } else {
+    if (db_raise(data)) return NULL;
+    Py_INCREF(Py_None);
+    pyrv = Py_None;
+  }
+  return pyrv;
+}
+
+
+/**
+ * Implementation of set_bulk.
+ */
+static PyObject* db_set_bulk(DB_data* data, PyObject* pyargs) {
+  int32_t argc = PyTuple_Size(pyargs);
+  if (argc < 1 || argc > 2) {
+    throwinvarg();
+    return NULL;
+  }
+  kc::PolyDB* db = data->db;
+  PyObject* pyrecs = PyTuple_GetItem(pyargs, 0);
+  if (!PyMapping_Check(pyrecs)) {
+    throwinvarg();
+    return NULL;
+  }
+  StringMap recs;
+  PyObject* pyitems = PyMapping_Items(pyrecs);
+  int32_t rnum = PySequence_Length(pyitems);
+  for (int32_t i = 0; i < rnum; i++) {
+    PyObject* pyitem = PySequence_GetItem(pyitems, i);
+    if (PyTuple_Size(pyitem) == 2) {
+      PyObject* pykey = PyTuple_GetItem(pyitem, 0);
+      PyObject* pyvalue = PyTuple_GetItem(pyitem, 1);
+      SoftString key(pykey);
+      SoftString value(pyvalue);
+      recs[std::string(key.ptr(), key.size())] = std::string(value.ptr(), value.size());
+    }
+    Py_DECREF(pyitem);
+  }
+  Py_DECREF(pyitems);
+  PyObject* pyatomic = Py_True;
+  if (argc > 1) pyatomic = PyTuple_GetItem(pyargs, 1);
+  bool atomic = PyObject_IsTrue(pyatomic);
+  class Setter : public kc::PolyDB::Visitor {
+  public:
+    explicit Setter(const StringMap* recs) : recs_(recs), done_() {}
+    const StringVector& done() {
+      return done_;
+    }
+  private:
+    const char* visit_full(const char* kbuf, size_t ksiz,
+                           const char* vbuf, size_t vsiz, size_t* sp) {
+      return visit(kbuf, ksiz, sp);
+    }
+    const char* visit_empty(const char* kbuf, size_t ksiz, size_t* sp) {
+      return visit(kbuf, ksiz, sp);
+    }
+    const char* visit(const char* kbuf, size_t ksiz, size_t* sp) {
+      StringMap::const_iterator it = recs_->find(std::string(kbuf, ksiz));
+      if (it == recs_->end()) return NOP;
+      done_.push_back(it->first);
+      *sp = it->second.size();
+      return it->second.data();
+    }
+    const StringMap* recs_;
+    StringVector done_;
+  } setter(&recs);
+  StringVector keys;
+  keys.reserve(recs.size());
+  StringMap::const_iterator rit = recs.begin();
+  StringMap::const_iterator ritend = recs.end();
+  while (rit != ritend) {
+    keys.push_back(rit->first);
+    rit++;
+  }
+  db_admit(data);
+  NativeFunction nf(data, "set_bulk");
+  int64_t rv = db->accept_bulk(keys, &setter, atomic) ? (int64_t)setter.done().size() : -1;
+  const StringVector& done = setter.done();
+  StringVector::const_iterator it = done.begin();
+  StringVector::const_iterator itend = done.end();
+  while (it != itend) {
+    const std::string& value = recs[*it];
+    data->hub->notify(UpdateListener::USET, it->data(), it->size(), value.data(), value.size());
+    it++;
+  }
+  nf.cleanup();
+  data->counters.writes += done.size();
+  if (rv < 0 && db_raise(data)) return NULL;
+  return PyLong_FromLongLong(rv);
+}
+
+
+/**
+ * Implementation of remove_bulk.
+ */
+static PyObject* db_remove_bulk(DB_data* data, PyObject* pyargs) {
+  int32_t argc = PyTuple_Size(pyargs);
+  if (argc < 1 || argc > 2) {
+    throwinvarg();
+    return NULL;
+  }
+  kc::PolyDB* db = data->db;
+  PyObject* pykeys = PyTuple_GetItem(pyargs, 0);
+  if (!PySequence_Check(pykeys)) {
+    throwinvarg();
+    return NULL;
+  }
+  StringVector keys;
+  int32_t knum = PySequence_Length(pykeys);
+  for (int32_t i = 0; i < knum; i++) {
+    PyObject* pykey = PySequence_GetItem(pykeys, i);
+    SoftString key(pykey);
+    keys.push_back(std::string(key.ptr(), key.size()));
+    Py_DECREF(pykey);
+  }
+  PyObject* pyatomic = Py_True;
+  if (argc > 1) pyatomic = PyTuple_GetItem(pyargs, 1);
+  bool atomic = PyObject_IsTrue(pyatomic);
+  class Remover : public kc::PolyDB::Visitor {
+  public:
+    explicit Remover() : done_() {}
+    const StringVector& done() {
+      return done_;
+    }
+  private:
+    const char* visit_full(const char* kbuf, size_t ksiz,
+                           const char* vbuf, size_t vsiz, size_t* sp) {
+      done_.push_back(std::string(kbuf, ksiz));
+      return REMOVE;
+    }
+    StringVector done_;
+  } remover;
+  db_admit(data);
+  NativeFunction nf(data, "remove_bulk");
+  int64_t rv = db->accept_bulk(keys, &remover, atomic) ? (int64_t)remover.done().size() : -1;
+  const StringVector& done = remover.done();
+  StringVector::const_iterator it = done.begin();
+  StringVector::const_iterator itend = done.end();
+  while (it != itend) {
+    data->hub->notify(UpdateListener::UREMOVE, it->data(), it->size());
+    it++;
+  }
+  nf.cleanup();
+  data->counters.removes += done.size();
+  if (rv < 0 && db_raise(data)) return NULL;
+  return PyLong_FromLongLong(rv);
+}
+
+
+/**
+ * Implementation of get_bulk.
+ */
+static PyObject* db_get_bulk(DB_data* data, PyObject* pyargs) {
+  int32_t argc = PyTuple_Size(pyargs);
+  if (argc < 1 || argc > 2) {
+    throwinvarg();
+    return NULL;
+  }
+  kc::PolyDB* db = data->db;
+  PyObject* pykeys = PyTuple_GetItem(pyargs, 0);
+  if (!PySequence_Check(pykeys)) {
+    throwinvarg();
+    return NULL;
+  }
+  StringVector keys;
+  int32_t knum = PySequence_Length(pykeys);
+  for (int32_t i = 0; i < knum; i++) {
+    PyObject* pykey = PySequence_GetItem(pykeys, i);
+    SoftString key(pykey);
+    keys.push_back(std::string(key.ptr(), key.size()));
+    Py_DECREF(pykey);
+  }
+  PyObject* pyatomic = Py_True;
+  if (argc > 1) pyatomic = PyTuple_GetItem(pyargs, 1);
+  bool atomic = PyObject_IsTrue(pyatomic);
+  NativeFunction nf(data, "get_bulk");
+  StringMap recs;
+  int64_t rv = db->get_bulk(keys, &recs, atomic);
+  if (rv > 0 && data->expiry) {
+    StringMap::iterator it = recs.begin();
+    while (it != recs.end()) {
+      if (db_expired(data, it->first.data(), it->first.size())) {
+        recs.erase(it++);
+      } else {
+        it++;
+      }
+    }
+  }
+  nf.cleanup();
+  if (rv < 0) {
+    if (db_raise(data)) return NULL;
+    Py_RETURN_NONE;
+  }
+  PyObject* pyrecs = PyDict_New();
+  StringMap::const_iterator it = recs.begin();
+  StringMap::const_iterator itend = recs.end();
+  while (it != itend) {
+    PyObject* pykey = newbytes(it->first.data(), it->first.size());
+    PyObject* pyvalue = newbytes(it->second.data(), it->second.size());
+    PyDict_SetItem(pyrecs, pykey, pyvalue);
+    Py_DECREF(pyvalue);
+    Py_DECREF(pykey);
+    it++;
+  }
+  return pyrecs;
+}
+
+
+/**
+ * Implementation of get_bulk_str.
+ */
+static PyObject* db_get_bulk_str(DB_data* data, PyObject* pyargs) {
+  int32_t argc = PyTuple_Size(pyargs);
+  if (argc < 1 || argc > 2) {
+    throwinvarg();
+    return NULL;
+  }
+  kc::PolyDB* db = data->db;
+  PyObject* pykeys = PyTuple_GetItem(pyargs, 0);
+  if (!PySequence_Check(pykeys)) {
+    throwinvarg();
+    return NULL;
+  }
+  StringVector keys;
+  int32_t knum = PySequence_Length(pykeys);
+  for (int32_t i = 0; i < knum; i++) {
+    PyObject* pykey = PySequence_GetItem(pykeys, i);
+    SoftString key(pykey);
+    keys.push_back(std::string(key.ptr(), key.size()));
+    Py_DECREF(pykey);
+  }
+  PyObject* pyatomic = Py_True;
+  if (argc > 1) pyatomic = PyTuple_GetItem(pyargs, 1);
+  bool atomic = PyObject_IsTrue(pyatomic);
+  NativeFunction nf(data, "get_bulk_str");
+  StringMap recs;
+  int64_t rv = db->get_bulk(keys, &recs, atomic);
+  if (rv > 0 && data->expiry) {
+    StringMap::iterator it = recs.begin();
+    while (it != recs.end()) {
+      if (db_expired(data, it->first.data(), it->first.size())) {
+        recs.erase(it++);
+      } else {
+        it++;
+      }
+    }
+  }
+  nf.cleanup();
+  if (rv < 0) {
+    if (db_raise(data)) return NULL;
+    Py_RETURN_NONE;
+  }
+  return maptopymap(&recs);
+}
+
+
+/**
+ * Implementation of pop.
+ */
+static PyObject* db_pop(DB_data* data, PyObject* pyargs) {
+  int32_t argc = PyTuple_Size(pyargs);
+  if (argc < 1 || argc > 2) {
+    throwinvarg();
+    return NULL;
+  }
+  kc::PolyDB* db = data->db;
+  PyObject* pykey = PyTuple_GetItem(pyargs, 0);
+  SoftString key(pykey);
+  db_admit(data);
+  NativeFunction nf(data, "pop");
+  nf.set_key(key.ptr(), key.size());
+  size_t vsiz;
+  char* vbuf = db->seize(key.ptr(), key.size(), &vsiz);
+  bool removed = vbuf != NULL;
+  if (removed) data->hub->notify(UpdateListener::UREMOVE, key.ptr(), key.size());
+  if (vbuf && db_expired(data, key.ptr(), key.size())) {
+    delete[] vbuf;
+    vbuf = NULL;
+  }
+  nf.transfer(key.size(), vbuf ? vsiz : 0);
+  nf.cleanup();
+  data->counters.hits += vbuf ? 1 : 0;
+  data->counters.misses += vbuf ? 0 : 1;
+  data->counters.removes += removed ? 1 : 0;
+  PyObject* pyrv;
+  if (vbuf) {
+    pyrv = newbytes(vbuf, vsiz);
+    delete[] vbuf;
+  } else {
+    if (db_raise(data)) return NULL;
+    if (argc < 2) {
+      PyErr_SetObject(PyExc_KeyError, pykey);
+      return NULL;
+    }
+    pyrv = PyTuple_GetItem(pyargs, 1);
+    Py_INCREF(pyrv);
+  }
+  return pyrv;
+}
+
+
+/**
+ * Implementation of setdefault.
+ */
+static PyObject* db_setdefault(DB_data* data, PyObject* pyargs) {
+  int32_t argc = PyTuple_Size(pyargs);
+  if (argc < 1 || argc > 2) {
+    throwinvarg();
+    return NULL;
+  }
+  PyObject* pydefault = Py_None;
+  if (argc > 1) pydefault = PyTuple_GetItem(pyargs, 1);
+  if (pydefault == Py_None) return db_get(data, pyargs);
+  kc::PolyDB* db = data->db;
+  PyObject* pykey = PyTuple_GetItem(pyargs, 0);
+  SoftString key(pykey);
+  SoftString value(pydefault);
+  class VisitorImpl : public kc::PolyDB::Visitor {
+  public:
+    explicit VisitorImpl(const char* vbuf, size_t vsiz) :
+        vbuf_(vbuf), vsiz_(vsiz), hit_(false), old_() {}
+    bool hit() {
+      return hit_;
+    }
+    const std::string& old() {
+      return old_;
+    }
+  private:
+    const char* visit_full(const char* kbuf, size_t ksiz,
+                           const char* vbuf, size_t vsiz, size_t* sp) {
+      hit_ = true;
+      old_.assign(vbuf, vsiz);
+      return NOP;
+    }
+    const char* visit_empty(const char* kbuf, size_t ksiz, size_t* sp) {
+      *sp = vsiz_;
+      return vbuf_;
+    }
+    const char* vbuf_;
+    size_t vsiz_;
+    bool hit_;
+    std::string old_;
+  } visitor(value.ptr(), value.size());
+  db_admit(data);
+  NativeFunction nf(data, "setdefault");
+  nf.set_key(key.ptr(), key.size());
+  bool rv = db->accept(key.ptr(), key.size(), &visitor, true);
+  bool hit = rv && visitor.hit();
+  if (hit && db_expired(data, key.ptr(), key.size())) {
+    rv = db->set(key.ptr(), key.size(), value.ptr(), value.size());
+    hit = false;
+  }
+  if (rv && !hit) data->hub->notify(UpdateListener::USET, key.ptr(), key.size(),
+                                    value.ptr(), value.size());
+  nf.transfer(key.size() + (hit ? 0 : value.size()), hit ? visitor.old().size() : 0);
+  nf.cleanup();
+  data->counters.hits += hit ? 1 : 0;
+  data->counters.misses += hit ? 0 : 1;
+  data->counters.writes += rv && !hit ? 1 : 0;
+  if (!rv) {
+    if (db_raise(data)) return NULL;
+    Py_RETURN_NONE;
+  }
+  if (hit) return newbytes(visitor.old().data(), visitor.old().size());
+  return newbytes(value.ptr(), value.size());
+}
+
+
+/**
+ * Implementation of update.
+ */
+static PyObject* db_update(DB_data* data, PyObject* pyargs, PyObject* pykwds) {
+  int32_t argc = PyTuple_Size(pyargs);
+  if (argc > 1) {
+    throwinvarg();
+    return NULL;
+  }
+  PyObject* pyrecs = PyDict_New();
+  if (argc > 0) {
+    PyObject* pyother = PyTuple_GetItem(pyargs, 0);
+    int32_t err;
+    if (PyObject_HasAttrString(pyother, "keys")) {
+      err = PyDict_Merge(pyrecs, pyother, 1);
+    } else {
+      err = PyDict_MergeFromSeq2(pyrecs, pyother, 1);
+    }
+    if (err != 0) {
+      Py_DECREF(pyrecs);
+      return NULL;
+    }
+  }
+  if (pykwds && PyDict_Merge(pyrecs, pykwds, 1) != 0) {
+    Py_DECREF(pyrecs);
+    return NULL;
+  }
+  PyObject* pybargs = PyTuple_Pack(1, pyrecs);
+  Py_DECREF(pyrecs);
+  PyObject* pyrv = db_set_bulk(data, pybargs);
+  Py_DECREF(pybargs);
+  if (!pyrv) return NULL;
+  int64_t rv = PyLong_AsLongLong(pyrv);
+  Py_DECREF(pyrv);
+  if (rv < 0) {
+    throwruntime("DB::set_bulk failed");
+    return NULL;
+  }
+  Py_RETURN_NONE;
+}
+
+
+/**
+ * Implementation of keys.
+ */
+static PyObject* db_keys(DB_data* data) {
+  return db_view(data, VKEYS);
+}
+
+
+/**
+ * Implementation of values.
+ */
+static PyObject* db_values(DB_data* data) {
+  return db_view(data, VVALUES);
+}
+
+
+/**
+ * Implementation of items.
+ */
+static PyObject* db_items(DB_data* data) {
+  return db_view(data, VITEMS);
+}
+
+
+/**
+ * Create a view of the database.
+ */
+static PyObject* db_view(DB_data* data, int32_t kind) {
+  PyObject* pyview = PyObject_CallMethod(mod_kc, (char*)"View", NULL);
+  if (!pyview) return NULL;
+  View_data* vdata = (View_data*)pyview;
+  Py_DECREF(vdata->pydb);
+  Py_INCREF((PyObject*)data);
+  vdata->pydb = (PyObject*)data;
+  vdata->kind = kind;
+  return pyview;
+}
+
+
+/**
+ * Implementation of write_batch.
+ */
+static PyObject* db_write_batch(DB_data* data, PyObject* pyargs, PyObject* pykwds) {
+  int32_t argc = PyTuple_Size(pyargs);
+  static const char* kwnames[] = {
+    "max_ops", "max_bytes", "max_delay", "transactional", NULL
+  };
+  if (argc > 4 || !checkkwargs(pykwds, kwnames)) {
+    throwinvarg();
+    return NULL;
+  }
+  PyObject* pyparams[4];
+  for (int32_t i = 0; i < 4; i++) {
+    pyparams[i] = i < argc ? PyTuple_GetItem(pyargs, i) : getkwarg(pykwds, kwnames[i]);
+  }
+  PyObject* pywb = PyObject_CallMethod(mod_kc, (char*)"WriteBatch", NULL);
+  if (!pywb) return NULL;
+  WriteBatch_data* wdata = (WriteBatch_data*)pywb;
+  Py_DECREF(wdata->pydb);
+  Py_INCREF((PyObject*)data);
+  wdata->pydb = (PyObject*)data;
+  wdata->max_ops = pyparams[0] == Py_None ? 1024 : pyatoi(pyparams[0]);
+  wdata->max_bytes = pyparams[1] == Py_None ? 0 : pyatoi(pyparams[1]);
+  wdata->max_delay = pyparams[2] == Py_None ? 0 : pyatof(pyparams[2]);
+  wdata->transactional = pyparams[3] == Py_None || PyObject_IsTrue(pyparams[3]);
+  return pywb;
+}
+
+
+/**
+ * Implementation of clear.
+ */
+static PyObject* db_clear(DB_data* data) {
+  kc::PolyDB* db = data->db;
+  db_admit(data);
+  NativeFunction nf(data, "clear");
+  bool rv = db->clear();
+  if (rv) data->hub->notify(UpdateListener::UCLEAR, NULL, 0);
+  nf.cleanup();
+  if (rv) Py_RETURN_TRUE;
+  if (db_raise(data)) return NULL;
+  Py_RETURN_FALSE;
+}
+
+
+/**
+ * Implementation of synchronize.
+ */
+static PyObject* db_synchronize(DB_data* data, PyObject* pyargs) {
+  int32_t argc = PyTuple_Size(pyargs);
+  if (argc > 2) {
+    throwinvarg();
+    return NULL;
+  }
+  PyObject* pyhard = Py_None;
+  if (argc > 0) pyhard = PyTuple_GetItem(pyargs, 0);
+  PyObject* pyproc = Py_None;
+  if (argc > 1) pyproc = PyTuple_GetItem(pyargs, 1);
+  kc::PolyDB* db = data->db;
+  bool hard = PyObject_IsTrue(pyhard);
+  bool rv;
+  if (PyObject_IsInstance(pyproc, cls_fproc) || PyCallable_Check(pyproc)) {
+    if (data->pylock == Py_None) {
+      db->set_error(kc::PolyDB::Error::INVALID, "unsupported method");
+      if (db_raise(data)) return NULL;
+      Py_RETURN_NONE;
+    }
+    SoftFileProcessor proc(pyproc);
+    NativeFunction nf(data, "synchronize");
+    rv = db->synchronize(hard, &proc);
+    nf.cleanup();
+    PyObject* pyextype, *pyexvalue, *pyextrace;
+    if (proc.exception(&pyextype, &pyexvalue, &pyextrace)) {
+      PyErr_SetObject(pyextype, pyexvalue);
+      return NULL;
+    }
+  } else {
+    NativeFunction nf(data, "synchronize");
+    rv = db->synchronize(hard, NULL);
+    nf.cleanup();
+  }
+  if (rv) Py_RETURN_TRUE;
+  if (db_raise(data)) return NULL;
+  Py_RETURN_FALSE;
+}
+
+
+/**
+ * Implementation of occupy.
+ */
+static PyObject* db_occupy(DB_data* data, PyObject* pyargs) {
+  int32_t argc = PyTuple_Size(pyargs);
+  if (argc > 2) {
+    throwinvarg();
+    return NULL;
+  }
+  PyObject* pywritable = Py_None;
+  if (argc > 0) pywritable = PyTuple_GetItem(pyargs, 0);
+  PyObject* pyproc = Py_None;
+  if (argc > 1) pyproc = PyTuple_GetItem(pyargs, 1);
+  kc::PolyDB* db = data->db;
+  bool writable = PyObject_IsTrue(pywritable);
+  bool rv;
+  if (PyObject_IsInstance(pyproc, cls_fproc) || PyCallable_Check(pyproc)) {
+    if (data->pylock == Py_None) {
+      db->set_error(kc::PolyDB::Error::INVALID, "unsupported method");
+      if (db_raise(data)) return NULL;
+      Py_RETURN_NONE;
+    }
+    SoftFileProcessor proc(pyproc);
+    NativeFunction nf(data, "occupy");
+    rv = db->occupy(writable, &proc);
+    nf.cleanup();
+    PyObject* pyextype, *pyexvalue, *pyextrace;
+    if (proc.exception(&pyextype, &pyexvalue, &pyextrace)) {
+      PyErr_SetObject(pyextype, pyexvalue);
+      return NULL;
+    }
+  } else {
+    NativeFunction nf(data, "occupy");
+    rv = db->occupy(writable, NULL);
+    nf.cleanup();
+  }
+  if (rv) Py_RETURN_TRUE;
+  if (db_raise(data)) return NULL;
+  Py_RETURN_FALSE;
+}
+
+
+/**
+ * Implementation of copy.
+ */
+static PyObject* db_copy(DB_data* data, PyObject* pyargs) {
+  int32_t argc = PyTuple_Size(pyargs);
+  if (argc != 1) {
+    throwinvarg();
+    return NULL;
+  }
+  PyObject* pydest = PyTuple_GetItem(pyargs, 0);
+  kc::PolyDB* db = data->db;
+  SoftString dest(pydest);
+  NativeFunction nf(data, "copy");
+  bool rv = db->copy(dest.ptr());
+  nf.cleanup();
+  if (rv) Py_RETURN_TRUE;
+  if (db_raise(data)) return NULL;
+  Py_RETURN_FALSE;
+}
+
+
+/**
+ * Implementation of begin_transaction.
+ */
+static PyObject* db_begin_transaction(DB_data* data, PyObject* pyargs) {
+  int32_t argc = PyTuple_Size(pyargs);
+  if (argc > 1) {
+    throwinvarg();
+    return NULL;
+  }
+  PyObject* pyhard = Py_None;
+  if (argc > 0) pyhard = PyTuple_GetItem(pyargs, 0);
+  bool hard = PyObject_IsTrue(pyhard);
+  if (!db_begin_transaction_impl(data, hard)) {
+    if (db_raise(data)) return NULL;
+    Py_RETURN_FALSE;
+  }
+  data->tranopen = true;
+  data->tranthid = PyThread_get_thread_ident();
+  Py_RETURN_TRUE;
+}
+
+
+/**
+ * Begin a transaction, yielding to other threads while another one is in progress.
+ */
+static bool db_begin_transaction_impl(DB_data* data, bool hard) {
+  kc::PolyDB* db = data->db;
+  if (data->tranopen && data->tranthid == PyThread_get_thread_ident()) {
+    db->set_error(kc::PolyDB::Error::LOGIC, "transaction already in progress");
+    return false;
+  }
+  while (true) {
+    NativeFunction nf(data, "begin_transaction");
+    bool rv = db->begin_transaction_try(hard);
+    nf.cleanup();
+    if (rv) break;
+    if (db->error() != kc::PolyDB::Error::LOGIC) return false;
+    threadyield();
+  }
+  return true;
+}
+
+
+/**
+ * Begin an implicit transaction, joining the transaction of the current thread if any.
+ */
+static bool db_begin_implicit(DB_data* data, bool* joined) {
+  *joined = data->tranopen && data->tranthid == PyThread_get_thread_ident();
+  return *joined || db_begin_transaction_impl(data, false);
+}
+
+
+/**
+ * Implementation of end_transaction.
+ */
+static PyObject* db_end_transaction(DB_data* data, PyObject* pyargs) {
+  int32_t argc = PyTuple_Size(pyargs);
+  if (argc > 1) {
+    throwinvarg();
+    return NULL;
+  }
+  PyObject* pycommit = Py_None;
+  if (argc > 0) pycommit = PyTuple_GetItem(pyargs, 0);
+  kc::PolyDB* db = data->db;
+  bool commit = pycommit == Py_None || PyObject_IsTrue(pycommit);
+  NativeFunction nf(data, "end_transaction");
+  bool rv = db->end_transaction(commit);
+  if (!commit) data->hub->notify(UpdateListener::URESET, NULL, 0);
+  nf.cleanup();
+  data->tranopen = false;
+  if (rv) Py_RETURN_TRUE;
+  if (db_raise(data)) return NULL;
+  Py_RETURN_FALSE;
+}
+
+
+/**
+ * Implementation of transaction.
+ */
+static PyObject* db_transaction(DB_data* data, PyObject* pyargs) {
+  int32_t argc = PyTuple_Size(pyargs);
+  if (argc < 1 || argc > 2) {
+    throwinvarg();
+    return NULL;
+  }
+  PyObject* pyproc = PyTuple_GetItem(pyargs, 0);
+  PyObject* pyhard = Py_None;
+  if (argc > 1) pyhard = PyTuple_GetItem(pyargs, 1);
+  PyObject* pyrv = PyObject_CallMethod((PyObject*)data, (char*)"begin_transaction",
+                                       (char*)"(O)", pyhard);
+  if (!pyrv) return NULL;
+  if (!PyObject_IsTrue(pyrv)) {
+    Py_DECREF(pyrv);
+    Py_RETURN_FALSE;
+  }
+  Py_DECREF(pyrv);
+  pyrv = PyObject_CallFunction(pyproc, NULL);
+  bool commit = false;
+  if (pyrv) commit = PyObject_IsTrue(pyrv);
+  Py_DECREF(pyrv);
+  pyrv = PyObject_CallMethod((PyObject*)data, (char*)"end_transaction",
+                             (char*)"(O)", commit ? Py_True : Py_False);
+  if (!pyrv) return NULL;
+  if (!PyObject_IsTrue(pyrv)) {
+    Py_DECREF(pyrv);
+    Py_RETURN_FALSE;
+  }
+  Py_DECREF(pyrv);
+  Py_RETURN_TRUE;
+}
+
+
+/**
+ * Dump records into a chunked snapshot file with worker threads.
+ */
+static bool db_dump_chunked(kc::PolyDB* db, const char* path, int32_t thnum, int64_t chunk) {
+  std::ofstream ofs(path, std::ios_base::out | std::ios_base::binary | std::ios_base::trunc);
+  if (!ofs) {
+    db->set_error(kc::PolyDB::Error::NOREPOS, "open failed");
+    return false;
+  }
+  ofs.write(PSNAPMAGIC, sizeof(PSNAPMAGIC));
+  SnapshotWorker* workers = new SnapshotWorker[thnum];
+  kc::PolyDB::Cursor* cur = db->cursor();
+  bool err = false;
+  bool eof = !cur->jump();
+  if (eof && db->error() != kc::PolyDB::Error::NOREC) err = true;
+  int64_t cnum = 0;
+  int64_t rnum = 0;
+  while (!eof && !err) {
+    int32_t wnum = 0;
+    while (wnum < thnum && !eof) {
+      SnapshotWorker* worker = workers + wnum;
+      worker->set_dump();
+      while ((int64_t)worker->size() < chunk) {
+        size_t ksiz, vsiz;
+        const char* vbuf;
+        char* kbuf = cur->get(&ksiz, &vbuf, &vsiz, true);
+        if (!kbuf) {
+          if (cur->error() != kc::PolyDB::Error::NOREC) err = true;
+          eof = true;
+          break;
+        }
+        worker->append(kbuf, ksiz, vbuf, vsiz);
+        delete[] kbuf;
+      }
+      if (worker->rnum() > 0) wnum++;
+    }
+    for (int32_t i = 0; i < wnum; i++) {
+      workers[i].start();
+    }
+    for (int32_t i = 0; i < wnum; i++) {
+      workers[i].join();
+    }
+    for (int32_t i = 0; i < wnum && !err; i++) {
+      kc::PolyDB::Error::Code code;
+      std::string message;
+      if (workers[i].error(&code, &message)) {
+        db->set_error(code, message.c_str());
+        err = true;
+        break;
+      }
+      char hbuf[SnapshotWorker::HEADSIZ];
+      workers[i].write_head(hbuf);
+      ofs.write(hbuf, sizeof(hbuf));
+      const std::string* packed = workers[i].packed();
+      ofs.write(packed->data(), packed->size());
+      cnum++;
+      rnum += workers[i].rnum();
+    }
+  }
+  delete cur;
+  delete[] workers;
+  if (!err) {
+    char tbuf[sizeof(uint64_t) * 3];
+    kc::writefixnum(tbuf, 0, sizeof(uint64_t));
+    kc::writefixnum(tbuf + sizeof(uint64_t), cnum, sizeof(uint64_t));
+    kc::writefixnum(tbuf + sizeof(uint64_t) * 2, rnum, sizeof(uint64_t));
+    ofs.write(tbuf, sizeof(tbuf));
+  }
+  ofs.close();
+  if (!err && !ofs) {
+    db->set_error(kc::PolyDB::Error::SYSTEM, "write failed");
+    err = true;
+  }
+  return !err;
+}
+
+
+/**
+ * Load records from a chunked snapshot file with worker threads.
+ */
+static bool db_load_chunked(kc::PolyDB* db, std::ifstream* ifs, int32_t thnum,
+                            const std::vector<DB_data*>* targets) {
+  SnapshotWorker* workers = new SnapshotWorker[thnum];
+  bool err = false;
+  bool eof = false;
+  int64_t cnum = 0;
+  int64_t rnum = 0;
+  int64_t tcnum = -1;
+  int64_t trnum = -1;
+  while (!eof && !err) {
+    int32_t wnum = 0;
+    while (wnum < thnum) {
+      char hbuf[SnapshotWorker::HEADSIZ];
+      if (!ifs->read(hbuf, sizeof(uint64_t))) {
+        db->set_error(kc::PolyDB::Error::BROKEN, "truncated snapshot");
+        err = true;
+        break;
+      }
+      uint64_t psiz = kc::readfixnum(hbuf, sizeof(uint64_t));
+      if (psiz < 1) {
+        char tbuf[sizeof(uint64_t) * 2];
+        if (!ifs->read(tbuf, sizeof(tbuf))) {
+          db->set_error(kc::PolyDB::Error::BROKEN, "truncated snapshot");
+          err = true;
+        } else {
+          tcnum = kc::readfixnum(tbuf, sizeof(uint64_t));
+          trnum = kc::readfixnum(tbuf + sizeof(uint64_t), sizeof(uint64_t));
+        }
+        eof = true;
+        break;
+      }
+      SnapshotWorker* worker = workers + wnum;
+      worker->set_load(targets);
+      std::string* packed = worker->packed();
+      packed->resize(psiz);
+      if (!ifs->read(hbuf + sizeof(uint64_t), sizeof(hbuf) - sizeof(uint64_t)) ||
+          !ifs->read((char*)packed->data(), psiz)) {
+        db->set_error(kc::PolyDB::Error::BROKEN, "truncated snapshot");
+        err = true;
+        break;
+      }
+      worker->read_head(hbuf);
+      wnum++;
+    }
+    if (err) break;
+    for (int32_t i = 0; i < wnum; i++) {
+      workers[i].start();
+    }
+    for (int32_t i = 0; i < wnum; i++) {
+      workers[i].join();
+    }
+    for (int32_t i = 0; i < wnum; i++) {
+      kc::PolyDB::Error::Code code;
+      std::string message;
+      if (workers[i].error(&code, &message)) {
+        db->set_error(code, message.c_str());
+        err = true;
+        break;
+      }
+      cnum++;
+      rnum += workers[i].rnum();
+    }
+  }
+  delete[] workers;
+  if (!err && (cnum != tcnum || rnum != trnum)) {
+    db->set_error(kc::PolyDB::Error::BROKEN, "record count mismatch");
+    err = true;
+  }
+  return !err;
+}
+
+
+/**
+ * Implementation of dump_snapshot.
+ */
+static PyObject* db_dump_snapshot(DB_data* data, PyObject* pyargs) {
+  int32_t argc = PyTuple_Size(pyargs);
+  if (argc < 1 || argc > 3) {
+    throwinvarg();
+    return NULL;
+  }
+  PyObject* pydest = PyTuple_GetItem(pyargs, 0);
+  PyObject* pythnum = Py_None;
+  if (argc > 1) pythnum = PyTuple_GetItem(pyargs, 1);
+  PyObject* pychunk = Py_None;
+  if (argc > 2) pychunk = PyTuple_GetItem(pyargs, 2);
+  int32_t thnum = pythnum == Py_None ? 0 : pyatoi(pythnum);
+  int64_t chunk = pychunk == Py_None ? 1LL << 22 : pyatoi(pychunk);
+  if ((pythnum != Py_None && thnum < 1) || chunk < 1) {
+    throwinvarg();
+    return NULL;
+  }
+  kc::PolyDB* db = data->db;
+  SoftString dest(pydest);
+  NativeFunction nf(data, "dump_snapshot");
+  bool rv;
+  if (thnum > 0) {
+    rv = db_dump_chunked(db, dest.ptr(), thnum, chunk);
+  } else {
+    rv = db->dump_snapshot(dest.ptr());
+  }
+  nf.cleanup();
+  if (rv) Py_RETURN_TRUE;
+  if (db_raise(data)) return NULL;
+  Py_RETURN_FALSE;
+}
+
+
+/**
+ * Implementation of load_snapshot.
+ */
+static PyObject* db_load_snapshot(DB_data* data, PyObject* pyargs) {
+  int32_t argc = PyTuple_Size(pyargs);
+  if (argc < 1 || argc > 3) {
+    throwinvarg();
+    return NULL;
+  }
+  PyObject* pysrc = PyTuple_GetItem(pyargs, 0);
+  PyObject* pythnum = Py_None;
+  if (argc > 1) pythnum = PyTuple_GetItem(pyargs, 1);
+  PyObject* pyshards = Py_None;
+  if (argc > 2) pyshards = PyTuple_GetItem(pyargs, 2);
+  int32_t thnum = pythnum == Py_None ? 1 : pyatoi(pythnum);
+  if (thnum < 1) {
+    throwinvarg();
+    return NULL;
+  }
+  std::vector<DB_data*> targets;
+  if (pyshards == Py_None) {
+    targets.push_back(data);
+  } else {
+    PyObject* pyseq = PySequence_Fast(pyshards, "shards must be a sequence");
+    if (!pyseq) return NULL;
+    Py_ssize_t num = PySequence_Fast_GET_SIZE(pyseq);
+    for (Py_ssize_t i = 0; i < num; i++) {
+      PyObject* pyshard = PySequence_Fast_GET_ITEM(pyseq, i);
+      if (!PyObject_IsInstance(pyshard, cls_db)) break;
+      targets.push_back((DB_data*)pyshard);
+    }
+    Py_DECREF(pyseq);
+    if (targets.empty() || (Py_ssize_t)targets.size() != num) {
+      throwinvarg();
+      return NULL;
+    }
+  }
+  kc::PolyDB* db = data->db;
+  SoftString src(pysrc);
+  bool rv;
+  std::ifstream ifs(src.ptr(), std::ios_base::in | std::ios_base::binary);
+  char mbuf[sizeof(PSNAPMAGIC)];
+  if (ifs.read(mbuf, sizeof(mbuf)) && !std::memcmp(mbuf, PSNAPMAGIC, sizeof(mbuf))) {
+#if PY_VERSION_HEX < 0x03070000
+    PyEval_InitThreads();
+#endif
+    Py_BEGIN_ALLOW_THREADS
+    rv = db_load_chunked(db, &ifs, thnum, &targets);
+    Py_END_ALLOW_THREADS
+  } else if (pyshards != Py_None) {
+    db->set_error(kc::PolyDB::Error::INVALID, "not a chunked snapshot");
+    rv = false;
+  } else {
+    ifs.close();
+    db_admit(data);
+    NativeFunction nf(data, "load_snapshot");
+    rv = db->load_snapshot(src.ptr());
+    data->hub->notify(UpdateListener::URESET, NULL, 0);
+    nf.cleanup();
+  }
+  if (rv) Py_RETURN_TRUE;
+  if (db_raise(data)) return NULL;
+  Py_RETURN_FALSE;
+}
+
+
+/**
+ * Implementation of tune_journal.
+ */
+static PyObject* db_tune_journal(DB_data* data, PyObject* pyargs) {
+  int32_t argc = PyTuple_Size(pyargs);
+  if (argc != 1) {
+    throwinvarg();
+    return NULL;
+  }
+  PyObject* pyjdb = PyTuple_GetItem(pyargs, 0);
+  if (pyjdb != Py_None && (!PyObject_IsInstance(pyjdb, cls_db) || pyjdb == (PyObject*)data)) {
+    throwinvarg();
+    return NULL;
+  }
+  kc::PolyDB* db = data->db;
+  if (data->journal) {
+    data->hub->remove(data->journal);
+    delete data->journal;
+    data->journal = NULL;
+  }
+  if (pyjdb == Py_None) Py_RETURN_TRUE;
+  kc::PolyDB* jdb = ((DB_data*)pyjdb)->db;
+  NativeFunction nf(data, "tune_journal");
+  bool rv;
+  if (db_ordered(jdb)) {
+    ChangeJournal* journal = new ChangeJournal(pyjdb, jdb);
+    rv = journal->load();
+    if (rv) {
+      data->hub->add(journal);
+      data->journal = journal;
+    } else {
+      delete journal;
+      kc::PolyDB::Error err = jdb->error();
+      db->set_error(err.code(), err.message());
+    }
+  } else {
+    db->set_error(kc::PolyDB::Error::INVALID, "not an ordered database");
+    rv = false;
+  }
+  nf.cleanup();
+  if (rv) Py_RETURN_TRUE;
+  if (db_raise(data)) return NULL;
+  Py_RETURN_FALSE;
+}
+
+
+/**
+ * Implementation of dump_snapshot_stream.
+ */
+static PyObject* db_dump_snapshot_stream(DB_data* data, PyObject* pyargs) {
+  int32_t argc = PyTuple_Size(pyargs);
+  if (argc < 1 || argc > 4) {
+    throwinvarg();
+    return NULL;
+  }
+  PyObject* pydest = PyTuple_GetItem(pyargs, 0);
+  PyObject* pysince = Py_None;
+  if (argc > 1) pysince = PyTuple_GetItem(pyargs, 1);
+  PyObject* pyprogress = Py_None;
+  if (argc > 2) pyprogress = PyTuple_GetItem(pyargs, 2);
+  PyObject* pychunk = Py_None;
+  if (argc > 3) pychunk = PyTuple_GetItem(pyargs, 3);
+  int64_t since = pysince == Py_None ? -1 : pyatoi(pysince);
+  int64_t chunk = pychunk == Py_None ? 1 << 20 : pyatoi(pychunk);
+  if ((!PyLong_Check(pydest) && !PyObject_HasAttrString(pydest, "write")) ||
+      (pysince != Py_None && since < 0) || chunk < 1 ||
+      (pyprogress != Py_None && !PyCallable_Check(pyprogress))) {
+    throwinvarg();
+    return NULL;
+  }
+  kc::PolyDB* db = data->db;
+  ChangeJournal* journal = data->journal;
+  NativeFunction nf(data, "dump_snapshot_stream");
+  bool rv = true;
+  int64_t marker = journal ? journal->marker() : 0;
+  if (since >= 0 && !journal) {
+    db->set_error(kc::PolyDB::Error::INVALID, "no change journal");
+    rv = false;
+  } else if (since >= 0 && !journal->covers(since)) {
+    db->set_error(kc::PolyDB::Error::INVALID, "the marker is not covered by the journal");
+    rv = false;
+  }
+  kc::PolyDB::Cursor* cur = rv && since < 0 ? db->cursor() : NULL;
+  bool more = cur ? cur->jump() : rv;
+  if (cur && !more && cur->error() != kc::PolyDB::Error::NOREC) rv = false;
+  nf.cleanup();
+  if (!rv) {
+    delete cur;
+    if (db_raise(data)) return NULL;
+    Py_RETURN_NONE;
+  }
+  std::string buf(SNAPMAGIC, sizeof(SNAPMAGIC));
+  char nbuf[sizeof(uint64_t)];
+  buf.append(1, since < 0 ? 'F' : 'I');
+  kc::writefixnum(nbuf, since < 0 ? 0 : since, sizeof(nbuf));
+  buf.append(nbuf, sizeof(nbuf));
+  kc::writefixnum(nbuf, marker, sizeof(nbuf));
+  buf.append(nbuf, sizeof(nbuf));
+  int64_t from = since;
+  int64_t rnum = 0;
+  int64_t bytes = 0;
+  bool ok = true;
+  while (ok && (more || !buf.empty())) {
+    NativeFunction nf(data);
+    while (more && (int64_t)buf.size() < chunk) {
+      if (cur) {
+        size_t ksiz, vsiz;
+        const char* vbuf;
+        char* kbuf = cur->get(&ksiz, &vbuf, &vsiz, true);
+        if (kbuf) {
+          db_snapshot_record(&buf, 'S', kbuf, ksiz, vbuf, vsiz);
+          rnum++;
+          delete[] kbuf;
+        } else {
+          if (cur->error() != kc::PolyDB::Error::NOREC) rv = false;
+          more = false;
+        }
+      } else {
+        StringVector keys;
+        int64_t upto = journal->marker();
+        if (!journal->scan(&from, upto, SNAPBATCH, &keys)) rv = false;
+        for (size_t i = 0; rv && i < keys.size(); i++) {
+          const std::string& key = keys[i];
+          size_t vsiz;
+          char* vbuf = db->get(key.data(), key.size(), &vsiz);
+          if (vbuf) {
+            db_snapshot_record(&buf, 'S', key.data(), key.size(), vbuf, vsiz);
+            delete[] vbuf;
+          } else if (db->error() == kc::PolyDB::Error::NOREC) {
+            db_snapshot_record(&buf, 'R', key.data(), key.size(), NULL, 0);
+          } else {
+            rv = false;
+          }
+          rnum++;
+        }
+        if (!rv || from >= upto) more = false;
+      }
+    }
+    nf.cleanup();
+    if (!rv) break;
+    if (!more) {
+      buf.append(1, 'E');
+      kc::writefixnum(nbuf, rnum, sizeof(nbuf));
+      buf.append(nbuf, sizeof(nbuf));
+    }
+    ok = db_stream_write(pydest, buf);
+    bytes += buf.size();
+    buf.clear();
+    if (ok && pyprogress != Py_None) {
+      PyObject* pyrv = PyObject_CallFunction(pyprogress, (char*)"(LL)",
+                                             (long long)rnum, (long long)bytes);
+      if (pyrv) {
+        Py_DECREF(pyrv);
+      } else {
+        ok = false;
+      }
+    }
+  }
+  delete cur;
+  if (!ok) return NULL;
+  if (!rv) {
+    if (db_raise(data)) return NULL;
+    Py_RETURN_NONE;
+  }
+  return PyLong_FromLongLong(marker);
+}
+
+
+/**
+ * Implementation of load_snapshot_stream.
+ */
+static PyObject* db_load_snapshot_stream(DB_data* data, PyObject* pyargs) {
+  int32_t argc = PyTuple_Size(pyargs);
+  if (argc < 1 || argc > 3) {
+    throwinvarg();
+    return NULL;
+  }
+  PyObject* pysrc = PyTuple_GetItem(pyargs, 0);
+  PyObject* pyprogress = Py_None;
+  if (argc > 1) pyprogress = PyTuple_GetItem(pyargs, 1);
+  PyObject* pychunk = Py_None;
+  if (argc > 2) pychunk = PyTuple_GetItem(pyargs, 2);
+  int64_t chunk = pychunk == Py_None ? 1 << 20 : pyatoi(pychunk);
+  if ((!PyLong_Check(pysrc) && !PyObject_HasAttrString(pysrc, "read")) || chunk < 1 ||
+      (pyprogress != Py_None && !PyCallable_Check(pyprogress))) {
+    throwinvarg();
+    return NULL;
+  }
+  kc::PolyDB* db = data->db;
+  const size_t headsiz = sizeof(SNAPMAGIC) + 1 + sizeof(uint64_t) * 2;
+  std::string pend;
+  bool head = false;
+  bool end = false;
+  bool rv = true;
+  int64_t rnum = 0;
+  int64_t bytes = 0;
+  while (rv && !end) {
+    std::string rbuf;
+    if (!db_stream_read(pysrc, chunk, &rbuf)) return NULL;
+    if (rbuf.empty()) break;
+    bytes += rbuf.size();
+    pend.append(rbuf);
+    size_t off = 0;
+    db_admit(data);
+    NativeFunction nf(data, "load_snapshot_stream");
+    if (!head && pend.size() >= headsiz) {
+      if (std::memcmp(pend.data(), SNAPMAGIC, sizeof(SNAPMAGIC)) ||
+          (pend[sizeof(SNAPMAGIC)] != 'F' && pend[sizeof(SNAPMAGIC)] != 'I')) {
+        db->set_error(kc::PolyDB::Error::BROKEN, "invalid snapshot");
+        rv = false;
+      }
+      off = headsiz;
+      head = true;
+    }
+    while (rv && head && !end && off < pend.size()) {
+      const char* rp = pend.data() + off;
+      size_t rsiz = pend.size() - off;
+      char op = *rp;
+      if (op == 'E') {
+        if (rsiz < 1 + sizeof(uint64_t)) break;
+        if ((int64_t)kc::readfixnum(rp + 1, sizeof(uint64_t)) != rnum) {
+          db->set_error(kc::PolyDB::Error::BROKEN, "record count mismatch");
+          rv = false;
+        }
+        off += 1 + sizeof(uint64_t);
+        end = true;
+        break;
+      }
+      if (op != 'S' && op != 'R') {
+        db->set_error(kc::PolyDB::Error::BROKEN, "invalid snapshot");
+        rv = false;
+        break;
+      }
+      size_t hsiz = 1;
+      uint64_t ksiz = 0;
+      uint64_t vsiz = 0;
+      size_t step = kc::readvarnum(rp + hsiz, rsiz - hsiz, &ksiz);
+      if (step < 1) break;
+      hsiz += step;
+      if (op == 'S') {
+        step = kc::readvarnum(rp + hsiz, rsiz - hsiz, &vsiz);
+        if (step < 1) break;
+        hsiz += step;
+      }
+      if (rsiz - hsiz < ksiz + vsiz) break;
+      const char* kbuf = rp + hsiz;
+      if (op == 'S') {
+        const char* vbuf = kbuf + ksiz;
+        if (db->set(kbuf, ksiz, vbuf, vsiz)) {
+          data->hub->notify(UpdateListener::USET, kbuf, ksiz, vbuf, vsiz);
+        } else {
+          rv = false;
+        }
+      } else if (db->remove(kbuf, ksiz)) {
+        data->hub->notify(UpdateListener::UREMOVE, kbuf, ksiz);
+      } else if (db->error() != kc::PolyDB::Error::NOREC) {
+        rv = false;
+      }
+      off += hsiz + ksiz + vsiz;
+      rnum++;
+    }
+    nf.cleanup();
+    pend.erase(0, off);
+    if (rv && pyprogress != Py_None) {
+      PyObject* pyrv = PyObject_CallFunction(pyprogress, (char*)"(LL)",
+                                             (long long)rnum, (long long)bytes);
+      if (!pyrv) return NULL;
+      Py_DECREF(pyrv);
+    }
+  }
+  if (rv && !end) {
+    db->set_error(kc::PolyDB::Error::BROKEN, "truncated snapshot");
+    rv = false;
+  }
+  if (rv) Py_RETURN_TRUE;
+  if (db_raise(data)) return NULL;
+  Py_RETURN_FALSE;
+}
+
+
+/**
+ * Append a record of a streaming snapshot to a buffer.
+ */
+static void db_snapshot_record(std::string* buf, char op, const char* kbuf, size_t ksiz,
+                               const char* vbuf, size_t vsiz) {
+  char nbuf[kc::NUMBUFSIZ];
+  buf->append(1, op);
+  buf->append(nbuf, kc::writevarnum(nbuf, ksiz));
+  if (vbuf) buf->append(nbuf, kc::writevarnum(nbuf, vsiz));
+  buf->append(kbuf, ksiz);
+  if (vbuf) buf->append(vbuf, vsiz);
+}
+
+
+/**
+ * Write data into a file object or a file descriptor.
+ */
+static bool db_stream_write(PyObject* pydest, const std::string& buf) {
+  if (PyLong_Check(pydest)) {
+    int fd = PyLong_AsLong(pydest);
+    const char* rp = buf.data();
+    size_t size = buf.size();
+    bool ok = true;
+    Py_BEGIN_ALLOW_THREADS
+    while (size > 0) {
+      ssize_t wsiz = ::write(fd, rp, size);
+      if (wsiz < 0) {
+        if (errno == EINTR) continue;
+        ok = false;
+        break;
+      }
+      rp += wsiz;
+      size -= wsiz;
+    }
+    Py_END_ALLOW_THREADS
+    if (!ok) PyErr_SetFromErrno(PyExc_OSError);
+    return ok;
+  }
+  PyObject* pybuf = newbytes(buf.data(), buf.size());
+  PyObject* pyrv = PyObject_CallMethod(pydest, (char*)"write", (char*)"(O)", pybuf);
+  Py_DECREF(pybuf);
+  if (!pyrv) return false;
+  Py_DECREF(pyrv);
+  return true;
+}
+
+
+/**
+ * Read data from a file object or a file descriptor.
+ */
+static bool db_stream_read(PyObject* pysrc, int64_t size, std::string* buf) {
+  if (PyLong_Check(pysrc)) {
+    int fd = PyLong_AsLong(pysrc);
+    buf->resize(size);
+    ssize_t rsiz;
+    Py_BEGIN_ALLOW_THREADS
+    do {
+      rsiz = ::read(fd, &(*buf)[0], size);
+    } while (rsiz < 0 && errno == EINTR);
+    Py_END_ALLOW_THREADS
+    if (rsiz < 0) {
+      PyErr_SetFromErrno(PyExc_OSError);
+      return false;
+    }
+    buf->resize(rsiz);
+    return true;
+  }
+  PyObject* pyrv = PyObject_CallMethod(pysrc, (char*)"read", (char*)"(L)", (long long)size);
+  if (!pyrv) return false;
+  SoftString str(pyrv);
+  buf->assign(str.ptr(), str.size());
+  Py_DECREF(pyrv);
+  return true;
+}
+
+
+/**
+ * Implementation of count.
+ */
+static PyObject* db_count(DB_data* data) {
+  kc::PolyDB* db = data->db;
+  NativeFunction nf(data, "count");
+  int64_t count = db->count();
+  nf.cleanup();
+  if (count < 0 && db_raise(data)) return NULL;
+  return PyLong_FromLongLong(count);
+}
+
+
+/**
+ * Implementation of size.
+ */
+static PyObject* db_size(DB_data* data) {
+  kc::PolyDB* db = data->db;
+  NativeFunction nf(data, "size");
+  int64_t size = db->size();
+  nf.cleanup();
+  if (size < 0 && db_raise(data)) return NULL;
+  return PyLong_FromLongLong(size);
+}
+
+
+/**
+ * Implementation of path.
+ */
+static PyObject* db_path(DB_data* data) {
+  kc::PolyDB* db = data->db;
+  NativeFunction nf(data, "path");
+  const std::string& path = db->path();
+  nf.cleanup();
+  if (path.size() < 1) {
+    if (db_raise(data)) return NULL;
+    Py_RETURN_NONE;
+  }
+  return PyUnicode_FromString(path.c_str());
+}
+
+
+/**
+ * Implementation of status.
+ */
+static PyObject* db_status(DB_data* data) {
+  kc::PolyDB* db = data->db;
+  StringMap status;
+  NativeFunction nf(data, "status");
+  bool rv = db->status(&status);
+  if (rv && data->defrag) data->defrag->status(&status);
+  if (rv && data->syncer) data->syncer->status(&status);
+  nf.cleanup();
+  if (rv) return maptopymap(&status);
+  if (db_raise(data)) return NULL;
+  Py_RETURN_NONE;
+}
+
+
+/**
+ * Implementation of tuning.
+ */
+static PyObject* db_tuning(DB_data* data) {
+  if (!data->tuning) Py_RETURN_NONE;
+  return maptopymap(data->tuning);
+}
+
+
+/**
+ * Implementation of metrics.
+ */
+static PyObject* db_metrics(DB_data* data) {
+  MetricMap metrics;
+  if (!db_collect_metrics(data, &metrics)) {
+    if (db_raise(data)) return NULL;
+    Py_RETURN_NONE;
+  }
+  PyObject* pyrv = PyDict_New();
+  MetricMap::const_iterator it = metrics.begin();
+  MetricMap::const_iterator itend = metrics.end();
+  while (it != itend) {
+    PyObject* pyvalue = PyLong_FromLongLong(it->second);
+    PyDict_SetItemString(pyrv, it->first.c_str(), pyvalue);
+    Py_DECREF(pyvalue);
+    ++it;
+  }
+  return pyrv;
+}
+
+
+/**
+ * Collect the numeric metrics of a database object.
+ */
+static bool db_collect_metrics(DB_data* data, MetricMap* metrics) {
+  kc::PolyDB* db = data->db;
+  int64_t count, size;
+  StringMap status;
+  Py_BEGIN_ALLOW_THREADS
+  count = db->count();
+  size = db->size();
+  kc::BasicDB* idb = count >= 0 ? db->reveal_inner_db() : NULL;
+  if ((dynamic_cast<kc::HashDB*>(idb) || dynamic_cast<kc::TreeDB*>(idb)) &&
+      !db->status(&status)) status.clear();
+  Py_END_ALLOW_THREADS
+  if (count < 0 || size < 0) return false;
+  (*metrics)["count"] = count;
+  (*metrics)["size"] = size;
+  const char* names[][2] = {
+    { "frgcnt", "fragments" },
+    { "realsize", "file_size" },
+    { "cusage", "cache_usage" },
+  };
+  for (size_t i = 0; i < sizeof(names) / sizeof(*names); i++) {
+    StringMap::iterator sit = status.find(names[i][0]);
+    if (sit != status.end()) (*metrics)[names[i][1]] = kc::atoi(sit->second.c_str());
+  }
+  const OpCounters& counters = data->counters;
+  (*metrics)["calls"] = counters.calls;
+  (*metrics)["hits"] = counters.hits;
+  (*metrics)["misses"] = counters.misses;
+  (*metrics)["writes"] = counters.writes;
+  (*metrics)["removes"] = counters.removes;
+  return true;
+}
+
+
+/**
+ * Implementation of match_prefix.
+ */
+static PyObject* db_match_prefix(DB_data* data, PyObject* pyargs) {
+  int32_t argc = PyTuple_Size(pyargs);
+  if (argc < 1 || argc > 3) {
+    throwinvarg();
+    return NULL;
+  }
+  kc::PolyDB* db = data->db;
+  PyObject* pyprefix = PyTuple_GetItem(pyargs, 0);
+  SoftString prefix(pyprefix);
+  PyObject* pymax = Py_None;
+  if (argc > 1) pymax = PyTuple_GetItem(pyargs, 1);
+  int64_t max = pymax == Py_None ? -1 : pyatoi(pymax);
+  PyObject* pyfilter = Py_None;
+  if (argc > 2) pyfilter = PyTuple_GetItem(pyargs, 2);
+  ScanFilter filter;
+  if (!filter.set(pyfilter)) {
+    throwinvarg();
+    return NULL;
+  }
+  std::string pstr(prefix.ptr(), prefix.size());
+  PyObject* pyrv;
+  NativeFunction nf(data, "match_prefix");
+  StringVector keys;
+  if (filter.empty()) {
+    max = db->match_prefix(pstr, &keys, max);
+  } else {
+    max = db_match_impl(db, db_ordered(db), &pstr, NULL, &filter, max, &keys, NULL);
+  }
+  nf.cleanup();
+  if (max >= 0) {
+    pyrv = vectortopylist(&keys);
+  } else {
+    if (db_raise(data)) return NULL;
+    Py_INCREF(Py_None);
+    pyrv = Py_None;
+  }
+  return pyrv;
+}
+
+
+/**
+ * Implementation of match_regex.
+ */
+static PyObject* db_match_regex(DB_data* data, PyObject* pyargs) {
+  int32_t argc = PyTuple_Size(pyargs);
+  if (argc < 1 || argc > 4) {
+    throwinvarg();
+    return NULL;
+  }
+  kc::PolyDB* db = data->db;
+  PyObject* pyregex = PyTuple_GetItem(pyargs, 0);
+  SoftString regex(pyregex);
+  PyObject* pymax = Py_None;
+  if (argc > 1) pymax = PyTuple_GetItem(pyargs, 1);
+  int64_t max = pymax == Py_None ? -1 : pyatoi(pymax);
+  PyObject* pyvalues = Py_None;
+  if (argc > 2) pyvalues = PyTuple_GetItem(pyargs, 2);
+  bool values = PyObject_IsTrue(pyvalues);
+  PyObject* pyfilter = Py_None;
+  if (argc > 3) pyfilter = PyTuple_GetItem(pyargs, 3);
+  ScanFilter filter;
+  if (!filter.set(pyfilter)) {
+    throwinvarg();
+    return NULL;
+  }
+  std::string rstr(regex.ptr(), regex.size());
+  std::string prefix;
+  bool anchored = db_regex_prefix(rstr, &prefix);
+  PyObject* pyrv;
+  NativeFunction nf(data, "match_regex");
+  bool ordered = db_ordered(db);
+  bool ranged = anchored && !prefix.empty() && ordered;
+  StringVector keys;
+  StringVector vals;
+  if (ranged || values || !filter.empty()) {
+    max = db_match_impl(db, ordered, ranged ? &prefix : NULL, &rstr,
+                        filter.empty() ? NULL : &filter, max, &keys, values ? &vals : NULL);
+  } else {
+    max = db->match_regex(rstr, &keys, max);
+  }
+  nf.cleanup();
+  if (max >= 0) {
+    if (values) {
+      pyrv = PyList_New(keys.size());
+      for (size_t i = 0; i < keys.size(); i++) {
+        PyObject* pykey = newstring(keys[i].c_str());
+        PyObject* pyvalue = newbytes(vals[i].data(), vals[i].size());
+        PyList_SET_ITEM(pyrv, i, PyTuple_Pack(2, pykey, pyvalue));
+        Py_DECREF(pyvalue);
+        Py_DECREF(pykey);
+      }
+    } else {
+      pyrv = vectortopylist(&keys);
+    }
+  } else {
+    if (db_raise(data)) return NULL;
+    Py_INCREF(Py_None);
+    pyrv = Py_None;
+  }
+  return pyrv;
+}
+
+
+/**
+ * Extract the literal prefix of a regular expression.
+ */
+static bool db_regex_prefix(const std::string& regex, std::string* prefix) {
+  size_t size = regex.size();
+  int32_t depth = 0;
+  for (size_t i = 0; i < size; i++) {
+    char c = regex[i];
+    if (c == '\\') {
+      i++;
+    } else if (c == '[') {
+      if (i + 1 < size && regex[i+1] == '^') i++;
+      if (i + 1 < size && regex[i+1] == ']') i++;
+      while (i + 1 < size && regex[i+1] != ']') i++;
+      i++;
+    } else if (c == '(') {
+      depth++;
+    } else if (c == ')') {
+      depth--;
+    } else if (c == '|' && depth < 1) {
+      return false;
+    }
+  }
+  if (size < 1 || regex[0] != '^') return false;
+  size_t i = 1;
+  while (i < size) {
+    char c = regex[i];
+    size_t next = i + 1;
+    if (c == '\\') {
+      if (next >= size || std::isalnum((unsigned char)regex[next])) break;
+      c = regex[next];
+      next++;
+    } else if (c == '\0' || std::strchr(".[]()*+?{}|^$", c)) {
+      break;
+    }
+    if (next < size && (regex[next] == '*' || regex[next] == '?' || regex[next] == '{')) break;
+    prefix->append(1, c);
+    if (next < size && regex[next] == '+') break;
+    i = next;
+  }
+  return true;
+}
+
+
+/**
+ * Collect records whose keys match conditions by a cursor.
+ */
+static int64_t db_match_impl(kc::PolyDB* db, bool ordered, const std::string* prefix,
+                             const std::string* regex, const ScanFilter* filter, int64_t max,
+                             StringVector* keys, StringVector* values) {
+  kc::Regex reg;
+  if (regex && !reg.compile(*regex, kc::Regex::MATCHONLY)) {
+    db->set_error(kc::PolyDB::Error::LOGIC, "compilation failed");
+    return -1;
+  }
+  if (max < 0) max = kc::INT64MAX;
+  std::string start;
+  if (ordered) {
+    if (prefix) start = *prefix;
+    if (filter) filter->start(&start);
+  }
+  bool getvalue = values || (filter && filter->values());
+  kc::PolyDB::Cursor* cur = db->cursor();
+  bool err = false;
+  bool rv = start.empty() ? cur->jump() : cur->jump(start);
+  if (!rv && cur->error() != kc::PolyDB::Error::NOREC) err = true;
+  while (rv && (int64_t)keys->size() < max) {
+    size_t ksiz;
+    const char* vbuf = NULL;
+    size_t vsiz = 0;
+    char* kbuf = getvalue ? cur->get(&ksiz, &vbuf, &vsiz, true) : cur->get_key(&ksiz, true);
+    if (!kbuf) {
+      if (cur->error() != kc::PolyDB::Error::NOREC) err = true;
+      break;
+    }
+    bool hit = true;
+    if (prefix && (ksiz < prefix->size() || std::memcmp(kbuf, prefix->data(), prefix->size()))) {
+      if (ordered) {
+        delete[] kbuf;
+        break;
+      }
+      hit = false;
+    }
+    if (filter) {
+      if (ordered && filter->beyond(kbuf, ksiz)) {
+        delete[] kbuf;
+        break;
+      }
+      if (hit && !filter->match(kbuf, ksiz, vbuf, vsiz)) hit = false;
+    }
+    std::string key(kbuf, ksiz);
+    if (hit && regex && !reg.match(key)) hit = false;
+    if (hit) {
+      keys->push_back(key);
+      if (values) values->push_back(std::string(vbuf, vsiz));
+    }
+    delete[] kbuf;
   }
-  return 0;
+  delete cur;
+  return err ? -1 : (int64_t)keys->size();
 }
 
 
 /**
- * Implementation of repr.
+ * Implementation of explain_regex.
  */
-static PyObject* db_repr(DB_data* data) {
+static PyObject* db_explain_regex(DB_data* data, PyObject* pyargs) {
+  int32_t argc = PyTuple_Size(pyargs);
+  if (argc != 1) {
+    throwinvarg();
+    return NULL;
+  }
   kc::PolyDB* db = data->db;
-  std::string path = db->path();
-  if (path.size() < 1) path = "(None)";
-  std::string str;
-  NativeFunction nf(data);
-  kc::strprintf(&str, "<kyotocabinet.DB: %s: %lld: %lld>",
-                path.c_str(), (long long)db->count(), (long long)db->size());
+  PyObject* pyregex = PyTuple_GetItem(pyargs, 0);
+  SoftString regex(pyregex);
+  std::string prefix;
+  bool anchored = db_regex_prefix(std::string(regex.ptr(), regex.size()), &prefix);
+  NativeFunction nf(data, "explain_regex");
+  bool ordered = db_ordered(db);
   nf.cleanup();
-  return PyUnicode_FromString(str.c_str());
+  StringMap plan;
+  if (!anchored) {
+    plan["strategy"] = "scan";
+    plan["reason"] = "unanchored pattern";
+  } else if (prefix.empty()) {
+    plan["strategy"] = "scan";
+    plan["reason"] = "no literal prefix";
+  } else if (!ordered) {
+    plan["strategy"] = "scan";
+    plan["reason"] = "database not in lexical order";
+  } else {
+    plan["strategy"] = "prefix";
+    plan["reason"] = "anchored literal prefix";
+  }
+  plan["prefix"] = prefix;
+  return maptopymap(&plan);
 }
 
 
 /**
- * Implementation of str.
+ * Implementation of match_similar.
  */
-static PyObject* db_str(DB_data* data) {
+static PyObject* db_match_similar(DB_data* data, PyObject* pyargs) {
+  int32_t argc = PyTuple_Size(pyargs);
+  if (argc < 1 || argc > 5) {
+    throwinvarg();
+    return NULL;
+  }
   kc::PolyDB* db = data->db;
-  std::string path = db->path();
-  if (path.size() < 1) path = "(None)";
-  std::string str;
-  NativeFunction nf(data);
-  kc::strprintf(&str, "%s: %lld: %lld",
-                path.c_str(), (long long)db->count(), (long long)db->size());
+  PyObject* pyorigin = PyTuple_GetItem(pyargs, 0);
+  SoftString origin(pyorigin);
+  PyObject* pyrange = Py_None;
+  if (argc > 1) pyrange = PyTuple_GetItem(pyargs, 1);
+  int64_t range = pyrange == Py_None ? 1 : pyatoi(pyrange);
+  PyObject* pyutf = Py_None;
+  if (argc > 2) pyutf = PyTuple_GetItem(pyargs, 2);
+  bool utf = PyObject_IsTrue(pyutf);
+  PyObject* pymax = Py_None;
+  if (argc > 3) pymax = PyTuple_GetItem(pyargs, 3);
+  int64_t max = pymax == Py_None ? -1 : pyatoi(pymax);
+  PyObject* pyfilter = Py_None;
+  if (argc > 4) pyfilter = PyTuple_GetItem(pyargs, 4);
+  ScanFilter filter;
+  if (!filter.set(pyfilter)) {
+    throwinvarg();
+    return NULL;
+  }
+  int64_t lim = max;
+  if (!filter.empty()) max = -1;
+  PyObject* pyrv;
+  NativeFunction nf(data, "match_similar");
+  StringVector keys;
+  std::string ostr(origin.ptr(), origin.size());
+  FuzzyIndex* fuzzy = data->fuzzy;
+  if (fuzzy && fuzzy->utf() == utf && range >= 0 &&
+      fuzzy->search(db, ostr, range, max, &keys)) {
+    max = keys.size();
+  } else {
+    keys.clear();
+    max = db->match_similar(ostr, range, utf, &keys, max);
+  }
+  if (max >= 0 && !filter.empty()) {
+    max = db_filter_keys(db, &filter, lim, &keys);
+  }
   nf.cleanup();
-  return PyUnicode_FromString(str.c_str());
+  if (max >= 0) {
+    pyrv = vectortopylist(&keys);
+  } else {
+    if (db_raise(data)) return NULL;
+    Py_INCREF(Py_None);
+    pyrv = Py_None;
+  }
+  return pyrv;
 }
 
 
 /**
- * Implementation of error.
+ * Drop keys whose records do not pass a filter.
  */
-static PyObject* db_error(DB_data* data) {
-  kc::PolyDB* db = data->db;
-  kc::PolyDB::Error err = db->error();
-  PyObject* pyerr = PyObject_CallMethod(mod_kc, (char*)"Error",
-                                        (char*)"(IU)", err.code(), err.message());
-  return pyerr;
+static int64_t db_filter_keys(kc::PolyDB* db, const ScanFilter* filter, int64_t max,
+                              StringVector* keys) {
+  if (max < 0) max = kc::INT64MAX;
+  bool getvalue = filter->values();
+  StringVector hits;
+  for (size_t i = 0; i < keys->size() && (int64_t)hits.size() < max; i++) {
+    const std::string& key = (*keys)[i];
+    size_t vsiz = 0;
+    char* vbuf = NULL;
+    if (getvalue) {
+      vbuf = db->get(key.data(), key.size(), &vsiz);
+      if (!vbuf) {
+        if (db->error() != kc::PolyDB::Error::NOREC) return -1;
+        continue;
+      }
+    }
+    if (filter->match(key.data(), key.size(), vbuf, vsiz)) hits.push_back(key);
+    delete[] vbuf;
+  }
+  keys->swap(hits);
+  return keys->size();
 }
 
 
 /**
- * Implementation of open.
+ * Implementation of tune_fuzzy_index.
  */
-static PyObject* db_open(DB_data* data, PyObject* pyargs) {
+static PyObject* db_tune_fuzzy_index(DB_data* data, PyObject* pyargs) {
   int32_t argc = PyTuple_Size(pyargs);
-  if (argc > 2) {
+  if (argc < 1 || argc > 4) {
     throwinvarg();
     return NULL;
   }
-  PyObject* pypath = Py_None;
-  if (argc > 0) pypath = PyTuple_GetItem(pyargs, 0);
-  PyObject* pymode = Py_None;
-  if (argc > 1) pymode = PyTuple_GetItem(pyargs, 1);
+  PyObject* pyidb = PyTuple_GetItem(pyargs, 0);
+  PyObject* pyutf = Py_None;
+  if (argc > 1) pyutf = PyTuple_GetItem(pyargs, 1);
+  PyObject* pygram = Py_None;
+  if (argc > 2) pygram = PyTuple_GetItem(pyargs, 2);
+  PyObject* pyrebuild = Py_None;
+  if (argc > 3) pyrebuild = PyTuple_GetItem(pyargs, 3);
+  if (pyidb != Py_None && (!PyObject_IsInstance(pyidb, cls_db) || pyidb == (PyObject*)data)) {
+    throwinvarg();
+    return NULL;
+  }
+  bool utf = PyObject_IsTrue(pyutf);
+  int64_t gram = pygram == Py_None ? 3 : pyatoi(pygram);
+  if (gram < 1 || gram > 8) {
+    throwinvarg();
+    return NULL;
+  }
+  bool rebuild = PyObject_IsTrue(pyrebuild);
   kc::PolyDB* db = data->db;
-  SoftString path(pypath);
-  const char* tpath = path.size() > 0 ? path.ptr() : ":";
-  uint32_t mode = PyLong_Check(pymode) ? (uint32_t)PyLong_AsLong(pymode) :
-    kc::PolyDB::OWRITER | kc::PolyDB::OCREATE;
-  NativeFunction nf(data);
-  bool rv = db->open(tpath, mode);
+  if (data->fuzzy) {
+    data->hub->remove(data->fuzzy);
+    delete data->fuzzy;
+    data->fuzzy = NULL;
+  }
+  if (pyidb == Py_None) Py_RETURN_TRUE;
+  kc::PolyDB* idb = ((DB_data*)pyidb)->db;
+  NativeFunction nf(data, "tune_fuzzy_index");
+  bool rv;
+  if (db_ordered(idb)) {
+    FuzzyIndex* fuzzy = new FuzzyIndex(pyidb, idb, utf, gram);
+    data->hub->add(fuzzy);
+    data->fuzzy = fuzzy;
+    rv = (!rebuild && fuzzy->load()) || fuzzy->build(db);
+    if (!rv && db->error() == kc::PolyDB::Error::SUCCESS) {
+      kc::PolyDB::Error err = idb->error();
+      db->set_error(err.code(), err.message());
+    }
+  } else {
+    db->set_error(kc::PolyDB::Error::INVALID, "not an ordered database");
+    rv = false;
+  }
   nf.cleanup();
   if (rv) Py_RETURN_TRUE;
   if (db_raise(data)) return NULL;
@@ -2276,13 +9411,53 @@ static PyObject* db_open(DB_data* data, PyObject* pyargs) {
 
 
 /**
- * Implementation of close.
+ * Implementation of tune_expiry.
  */
-static PyObject* db_close(DB_data* data) {
+static PyObject* db_tune_expiry(DB_data* data, PyObject* pyargs) {
+  int32_t argc = PyTuple_Size(pyargs);
+  if (argc < 1 || argc > 3) {
+    throwinvarg();
+    return NULL;
+  }
+  PyObject* pyedb = PyTuple_GetItem(pyargs, 0);
+  PyObject* pyrate = Py_None;
+  if (argc > 1) pyrate = PyTuple_GetItem(pyargs, 1);
+  PyObject* pyinterval = Py_None;
+  if (argc > 2) pyinterval = PyTuple_GetItem(pyargs, 2);
+  if (pyedb != Py_None && (!PyObject_IsInstance(pyedb, cls_db) || pyedb == (PyObject*)data)) {
+    throwinvarg();
+    return NULL;
+  }
+  int64_t rate = pyrate == Py_None ? 1000 : pyatoi(pyrate);
+  double interval = pyinterval == Py_None ? 1.0 : pyatof(pyinterval);
+  if (interval <= 0) {
+    throwinvarg();
+    return NULL;
+  }
   kc::PolyDB* db = data->db;
-  NativeFunction nf(data);
-  g_curbur.sweap();
-  bool rv = db->close();
+#if PY_VERSION_HEX < 0x03070000
+  if (rate > 0) PyEval_InitThreads();
+#endif
+  db_stop_expiry(data);
+  NativeFunction nf(data, "tune_expiry");
+  if (data->expiry) {
+    data->hub->remove(data->expiry);
+    delete data->expiry;
+    data->expiry = NULL;
+  }
+  bool rv = true;
+  if (pyedb != Py_None) {
+    kc::PolyDB* edb = ((DB_data*)pyedb)->db;
+    if (db_ordered(edb)) {
+      ExpiryTable* expiry = new ExpiryTable(pyedb, edb, data, db, data->hub);
+      data->hub->add(expiry);
+      data->expiry = expiry;
+      if (rate > 0) expiry->start(rate, interval);
+    } else {
+      db->set_error(kc::PolyDB::Error::INVALID, "not an ordered database");
+      rv = false;
+    }
+  }
   nf.cleanup();
   if (rv) Py_RETURN_TRUE;
   if (db_raise(data)) return NULL;
@@ -2291,156 +9466,236 @@ static PyObject* db_close(DB_data* data) {
 
 
 /**
- * Implementation of accept.
+ * Implementation of sweep_expired.
  */
-static PyObject* db_accept(DB_data* data, PyObject* pyargs) {
+static PyObject* db_sweep_expired(DB_data* data, PyObject* pyargs) {
   int32_t argc = PyTuple_Size(pyargs);
-  if (argc < 2 || argc > 3) {
+  if (argc > 1) {
     throwinvarg();
     return NULL;
   }
+  PyObject* pymax = Py_None;
+  if (argc > 0) pymax = PyTuple_GetItem(pyargs, 0);
+  int64_t max = pymax == Py_None ? -1 : pyatoi(pymax);
   kc::PolyDB* db = data->db;
-  if (data->pylock == Py_None) {
-    db->set_error(kc::PolyDB::Error::INVALID, "unsupported method");
-    if (db_raise(data)) return NULL;
-    Py_RETURN_NONE;
+  ExpiryTable* expiry = data->expiry;
+  NativeFunction nf(data, "sweep_expired");
+  int64_t cnt;
+  if (expiry) {
+    cnt = expiry->sweep(max);
+    if (cnt < 0) db->set_error(kc::PolyDB::Error::MISC, "expiration table failed");
+  } else {
+    db->set_error(kc::PolyDB::Error::INVALID, "no expiration table");
+    cnt = -1;
   }
-  PyObject* pykey = PyTuple_GetItem(pyargs, 0);
-  SoftString key(pykey);
-  PyObject* pyvisitor = PyTuple_GetItem(pyargs, 1);
-  PyObject* pywritable = Py_None;
-  if (argc > 2) pywritable = PyTuple_GetItem(pyargs, 2);
-  bool writable = pywritable == Py_None || PyObject_IsTrue(pywritable);
-  bool rv;
-  if (PyObject_IsInstance(pyvisitor, cls_vis) || PyCallable_Check(pyvisitor)) {
-    SoftVisitor visitor(pyvisitor, writable);
+  nf.cleanup();
+  if (cnt < 0 && db_raise(data)) return NULL;
+  return PyLong_FromLongLong(cnt);
+}
+
+
+/**
+ * Sweep expired records from the background sweeper through the locking device.
+ */
+static int64_t db_sweep_native(DB_data* data, ExpiryTable* expiry, int64_t max) {
+  PyGILState_STATE gstate = PyGILState_Ensure();
+  int64_t cnt;
+  {
     NativeFunction nf(data);
-    rv = db->accept(key.ptr(), key.size(), &visitor, writable);
-    nf.cleanup();
-    PyObject* pyextype, *pyexvalue, *pyextrace;
-    if (visitor.exception(&pyextype, &pyexvalue, &pyextrace)) {
-      PyErr_SetObject(pyextype, pyexvalue);
-      return NULL;
+    if (data->pylock == Py_None) {
+      cnt = expiry->sweep(max);
+    } else {
+      Py_BEGIN_ALLOW_THREADS
+      cnt = expiry->sweep(max);
+      Py_END_ALLOW_THREADS
     }
-  } else {
-    throwinvarg();
-    return NULL;
+    nf.cleanup();
   }
-  if (rv) Py_RETURN_TRUE;
-  if (db_raise(data)) return NULL;
-  Py_RETURN_FALSE;
+  PyGILState_Release(gstate);
+  return cnt;
 }
 
 
 /**
- * Implementation of accept_bulk.
+ * Stop the background sweeper of the expiration table.
  */
-static PyObject* db_accept_bulk(DB_data* data, PyObject* pyargs) {
+static void db_stop_expiry(DB_data* data) {
+  ExpiryTable* expiry = data->expiry;
+  if (!expiry) return;
+  Py_BEGIN_ALLOW_THREADS
+  expiry->stop();
+  Py_END_ALLOW_THREADS
+}
+
+
+/**
+ * Implementation of expiry_status.
+ */
+static PyObject* db_expiry_status(DB_data* data) {
+  ExpiryTable* expiry = data->expiry;
+  if (!expiry) Py_RETURN_NONE;
+  NativeFunction nf(data, "expiry_status");
+  StringMap status;
+  expiry->status(&status);
+  nf.cleanup();
+  return maptopymap(&status);
+}
+
+
+/**
+ * Check whether a record has expired and set the error if so.
+ */
+static bool db_expired(DB_data* data, const char* kbuf, size_t ksiz) {
+  ExpiryTable* expiry = data->expiry;
+  if (!expiry || !expiry->expired(kbuf, ksiz)) return false;
+  data->db->set_error(kc::PolyDB::Error::NOREC, "no record");
+  return true;
+}
+
+
+/**
+ * Implementation of tune_changes.
+ */
+static PyObject* db_tune_changes(DB_data* data, PyObject* pyargs) {
   int32_t argc = PyTuple_Size(pyargs);
-  if (argc < 2 || argc > 3) {
+  if (argc > 2) {
     throwinvarg();
     return NULL;
   }
-  kc::PolyDB* db = data->db;
-  if (data->pylock == Py_None) {
-    db->set_error(kc::PolyDB::Error::INVALID, "unsupported method");
-    if (db_raise(data)) return NULL;
-    Py_RETURN_NONE;
-  }
-  PyObject* pykeys = PyTuple_GetItem(pyargs, 0);
-  if (!PySequence_Check(pykeys)) {
+  PyObject* pycap = Py_None;
+  if (argc > 0) pycap = PyTuple_GetItem(pyargs, 0);
+  PyObject* pyoverflow = Py_None;
+  if (argc > 1) pyoverflow = PyTuple_GetItem(pyargs, 1);
+  int64_t capacity = pycap == Py_None ? 0 : pyatoi(pycap);
+  if (capacity < 0) {
     throwinvarg();
     return NULL;
   }
-  StringVector keys;
-  int32_t knum = PySequence_Length(pykeys);
-  for (int32_t i = 0; i < knum; i++) {
-    PyObject* pykey = PySequence_GetItem(pykeys, i);
-    SoftString key(pykey);
-    keys.push_back(std::string(key.ptr(), key.size()));
-    Py_DECREF(pykey);
-  }
-  PyObject* pyvisitor = PyTuple_GetItem(pyargs, 1);
-  PyObject* pywritable = Py_None;
-  if (argc > 2) pywritable = PyTuple_GetItem(pyargs, 2);
-  bool writable = pywritable == Py_None || PyObject_IsTrue(pywritable);
-  bool rv;
-  if (PyObject_IsInstance(pyvisitor, cls_vis) || PyCallable_Check(pyvisitor)) {
-    SoftVisitor visitor(pyvisitor, writable);
-    NativeFunction nf(data);
-    rv = db->accept_bulk(keys, &visitor, writable);
-    nf.cleanup();
-    PyObject* pyextype, *pyexvalue, *pyextrace;
-    if (visitor.exception(&pyextype, &pyexvalue, &pyextrace)) {
-      PyErr_SetObject(pyextype, pyexvalue);
+  ChangeFeed::Overflow overflow = ChangeFeed::ODROP;
+  if (pyoverflow != Py_None) {
+    SoftString ostr(pyoverflow);
+    if (!std::strcmp(ostr.ptr(), "block")) {
+      overflow = ChangeFeed::OBLOCK;
+    } else if (!std::strcmp(ostr.ptr(), "error")) {
+      overflow = ChangeFeed::OERROR;
+    } else if (std::strcmp(ostr.ptr(), "drop")) {
+      throwinvarg();
       return NULL;
     }
-  } else {
-    throwinvarg();
-    return NULL;
   }
-  if (rv) Py_RETURN_TRUE;
-  if (db_raise(data)) return NULL;
-  Py_RETURN_FALSE;
+  ChangeFeed* feed = data->feed;
+  if (feed) {
+    data->feed = NULL;
+    UpdateHub* hub = data->hub;
+    Py_BEGIN_ALLOW_THREADS
+    feed->close();
+    hub->remove(feed);
+    Py_END_ALLOW_THREADS
+    feed->release();
+  }
+  if (capacity > 0) {
+    data->feed = new ChangeFeed(capacity, overflow);
+    data->hub->add(data->feed);
+  }
+  Py_RETURN_TRUE;
 }
 
 
 /**
- * Implementation of iterate.
+ * Implementation of changes.
  */
-static PyObject* db_iterate(DB_data* data, PyObject* pyargs) {
+static PyObject* db_changes(DB_data* data, PyObject* pyargs) {
   int32_t argc = PyTuple_Size(pyargs);
-  if (argc < 1 || argc > 2) {
+  if (argc > 3) {
     throwinvarg();
     return NULL;
   }
+  PyObject* pysince = Py_None;
+  if (argc > 0) pysince = PyTuple_GetItem(pyargs, 0);
+  PyObject* pymax = Py_None;
+  if (argc > 1) pymax = PyTuple_GetItem(pyargs, 1);
+  PyObject* pytimeout = Py_None;
+  if (argc > 2) pytimeout = PyTuple_GetItem(pyargs, 2);
+  int64_t since = pysince == Py_None ? -1 : pyatoi(pysince);
+  int64_t max = pymax == Py_None ? -1 : pyatoi(pymax);
+  double timeout = pytimeout == Py_None ? 0 : pyatof(pytimeout);
   kc::PolyDB* db = data->db;
-  if (data->pylock == Py_None) {
-    db->set_error(kc::PolyDB::Error::INVALID, "unsupported method");
-    if (db_raise(data)) return NULL;
-    Py_RETURN_NONE;
-  }
-  PyObject* pyvisitor = PyTuple_GetItem(pyargs, 0);
-  PyObject* pywritable = Py_None;
-  if (argc > 1) pywritable = PyTuple_GetItem(pyargs, 1);
-  bool writable = pywritable == Py_None || PyObject_IsTrue(pywritable);
+  ChangeFeed* feed = data->feed;
+  std::vector<ChangeFeed::Change> changes;
   bool rv;
-  if (PyObject_IsInstance(pyvisitor, cls_vis) || PyCallable_Check(pyvisitor)) {
-    SoftVisitor visitor(pyvisitor, writable);
-    NativeFunction nf(data);
-    rv = db->iterate(&visitor, writable);
-    nf.cleanup();
-    PyObject* pyextype, *pyexvalue, *pyextrace;
-    if (visitor.exception(&pyextype, &pyexvalue, &pyextrace)) {
-      PyErr_SetObject(pyextype, pyexvalue);
-      return NULL;
+  if (feed) {
+    feed->retain();
+    Py_BEGIN_ALLOW_THREADS
+    rv = feed->fetch(since, max, timeout, &changes);
+    Py_END_ALLOW_THREADS
+    if (!rv) {
+      db->set_error(kc::PolyDB::Error::INVALID, feed->broken() ? "the change feed overflowed" :
+                    "the sequence number is not covered by the feed");
     }
+    feed->release();
   } else {
-    throwinvarg();
-    return NULL;
+    db->set_error(kc::PolyDB::Error::INVALID, "no change feed");
+    rv = false;
   }
-  if (rv) Py_RETURN_TRUE;
-  if (db_raise(data)) return NULL;
-  Py_RETURN_FALSE;
+  if (!rv) {
+    if (db_raise(data)) return NULL;
+    Py_RETURN_NONE;
+  }
+  PyObject* pyrv = PyList_New(changes.size());
+  for (size_t i = 0; i < changes.size(); i++) {
+    const ChangeFeed::Change& change = changes[i];
+    PyObject* pyvalue;
+    if (change.valued) {
+      pyvalue = newbytes(change.value.data(), change.value.size());
+    } else {
+      Py_INCREF(Py_None);
+      pyvalue = Py_None;
+    }
+    PyObject* pyentry = PyTuple_New(4);
+    PyTuple_SetItem(pyentry, 0, PyLong_FromLongLong(change.seq));
+    PyTuple_SetItem(pyentry, 1, newstring(ChangeFeed::kind_name(change.kind)));
+    PyTuple_SetItem(pyentry, 2, newbytes(change.key.data(), change.key.size()));
+    PyTuple_SetItem(pyentry, 3, pyvalue);
+    PyList_SET_ITEM(pyrv, i, pyentry);
+  }
+  return pyrv;
 }
 
 
 /**
- * Implementation of set.
+ * Implementation of changes_status.
  */
-static PyObject* db_set(DB_data* data, PyObject* pyargs) {
+static PyObject* db_changes_status(DB_data* data) {
+  ChangeFeed* feed = data->feed;
+  if (!feed) Py_RETURN_NONE;
+  NativeFunction nf(data, "changes_status");
+  StringMap status;
+  feed->status(&status);
+  nf.cleanup();
+  return maptopymap(&status);
+}
+
+
+/**
+ * Implementation of defrag.
+ */
+static PyObject* db_defrag(DB_data* data, PyObject* pyargs) {
   int32_t argc = PyTuple_Size(pyargs);
-  if (argc != 2) {
+  if (argc > 1) {
     throwinvarg();
     return NULL;
   }
-  kc::PolyDB* db = data->db;
-  PyObject* pykey = PyTuple_GetItem(pyargs, 0);
-  PyObject* pyvalue = PyTuple_GetItem(pyargs, 1);
-  SoftString key(pykey);
-  SoftString value(pyvalue);
-  NativeFunction nf(data);
-  bool rv = db->set(key.ptr(), key.size(), value.ptr(), value.size());
+  PyObject* pystep = Py_None;
+  if (argc > 0) pystep = PyTuple_GetItem(pyargs, 0);
+  int64_t step = pystep == Py_None ? 0 : pyatoi(pystep);
+  if (step < 0) {
+    throwinvarg();
+    return NULL;
+  }
+  if (!data->defrag) data->defrag = new Defragmenter(data->db);
+  Defragmenter* defrag = data->defrag;
+  NativeFunction nf(data, "defrag");
+  bool rv = defrag->defrag(step);
   nf.cleanup();
   if (rv) Py_RETURN_TRUE;
   if (db_raise(data)) return NULL;
@@ -2449,21 +9704,40 @@ static PyObject* db_set(DB_data* data, PyObject* pyargs) {
 
 
 /**
- * Implementation of add.
+ * Implementation of tune_defrag.
  */
-static PyObject* db_add(DB_data* data, PyObject* pyargs) {
+static PyObject* db_tune_defrag(DB_data* data, PyObject* pyargs) {
   int32_t argc = PyTuple_Size(pyargs);
-  if (argc != 2) {
+  if (argc > 3) {
+    throwinvarg();
+    return NULL;
+  }
+  PyObject* pystep = Py_None;
+  if (argc > 0) pystep = PyTuple_GetItem(pyargs, 0);
+  PyObject* pyinterval = Py_None;
+  if (argc > 1) pyinterval = PyTuple_GetItem(pyargs, 1);
+  PyObject* pybudget = Py_None;
+  if (argc > 2) pybudget = PyTuple_GetItem(pyargs, 2);
+  int64_t step = pystep == Py_None ? 0 : pyatoi(pystep);
+  double interval = pyinterval == Py_None ? 1.0 : pyatof(pyinterval);
+  double budget = pybudget == Py_None ? 0.01 : pyatof(pybudget);
+  if (step < 0 || interval <= 0 || budget < 0) {
     throwinvarg();
     return NULL;
   }
+  if (!data->defrag) data->defrag = new Defragmenter(data->db);
+  Defragmenter* defrag = data->defrag;
   kc::PolyDB* db = data->db;
-  PyObject* pykey = PyTuple_GetItem(pyargs, 0);
-  PyObject* pyvalue = PyTuple_GetItem(pyargs, 1);
-  SoftString key(pykey);
-  SoftString value(pyvalue);
-  NativeFunction nf(data);
-  bool rv = db->add(key.ptr(), key.size(), value.ptr(), value.size());
+  NativeFunction nf(data, "tune_defrag");
+  bool rv = true;
+  if (step < 1) {
+    defrag->stop();
+  } else if (defrag->supported()) {
+    defrag->start(step, interval, budget);
+  } else {
+    db->set_error(kc::PolyDB::Error::NOIMPL, "not implemented");
+    rv = false;
+  }
   nf.cleanup();
   if (rv) Py_RETURN_TRUE;
   if (db_raise(data)) return NULL;
@@ -2472,1213 +9746,2133 @@ static PyObject* db_add(DB_data* data, PyObject* pyargs) {
 
 
 /**
- * Implementation of replace.
+ * Implementation of tune_group_commit.
  */
-static PyObject* db_replace(DB_data* data, PyObject* pyargs) {
+static PyObject* db_tune_group_commit(DB_data* data, PyObject* pyargs) {
   int32_t argc = PyTuple_Size(pyargs);
-  if (argc != 2) {
+  if (argc > 3) {
     throwinvarg();
     return NULL;
   }
-  kc::PolyDB* db = data->db;
-  PyObject* pykey = PyTuple_GetItem(pyargs, 0);
-  PyObject* pyvalue = PyTuple_GetItem(pyargs, 1);
-  SoftString key(pykey);
-  SoftString value(pyvalue);
-  NativeFunction nf(data);
-  bool rv = db->replace(key.ptr(), key.size(), value.ptr(), value.size());
+  PyObject* pywindow = Py_None;
+  if (argc > 0) pywindow = PyTuple_GetItem(pyargs, 0);
+  PyObject* pyhard = Py_None;
+  if (argc > 1) pyhard = PyTuple_GetItem(pyargs, 1);
+  PyObject* pymaxbatch = Py_None;
+  if (argc > 2) pymaxbatch = PyTuple_GetItem(pyargs, 2);
+  double window = pywindow == Py_None ? -1 : pyatof(pywindow);
+  bool hard = PyObject_IsTrue(pyhard);
+  int64_t maxbatch = pymaxbatch == Py_None ? 0 : pyatoi(pymaxbatch);
+  if ((pywindow != Py_None && window < 0) || maxbatch < 0) {
+    throwinvarg();
+    return NULL;
+  }
+  if (!data->committer) data->committer = new GroupCommitter(data->db);
+  GroupCommitter* committer = data->committer;
+  NativeFunction nf(data, "tune_group_commit");
+  if (window < 0) {
+    committer->stop();
+  } else {
+    committer->start(window, hard, maxbatch);
+  }
   nf.cleanup();
-  if (rv) Py_RETURN_TRUE;
-  if (db_raise(data)) return NULL;
-  Py_RETURN_FALSE;
+  Py_RETURN_TRUE;
 }
 
 
 /**
- * Implementation of append.
+ * Implementation of request_durable.
  */
-static PyObject* db_append(DB_data* data, PyObject* pyargs) {
+static PyObject* db_request_durable(DB_data* data) {
+  kc::PolyDB* db = data->db;
+  GroupCommitter* committer = data->committer;
+  int64_t ticket = committer ? committer->request() : -1;
+  if (ticket < 0) {
+    db->set_error(kc::PolyDB::Error::INVALID, "group commit is not running");
+    if (db_raise(data)) return NULL;
+    Py_RETURN_NONE;
+  }
+  return PyLong_FromLongLong(ticket);
+}
+
+
+/**
+ * Implementation of wait_durable.
+ */
+static PyObject* db_wait_durable(DB_data* data, PyObject* pyargs) {
   int32_t argc = PyTuple_Size(pyargs);
-  if (argc != 2) {
+  if (argc > 2) {
     throwinvarg();
     return NULL;
   }
+  PyObject* pyticket = Py_None;
+  if (argc > 0) pyticket = PyTuple_GetItem(pyargs, 0);
+  PyObject* pytimeout = Py_None;
+  if (argc > 1) pytimeout = PyTuple_GetItem(pyargs, 1);
   kc::PolyDB* db = data->db;
-  PyObject* pykey = PyTuple_GetItem(pyargs, 0);
-  PyObject* pyvalue = PyTuple_GetItem(pyargs, 1);
-  SoftString key(pykey);
-  SoftString value(pyvalue);
-  NativeFunction nf(data);
-  bool rv = db->append(key.ptr(), key.size(), value.ptr(), value.size());
-  nf.cleanup();
+  GroupCommitter* committer = data->committer;
+  int64_t ticket = pyticket == Py_None ? -1 : pyatoi(pyticket);
+  double timeout = pytimeout == Py_None ? -1 : pyatof(pytimeout);
+  if (pyticket == Py_None && committer) ticket = committer->request();
+  if (!committer || ticket < 0) {
+    db->set_error(kc::PolyDB::Error::INVALID, "group commit is not running");
+    if (db_raise(data)) return NULL;
+    Py_RETURN_FALSE;
+  }
+  if (!committer->issued(ticket)) {
+    db->set_error(kc::PolyDB::Error::INVALID, "no such ticket");
+    if (db_raise(data)) return NULL;
+    Py_RETURN_FALSE;
+  }
+  const char* msg = NULL;
+  bool rv;
+  Py_BEGIN_ALLOW_THREADS
+  rv = committer->wait(ticket, timeout, &msg);
+  Py_END_ALLOW_THREADS
   if (rv) Py_RETURN_TRUE;
+  db->set_error(kc::PolyDB::Error::SYSTEM, msg);
   if (db_raise(data)) return NULL;
   Py_RETURN_FALSE;
 }
 
 
 /**
- * Implementation of increment.
+ * Implementation of group_commit_status.
  */
-static PyObject* db_increment(DB_data* data, PyObject* pyargs) {
+static PyObject* db_group_commit_status(DB_data* data) {
+  GroupCommitter* committer = data->committer;
+  if (!committer) Py_RETURN_NONE;
+  StringMap status;
+  committer->status(&status);
+  return maptopymap(&status);
+}
+
+
+/**
+ * Check whether a database keeps records in the lexical order of keys.
+ */
+static bool db_ordered(kc::PolyDB* db) {
+  kc::BasicDB* idb = db->reveal_inner_db();
+  kc::Comparator* comp = NULL;
+  if (kc::TreeDB* tdb = dynamic_cast<kc::TreeDB*>(idb)) {
+    comp = tdb->rcomp();
+  } else if (kc::ForestDB* fdb = dynamic_cast<kc::ForestDB*>(idb)) {
+    comp = fdb->rcomp();
+  } else if (kc::GrassDB* gdb = dynamic_cast<kc::GrassDB*>(idb)) {
+    comp = gdb->rcomp();
+  } else if (dynamic_cast<kc::ProtoTreeDB*>(idb)) {
+    return true;
+  }
+  return comp == kc::LEXICALCOMP;
+}
+
+
+/**
+ * Implementation of export_to.
+ */
+static PyObject* db_export_to(DB_data* data, PyObject* pyargs) {
   int32_t argc = PyTuple_Size(pyargs);
-  if (argc < 1 || argc > 3) {
+  if (argc < 1 || argc > 7) {
+    throwinvarg();
+    return NULL;
+  }
+  PyObject* pydest = PyTuple_GetItem(pyargs, 0);
+  PyObject* pybatch = Py_None;
+  if (argc > 1) pybatch = PyTuple_GetItem(pyargs, 1);
+  PyObject* pythnum = Py_None;
+  if (argc > 2) pythnum = PyTuple_GetItem(pyargs, 2);
+  PyObject* pyfilter = Py_None;
+  if (argc > 3) pyfilter = PyTuple_GetItem(pyargs, 3);
+  PyObject* pytransform = Py_None;
+  if (argc > 4) pytransform = PyTuple_GetItem(pyargs, 4);
+  PyObject* pyprogress = Py_None;
+  if (argc > 5) pyprogress = PyTuple_GetItem(pyargs, 5);
+  PyObject* pyresume = Py_None;
+  if (argc > 6) pyresume = PyTuple_GetItem(pyargs, 6);
+  int64_t batch = pybatch == Py_None ? 1024 : pyatoi(pybatch);
+  int32_t thnum = pythnum == Py_None ? 1 : pyatoi(pythnum);
+  ScanFilter filter;
+  ExportWriter::Transform transform = ExportWriter::TNONE;
+  if (pytransform != Py_None) {
+    SoftString tstr(pytransform);
+    if (!std::strcmp(tstr.ptr(), "compress")) {
+      transform = ExportWriter::TCOMPRESS;
+    } else if (!std::strcmp(tstr.ptr(), "decompress")) {
+      transform = ExportWriter::TDECOMPRESS;
+    } else {
+      throwinvarg();
+      return NULL;
+    }
+  }
+  bool destdb = PyObject_IsInstance(pydest, cls_db);
+  if (batch < 1 || thnum < 1 || !filter.set(pyfilter) || pydest == (PyObject*)data ||
+      (pyprogress != Py_None && !PyCallable_Check(pyprogress))) {
     throwinvarg();
     return NULL;
   }
   kc::PolyDB* db = data->db;
-  PyObject* pykey = PyTuple_GetItem(pyargs, 0);
-  SoftString key(pykey);
-  PyObject* pynum = Py_None;
-  if (argc > 1) pynum = PyTuple_GetItem(pyargs, 1);
-  int64_t num = pynum == Py_None ? 0 : pyatoi(pynum);
-  PyObject* pyorig = Py_None;
-  if (argc > 2) pyorig = PyTuple_GetItem(pyargs, 2);
-  int64_t orig = pyorig == Py_None ? 0 : pyatoi(pyorig);
-  PyObject* pyrv;
-  NativeFunction nf(data);
-  num = db->increment(key.ptr(), key.size(), num, orig);
-  nf.cleanup();
-  if (num == kc::INT64MIN) {
-    if (db_raise(data)) return NULL;
-    Py_INCREF(Py_None);
-    pyrv = Py_None;
+  bool ordered = db_ordered(db);
+  std::string resume;
+  if (pyresume != Py_None) {
+    SoftString rstr(pyresume);
+    resume.assign(rstr.ptr(), rstr.size());
+  }
+  NativeFunction nf(data, "export_to");
+  kc::PolyDB* ddb = NULL;
+  bool rv = true;
+  if (destdb) {
+    ddb = ((DB_data*)pydest)->db;
   } else {
-    pyrv = PyLong_FromLongLong(num);
+    SoftString dpath(pydest);
+    ddb = new kc::PolyDB;
+    if (!ddb->open(std::string(dpath.ptr(), dpath.size()),
+                   kc::PolyDB::OWRITER | kc::PolyDB::OCREATE)) {
+      kc::PolyDB::Error err = ddb->error();
+      db->set_error(err.code(), err.message());
+      delete ddb;
+      ddb = NULL;
+      rv = false;
+    }
   }
-  return pyrv;
+  kc::PolyDB::Cursor* cur = db->cursor();
+  bool eof = false;
+  if (rv) {
+    std::string start;
+    if (ordered) {
+      filter.start(&start);
+      if (resume > start) start = resume;
+    } else if (!resume.empty()) {
+      start = resume;
+    }
+    eof = !(start.empty() ? cur->jump() : cur->jump(start));
+    if (eof && !ordered && !resume.empty() && cur->error() == kc::PolyDB::Error::NOREC) {
+      db->set_error(kc::PolyDB::Error::NOREC, "no such checkpoint");
+      rv = false;
+    } else if (!eof && !resume.empty()) {
+      size_t ksiz;
+      char* kbuf = cur->get_key(&ksiz);
+      if (kbuf && ksiz == resume.size() && !std::memcmp(kbuf, resume.data(), ksiz) &&
+          !cur->step()) eof = true;
+      delete[] kbuf;
+    }
+    if (rv && eof && cur->error() != kc::PolyDB::Error::NOREC) {
+      kc::PolyDB::Error err = cur->error();
+      db->set_error(err.code(), err.message());
+      rv = false;
+    }
+  }
+  nf.cleanup();
+  ExportWriter* writers = new ExportWriter[thnum];
+  StringVector keys[2], values[2];
+  int32_t cur_idx = 0;
+  int32_t wnum = 0;
+  int64_t count = 0;
+  std::string checkpoint;
+  bool ok = true;
+  bool halt = false;
+  DB_data* ddata = destdb ? (DB_data*)pydest : NULL;
+  UpdateHub* dhub = destdb ? ddata->hub : NULL;
+  while (rv && ok) {
+    NativeFunction bnf(data);
+    StringVector* bkeys = keys + cur_idx;
+    StringVector* bvalues = values + cur_idx;
+    bkeys->clear();
+    bvalues->clear();
+    while (!eof && (int64_t)bkeys->size() < batch) {
+      size_t ksiz, vsiz;
+      const char* vbuf;
+      char* kbuf = cur->get(&ksiz, &vbuf, &vsiz, true);
+      if (!kbuf) {
+        if (cur->error() != kc::PolyDB::Error::NOREC) {
+          kc::PolyDB::Error err = cur->error();
+          db->set_error(err.code(), err.message());
+          rv = false;
+        }
+        eof = true;
+        break;
+      }
+      if (ordered && filter.beyond(kbuf, ksiz)) {
+        delete[] kbuf;
+        eof = true;
+        break;
+      }
+      if (filter.match(kbuf, ksiz, vbuf, vsiz)) {
+        bkeys->push_back(std::string(kbuf, ksiz));
+        bvalues->push_back(std::string(vbuf, vsiz));
+      }
+      delete[] kbuf;
+    }
+    bnf.cleanup();
+    bool done = wnum > 0;
+    Py_BEGIN_ALLOW_THREADS
+    for (int32_t i = 0; i < wnum; i++) {
+      writers[i].join();
+    }
+    Py_END_ALLOW_THREADS
+    for (int32_t i = 0; i < wnum; i++) {
+      kc::PolyDB::Error::Code code;
+      std::string message;
+      if (rv && writers[i].error(&code, &message)) {
+        db->set_error(code, message.c_str());
+        rv = false;
+      }
+    }
+    if (done && rv) {
+      const StringVector& pkeys = keys[1-cur_idx];
+      count += pkeys.size();
+      checkpoint = pkeys.back();
+    }
+    wnum = 0;
+    if (rv && !bkeys->empty()) {
+      size_t bnum = bkeys->size();
+      size_t step = (bnum + thnum - 1) / thnum;
+      for (size_t begin = 0; begin < bnum; begin += step) {
+        writers[wnum].set(ddata, ddb, dhub, transform, bkeys, bvalues,
+                          begin, std::min(begin + step, bnum));
+        writers[wnum].start();
+        wnum++;
+      }
+      cur_idx = 1 - cur_idx;
+    }
+    if (done && rv && !halt && pyprogress != Py_None) {
+      PyObject* pyrv = PyObject_CallFunction(pyprogress, (char*)"(Ly#)", (long long)count,
+                                             checkpoint.data(), checkpoint.size());
+      if (!pyrv) {
+        ok = false;
+      } else {
+        if (pyrv == Py_False) {
+          eof = true;
+          halt = true;
+        }
+        Py_DECREF(pyrv);
+      }
+    }
+    if (wnum < 1) break;
+  }
+  PyObject* pyextype = NULL, *pyexvalue = NULL, *pyextrace = NULL;
+  if (!ok) PyErr_Fetch(&pyextype, &pyexvalue, &pyextrace);
+  Py_BEGIN_ALLOW_THREADS
+  for (int32_t i = 0; i < wnum; i++) {
+    writers[i].join();
+  }
+  Py_END_ALLOW_THREADS
+  NativeFunction enf(data);
+  delete[] writers;
+  delete cur;
+  if (ddb && !destdb) {
+    if (!ddb->close() && rv) {
+      kc::PolyDB::Error err = ddb->error();
+      db->set_error(err.code(), err.message());
+      rv = false;
+    }
+    delete ddb;
+  }
+  enf.cleanup();
+  if (!ok) {
+    PyErr_Restore(pyextype, pyexvalue, pyextrace);
+    return NULL;
+  }
+  if (rv) return PyLong_FromLongLong(count);
+  if (db_raise(data)) return NULL;
+  return PyLong_FromLongLong(-1);
 }
 
 
 /**
- * Implementation of increment_double.
+ * Store a slice of exported records into a destination database through its locking device.
  */
-static PyObject* db_increment_double(DB_data* data, PyObject* pyargs) {
+static void db_export_native(DB_data* data, ExportWriter* writer) {
+  PyGILState_STATE gstate = PyGILState_Ensure();
+  {
+    db_admit(data);
+    NativeFunction nf(data);
+    writer->write();
+    nf.cleanup();
+  }
+  PyGILState_Release(gstate);
+}
+
+
+/**
+ * Store the records of a loaded chunk for a target database through its locking device.
+ */
+static bool db_load_native(DB_data* data, SnapshotWorker* worker, size_t idx) {
+  PyGILState_STATE gstate = PyGILState_Ensure();
+  bool rv;
+  {
+    db_admit(data);
+    NativeFunction nf(data);
+    if (data->pylock == Py_None) {
+      rv = worker->store(idx, data->db, data->hub);
+    } else {
+      Py_BEGIN_ALLOW_THREADS
+      rv = worker->store(idx, data->db, data->hub);
+      Py_END_ALLOW_THREADS
+    }
+    nf.cleanup();
+  }
+  PyGILState_Release(gstate);
+  return rv;
+}
+
+
+/**
+ * Implementation of tune_stats.
+ */
+static PyObject* db_tune_stats(DB_data* data, PyObject* pyargs) {
   int32_t argc = PyTuple_Size(pyargs);
-  if (argc < 1 || argc > 3) {
+  if (argc > 1) {
     throwinvarg();
     return NULL;
   }
-  kc::PolyDB* db = data->db;
-  PyObject* pykey = PyTuple_GetItem(pyargs, 0);
-  SoftString key(pykey);
-  PyObject* pynum = Py_None;
-  if (argc > 1) pynum = PyTuple_GetItem(pyargs, 1);
-  double num = pynum == Py_None ? 0 : pyatof(pynum);
-  PyObject* pyorig = Py_None;
-  if (argc > 2) pyorig = PyTuple_GetItem(pyargs, 2);
-  double orig = pyorig == Py_None ? 0 : pyatof(pyorig);
-  PyObject* pyrv;
-  NativeFunction nf(data);
-  num = db->increment_double(key.ptr(), key.size(), num, orig);
-  nf.cleanup();
-  if (kc::chknan(num)) {
-    if (db_raise(data)) return NULL;
-    Py_INCREF(Py_None);
-    pyrv = Py_None;
+  PyObject* pyenabled = Py_True;
+  if (argc > 0) pyenabled = PyTuple_GetItem(pyargs, 0);
+  if (PyObject_IsTrue(pyenabled)) {
+    if (!data->stats) data->stats = new CallStats;
   } else {
-    pyrv = PyFloat_FromDouble(num);
+    delete data->stats;
+    data->stats = NULL;
   }
-  return pyrv;
+  Py_RETURN_TRUE;
 }
 
 
 /**
- * Implementation of cas.
+ * Implementation of stats.
  */
-static PyObject* db_cas(DB_data* data, PyObject* pyargs) {
+static PyObject* db_stats(DB_data* data, PyObject* pyargs) {
   int32_t argc = PyTuple_Size(pyargs);
-  if (argc != 3) {
+  if (argc > 1) {
     throwinvarg();
     return NULL;
   }
-  kc::PolyDB* db = data->db;
-  PyObject* pykey = PyTuple_GetItem(pyargs, 0);
-  SoftString key(pykey);
-  PyObject* pyoval = PyTuple_GetItem(pyargs, 1);
-  SoftString oval(pyoval);
-  const char* ovbuf = NULL;
-  size_t ovsiz = 0;
-  if (pyoval != Py_None) {
-    ovbuf = oval.ptr();
-    ovsiz = oval.size();
-  }
-  PyObject* pynval = PyTuple_GetItem(pyargs, 2);
-  SoftString nval(pynval);
-  const char* nvbuf = NULL;
-  size_t nvsiz = 0;
-  if (pynval != Py_None) {
-    nvbuf = nval.ptr();
-    nvsiz = nval.size();
+  PyObject* pyreset = Py_None;
+  if (argc > 0) pyreset = PyTuple_GetItem(pyargs, 0);
+  CallStats* stats = data->stats;
+  if (!stats) Py_RETURN_NONE;
+  const char* kinds[] = { "native", "lock", "conv" };
+  double elapsed = stats->elapsed();
+  PyObject* pystats = PyDict_New();
+  const CallStats::EntryMap& entries = stats->entries();
+  CallStats::EntryMap::const_iterator it = entries.begin();
+  CallStats::EntryMap::const_iterator itend = entries.end();
+  while (it != itend) {
+    const CallStats::Entry& entry = it->second;
+    PyObject* pyentry = PyDict_New();
+    PyObject* pyvalue = PyLong_FromLongLong(entry.calls);
+    PyDict_SetItemString(pyentry, "calls", pyvalue);
+    Py_DECREF(pyvalue);
+    pyvalue = PyLong_FromLongLong(entry.isiz);
+    PyDict_SetItemString(pyentry, "bytes_in", pyvalue);
+    Py_DECREF(pyvalue);
+    pyvalue = PyLong_FromLongLong(entry.osiz);
+    PyDict_SetItemString(pyentry, "bytes_out", pyvalue);
+    Py_DECREF(pyvalue);
+    pyvalue = PyFloat_FromDouble(elapsed > 0 ? entry.calls / elapsed : 0.0);
+    PyDict_SetItemString(pyentry, "throughput", pyvalue);
+    Py_DECREF(pyvalue);
+    for (int32_t i = 0; i < CallStats::KNUM; i++) {
+      std::string name = kinds[i];
+      pyvalue = PyFloat_FromDouble(entry.times[i]);
+      PyDict_SetItemString(pyentry, (name + "_time").c_str(), pyvalue);
+      Py_DECREF(pyvalue);
+      pyvalue = PyList_New(CallStats::BUCKETNUM);
+      for (int32_t j = 0; j < CallStats::BUCKETNUM; j++) {
+        PyList_SetItem(pyvalue, j, PyLong_FromLongLong(entry.hists[i][j]));
+      }
+      PyDict_SetItemString(pyentry, (name + "_hist").c_str(), pyvalue);
+      Py_DECREF(pyvalue);
+    }
+    PyDict_SetItemString(pystats, it->first, pyentry);
+    Py_DECREF(pyentry);
+    ++it;
   }
-  NativeFunction nf(data);
-  bool rv = db->cas(key.ptr(), key.size(), ovbuf, ovsiz, nvbuf, nvsiz);
-  nf.cleanup();
-  if (rv) Py_RETURN_TRUE;
-  if (db_raise(data)) return NULL;
-  Py_RETURN_FALSE;
+  if (pyreset != Py_None && PyObject_IsTrue(pyreset)) stats->reset();
+  return pystats;
 }
 
 
 /**
- * Implementation of remove.
+ * Implementation of tune_contention.
  */
-static PyObject* db_remove(DB_data* data, PyObject* pyargs) {
+static PyObject* db_tune_contention(DB_data* data, PyObject* pyargs) {
   int32_t argc = PyTuple_Size(pyargs);
-  if (argc != 1) {
-    throwinvarg();
-    return NULL;
-  }
-  kc::PolyDB* db = data->db;
-  PyObject* pykey = PyTuple_GetItem(pyargs, 0);
-  SoftString key(pykey);
-  NativeFunction nf(data);
-  bool rv = db->remove(key.ptr(), key.size());
-  nf.cleanup();
-  if (rv) Py_RETURN_TRUE;
-  if (db_raise(data)) return NULL;
-  Py_RETURN_FALSE;
+  if (argc > 2) {
+    throwinvarg();
+    return NULL;
+  }
+  PyObject* pyenabled = Py_True;
+  if (argc > 0) pyenabled = PyTuple_GetItem(pyargs, 0);
+  PyObject* pysample = Py_None;
+  if (argc > 1) pysample = PyTuple_GetItem(pyargs, 1);
+  int64_t sample = pysample == Py_None ? 1 : pyatoi(pysample);
+  if (sample < 1) {
+    throwinvarg();
+    return NULL;
+  }
+  delete data->contention;
+  data->contention = NULL;
+  if (PyObject_IsTrue(pyenabled)) data->contention = new ContentionProfiler(sample);
+  Py_RETURN_TRUE;
 }
 
 
 /**
- * Implementation of get.
+ * Implementation of contention.
  */
-static PyObject* db_get(DB_data* data, PyObject* pyargs) {
+static PyObject* db_contention(DB_data* data, PyObject* pyargs) {
   int32_t argc = PyTuple_Size(pyargs);
-  if (argc != 1) {
+  if (argc > 1) {
     throwinvarg();
     return NULL;
   }
-  kc::PolyDB* db = data->db;
-  PyObject* pykey = PyTuple_GetItem(pyargs, 0);
-  SoftString key(pykey);
-  NativeFunction nf(data);
-  size_t vsiz;
-  char* vbuf = db->get(key.ptr(), key.size(), &vsiz);
-  nf.cleanup();
-  PyObject* pyrv;
-  if (vbuf) {
-    pyrv = newbytes(vbuf, vsiz);
-    delete[] vbuf;
-  } else {
-    if (db_raise(data)) return NULL;
-    Py_INCREF(Py_None);
-    pyrv = Py_None;
-  }
+  PyObject* pyreset = Py_None;
+  if (argc > 0) pyreset = PyTuple_GetItem(pyargs, 0);
+  ContentionProfiler* prof = data->contention;
+  if (!prof) Py_RETURN_NONE;
+  const ContentionProfiler::EntryMap& entries = prof->entries();
+  PyObject* pyrv = PyList_New(entries.size());
+  ContentionProfiler::EntryMap::const_iterator it = entries.begin();
+  ContentionProfiler::EntryMap::const_iterator itend = entries.end();
+  size_t idx = 0;
+  while (it != itend) {
+    PyObject* pytuple = PyTuple_New(6);
+    PyTuple_SetItem(pytuple, 0, PyLong_FromUnsignedLong(it->first.thid));
+    PyTuple_SetItem(pytuple, 1, newstring(it->first.name));
+    PyTuple_SetItem(pytuple, 2, newstring(ContentionProfiler::kindname(it->first.kind)));
+    PyTuple_SetItem(pytuple, 3, PyLong_FromLongLong(it->second.count));
+    PyTuple_SetItem(pytuple, 4, PyFloat_FromDouble(it->second.total));
+    PyTuple_SetItem(pytuple, 5, PyFloat_FromDouble(it->second.max));
+    PyList_SetItem(pyrv, idx++, pytuple);
+    ++it;
+  }
+  if (pyreset != Py_None && PyObject_IsTrue(pyreset)) prof->reset();
   return pyrv;
 }
 
 
 /**
- * Implementation of get_str.
+ * Implementation of dump_contention.
  */
-static PyObject* db_get_str(DB_data* data, PyObject* pyargs) {
+static PyObject* db_dump_contention(DB_data* data, PyObject* pyargs) {
   int32_t argc = PyTuple_Size(pyargs);
-  if (argc != 1) {
+  if (argc < 1 || argc > 2) {
     throwinvarg();
     return NULL;
   }
+  PyObject* pydest = PyTuple_GetItem(pyargs, 0);
+  PyObject* pyformat = Py_None;
+  if (argc > 1) pyformat = PyTuple_GetItem(pyargs, 1);
+  bool folded = false;
+  if (pyformat != Py_None) {
+    SoftString format(pyformat);
+    if (!std::strcmp(format.ptr(), "folded")) {
+      folded = true;
+    } else if (std::strcmp(format.ptr(), "report")) {
+      throwinvarg();
+      return NULL;
+    }
+  }
   kc::PolyDB* db = data->db;
-  PyObject* pykey = PyTuple_GetItem(pyargs, 0);
-  SoftString key(pykey);
-  NativeFunction nf(data);
-  size_t vsiz;
-  char* vbuf = db->get(key.ptr(), key.size(), &vsiz);
-  nf.cleanup();
-  PyObject* pyrv;
-  if (vbuf) {
-    pyrv = newstring(vbuf);
-    delete[] vbuf;
+  ContentionProfiler* prof = data->contention;
+  SoftString dest(pydest);
+  if (!prof) {
+    db->set_error(kc::PolyDB::Error::INVALID, "no contention profiler");
+  } else if (prof->dump(dest.ptr(), folded)) {
+    Py_RETURN_TRUE;
   } else {
-    if (db_raise(data)) return NULL;
-    Py_INCREF(Py_None);
-    pyrv = Py_None;
+    db->set_error(kc::PolyDB::Error::SYSTEM, "writing the profile failed");
   }
-  return pyrv;
+  if (db_raise(data)) return NULL;
+  Py_RETURN_FALSE;
 }
 
 
 /**
- * Implementation of check.
+ * Implementation of tune_slow_log.
  */
-static PyObject* db_check(DB_data* data, PyObject* pyargs) {
+static PyObject* db_tune_slow_log(DB_data* data, PyObject* pyargs) {
   int32_t argc = PyTuple_Size(pyargs);
-  if (argc != 1) {
+  if (argc > 3) {
     throwinvarg();
     return NULL;
   }
-  kc::PolyDB* db = data->db;
-  PyObject* pykey = PyTuple_GetItem(pyargs, 0);
-  SoftString key(pykey);
-  NativeFunction nf(data);
-  int32_t vsiz = db->check(key.ptr(), key.size());
-  nf.cleanup();
-  if (vsiz < 0 && db_raise(data)) return NULL;
-  return PyLong_FromLongLong(vsiz);
+  PyObject* pythres = Py_None;
+  if (argc > 0) pythres = PyTuple_GetItem(pyargs, 0);
+  PyObject* pycap = Py_None;
+  if (argc > 1) pycap = PyTuple_GetItem(pyargs, 1);
+  PyObject* pyhook = Py_None;
+  if (argc > 2) pyhook = PyTuple_GetItem(pyargs, 2);
+  double threshold = pythres == Py_None ? 0 : pyatof(pythres);
+  int64_t capacity = pycap == Py_None ? 1024 : pyatoi(pycap);
+  if (threshold < 0 || capacity < 1 || (pyhook != Py_None && !PyCallable_Check(pyhook))) {
+    throwinvarg();
+    return NULL;
+  }
+  delete data->slowlog;
+  data->slowlog = NULL;
+  if (pythres != Py_None) data->slowlog = new SlowLog(threshold, capacity, pyhook);
+  Py_RETURN_TRUE;
 }
 
 
 /**
- * Implementation of seize.
+ * Implementation of slow_log.
  */
-static PyObject* db_seize(DB_data* data, PyObject* pyargs) {
+static PyObject* db_slow_log(DB_data* data, PyObject* pyargs) {
   int32_t argc = PyTuple_Size(pyargs);
-  if (argc != 1) {
+  if (argc > 1) {
     throwinvarg();
     return NULL;
   }
-  kc::PolyDB* db = data->db;
-  PyObject* pykey = PyTuple_GetItem(pyargs, 0);
-  SoftString key(pykey);
-  NativeFunction nf(data);
-  size_t vsiz;
-  char* vbuf = db->seize(key.ptr(), key.size(), &vsiz);
-  nf.cleanup();
-  PyObject* pyrv;
-  if (vbuf) {
-    pyrv = newbytes(vbuf, vsiz);
-    delete[] vbuf;
-  } else {
-    if (db_raise(data)) return NULL;
-    Py_INCREF(Py_None);
-    pyrv = Py_None;
+  PyObject* pyreset = Py_None;
+  if (argc > 0) pyreset = PyTuple_GetItem(pyargs, 0);
+  SlowLog* slowlog = data->slowlog;
+  if (!slowlog) Py_RETURN_NONE;
+  const std::deque<SlowOperation>& entries = slowlog->entries();
+  PyObject* pyrv = PyList_New(entries.size());
+  for (size_t i = 0; i < entries.size(); i++) {
+    PyList_SetItem(pyrv, i, db_slow_entry(entries[i]));
   }
+  if (pyreset != Py_None && PyObject_IsTrue(pyreset)) slowlog->reset();
   return pyrv;
 }
 
 
 /**
- * Implementation of seize_str.
+ * Convert an entry of the slow operation log into a dictionary.
  */
-static PyObject* db_seize_str(DB_data* data, PyObject* pyargs) {
-  int32_t argc = PyTuple_Size(pyargs);
-  if (argc != 1) {
-    throwinvarg();
-    return NULL;
-  }
-  kc::PolyDB* db = data->db;
-  PyObject* pykey = PyTuple_GetItem(pyargs, 0);
-  SoftString key(pykey);
-  NativeFunction nf(data);
-  size_t vsiz;
-  char* vbuf = db->seize(key.ptr(), key.size(), &vsiz);
-  nf.cleanup();
-  PyObject* pyrv;
-  if (vbuf) {
-    pyrv = newstring(vbuf);
-    delete[] vbuf;
+static PyObject* db_slow_entry(const SlowOperation& entry) {
+  PyObject* pyentry = PyDict_New();
+  PyObject* pyvalue = PyFloat_FromDouble(entry.time);
+  PyDict_SetItemString(pyentry, "time", pyvalue);
+  Py_DECREF(pyvalue);
+  pyvalue = newstring(entry.name);
+  PyDict_SetItemString(pyentry, "method", pyvalue);
+  Py_DECREF(pyvalue);
+  if (entry.keyed) {
+    pyvalue = newbytes(entry.key.data(), entry.key.size());
   } else {
-    if (db_raise(data)) return NULL;
     Py_INCREF(Py_None);
-    pyrv = Py_None;
+    pyvalue = Py_None;
+  }
+  PyDict_SetItemString(pyentry, "key", pyvalue);
+  Py_DECREF(pyvalue);
+  pyvalue = PyLong_FromLongLong(entry.isiz);
+  PyDict_SetItemString(pyentry, "bytes_in", pyvalue);
+  Py_DECREF(pyvalue);
+  pyvalue = PyLong_FromLongLong(entry.osiz);
+  PyDict_SetItemString(pyentry, "bytes_out", pyvalue);
+  Py_DECREF(pyvalue);
+  pyvalue = PyFloat_FromDouble(entry.lock);
+  PyDict_SetItemString(pyentry, "lock_time", pyvalue);
+  Py_DECREF(pyvalue);
+  pyvalue = PyFloat_FromDouble(entry.native);
+  PyDict_SetItemString(pyentry, "native_time", pyvalue);
+  Py_DECREF(pyvalue);
+  pyvalue = PyFloat_FromDouble(entry.total);
+  PyDict_SetItemString(pyentry, "total_time", pyvalue);
+  Py_DECREF(pyvalue);
+  pyvalue = PyLong_FromUnsignedLong(entry.thid);
+  PyDict_SetItemString(pyentry, "thread", pyvalue);
+  Py_DECREF(pyvalue);
+  return pyentry;
+}
+
+
+/**
+ * Call the hook of the slow operation log with pending entries.
+ */
+static int db_slow_hook(void* arg) {
+  DB_data* data = (DB_data*)arg;
+  SlowLog* slowlog = data->slowlog;
+  if (slowlog) {
+    std::deque<SlowOperation> entries;
+    slowlog->take_pending(&entries);
+    PyObject* pyhook = slowlog->hook();
+    Py_INCREF(pyhook);
+    slowlog->begin_hook(PyThread_get_thread_ident());
+    for (size_t i = 0; i < entries.size(); i++) {
+      PyObject* pyentry = db_slow_entry(entries[i]);
+      PyObject* pyrv = PyObject_CallFunctionObjArgs(pyhook, pyentry, NULL);
+      Py_DECREF(pyentry);
+      if (pyrv) {
+        Py_DECREF(pyrv);
+      } else {
+        PyErr_WriteUnraisable(pyhook);
+      }
+    }
+    if (data->slowlog == slowlog) slowlog->end_hook();
+    Py_DECREF(pyhook);
   }
-  return pyrv;
+  Py_DECREF((PyObject*)data);
+  return 0;
 }
 
 
 /**
- * Implementation of set_bulk.
+ * Implementation of merge.
  */
-static PyObject* db_set_bulk(DB_data* data, PyObject* pyargs) {
+static PyObject* db_merge(DB_data* data, PyObject* pyargs) {
   int32_t argc = PyTuple_Size(pyargs);
   if (argc < 1 || argc > 2) {
     throwinvarg();
     return NULL;
   }
-  kc::PolyDB* db = data->db;
-  PyObject* pyrecs = PyTuple_GetItem(pyargs, 0);
-  if (!PyMapping_Check(pyrecs)) {
+  PyObject* pysrcary = PyTuple_GetItem(pyargs, 0);
+  if (!PySequence_Check(pysrcary)) {
     throwinvarg();
     return NULL;
   }
-  StringMap recs;
-  PyObject* pyitems = PyMapping_Items(pyrecs);
-  int32_t rnum = PySequence_Length(pyitems);
-  for (int32_t i = 0; i < rnum; i++) {
-    PyObject* pyitem = PySequence_GetItem(pyitems, i);
-    if (PyTuple_Size(pyitem) == 2) {
-      PyObject* pykey = PyTuple_GetItem(pyitem, 0);
-      PyObject* pyvalue = PyTuple_GetItem(pyitem, 1);
-      SoftString key(pykey);
-      SoftString value(pyvalue);
-      recs[std::string(key.ptr(), key.size())] = std::string(value.ptr(), value.size());
+  PyObject* pymode = Py_None;
+  if (argc > 1) pymode = PyTuple_GetItem(pyargs, 1);
+  uint32_t mode = PyLong_Check(pymode) ? (uint32_t)PyLong_AsLong(pymode) :
+    kc::PolyDB::OWRITER | kc::PolyDB::OCREATE;
+  kc::PolyDB* db = data->db;
+  int32_t num = PySequence_Length(pysrcary);
+  if (num < 1) Py_RETURN_TRUE;
+  kc::BasicDB** srcary = new kc::BasicDB*[num];
+  size_t srcnum = 0;
+  for (int32_t i = 0; i < num; i++) {
+    PyObject* pysrcdb = PySequence_GetItem(pysrcary, i);
+    if (PyObject_IsInstance(pysrcdb, cls_db)) {
+      DB_data* srcdbdata = (DB_data*)pysrcdb;
+      srcary[srcnum++] = srcdbdata->db;
     }
-    Py_DECREF(pyitem);
+    Py_DECREF(pysrcdb);
   }
-  Py_DECREF(pyitems);
-  PyObject* pyatomic = Py_True;
-  if (argc > 1) pyatomic = PyTuple_GetItem(pyargs, 1);
-  bool atomic = PyObject_IsTrue(pyatomic);
-  NativeFunction nf(data);
-  int64_t rv = db->set_bulk(recs, atomic);
+  db_admit(data);
+  NativeFunction nf(data, "merge");
+  bool rv = db->merge(srcary, srcnum, (kc::PolyDB::MergeMode)mode);
+  data->hub->notify(UpdateListener::URESET, NULL, 0);
   nf.cleanup();
-  if (rv < 0 && db_raise(data)) return NULL;
-  return PyLong_FromLongLong(rv);
+  delete[] srcary;
+  if (rv) Py_RETURN_TRUE;
+  if (db_raise(data)) return NULL;
+  Py_RETURN_FALSE;
 }
 
 
 /**
- * Implementation of remove_bulk.
+ * Implementation of cursor.
  */
-static PyObject* db_remove_bulk(DB_data* data, PyObject* pyargs) {
+static PyObject* db_cursor(DB_data* data) {
+  PyObject* pycur = PyObject_CallMethod(mod_kc, (char*)"Cursor",
+                                        (char*)"(O)", (PyObject*)data);
+  return pycur;
+}
+
+
+/**
+ * Implementation of cursor_process.
+ */
+static PyObject* db_cursor_process(DB_data* data, PyObject* pyargs) {
   int32_t argc = PyTuple_Size(pyargs);
-  if (argc < 1 || argc > 2) {
+  if (argc != 1) {
     throwinvarg();
     return NULL;
   }
-  kc::PolyDB* db = data->db;
-  PyObject* pykeys = PyTuple_GetItem(pyargs, 0);
-  if (!PySequence_Check(pykeys)) {
+  PyObject* pyproc = PyTuple_GetItem(pyargs, 0);
+  if (!PyCallable_Check(pyproc)) {
     throwinvarg();
     return NULL;
   }
-  StringVector keys;
-  int32_t knum = PySequence_Length(pykeys);
-  for (int32_t i = 0; i < knum; i++) {
-    PyObject* pykey = PySequence_GetItem(pykeys, i);
-    SoftString key(pykey);
-    keys.push_back(std::string(key.ptr(), key.size()));
-    Py_DECREF(pykey);
+  PyObject* pycur = PyObject_CallMethod(mod_kc, (char*)"Cursor",
+                                        (char*)"(O)", (PyObject*)data);
+  if (!pycur) return NULL;
+  PyObject* pyrv = PyObject_CallFunction(pyproc, (char*)"(O)", pycur);
+  if (!pyrv) {
+    Py_DECREF(pycur);
+    return NULL;
   }
-  PyObject* pyatomic = Py_True;
-  if (argc > 1) pyatomic = PyTuple_GetItem(pyargs, 1);
-  bool atomic = PyObject_IsTrue(pyatomic);
-  NativeFunction nf(data);
-  int64_t rv = db->remove_bulk(keys, atomic);
-  nf.cleanup();
-  if (rv < 0 && db_raise(data)) return NULL;
-  return PyLong_FromLongLong(rv);
+  Py_DECREF(pyrv);
+  pyrv = PyObject_CallMethod(pycur, (char*)"disable", NULL);
+  if (!pyrv) {
+    Py_DECREF(pycur);
+    return NULL;
+  }
+  Py_DECREF(pyrv);
+  Py_DECREF(pycur);
+  Py_RETURN_NONE;
 }
 
 
 /**
- * Implementation of get_bulk.
+ * Implementation of tune_blob_store.
  */
-static PyObject* db_get_bulk(DB_data* data, PyObject* pyargs) {
+static PyObject* db_tune_blob_store(DB_data* data, PyObject* pyargs) {
   int32_t argc = PyTuple_Size(pyargs);
-  if (argc < 1 || argc > 2) {
+  if (argc != 1) {
     throwinvarg();
     return NULL;
   }
-  kc::PolyDB* db = data->db;
-  PyObject* pykeys = PyTuple_GetItem(pyargs, 0);
-  if (!PySequence_Check(pykeys)) {
+  PyObject* pycdb = PyTuple_GetItem(pyargs, 0);
+  if (pycdb != Py_None && (!PyObject_IsInstance(pycdb, cls_db) || pycdb == (PyObject*)data)) {
     throwinvarg();
     return NULL;
   }
-  StringVector keys;
-  int32_t knum = PySequence_Length(pykeys);
-  for (int32_t i = 0; i < knum; i++) {
-    PyObject* pykey = PySequence_GetItem(pykeys, i);
-    SoftString key(pykey);
-    keys.push_back(std::string(key.ptr(), key.size()));
-    Py_DECREF(pykey);
-  }
-  PyObject* pyatomic = Py_True;
-  if (argc > 1) pyatomic = PyTuple_GetItem(pyargs, 1);
-  bool atomic = PyObject_IsTrue(pyatomic);
-  NativeFunction nf(data);
-  StringMap recs;
-  int64_t rv = db->get_bulk(keys, &recs, atomic);
-  nf.cleanup();
-  if (rv < 0) {
-    if (db_raise(data)) return NULL;
-    Py_RETURN_NONE;
-  }
-  PyObject* pyrecs = PyDict_New();
-  StringMap::const_iterator it = recs.begin();
-  StringMap::const_iterator itend = recs.end();
-  while (it != itend) {
-    PyObject* pykey = newbytes(it->first.data(), it->first.size());
-    PyObject* pyvalue = newbytes(it->second.data(), it->second.size());
-    PyDict_SetItem(pyrecs, pykey, pyvalue);
-    Py_DECREF(pyvalue);
-    Py_DECREF(pykey);
-    it++;
-  }
-  return pyrecs;
+  Py_XDECREF(data->blobstore);
+  data->blobstore = NULL;
+  if (pycdb == Py_None) Py_RETURN_TRUE;
+  Py_INCREF(pycdb);
+  data->blobstore = pycdb;
+  Py_RETURN_TRUE;
 }
 
 
 /**
- * Implementation of get_bulk_str.
+ * Implementation of open_blob.
  */
-static PyObject* db_get_bulk_str(DB_data* data, PyObject* pyargs) {
+static PyObject* db_open_blob(DB_data* data, PyObject* pyargs) {
   int32_t argc = PyTuple_Size(pyargs);
-  if (argc < 1 || argc > 2) {
+  if (argc < 1 || argc > 3) {
     throwinvarg();
     return NULL;
   }
-  kc::PolyDB* db = data->db;
-  PyObject* pykeys = PyTuple_GetItem(pyargs, 0);
-  if (!PySequence_Check(pykeys)) {
+  PyObject* pykey = PyTuple_GetItem(pyargs, 0);
+  PyObject* pymode = Py_None;
+  if (argc > 1) pymode = PyTuple_GetItem(pyargs, 1);
+  PyObject* pychunk = Py_None;
+  if (argc > 2) pychunk = PyTuple_GetItem(pyargs, 2);
+  std::string mode = "r";
+  if (pymode != Py_None) {
+    SoftString mstr(pymode);
+    mode.clear();
+    for (size_t i = 0; i < mstr.size(); i++) {
+      if (mstr.ptr()[i] != 'b') mode.append(1, mstr.ptr()[i]);
+    }
+  }
+  bool update = mode.size() == 2 && mode[1] == '+';
+  if (mode.size() < 1 || mode.size() > 2 || (mode.size() == 2 && !update) ||
+      (mode[0] != 'r' && mode[0] != 'w' && mode[0] != 'a')) {
     throwinvarg();
     return NULL;
   }
-  StringVector keys;
-  int32_t knum = PySequence_Length(pykeys);
-  for (int32_t i = 0; i < knum; i++) {
-    PyObject* pykey = PySequence_GetItem(pykeys, i);
-    SoftString key(pykey);
-    keys.push_back(std::string(key.ptr(), key.size()));
-    Py_DECREF(pykey);
+  int64_t chunk = pychunk == Py_None ? 1 << 20 : pyatoi(pychunk);
+  if (chunk < 1 || chunk > kc::INT32MAX) {
+    throwinvarg();
+    return NULL;
   }
-  PyObject* pyatomic = Py_True;
-  if (argc > 1) pyatomic = PyTuple_GetItem(pyargs, 1);
-  bool atomic = PyObject_IsTrue(pyatomic);
-  NativeFunction nf(data);
-  StringMap recs;
-  int64_t rv = db->get_bulk(keys, &recs, atomic);
+  kc::PolyDB* db = data->db;
+  if (!data->blobstore) {
+    db->set_error(kc::PolyDB::Error::INVALID, "no blob store");
+    if (db_raise(data)) return NULL;
+    Py_RETURN_NONE;
+  }
+  SoftString key(pykey);
+  SoftBlob* blob = new SoftBlob(db, data->hub, data->blobstore,
+                                ((DB_data*)data->blobstore)->db,
+                                std::string(key.ptr(), key.size()),
+                                mode[0] == 'r' || update, mode[0] != 'r' || update,
+                                mode[0] == 'a');
+  bool tran = mode[0] == 'w';
+  bool joined = false;
+  bool cjoined = false;
+  if (tran && !blob_begin(data, blob, &joined, &cjoined)) {
+    delete blob;
+    if (db_raise(data)) return NULL;
+    Py_RETURN_NONE;
+  }
+  NativeFunction nf(data, "open_blob");
+  bool rv = blob->open(chunk, mode[0] != 'r', mode[0] == 'w');
+  if (tran) rv = blob_commit(data, blob, rv, joined, cjoined);
   nf.cleanup();
-  if (rv < 0) {
+  if (!rv) {
+    delete blob;
     if (db_raise(data)) return NULL;
     Py_RETURN_NONE;
   }
-  return maptopymap(&recs);
+  PyObject* pyblob = PyObject_CallMethod(mod_kc, (char*)"Blob", NULL);
+  if (!pyblob) {
+    delete blob;
+    return NULL;
+  }
+  Blob_data* bdata = (Blob_data*)pyblob;
+  Py_DECREF(bdata->pydb);
+  Py_INCREF((PyObject*)data);
+  bdata->pydb = (PyObject*)data;
+  bdata->blob = blob;
+  return pyblob;
 }
 
 
 /**
- * Implementation of clear.
+ * Implementation of shift.
  */
-static PyObject* db_clear(DB_data* data) {
+static PyObject* db_shift(DB_data* data) {
   kc::PolyDB* db = data->db;
-  NativeFunction nf(data);
-  bool rv = db->clear();
+  db_admit(data);
+  NativeFunction nf(data, "shift");
+  char* kbuf;
+  const char* vbuf;
+  size_t ksiz, vsiz;
+  kbuf = db_shift_impl(db, &ksiz, &vbuf, &vsiz);
+  if (kbuf) data->hub->notify(UpdateListener::UREMOVE, kbuf, ksiz);
   nf.cleanup();
-  if (rv) Py_RETURN_TRUE;
-  if (db_raise(data)) return NULL;
-  Py_RETURN_FALSE;
+  PyObject* pyrv;
+  if (kbuf) {
+    pyrv = PyTuple_New(2);
+    PyObject* pykey = newbytes(kbuf, ksiz);
+    PyObject* pyvalue = newbytes(vbuf, vsiz);
+    PyTuple_SetItem(pyrv, 0, pykey);
+    PyTuple_SetItem(pyrv, 1, pyvalue);
+    delete[] kbuf;
+  } else {
+    if (db_raise(data)) return NULL;
+    Py_INCREF(Py_None);
+    pyrv = Py_None;
+  }
+  return pyrv;
 }
 
 
 /**
- * Implementation of synchronize.
+ * Implementation of shift_str.
  */
-static PyObject* db_synchronize(DB_data* data, PyObject* pyargs) {
-  int32_t argc = PyTuple_Size(pyargs);
-  if (argc > 2) {
-    throwinvarg();
-    return NULL;
-  }
-  PyObject* pyhard = Py_None;
-  if (argc > 0) pyhard = PyTuple_GetItem(pyargs, 0);
-  PyObject* pyproc = Py_None;
-  if (argc > 1) pyproc = PyTuple_GetItem(pyargs, 1);
+static PyObject* db_shift_str(DB_data* data) {
   kc::PolyDB* db = data->db;
-  bool hard = PyObject_IsTrue(pyhard);
-  bool rv;
-  if (PyObject_IsInstance(pyproc, cls_fproc) || PyCallable_Check(pyproc)) {
-    if (data->pylock == Py_None) {
-      db->set_error(kc::PolyDB::Error::INVALID, "unsupported method");
-      if (db_raise(data)) return NULL;
-      Py_RETURN_NONE;
-    }
-    SoftFileProcessor proc(pyproc);
-    NativeFunction nf(data);
-    rv = db->synchronize(hard, &proc);
-    nf.cleanup();
-    PyObject* pyextype, *pyexvalue, *pyextrace;
-    if (proc.exception(&pyextype, &pyexvalue, &pyextrace)) {
-      PyErr_SetObject(pyextype, pyexvalue);
-      return NULL;
-    }
+  db_admit(data);
+  NativeFunction nf(data, "shift_str");
+  char* kbuf;
+  const char* vbuf;
+  size_t ksiz, vsiz;
+  kbuf = db_shift_impl(db, &ksiz, &vbuf, &vsiz);
+  if (kbuf) data->hub->notify(UpdateListener::UREMOVE, kbuf, ksiz);
+  nf.cleanup();
+  PyObject* pyrv;
+  if (kbuf) {
+    pyrv = PyTuple_New(2);
+    PyObject* pykey = newstring(kbuf);
+    PyObject* pyvalue = newstring(vbuf);
+    PyTuple_SetItem(pyrv, 0, pykey);
+    PyTuple_SetItem(pyrv, 1, pyvalue);
+    delete[] kbuf;
   } else {
-    NativeFunction nf(data);
-    rv = db->synchronize(hard, NULL);
-    nf.cleanup();
+    if (db_raise(data)) return NULL;
+    Py_INCREF(Py_None);
+    pyrv = Py_None;
   }
-  if (rv) Py_RETURN_TRUE;
-  if (db_raise(data)) return NULL;
-  Py_RETURN_FALSE;
+  return pyrv;
 }
 
 
 /**
- * Implementation of occupy.
+ * Common implementation of shift and shift_str.
  */
-static PyObject* db_occupy(DB_data* data, PyObject* pyargs) {
-  int32_t argc = PyTuple_Size(pyargs);
-  if (argc > 2) {
-    throwinvarg();
-    return NULL;
-  }
-  PyObject* pywritable = Py_None;
-  if (argc > 0) pywritable = PyTuple_GetItem(pyargs, 0);
-  PyObject* pyproc = Py_None;
-  if (argc > 1) pyproc = PyTuple_GetItem(pyargs, 1);
-  kc::PolyDB* db = data->db;
-  bool writable = PyObject_IsTrue(pywritable);
-  bool rv;
-  if (PyObject_IsInstance(pyproc, cls_fproc) || PyCallable_Check(pyproc)) {
-    if (data->pylock == Py_None) {
-      db->set_error(kc::PolyDB::Error::INVALID, "unsupported method");
-      if (db_raise(data)) return NULL;
-      Py_RETURN_NONE;
+static char* db_shift_impl(kc::PolyDB* db, size_t* ksp, const char** vbp, size_t* vsp) {
+  kc::PolyDB::Cursor cur(db);
+  if (!cur.jump()) return NULL;
+  class VisitorImpl : public kc::PolyDB::Visitor {
+  public:
+    explicit VisitorImpl() : kbuf_(NULL), ksiz_(0), vbuf_(NULL), vsiz_(0) {}
+    char* rv(size_t* ksp, const char** vbp, size_t* vsp) {
+      *ksp = ksiz_;
+      *vbp = vbuf_;
+      *vsp = vsiz_;
+      return kbuf_;
     }
-    SoftFileProcessor proc(pyproc);
-    NativeFunction nf(data);
-    rv = db->occupy(writable, &proc);
-    nf.cleanup();
-    PyObject* pyextype, *pyexvalue, *pyextrace;
-    if (proc.exception(&pyextype, &pyexvalue, &pyextrace)) {
-      PyErr_SetObject(pyextype, pyexvalue);
-      return NULL;
+  private:
+    const char* visit_full(const char* kbuf, size_t ksiz,
+                           const char* vbuf, size_t vsiz, size_t* sp) {
+      size_t rsiz = ksiz + 1 + vsiz + 1;
+      kbuf_ = new char[rsiz];
+      std::memcpy(kbuf_, kbuf, ksiz);
+      kbuf_[ksiz] = '\0';
+      ksiz_ = ksiz;
+      vbuf_ = kbuf_ + ksiz + 1;
+      std::memcpy(vbuf_, vbuf, vsiz);
+      vbuf_[vsiz] = '\0';
+      vsiz_ = vsiz;
+      return REMOVE;
     }
-  } else {
-    NativeFunction nf(data);
-    rv = db->occupy(writable, NULL);
-    nf.cleanup();
+    char* kbuf_;
+    size_t ksiz_;
+    char* vbuf_;
+    size_t vsiz_;
+  } visitor;
+  if (!cur.accept(&visitor, true, false)) {
+    *ksp = 0;
+    *vbp = NULL;
+    *vsp = 0;
+    return NULL;
   }
-  if (rv) Py_RETURN_TRUE;
-  if (db_raise(data)) return NULL;
-  Py_RETURN_FALSE;
+  return visitor.rv(ksp, vbp, vsp);
 }
 
 
 /**
- * Implementation of copy.
+ * Implementation of tune_exception_rule.
  */
-static PyObject* db_copy(DB_data* data, PyObject* pyargs) {
+static PyObject* db_tune_exception_rule(DB_data* data, PyObject* pyargs) {
   int32_t argc = PyTuple_Size(pyargs);
   if (argc != 1) {
     throwinvarg();
     return NULL;
   }
-  PyObject* pydest = PyTuple_GetItem(pyargs, 0);
+  PyObject* pycodes = PyTuple_GetItem(pyargs, 0);
+  if (!PySequence_Check(pycodes)) Py_RETURN_FALSE;
+  uint32_t exbits = 0;
+  int32_t num = PySequence_Length(pycodes);
+  for (int32_t i = 0; i < num; i++) {
+    PyObject* pycode = PySequence_GetItem(pycodes, i);
+    if (PyLong_Check(pycode)) {
+      uint32_t code = PyLong_AsLong(pycode);
+      if (code <= kc::PolyDB::Error::MISC) exbits |= 1 << code;
+    }
+    Py_DECREF(pycode);
+  }
+  data->exbits = exbits;
+  Py_RETURN_TRUE;
+}
+
+
+/**
+ * Implementation of __len__.
+ */
+static Py_ssize_t db_op_len(DB_data* data) {
   kc::PolyDB* db = data->db;
-  SoftString dest(pydest);
-  NativeFunction nf(data);
-  bool rv = db->copy(dest.ptr());
+  NativeFunction nf(data, "__len__");
+  int64_t count = db->count();
   nf.cleanup();
-  if (rv) Py_RETURN_TRUE;
-  if (db_raise(data)) return NULL;
-  Py_RETURN_FALSE;
+  return count;
 }
 
 
 /**
- * Implementation of begin_transaction.
+ * Implementation of __contains__.
  */
-static PyObject* db_begin_transaction(DB_data* data, PyObject* pyargs) {
-  int32_t argc = PyTuple_Size(pyargs);
-  if (argc > 1) {
-    throwinvarg();
-    return NULL;
+static int db_op_contains(DB_data* data, PyObject* pykey) {
+  kc::PolyDB* db = data->db;
+  SoftString key(pykey);
+  NativeFunction nf(data, "__contains__");
+  nf.set_key(key.ptr(), key.size());
+  int32_t vsiz = db->check(key.ptr(), key.size());
+  bool err = vsiz < 0 && db->error() != kc::PolyDB::Error::NOREC;
+  if (vsiz >= 0 && db_expired(data, key.ptr(), key.size())) vsiz = -1;
+  nf.cleanup();
+  if (err) {
+    if (!db_raise(data)) throwruntime("DB::check failed");
+    return -1;
+  }
+  data->counters.hits += vsiz >= 0 ? 1 : 0;
+  data->counters.misses += vsiz >= 0 ? 0 : 1;
+  return vsiz >= 0 ? 1 : 0;
+}
+
+
+/**
+ * Implementation of __getitem__.
+ */
+static PyObject* db_op_getitem(DB_data* data, PyObject* pykey) {
+  kc::PolyDB* db = data->db;
+  SoftString key(pykey);
+  NativeFunction nf(data, "__getitem__");
+  nf.set_key(key.ptr(), key.size());
+  size_t vsiz;
+  char* vbuf = db->get(key.ptr(), key.size(), &vsiz);
+  if (vbuf && db_expired(data, key.ptr(), key.size())) {
+    delete[] vbuf;
+    vbuf = NULL;
+  }
+  nf.cleanup();
+  data->counters.hits += vbuf ? 1 : 0;
+  data->counters.misses += vbuf ? 0 : 1;
+  PyObject* pyrv;
+  if (vbuf) {
+    pyrv = newbytes(vbuf, vsiz);
+    delete[] vbuf;
+  } else {
+    Py_INCREF(Py_None);
+    pyrv = Py_None;
   }
-  PyObject* pyhard = Py_None;
-  if (argc > 0) pyhard = PyTuple_GetItem(pyargs, 0);
+  return pyrv;
+}
+
+
+/**
+ * Implementation of __setitem__.
+ */
+static int db_op_setitem(DB_data* data, PyObject* pykey, PyObject* pyvalue) {
   kc::PolyDB* db = data->db;
-  bool hard = PyObject_IsTrue(pyhard);
-  bool err = false;
-  while (true) {
-    NativeFunction nf(data);
-    bool rv = db->begin_transaction_try(hard);
+  if (pyvalue) {
+    SoftString key(pykey);
+    SoftString value(pyvalue);
+    db_admit(data);
+    NativeFunction nf(data, "__setitem__");
+    nf.set_key(key.ptr(), key.size());
+    bool rv = db->set(key.ptr(), key.size(), value.ptr(), value.size());
+    if (rv) data->hub->notify(UpdateListener::USET, key.ptr(), key.size(),
+                              value.ptr(), value.size());
     nf.cleanup();
-    if (rv) break;
-    if (db->error() != kc::PolyDB::Error::LOGIC) {
-      err = true;
-      break;
-    }
-    threadyield();
-  }
-  if (err) {
-    if (db_raise(data)) return NULL;
-    Py_RETURN_FALSE;
+    if (rv) data->counters.writes++;
+    if (rv) return 0;
+    throwruntime("DB::set failed");
+    return -1;
+  } else {
+    SoftString key(pykey);
+    db_admit(data);
+    NativeFunction nf(data, "__setitem__");
+    nf.set_key(key.ptr(), key.size());
+    bool rv = db->remove(key.ptr(), key.size());
+    if (rv) data->hub->notify(UpdateListener::UREMOVE, key.ptr(), key.size());
+    nf.cleanup();
+    if (rv) data->counters.removes++;
+    if (rv) return 0;
+    throwruntime("DB::remove failed");
+    return -1;
   }
-  Py_RETURN_TRUE;
 }
 
 
 /**
- * Implementation of end_transaction.
+ * Implementation of __iter__.
  */
-static PyObject* db_end_transaction(DB_data* data, PyObject* pyargs) {
-  int32_t argc = PyTuple_Size(pyargs);
-  if (argc > 1) {
-    throwinvarg();
-    return NULL;
-  }
-  PyObject* pycommit = Py_None;
-  if (argc > 0) pycommit = PyTuple_GetItem(pyargs, 0);
-  kc::PolyDB* db = data->db;
-  bool commit = pycommit == Py_None || PyObject_IsTrue(pycommit);
-  NativeFunction nf(data);
-  bool rv = db->end_transaction(commit);
-  nf.cleanup();
-  if (rv) Py_RETURN_TRUE;
-  if (db_raise(data)) return NULL;
-  Py_RETURN_FALSE;
+static PyObject* db_op_iter(DB_data* data) {
+  PyObject* pycur = PyObject_CallMethod(mod_kc, (char*)"Cursor",
+                                        (char*)"(O)", (PyObject*)data);
+  PyObject* pyrv = PyObject_CallMethod(pycur, (char*)"jump", NULL);
+  if (pyrv) Py_DECREF(pyrv);
+  return pycur;
 }
 
 
 /**
- * Implementation of transaction.
+ * Implementation of process.
  */
-static PyObject* db_transaction(DB_data* data, PyObject* pyargs) {
+static PyObject* db_process(PyObject* cls, PyObject* pyargs) {
   int32_t argc = PyTuple_Size(pyargs);
-  if (argc < 1 || argc > 2) {
+  if (argc < 1 || argc > 4) {
     throwinvarg();
     return NULL;
   }
   PyObject* pyproc = PyTuple_GetItem(pyargs, 0);
-  PyObject* pyhard = Py_None;
-  if (argc > 1) pyhard = PyTuple_GetItem(pyargs, 1);
-  PyObject* pyrv = PyObject_CallMethod((PyObject*)data, (char*)"begin_transaction",
-                                       (char*)"(O)", pyhard);
-  if (!pyrv) return NULL;
+  if (!PyCallable_Check(pyproc)) {
+    throwinvarg();
+    return NULL;
+  }
+  PyObject* pypath = Py_None;
+  if (argc > 1) pypath = PyTuple_GetItem(pyargs, 1);
+  PyObject* pymode = Py_None;
+  if (argc > 2) pymode = PyTuple_GetItem(pyargs, 2);
+  PyObject* pyopts = Py_None;
+  if (argc > 3) pyopts = PyTuple_GetItem(pyargs, 3);
+  PyObject* pydb = PyObject_CallMethod(mod_kc, (char*)"DB", (char*)"(O)", pyopts);
+  if (!pydb) return NULL;
+  PyObject* pyrv = PyObject_CallMethod(pydb, (char*)"open", (char*)"(OO)", pypath, pymode);
   if (!PyObject_IsTrue(pyrv)) {
     Py_DECREF(pyrv);
-    Py_RETURN_FALSE;
+    PyObject* pyerr = PyObject_CallMethod(pydb, (char*)"error", NULL);
+    Py_DECREF(pydb);
+    return pyerr;
+  }
+  pyrv = PyObject_CallFunction(pyproc, (char*)"(O)", pydb);
+  if (!pyrv) {
+    Py_DECREF(pydb);
+    return NULL;
   }
   Py_DECREF(pyrv);
-  pyrv = PyObject_CallFunction(pyproc, NULL);
-  bool commit = false;
-  if (pyrv) commit = PyObject_IsTrue(pyrv);
-  Py_DECREF(pyrv);
-  pyrv = PyObject_CallMethod((PyObject*)data, (char*)"end_transaction",
-                             (char*)"(O)", commit ? Py_True : Py_False);
-  if (!pyrv) return NULL;
+  pyrv = PyObject_CallMethod(pydb, (char*)"close", NULL);
+  if (!pyrv) {
+    Py_DECREF(pydb);
+    return NULL;
+  }
   if (!PyObject_IsTrue(pyrv)) {
     Py_DECREF(pyrv);
-    Py_RETURN_FALSE;
+    PyObject* pyerr = PyObject_CallMethod(pydb, (char*)"error", NULL);
+    Py_DECREF(pydb);
+    return pyerr;
   }
   Py_DECREF(pyrv);
-  Py_RETURN_TRUE;
+  Py_DECREF(pydb);
+  Py_RETURN_NONE;
 }
 
 
 /**
- * Implementation of dump_snapshot.
+ * Define objects of the IndexedDB class.
  */
-static PyObject* db_dump_snapshot(DB_data* data, PyObject* pyargs) {
-  int32_t argc = PyTuple_Size(pyargs);
-  if (argc != 1) {
-    throwinvarg();
-    return NULL;
-  }
-  PyObject* pydest = PyTuple_GetItem(pyargs, 0);
-  kc::PolyDB* db = data->db;
-  SoftString dest(pydest);
-  NativeFunction nf(data);
-  bool rv = db->dump_snapshot(dest.ptr());
-  nf.cleanup();
-  if (rv) Py_RETURN_TRUE;
-  if (db_raise(data)) return NULL;
-  Py_RETURN_FALSE;
+static bool define_idb() {
+  static PyTypeObject type_idb = { PyVarObject_HEAD_INIT(NULL, 0) };
+  size_t zoff = offsetof(PyTypeObject, tp_name);
+  std::memset((char*)&type_idb + zoff, 0, sizeof(type_idb) - zoff);
+  type_idb.tp_name = "kyotocabinet.IndexedDB";
+  type_idb.tp_basicsize = sizeof(IndexedDB_data);
+  type_idb.tp_itemsize = 0;
+  type_idb.tp_flags = Py_TPFLAGS_DEFAULT | Py_TPFLAGS_BASETYPE;
+  type_idb.tp_doc = "Interface of database with secondary indexes.";
+  type_idb.tp_new = idb_new;
+  type_idb.tp_dealloc = (destructor)idb_dealloc;
+  type_idb.tp_init = (initproc)idb_init;
+  type_idb.tp_repr = (unaryfunc)idb_repr;
+  type_idb.tp_str = (unaryfunc)idb_str;
+  static PyMethodDef idb_methods[] = {
+    { "add_index", (PyCFunction)idb_add_index, METH_VARARGS,
+      "Register a secondary index." },
+    { "remove_index", (PyCFunction)idb_remove_index, METH_VARARGS,
+      "Unregister a secondary index." },
+    { "rebuild", (PyCFunction)idb_rebuild, METH_VARARGS,
+      "Rebuild secondary indexes from the primary database." },
+    { "set", (PyCFunction)idb_set, METH_VARARGS,
+      "Set the value of a record and update the indexes." },
+    { "remove", (PyCFunction)idb_remove, METH_VARARGS,
+      "Remove a record and update the indexes." },
+    { "lookup", (PyCFunction)idb_lookup, METH_VARARGS,
+      "Get records whose index key is equal to a key." },
+    { "range", (PyCFunction)idb_range, METH_VARARGS,
+      "Get records whose index key is in a range." },
+    { "db", (PyCFunction)idb_db, METH_NOARGS,
+      "Get the primary database object." },
+    { "index", (PyCFunction)idb_index, METH_VARARGS,
+      "Get the database object of a secondary index." },
+    { NULL, NULL, 0, NULL }
+  };
+  type_idb.tp_methods = idb_methods;
+  if (PyType_Ready(&type_idb) != 0) return false;
+  cls_idb = (PyObject*)&type_idb;
+  Py_INCREF(cls_idb);
+  if (PyModule_AddObject(mod_kc, "IndexedDB", cls_idb) != 0) return false;
+  return true;
 }
 
 
 /**
- * Implementation of load_snapshot.
+ * Implementation of new.
  */
-static PyObject* db_load_snapshot(DB_data* data, PyObject* pyargs) {
+static PyObject* idb_new(PyTypeObject* pytype, PyObject* pyargs, PyObject* pykwds) {
+  IndexedDB_data* data = (IndexedDB_data*)pytype->tp_alloc(pytype, 0);
+  if (!data) return NULL;
+  Py_INCREF(Py_None);
+  data->pydb = Py_None;
+  data->pyindexes = PyDict_New();
+  return (PyObject*)data;
+}
+
+
+/**
+ * Implementation of dealloc.
+ */
+static void idb_dealloc(IndexedDB_data* data) {
+  Py_DECREF(data->pyindexes);
+  Py_DECREF(data->pydb);
+  Py_TYPE(data)->tp_free((PyObject*)data);
+}
+
+
+/**
+ * Implementation of init.
+ */
+static int idb_init(IndexedDB_data* data, PyObject* pyargs, PyObject* pykwds) {
   int32_t argc = PyTuple_Size(pyargs);
   if (argc != 1) {
     throwinvarg();
-    return NULL;
+    return -1;
   }
-  PyObject* pysrc = PyTuple_GetItem(pyargs, 0);
-  kc::PolyDB* db = data->db;
-  SoftString src(pysrc);
-  NativeFunction nf(data);
-  bool rv = db->load_snapshot(src.ptr());
-  nf.cleanup();
-  if (rv) Py_RETURN_TRUE;
-  if (db_raise(data)) return NULL;
-  Py_RETURN_FALSE;
+  PyObject* pydb = PyTuple_GetItem(pyargs, 0);
+  if (!PyObject_IsInstance(pydb, cls_db)) {
+    throwinvarg();
+    return -1;
+  }
+  Py_INCREF(pydb);
+  Py_DECREF(data->pydb);
+  data->pydb = pydb;
+  return 0;
 }
 
 
 /**
- * Implementation of count.
+ * Implementation of repr.
  */
-static PyObject* db_count(DB_data* data) {
-  kc::PolyDB* db = data->db;
-  NativeFunction nf(data);
-  int64_t count = db->count();
+static PyObject* idb_repr(IndexedDB_data* data) {
+  PyObject* pydb = data->pydb;
+  if (pydb == Py_None) return newstring("<kyotocabinet.IndexedDB: (None)>");
+  NativeFunction nf((DB_data*)pydb);
+  std::string path = ((DB_data*)pydb)->db->path();
   nf.cleanup();
-  if (count < 0 && db_raise(data)) return NULL;
-  return PyLong_FromLongLong(count);
+  if (path.size() < 1) path = "(None)";
+  std::string str;
+  kc::strprintf(&str, "<kyotocabinet.IndexedDB: %s: %d>",
+                path.c_str(), (int)PyDict_Size(data->pyindexes));
+  return PyUnicode_FromString(str.c_str());
 }
 
 
 /**
- * Implementation of size.
+ * Implementation of str.
  */
-static PyObject* db_size(DB_data* data) {
-  kc::PolyDB* db = data->db;
-  NativeFunction nf(data);
-  int64_t size = db->size();
+static PyObject* idb_str(IndexedDB_data* data) {
+  PyObject* pydb = data->pydb;
+  if (pydb == Py_None) return newstring("(None)");
+  NativeFunction nf((DB_data*)pydb);
+  std::string path = ((DB_data*)pydb)->db->path();
   nf.cleanup();
-  if (size < 0 && db_raise(data)) return NULL;
-  return PyLong_FromLongLong(size);
+  if (path.size() < 1) path = "(None)";
+  return PyUnicode_FromString(path.c_str());
 }
 
 
 /**
- * Implementation of path.
+ * Check whether the primary database is specified.
  */
-static PyObject* db_path(DB_data* data) {
-  kc::PolyDB* db = data->db;
-  NativeFunction nf(data);
-  const std::string& path = db->path();
-  nf.cleanup();
-  if (path.size() < 1) {
-    if (db_raise(data)) return NULL;
-    Py_RETURN_NONE;
+static bool idb_check(IndexedDB_data* data) {
+  if (data->pydb != Py_None) return true;
+  throwinvarg();
+  return false;
+}
+
+
+/**
+ * Extract index keys of a record.
+ */
+static bool idb_extract(PyObject* pyext, const std::string& key,
+                        const char* vbuf, size_t vsiz, StringVector* ikeys) {
+  if (PyTuple_Check(pyext)) {
+    SoftString sep(PyTuple_GetItem(pyext, 1));
+    int64_t idx = pyatoi(PyTuple_GetItem(pyext, 2));
+    const char* rp = vbuf;
+    const char* ep = vbuf + vsiz;
+    while (idx > 0) {
+      const char* fp = sep.size() > 0 ? std::search(rp, ep, sep.ptr(), sep.ptr() + sep.size()) : ep;
+      if (fp >= ep) return true;
+      rp = fp + sep.size();
+      idx--;
+    }
+    const char* fp = sep.size() > 0 ? std::search(rp, ep, sep.ptr(), sep.ptr() + sep.size()) : ep;
+    ikeys->push_back(std::string(rp, fp - rp));
+    return true;
   }
-  return PyUnicode_FromString(path.c_str());
+  PyObject* pykey = newbytes(key.data(), key.size());
+  PyObject* pyvalue = newbytes(vbuf, vsiz);
+  PyObject* pyrv = PyObject_CallFunctionObjArgs(pyext, pykey, pyvalue, NULL);
+  Py_DECREF(pyvalue);
+  Py_DECREF(pykey);
+  if (!pyrv) return false;
+  if (PyList_Check(pyrv) || PyTuple_Check(pyrv)) {
+    int32_t num = PySequence_Length(pyrv);
+    for (int32_t i = 0; i < num; i++) {
+      PyObject* pyikey = PySequence_GetItem(pyrv, i);
+      if (pyikey != Py_None) {
+        SoftString ikey(pyikey);
+        ikeys->push_back(std::string(ikey.ptr(), ikey.size()));
+      }
+      Py_DECREF(pyikey);
+    }
+  } else if (pyrv != Py_None) {
+    SoftString ikey(pyrv);
+    ikeys->push_back(std::string(ikey.ptr(), ikey.size()));
+  }
+  Py_DECREF(pyrv);
+  return true;
+}
+
+
+/**
+ * Make the key of an index entry.
+ */
+static std::string idb_entry_key(const std::string& ikey, const std::string& key) {
+  std::string ekey = ikey;
+  ekey.append(1, '\0');
+  ekey.append(key);
+  return ekey;
+}
+
+
+/**
+ * Write or remove a record and update the indexes in transactions.
+ */
+static PyObject* idb_write(IndexedDB_data* data, PyObject* pykey, PyObject* pyvalue) {
+  DB_data* pdata = (DB_data*)data->pydb;
+  kc::PolyDB* pdb = pdata->db;
+  SoftString key(pykey);
+  std::string kstr(key.ptr(), key.size());
+  const char* vbuf = NULL;
+  size_t vsiz = 0;
+  SoftString* value = NULL;
+  if (pyvalue) {
+    value = new SoftString(pyvalue);
+    vbuf = value->ptr();
+    vsiz = value->size();
+  }
+  PyObject* pyidxs = PyDict_Values(data->pyindexes);
+  int32_t inum = PyList_Size(pyidxs);
+  std::vector<DB_data*> tdbs;
+  tdbs.push_back(pdata);
+  for (int32_t i = 0; i < inum; i++) {
+    DB_data* idata = (DB_data*)PyTuple_GetItem(PyList_GetItem(pyidxs, i), 0);
+    if (std::find(tdbs.begin(), tdbs.end(), idata) == tdbs.end()) tdbs.push_back(idata);
+  }
+  DB_data* edata = NULL;
+  bool pyerr = false;
+  db_admit(pdata);
+  std::vector<bool> joined(tdbs.size(), false);
+  size_t began = 0;
+  while (began < tdbs.size()) {
+    bool tjoined;
+    if (!db_begin_implicit(tdbs[began], &tjoined)) {
+      edata = tdbs[began];
+      break;
+    }
+    joined[began] = tjoined;
+    began++;
+  }
+  char* obuf = NULL;
+  size_t osiz = 0;
+  if (!edata) {
+    NativeFunction nf(pdata);
+    obuf = pdb->get(kstr.data(), kstr.size(), &osiz);
+    nf.cleanup();
+    if (!obuf && pdb->error() != kc::PolyDB::Error::NOREC) edata = pdata;
+  }
+  for (int32_t i = 0; !edata && !pyerr && i < inum; i++) {
+    PyObject* pyidx = PyList_GetItem(pyidxs, i);
+    DB_data* idata = (DB_data*)PyTuple_GetItem(pyidx, 0);
+    PyObject* pyext = PyTuple_GetItem(pyidx, 1);
+    StringVector okeys, nkeys;
+    if ((obuf && !idb_extract(pyext, kstr, obuf, osiz, &okeys)) ||
+        (vbuf && !idb_extract(pyext, kstr, vbuf, vsiz, &nkeys))) {
+      pyerr = true;
+      break;
+    }
+    kc::PolyDB* idb = idata->db;
+    NativeFunction nf(idata);
+    for (size_t j = 0; j < okeys.size(); j++) {
+      if (std::find(nkeys.begin(), nkeys.end(), okeys[j]) != nkeys.end()) continue;
+      std::string ekey = idb_entry_key(okeys[j], kstr);
+      if (!idb->remove(ekey.data(), ekey.size()) &&
+          idb->error() != kc::PolyDB::Error::NOREC) {
+        edata = idata;
+        break;
+      }
+    }
+    for (size_t j = 0; !edata && j < nkeys.size(); j++) {
+      std::string ekey = idb_entry_key(nkeys[j], kstr);
+      if (!idb->set(ekey.data(), ekey.size(), kstr.data(), kstr.size())) edata = idata;
+    }
+    nf.cleanup();
+  }
+  if (!edata && !pyerr) {
+    NativeFunction nf(pdata);
+    bool rv = vbuf ? pdb->set(kstr.data(), kstr.size(), vbuf, vsiz) :
+      pdb->remove(kstr.data(), kstr.size());
+    if (rv) pdata->hub->notify(vbuf ? UpdateListener::USET : UpdateListener::UREMOVE,
+                               kstr.data(), kstr.size(), vbuf, vsiz);
+    nf.cleanup();
+    if (!rv) edata = pdata;
+  }
+  PyObject* pyextype = NULL;
+  PyObject* pyexvalue = NULL;
+  PyObject* pyextrace = NULL;
+  if (pyerr) PyErr_Fetch(&pyextype, &pyexvalue, &pyextrace);
+  while (began > 0) {
+    began--;
+    if (joined[began]) continue;
+    DB_data* tdata = tdbs[began];
+    bool commit = !edata && !pyerr;
+    NativeFunction nf(tdata);
+    bool rv = tdata->db->end_transaction(commit);
+    if (!commit) tdata->hub->notify(UpdateListener::URESET, NULL, 0);
+    nf.cleanup();
+    if (!rv && !edata) edata = tdata;
+  }
+  if (pyerr) PyErr_Restore(pyextype, pyexvalue, pyextrace);
+  delete[] obuf;
+  delete value;
+  Py_DECREF(pyidxs);
+  if (pyerr) return NULL;
+  if (!edata) Py_RETURN_TRUE;
+  if (db_raise(edata)) return NULL;
+  Py_RETURN_FALSE;
+}
+
+
+/**
+ * Collect primary keys from an index.
+ */
+static bool idb_scan(DB_data* idata, const std::string* begin, const std::string* end,
+                     bool exact, int64_t max, StringVector* keys) {
+  kc::PolyDB* idb = idata->db;
+  NativeFunction nf(idata);
+  kc::PolyDB::Cursor* cur = idb->cursor();
+  std::string prefix;
+  if (begin) prefix = exact ? *begin + std::string(1, '\0') : *begin;
+  bool err = false;
+  if (begin ? cur->jump(prefix) : cur->jump()) {
+    while (max < 0 || (int64_t)keys->size() < max) {
+      size_t ksiz;
+      const char* vbuf;
+      size_t vsiz;
+      char* kbuf = cur->get(&ksiz, &vbuf, &vsiz, true);
+      if (!kbuf) {
+        if (cur->error() != kc::PolyDB::Error::NOREC) err = true;
+        break;
+      }
+      bool hit = ksiz > vsiz;
+      size_t isiz = hit ? ksiz - vsiz - 1 : 0;
+      if (exact) {
+        if (ksiz < prefix.size() || std::memcmp(kbuf, prefix.data(), prefix.size())) {
+          delete[] kbuf;
+          break;
+        }
+        hit = hit && isiz == begin->size();
+      } else if (end && hit && std::string(kbuf, isiz) >= *end) {
+        delete[] kbuf;
+        break;
+      }
+      if (hit) keys->push_back(std::string(vbuf, vsiz));
+      delete[] kbuf;
+    }
+  } else if (cur->error() != kc::PolyDB::Error::NOREC) {
+    err = true;
+  }
+  delete cur;
+  nf.cleanup();
+  return !err;
 }
 
 
 /**
- * Implementation of status.
+ * Retrieve primary records of keys collected from an index.
  */
-static PyObject* db_status(DB_data* data) {
-  kc::PolyDB* db = data->db;
-  StringMap status;
-  NativeFunction nf(data);
-  bool rv = db->status(&status);
+static PyObject* idb_fetch(IndexedDB_data* data, const StringVector& keys) {
+  DB_data* pdata = (DB_data*)data->pydb;
+  kc::PolyDB* pdb = pdata->db;
+  NativeFunction nf(pdata);
+  StringMap recs;
+  int64_t rv = pdb->get_bulk(keys, &recs, false);
   nf.cleanup();
-  if (rv) return maptopymap(&status);
-  if (db_raise(data)) return NULL;
-  Py_RETURN_NONE;
+  if (rv < 0) {
+    if (db_raise(pdata)) return NULL;
+    Py_RETURN_NONE;
+  }
+  PyObject* pyrecs = PyDict_New();
+  StringMap::const_iterator it = recs.begin();
+  StringMap::const_iterator itend = recs.end();
+  while (it != itend) {
+    PyObject* pykey = newbytes(it->first.data(), it->first.size());
+    PyObject* pyvalue = newbytes(it->second.data(), it->second.size());
+    PyDict_SetItem(pyrecs, pykey, pyvalue);
+    Py_DECREF(pyvalue);
+    Py_DECREF(pykey);
+    it++;
+  }
+  return pyrecs;
 }
 
 
 /**
- * Implementation of match_prefix.
+ * Implementation of add_index.
  */
-static PyObject* db_match_prefix(DB_data* data, PyObject* pyargs) {
+static PyObject* idb_add_index(IndexedDB_data* data, PyObject* pyargs) {
   int32_t argc = PyTuple_Size(pyargs);
-  if (argc < 1 || argc > 2) {
+  if (argc != 3) {
     throwinvarg();
     return NULL;
   }
-  kc::PolyDB* db = data->db;
-  PyObject* pyprefix = PyTuple_GetItem(pyargs, 0);
-  SoftString prefix(pyprefix);
-  PyObject* pymax = Py_None;
-  if (argc > 1) pymax = PyTuple_GetItem(pyargs, 1);
-  int64_t max = pymax == Py_None ? -1 : pyatoi(pymax);
-  PyObject* pyrv;
-  NativeFunction nf(data);
-  StringVector keys;
-  max = db->match_prefix(std::string(prefix.ptr(), prefix.size()), &keys, max);
-  nf.cleanup();
-  if (max >= 0) {
-    pyrv = vectortopylist(&keys);
-  } else {
-    if (db_raise(data)) return NULL;
-    Py_INCREF(Py_None);
-    pyrv = Py_None;
+  PyObject* pyname = PyTuple_GetItem(pyargs, 0);
+  PyObject* pyidxdb = PyTuple_GetItem(pyargs, 1);
+  PyObject* pyext = PyTuple_GetItem(pyargs, 2);
+  if (!PyObject_IsInstance(pyidxdb, cls_db) || pyidxdb == data->pydb ||
+      !db_ordered(((DB_data*)pyidxdb)->db)) {
+    throwinvarg();
+    return NULL;
   }
-  return pyrv;
+  if (PyTuple_Check(pyext)) {
+    if (PyTuple_Size(pyext) != 3) {
+      throwinvarg();
+      return NULL;
+    }
+    SoftString kind(PyTuple_GetItem(pyext, 0));
+    if (std::strcmp(kind.ptr(), "field")) {
+      throwinvarg();
+      return NULL;
+    }
+  } else if (!PyCallable_Check(pyext)) {
+    throwinvarg();
+    return NULL;
+  }
+  PyObject* pyidx = PyTuple_Pack(2, pyidxdb, pyext);
+  int rv = PyDict_SetItem(data->pyindexes, pyname, pyidx);
+  Py_DECREF(pyidx);
+  if (rv != 0) return NULL;
+  Py_RETURN_TRUE;
 }
 
 
 /**
- * Implementation of match_regex.
+ * Implementation of remove_index.
  */
-static PyObject* db_match_regex(DB_data* data, PyObject* pyargs) {
+static PyObject* idb_remove_index(IndexedDB_data* data, PyObject* pyargs) {
   int32_t argc = PyTuple_Size(pyargs);
-  if (argc < 1 || argc > 2) {
+  if (argc != 1) {
     throwinvarg();
     return NULL;
   }
-  kc::PolyDB* db = data->db;
-  PyObject* pyregex = PyTuple_GetItem(pyargs, 0);
-  SoftString regex(pyregex);
-  PyObject* pymax = Py_None;
-  if (argc > 1) pymax = PyTuple_GetItem(pyargs, 1);
-  int64_t max = pymax == Py_None ? -1 : pyatoi(pymax);
-  PyObject* pyrv;
-  NativeFunction nf(data);
-  StringVector keys;
-  max = db->match_regex(std::string(regex.ptr(), regex.size()), &keys, max);
-  nf.cleanup();
-  if (max >= 0) {
-    pyrv = vectortopylist(&keys);
-  } else {
-    if (db_raise(data)) return NULL;
-    Py_INCREF(Py_None);
-    pyrv = Py_None;
-  }
-  return pyrv;
+  PyObject* pyname = PyTuple_GetItem(pyargs, 0);
+  if (!PyDict_GetItem(data->pyindexes, pyname)) Py_RETURN_FALSE;
+  if (PyDict_DelItem(data->pyindexes, pyname) != 0) return NULL;
+  Py_RETURN_TRUE;
 }
 
 
 /**
- * Implementation of match_similar.
+ * Implementation of rebuild.
  */
-static PyObject* db_match_similar(DB_data* data, PyObject* pyargs) {
+static PyObject* idb_rebuild(IndexedDB_data* data, PyObject* pyargs) {
   int32_t argc = PyTuple_Size(pyargs);
-  if (argc < 1 || argc > 4) {
+  if (argc > 1) {
     throwinvarg();
     return NULL;
   }
-  kc::PolyDB* db = data->db;
-  PyObject* pyorigin = PyTuple_GetItem(pyargs, 0);
-  SoftString origin(pyorigin);
-  PyObject* pyrange = Py_None;
-  if (argc > 1) pyrange = PyTuple_GetItem(pyargs, 1);
-  int64_t range = pyrange == Py_None ? 1 : pyatoi(pyrange);
-  PyObject* pyutf = Py_None;
-  if (argc > 2) pyutf = PyTuple_GetItem(pyargs, 2);
-  bool utf = PyObject_IsTrue(pyutf);
-  PyObject* pymax = Py_None;
-  if (argc > 3) pymax = PyTuple_GetItem(pyargs, 3);
-  int64_t max = pymax == Py_None ? -1 : pyatoi(pymax);
-  PyObject* pyrv;
-  NativeFunction nf(data);
-  StringVector keys;
-  max = db->match_similar(std::string(origin.ptr(), origin.size()), range, utf, &keys, max);
-  nf.cleanup();
-  if (max >= 0) {
-    pyrv = vectortopylist(&keys);
+  PyObject* pyname = Py_None;
+  if (argc > 0) pyname = PyTuple_GetItem(pyargs, 0);
+  if (!idb_check(data)) return NULL;
+  PyObject* pyidxs;
+  if (pyname == Py_None) {
+    pyidxs = PyDict_Values(data->pyindexes);
   } else {
-    if (db_raise(data)) return NULL;
-    Py_INCREF(Py_None);
-    pyrv = Py_None;
-  }
-  return pyrv;
+    PyObject* pyidx = PyDict_GetItem(data->pyindexes, pyname);
+    if (!pyidx) {
+      throwinvarg();
+      return NULL;
+    }
+    pyidxs = PyList_New(1);
+    Py_INCREF(pyidx);
+    PyList_SET_ITEM(pyidxs, 0, pyidx);
+  }
+  DB_data* pdata = (DB_data*)data->pydb;
+  kc::PolyDB* pdb = pdata->db;
+  int32_t inum = PyList_Size(pyidxs);
+  DB_data* edata = NULL;
+  bool pyerr = false;
+  for (int32_t i = 0; !edata && !pyerr && i < inum; i++) {
+    PyObject* pyidx = PyList_GetItem(pyidxs, i);
+    DB_data* idata = (DB_data*)PyTuple_GetItem(pyidx, 0);
+    PyObject* pyext = PyTuple_GetItem(pyidx, 1);
+    kc::PolyDB* idb = idata->db;
+    NativeFunction nf(idata);
+    bool rv = idb->clear();
+    nf.cleanup();
+    if (!rv) {
+      edata = idata;
+      break;
+    }
+    NativeFunction nfc(pdata);
+    kc::PolyDB::Cursor* cur = pdb->cursor();
+    rv = cur->jump();
+    nfc.cleanup();
+    if (!rv && pdb->error() != kc::PolyDB::Error::NOREC) edata = pdata;
+    while (rv && !edata) {
+      NativeFunction nfp(pdata);
+      size_t ksiz;
+      const char* vbuf;
+      size_t vsiz;
+      char* kbuf = cur->get(&ksiz, &vbuf, &vsiz, true);
+      nfp.cleanup();
+      if (!kbuf) {
+        if (cur->error() != kc::PolyDB::Error::NOREC) edata = pdata;
+        break;
+      }
+      std::string kstr(kbuf, ksiz);
+      StringVector ikeys;
+      if (!idb_extract(pyext, kstr, vbuf, vsiz, &ikeys)) {
+        delete[] kbuf;
+        pyerr = true;
+        break;
+      }
+      delete[] kbuf;
+      NativeFunction nfi(idata);
+      for (size_t j = 0; j < ikeys.size(); j++) {
+        std::string ekey = idb_entry_key(ikeys[j], kstr);
+        if (!idb->set(ekey.data(), ekey.size(), kstr.data(), kstr.size())) {
+          edata = idata;
+          break;
+        }
+      }
+      nfi.cleanup();
+    }
+    PyObject* pyextype = NULL;
+    PyObject* pyexvalue = NULL;
+    PyObject* pyextrace = NULL;
+    if (pyerr) PyErr_Fetch(&pyextype, &pyexvalue, &pyextrace);
+    NativeFunction nfd(pdata);
+    delete cur;
+    nfd.cleanup();
+    if (pyerr) PyErr_Restore(pyextype, pyexvalue, pyextrace);
+  }
+  Py_DECREF(pyidxs);
+  if (pyerr) return NULL;
+  if (!edata) Py_RETURN_TRUE;
+  if (db_raise(edata)) return NULL;
+  Py_RETURN_FALSE;
 }
 
 
 /**
- * Implementation of merge.
+ * Implementation of set.
  */
-static PyObject* db_merge(DB_data* data, PyObject* pyargs) {
+static PyObject* idb_set(IndexedDB_data* data, PyObject* pyargs) {
   int32_t argc = PyTuple_Size(pyargs);
-  if (argc < 1 || argc > 2) {
+  if (argc != 2) {
     throwinvarg();
     return NULL;
   }
-  PyObject* pysrcary = PyTuple_GetItem(pyargs, 0);
-  if (!PySequence_Check(pysrcary)) {
+  if (!idb_check(data)) return NULL;
+  PyObject* pykey = PyTuple_GetItem(pyargs, 0);
+  PyObject* pyvalue = PyTuple_GetItem(pyargs, 1);
+  return idb_write(data, pykey, pyvalue);
+}
+
+
+/**
+ * Implementation of remove.
+ */
+static PyObject* idb_remove(IndexedDB_data* data, PyObject* pyargs) {
+  int32_t argc = PyTuple_Size(pyargs);
+  if (argc != 1) {
     throwinvarg();
     return NULL;
   }
-  PyObject* pymode = Py_None;
-  if (argc > 1) pymode = PyTuple_GetItem(pyargs, 1);
-  uint32_t mode = PyLong_Check(pymode) ? (uint32_t)PyLong_AsLong(pymode) :
-    kc::PolyDB::OWRITER | kc::PolyDB::OCREATE;
-  kc::PolyDB* db = data->db;
-  int32_t num = PySequence_Length(pysrcary);
-  if (num < 1) Py_RETURN_TRUE;
-  kc::BasicDB** srcary = new kc::BasicDB*[num];
-  size_t srcnum = 0;
-  for (int32_t i = 0; i < num; i++) {
-    PyObject* pysrcdb = PySequence_GetItem(pysrcary, i);
-    if (PyObject_IsInstance(pysrcdb, cls_db)) {
-      DB_data* srcdbdata = (DB_data*)pysrcdb;
-      srcary[srcnum++] = srcdbdata->db;
-    }
-    Py_DECREF(pysrcdb);
-  }
-  NativeFunction nf(data);
-  bool rv = db->merge(srcary, srcnum, (kc::PolyDB::MergeMode)mode);
-  nf.cleanup();
-  delete[] srcary;
-  if (rv) Py_RETURN_TRUE;
-  if (db_raise(data)) return NULL;
-  Py_RETURN_FALSE;
+  if (!idb_check(data)) return NULL;
+  PyObject* pykey = PyTuple_GetItem(pyargs, 0);
+  return idb_write(data, pykey, NULL);
 }
 
 
 /**
- * Implementation of cursor.
+ * Implementation of lookup.
  */
-static PyObject* db_cursor(DB_data* data) {
-  PyObject* pycur = PyObject_CallMethod(mod_kc, (char*)"Cursor",
-                                        (char*)"(O)", (PyObject*)data);
-  return pycur;
+static PyObject* idb_lookup(IndexedDB_data* data, PyObject* pyargs) {
+  int32_t argc = PyTuple_Size(pyargs);
+  if (argc < 2 || argc > 3) {
+    throwinvarg();
+    return NULL;
+  }
+  PyObject* pyname = PyTuple_GetItem(pyargs, 0);
+  PyObject* pyikey = PyTuple_GetItem(pyargs, 1);
+  PyObject* pymax = Py_None;
+  if (argc > 2) pymax = PyTuple_GetItem(pyargs, 2);
+  if (!idb_check(data)) return NULL;
+  PyObject* pyidx = PyDict_GetItem(data->pyindexes, pyname);
+  if (!pyidx) {
+    throwinvarg();
+    return NULL;
+  }
+  DB_data* idata = (DB_data*)PyTuple_GetItem(pyidx, 0);
+  SoftString ikey(pyikey);
+  std::string istr(ikey.ptr(), ikey.size());
+  int64_t max = pymax == Py_None ? -1 : pyatoi(pymax);
+  StringVector keys;
+  if (!idb_scan(idata, &istr, NULL, true, max, &keys)) {
+    if (db_raise(idata)) return NULL;
+    Py_RETURN_NONE;
+  }
+  return idb_fetch(data, keys);
 }
 
 
 /**
- * Implementation of cursor_process.
+ * Implementation of range.
  */
-static PyObject* db_cursor_process(DB_data* data, PyObject* pyargs) {
+static PyObject* idb_range(IndexedDB_data* data, PyObject* pyargs) {
   int32_t argc = PyTuple_Size(pyargs);
-  if (argc != 1) {
+  if (argc < 1 || argc > 4) {
     throwinvarg();
     return NULL;
   }
-  PyObject* pyproc = PyTuple_GetItem(pyargs, 0);
-  if (!PyCallable_Check(pyproc)) {
+  PyObject* pyname = PyTuple_GetItem(pyargs, 0);
+  PyObject* pybegin = Py_None;
+  if (argc > 1) pybegin = PyTuple_GetItem(pyargs, 1);
+  PyObject* pyend = Py_None;
+  if (argc > 2) pyend = PyTuple_GetItem(pyargs, 2);
+  PyObject* pymax = Py_None;
+  if (argc > 3) pymax = PyTuple_GetItem(pyargs, 3);
+  if (!idb_check(data)) return NULL;
+  PyObject* pyidx = PyDict_GetItem(data->pyindexes, pyname);
+  if (!pyidx) {
     throwinvarg();
     return NULL;
   }
-  PyObject* pycur = PyObject_CallMethod(mod_kc, (char*)"Cursor",
-                                        (char*)"(O)", (PyObject*)data);
-  if (!pycur) return NULL;
-  PyObject* pyrv = PyObject_CallFunction(pyproc, (char*)"(O)", pycur);
-  if (!pyrv) {
-    Py_DECREF(pycur);
-    return NULL;
+  DB_data* idata = (DB_data*)PyTuple_GetItem(pyidx, 0);
+  std::string begin, end;
+  if (pybegin != Py_None) {
+    SoftString bstr(pybegin);
+    begin.append(bstr.ptr(), bstr.size());
   }
-  Py_DECREF(pyrv);
-  pyrv = PyObject_CallMethod(pycur, (char*)"disable", NULL);
-  if (!pyrv) {
-    Py_DECREF(pycur);
-    return NULL;
+  if (pyend != Py_None) {
+    SoftString estr(pyend);
+    end.append(estr.ptr(), estr.size());
   }
-  Py_DECREF(pyrv);
-  Py_DECREF(pycur);
-  Py_RETURN_NONE;
+  int64_t max = pymax == Py_None ? -1 : pyatoi(pymax);
+  StringVector keys;
+  if (!idb_scan(idata, pybegin == Py_None ? NULL : &begin, pyend == Py_None ? NULL : &end,
+                false, max, &keys)) {
+    if (db_raise(idata)) return NULL;
+    Py_RETURN_NONE;
+  }
+  return idb_fetch(data, keys);
 }
 
 
 /**
- * Implementation of shift.
+ * Implementation of db.
  */
-static PyObject* db_shift(DB_data* data) {
-  kc::PolyDB* db = data->db;
-  NativeFunction nf(data);
-  char* kbuf;
-  const char* vbuf;
-  size_t ksiz, vsiz;
-  kbuf = db_shift_impl(db, &ksiz, &vbuf, &vsiz);
-  nf.cleanup();
-  PyObject* pyrv;
-  if (kbuf) {
-    pyrv = PyTuple_New(2);
-    PyObject* pykey = newbytes(kbuf, ksiz);
-    PyObject* pyvalue = newbytes(vbuf, vsiz);
-    PyTuple_SetItem(pyrv, 0, pykey);
-    PyTuple_SetItem(pyrv, 1, pyvalue);
-    delete[] kbuf;
-  } else {
-    if (db_raise(data)) return NULL;
-    Py_INCREF(Py_None);
-    pyrv = Py_None;
-  }
-  return pyrv;
+static PyObject* idb_db(IndexedDB_data* data) {
+  Py_INCREF(data->pydb);
+  return data->pydb;
 }
 
 
 /**
- * Implementation of shift_str.
+ * Implementation of index.
  */
-static PyObject* db_shift_str(DB_data* data) {
-  kc::PolyDB* db = data->db;
-  NativeFunction nf(data);
-  char* kbuf;
-  const char* vbuf;
-  size_t ksiz, vsiz;
-  kbuf = db_shift_impl(db, &ksiz, &vbuf, &vsiz);
-  nf.cleanup();
-  PyObject* pyrv;
-  if (kbuf) {
-    pyrv = PyTuple_New(2);
-    PyObject* pykey = newstring(kbuf);
-    PyObject* pyvalue = newstring(vbuf);
-    PyTuple_SetItem(pyrv, 0, pykey);
-    PyTuple_SetItem(pyrv, 1, pyvalue);
-    delete[] kbuf;
-  } else {
-    if (db_raise(data)) return NULL;
-    Py_INCREF(Py_None);
-    pyrv = Py_None;
+static PyObject* idb_index(IndexedDB_data* data, PyObject* pyargs) {
+  int32_t argc = PyTuple_Size(pyargs);
+  if (argc != 1) {
+    throwinvarg();
+    return NULL;
   }
-  return pyrv;
+  PyObject* pyname = PyTuple_GetItem(pyargs, 0);
+  PyObject* pyidx = PyDict_GetItem(data->pyindexes, pyname);
+  if (!pyidx) Py_RETURN_NONE;
+  PyObject* pyidxdb = PyTuple_GetItem(pyidx, 0);
+  Py_INCREF(pyidxdb);
+  return pyidxdb;
 }
 
 
 /**
- * Common implementation of shift and shift_str.
+ * Define objects of the TreeBuilder class.
  */
-static char* db_shift_impl(kc::PolyDB* db, size_t* ksp, const char** vbp, size_t* vsp) {
-  kc::PolyDB::Cursor cur(db);
-  if (!cur.jump()) return NULL;
-  class VisitorImpl : public kc::PolyDB::Visitor {
-  public:
-    explicit VisitorImpl() : kbuf_(NULL), ksiz_(0), vbuf_(NULL), vsiz_(0) {}
-    char* rv(size_t* ksp, const char** vbp, size_t* vsp) {
-      *ksp = ksiz_;
-      *vbp = vbuf_;
-      *vsp = vsiz_;
-      return kbuf_;
-    }
-  private:
-    const char* visit_full(const char* kbuf, size_t ksiz,
-                           const char* vbuf, size_t vsiz, size_t* sp) {
-      size_t rsiz = ksiz + 1 + vsiz + 1;
-      kbuf_ = new char[rsiz];
-      std::memcpy(kbuf_, kbuf, ksiz);
-      kbuf_[ksiz] = '\0';
-      ksiz_ = ksiz;
-      vbuf_ = kbuf_ + ksiz + 1;
-      std::memcpy(vbuf_, vbuf, vsiz);
-      vbuf_[vsiz] = '\0';
-      vsiz_ = vsiz;
-      return REMOVE;
-    }
-    char* kbuf_;
-    size_t ksiz_;
-    char* vbuf_;
-    size_t vsiz_;
-  } visitor;
-  if (!cur.accept(&visitor, true, false)) {
-    *ksp = 0;
-    *vbp = NULL;
-    *vsp = 0;
-    return NULL;
-  }
-  return visitor.rv(ksp, vbp, vsp);
+static bool define_tb() {
+  static PyTypeObject type_tb = { PyVarObject_HEAD_INIT(NULL, 0) };
+  size_t zoff = offsetof(PyTypeObject, tp_name);
+  std::memset((char*)&type_tb + zoff, 0, sizeof(type_tb) - zoff);
+  type_tb.tp_name = "kyotocabinet.TreeBuilder";
+  type_tb.tp_basicsize = sizeof(TreeBuilder_data);
+  type_tb.tp_itemsize = 0;
+  type_tb.tp_flags = Py_TPFLAGS_DEFAULT;
+  type_tb.tp_doc = "Interface of bulk builder of a database from unsorted records.";
+  type_tb.tp_new = tb_new;
+  type_tb.tp_dealloc = (destructor)tb_dealloc;
+  type_tb.tp_init = (initproc)tb_init;
+  type_tb.tp_repr = (unaryfunc)tb_repr;
+  type_tb.tp_str = (unaryfunc)tb_str;
+  static PyMethodDef tb_methods[] = {
+    { "add", (PyCFunction)tb_add, METH_VARARGS,
+      "Add a record." },
+    { "add_bulk", (PyCFunction)tb_add_bulk, METH_VARARGS,
+      "Add multiple records at once." },
+    { "add_db", (PyCFunction)tb_add_db, METH_VARARGS,
+      "Add all records of a database." },
+    { "finish", (PyCFunction)tb_finish, METH_NOARGS,
+      "Merge the added records into the database." },
+    { "status", (PyCFunction)tb_status, METH_NOARGS,
+      "Get the miscellaneous status information." },
+    { "db", (PyCFunction)tb_db, METH_NOARGS,
+      "Get the destination database object." },
+    { NULL, NULL, 0, NULL }
+  };
+  type_tb.tp_methods = tb_methods;
+  if (PyType_Ready(&type_tb) != 0) return false;
+  cls_tb = (PyObject*)&type_tb;
+  Py_INCREF(cls_tb);
+  if (PyModule_AddObject(mod_kc, "TreeBuilder", cls_tb) != 0) return false;
+  return true;
 }
 
 
 /**
- * Implementation of tune_exception_rule.
+ * Implementation of new.
  */
-static PyObject* db_tune_exception_rule(DB_data* data, PyObject* pyargs) {
+static PyObject* tb_new(PyTypeObject* pytype, PyObject* pyargs, PyObject* pykwds) {
+  TreeBuilder_data* data = (TreeBuilder_data*)pytype->tp_alloc(pytype, 0);
+  if (!data) return NULL;
+  data->sorter = NULL;
+  Py_INCREF(Py_None);
+  data->pydb = Py_None;
+  return (PyObject*)data;
+}
+
+
+/**
+ * Implementation of dealloc.
+ */
+static void tb_dealloc(TreeBuilder_data* data) {
+  delete data->sorter;
+  Py_DECREF(data->pydb);
+  Py_TYPE(data)->tp_free((PyObject*)data);
+}
+
+
+/**
+ * Implementation of init.
+ */
+static int tb_init(TreeBuilder_data* data, PyObject* pyargs, PyObject* pykwds) {
   int32_t argc = PyTuple_Size(pyargs);
-  if (argc != 1) {
+  if (argc < 1 || argc > 3) {
     throwinvarg();
-    return NULL;
+    return -1;
   }
-  PyObject* pycodes = PyTuple_GetItem(pyargs, 0);
-  if (!PySequence_Check(pycodes)) Py_RETURN_FALSE;
-  uint32_t exbits = 0;
-  int32_t num = PySequence_Length(pycodes);
-  for (int32_t i = 0; i < num; i++) {
-    PyObject* pycode = PySequence_GetItem(pycodes, i);
-    if (PyLong_Check(pycode)) {
-      uint32_t code = PyLong_AsLong(pycode);
-      if (code <= kc::PolyDB::Error::MISC) exbits |= 1 << code;
-    }
-    Py_DECREF(pycode);
+  PyObject* pydb = PyTuple_GetItem(pyargs, 0);
+  if (!PyObject_IsInstance(pydb, cls_db)) {
+    throwinvarg();
+    return -1;
   }
-  data->exbits = exbits;
-  Py_RETURN_TRUE;
+  PyObject* pybudget = Py_None;
+  if (argc > 1) pybudget = PyTuple_GetItem(pyargs, 1);
+  PyObject* pytmpdir = Py_None;
+  if (argc > 2) pytmpdir = PyTuple_GetItem(pyargs, 2);
+  int64_t budget = 1LL << 26;
+  if (PyUnicode_Check(pybudget) || PyBytes_Check(pybudget)) {
+    SoftString bstr(pybudget);
+    budget = kc::atoix(bstr.ptr());
+  } else if (pybudget != Py_None) {
+    budget = pyatoi(pybudget);
+  }
+  if (budget < 1) {
+    throwinvarg();
+    return -1;
+  }
+  std::string tmpdir;
+  if (pytmpdir == Py_None) {
+    PyObject* pymod = PyImport_ImportModule("tempfile");
+    if (!pymod) return -1;
+    PyObject* pyrv = PyObject_CallMethod(pymod, (char*)"gettempdir", NULL);
+    Py_DECREF(pymod);
+    if (!pyrv) return -1;
+    SoftString dir(pyrv);
+    tmpdir.assign(dir.ptr(), dir.size());
+    Py_DECREF(pyrv);
+  } else {
+    SoftString dir(pytmpdir);
+    tmpdir.assign(dir.ptr(), dir.size());
+  }
+  delete data->sorter;
+  data->sorter = new ExternalSorter(tmpdir, budget);
+  Py_INCREF(pydb);
+  Py_DECREF(data->pydb);
+  data->pydb = pydb;
+  return 0;
 }
 
 
 /**
- * Implementation of __len__.
+ * Implementation of repr.
  */
-static Py_ssize_t db_op_len(DB_data* data) {
-  kc::PolyDB* db = data->db;
-  NativeFunction nf(data);
-  int64_t count = db->count();
+static PyObject* tb_repr(TreeBuilder_data* data) {
+  PyObject* pydb = data->pydb;
+  if (pydb == Py_None) return newstring("<kyotocabinet.TreeBuilder: (None)>");
+  NativeFunction nf((DB_data*)pydb);
+  std::string path = ((DB_data*)pydb)->db->path();
   nf.cleanup();
-  return count;
+  if (path.size() < 1) path = "(None)";
+  std::string str;
+  kc::strprintf(&str, "<kyotocabinet.TreeBuilder: %s>", path.c_str());
+  return PyUnicode_FromString(str.c_str());
 }
 
 
 /**
- * Implementation of __getitem__.
+ * Implementation of str.
  */
-static PyObject* db_op_getitem(DB_data* data, PyObject* pykey) {
-  kc::PolyDB* db = data->db;
-  SoftString key(pykey);
-  NativeFunction nf(data);
-  size_t vsiz;
-  char* vbuf = db->get(key.ptr(), key.size(), &vsiz);
+static PyObject* tb_str(TreeBuilder_data* data) {
+  PyObject* pydb = data->pydb;
+  if (pydb == Py_None) return newstring("(None)");
+  NativeFunction nf((DB_data*)pydb);
+  std::string path = ((DB_data*)pydb)->db->path();
   nf.cleanup();
-  PyObject* pyrv;
-  if (vbuf) {
-    pyrv = newbytes(vbuf, vsiz);
-    delete[] vbuf;
-  } else {
-    Py_INCREF(Py_None);
-    pyrv = Py_None;
-  }
-  return pyrv;
+  if (path.size() < 1) path = "(None)";
+  return PyUnicode_FromString(path.c_str());
 }
 
 
 /**
- * Implementation of __setitem__.
+ * Check whether the builder is usable.
  */
-static int db_op_setitem(DB_data* data, PyObject* pykey, PyObject* pyvalue) {
-  kc::PolyDB* db = data->db;
-  if (pyvalue) {
-    SoftString key(pykey);
-    SoftString value(pyvalue);
-    NativeFunction nf(data);
-    bool rv = db->set(key.ptr(), key.size(), value.ptr(), value.size());
-    nf.cleanup();
-    if (rv) return 0;
-    throwruntime("DB::set failed");
-    return -1;
-  } else {
-    SoftString key(pykey);
-    NativeFunction nf(data);
-    bool rv = db->remove(key.ptr(), key.size());
-    nf.cleanup();
-    if (rv) return 0;
-    throwruntime("DB::remove failed");
-    return -1;
-  }
+static bool tb_check(TreeBuilder_data* data) {
+  if (data->sorter) return true;
+  PyErr_SetString(PyExc_ValueError, "operation on a finished builder");
+  return false;
 }
 
 
 /**
- * Implementation of __iter__.
+ * Add a record and spill the buffered records if they exceed the budget.
  */
-static PyObject* db_op_iter(DB_data* data) {
-  PyObject* pycur = PyObject_CallMethod(mod_kc, (char*)"Cursor",
-                                        (char*)"(O)", (PyObject*)data);
-  PyObject* pyrv = PyObject_CallMethod(pycur, (char*)"jump", NULL);
-  if (pyrv) Py_DECREF(pyrv);
-  return pycur;
+static bool tb_append(TreeBuilder_data* data, PyObject* pykey, PyObject* pyvalue) {
+  ExternalSorter* sorter = data->sorter;
+  SoftString key(pykey);
+  SoftString value(pyvalue);
+  sorter->append(key.ptr(), key.size(), value.ptr(), value.size());
+  if (!sorter->full()) return true;
+  DB_data* dbdata = (DB_data*)data->pydb;
+  NativeFunction nf(dbdata);
+  bool rv = sorter->spill();
+  kc::PolyDB::Error::Code code;
+  std::string message;
+  if (!rv && sorter->error(&code, &message)) dbdata->db->set_error(code, message.c_str());
+  nf.cleanup();
+  return rv;
 }
 
 
 /**
- * Implementation of process.
+ * Implementation of add.
  */
-static PyObject* db_process(PyObject* cls, PyObject* pyargs) {
+static PyObject* tb_add(TreeBuilder_data* data, PyObject* pyargs) {
   int32_t argc = PyTuple_Size(pyargs);
-  if (argc < 1 || argc > 4) {
+  if (argc != 2) {
     throwinvarg();
     return NULL;
   }
-  PyObject* pyproc = PyTuple_GetItem(pyargs, 0);
-  if (!PyCallable_Check(pyproc)) {
+  if (!tb_check(data)) return NULL;
+  PyObject* pykey = PyTuple_GetItem(pyargs, 0);
+  PyObject* pyvalue = PyTuple_GetItem(pyargs, 1);
+  if (tb_append(data, pykey, pyvalue)) Py_RETURN_TRUE;
+  if (db_raise((DB_data*)data->pydb)) return NULL;
+  Py_RETURN_FALSE;
+}
+
+
+/**
+ * Implementation of add_bulk.
+ */
+static PyObject* tb_add_bulk(TreeBuilder_data* data, PyObject* pyargs) {
+  int32_t argc = PyTuple_Size(pyargs);
+  if (argc != 1) {
     throwinvarg();
     return NULL;
   }
-  PyObject* pypath = Py_None;
-  if (argc > 1) pypath = PyTuple_GetItem(pyargs, 1);
-  PyObject* pymode = Py_None;
-  if (argc > 2) pymode = PyTuple_GetItem(pyargs, 2);
-  PyObject* pyopts = Py_None;
-  if (argc > 3) pyopts = PyTuple_GetItem(pyargs, 3);
-  PyObject* pydb = PyObject_CallMethod(mod_kc, (char*)"DB", (char*)"(O)", pyopts);
-  if (!pydb) return NULL;
-  PyObject* pyrv = PyObject_CallMethod(pydb, (char*)"open", (char*)"(OO)", pypath, pymode);
-  if (!PyObject_IsTrue(pyrv)) {
-    Py_DECREF(pyrv);
-    PyObject* pyerr = PyObject_CallMethod(pydb, (char*)"error", NULL);
-    Py_DECREF(pydb);
-    return pyerr;
+  if (!tb_check(data)) return NULL;
+  PyObject* pyrecs = PyTuple_GetItem(pyargs, 0);
+  bool mapping = PyMapping_Check(pyrecs) && !PySequence_Check(pyrecs);
+  PyObject* pyitems = mapping ? PyMapping_Items(pyrecs) : pyrecs;
+  if (!pyitems) return NULL;
+  if (!mapping) Py_INCREF(pyitems);
+  PyObject* pyiter = PyObject_GetIter(pyitems);
+  Py_DECREF(pyitems);
+  if (!pyiter) return NULL;
+  int64_t cnt = 0;
+  bool err = false;
+  PyObject* pyrec;
+  while ((pyrec = PyIter_Next(pyiter)) != NULL) {
+    if (!PySequence_Check(pyrec) || PySequence_Size(pyrec) != 2) {
+      Py_DECREF(pyrec);
+      Py_DECREF(pyiter);
+      throwinvarg();
+      return NULL;
+    }
+    PyObject* pykey = PySequence_GetItem(pyrec, 0);
+    PyObject* pyvalue = PySequence_GetItem(pyrec, 1);
+    bool rv = tb_append(data, pykey, pyvalue);
+    Py_DECREF(pyvalue);
+    Py_DECREF(pykey);
+    Py_DECREF(pyrec);
+    if (!rv) {
+      err = true;
+      break;
+    }
+    cnt++;
   }
-  pyrv = PyObject_CallFunction(pyproc, (char*)"(O)", pydb);
-  if (!pyrv) {
-    Py_DECREF(pydb);
+  Py_DECREF(pyiter);
+  if (PyErr_Occurred()) return NULL;
+  if (!err) return PyLong_FromLongLong(cnt);
+  if (db_raise((DB_data*)data->pydb)) return NULL;
+  return PyLong_FromLongLong(-1);
+}
+
+
+/**
+ * Implementation of add_db.
+ */
+static PyObject* tb_add_db(TreeBuilder_data* data, PyObject* pyargs) {
+  int32_t argc = PyTuple_Size(pyargs);
+  if (argc != 1) {
+    throwinvarg();
     return NULL;
   }
-  Py_DECREF(pyrv);
-  pyrv = PyObject_CallMethod(pydb, (char*)"close", NULL);
-  if (!pyrv) {
-    Py_DECREF(pydb);
+  if (!tb_check(data)) return NULL;
+  PyObject* pysrc = PyTuple_GetItem(pyargs, 0);
+  if (!PyObject_IsInstance(pysrc, cls_db)) {
+    throwinvarg();
     return NULL;
   }
-  if (!PyObject_IsTrue(pyrv)) {
-    Py_DECREF(pyrv);
-    PyObject* pyerr = PyObject_CallMethod(pydb, (char*)"error", NULL);
-    Py_DECREF(pydb);
-    return pyerr;
+  ExternalSorter* sorter = data->sorter;
+  DB_data* dbdata = (DB_data*)data->pydb;
+  kc::PolyDB* db = dbdata->db;
+  kc::PolyDB* src = ((DB_data*)pysrc)->db;
+  NativeFunction nf((DB_data*)pysrc);
+  kc::PolyDB::Cursor* cur = src->cursor();
+  int64_t cnt = 0;
+  bool err = false;
+  if (cur->jump()) {
+    while (true) {
+      size_t ksiz, vsiz;
+      const char* vbuf;
+      char* kbuf = cur->get(&ksiz, &vbuf, &vsiz, true);
+      if (!kbuf) {
+        if (cur->error() != kc::PolyDB::Error::NOREC) err = true;
+        break;
+      }
+      sorter->append(kbuf, ksiz, vbuf, vsiz);
+      delete[] kbuf;
+      cnt++;
+      if (sorter->full() && !sorter->spill()) {
+        kc::PolyDB::Error::Code code;
+        std::string message;
+        if (sorter->error(&code, &message)) db->set_error(code, message.c_str());
+        cnt = -1;
+        break;
+      }
+    }
+  } else if (cur->error() != kc::PolyDB::Error::NOREC) {
+    err = true;
   }
-  Py_DECREF(pyrv);
-  Py_DECREF(pydb);
-  Py_RETURN_NONE;
+  if (err) {
+    kc::PolyDB::Error e = src->error();
+    db->set_error(e.code(), e.message());
+    cnt = -1;
+  }
+  delete cur;
+  nf.cleanup();
+  if (cnt < 0 && db_raise(dbdata)) return NULL;
+  return PyLong_FromLongLong(cnt);
+}
+
+
+/**
+ * Implementation of finish.
+ */
+static PyObject* tb_finish(TreeBuilder_data* data) {
+  if (!tb_check(data)) return NULL;
+  ExternalSorter* sorter = data->sorter;
+  DB_data* dbdata = (DB_data*)data->pydb;
+  NativeFunction nf(dbdata);
+  int64_t cnt = sorter->finish(dbdata->db);
+  delete sorter;
+  nf.cleanup();
+  data->sorter = NULL;
+  if (cnt < 0 && db_raise(dbdata)) return NULL;
+  return PyLong_FromLongLong(cnt);
+}
+
+
+/**
+ * Implementation of status.
+ */
+static PyObject* tb_status(TreeBuilder_data* data) {
+  if (!tb_check(data)) return NULL;
+  StringMap status;
+  data->sorter->status(&status);
+  return maptopymap(&status);
+}
+
+
+/**
+ * Implementation of db.
+ */
+static PyObject* tb_db(TreeBuilder_data* data) {
+  Py_INCREF(data->pydb);
+  return data->pydb;
 }
 
 